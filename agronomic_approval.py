@@ -5,12 +5,13 @@ Expert dashboard for conversation approval and management
 from fastapi import FastAPI, Request, Form, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
-import httpx
 import logging
 from typing import List, Dict, Any, Optional
 import json
 from datetime import datetime
 
+from http_clients import http_clients, register_http_clients
+
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
@@ -19,6 +20,7 @@ app = FastAPI(
     description="Expert dashboard for conversation approval and management",
     version="1.0.0"
 )
+register_http_clients(app)
 
 # Setup templates
 templates = Jinja2Templates(directory="templates")
@@ -26,13 +28,12 @@ templates = Jinja2Templates(directory="templates")
 async def get_api_gateway_data(endpoint: str) -> Dict[str, Any]:
     """Get data from API Gateway"""
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(f"http://localhost:8000{endpoint}")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.warning(f"API Gateway returned status {response.status_code}")
-                return {"error": f"API returned status {response.status_code}"}
+        response = await http_clients.get(f"http://localhost:8000{endpoint}", timeout=10)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.warning(f"API Gateway returned status {response.status_code}")
+            return {"error": f"API returned status {response.status_code}"}
     except Exception as e:
         logger.error(f"Failed to connect to API Gateway: {str(e)}")
         return {"error": str(e)}
@@ -40,13 +41,12 @@ async def get_api_gateway_data(endpoint: str) -> Dict[str, Any]:
 async def send_approval_request(endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Send approval request to API Gateway"""
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            response = await client.post(f"http://localhost:8000{endpoint}", json=data)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.warning(f"API Gateway returned status {response.status_code}")
-                return {"error": f"API returned status {response.status_code}"}
+        response = await http_clients.post(f"http://localhost:8000{endpoint}", json=data, timeout=15)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.warning(f"API Gateway returned status {response.status_code}")
+            return {"error": f"API returned status {response.status_code}"}
     except Exception as e:
         logger.error(f"Failed to send approval request: {str(e)}")
         return {"error": str(e)}
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Shared asyncpg Connection Pool
+One process-wide async pool used natively by every FastAPI app's async handlers
+"""
+
+import os
+import html
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+
+from metrics import call_site
+from database_pool import DEFAULT_DB_NAME
+from sql_profiler import sql_profiler, status_rows
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+POOL_MIN_SIZE = int(os.getenv('DB_ASYNC_POOL_MIN', '2'))
+POOL_MAX_SIZE = int(os.getenv('DB_ASYNC_POOL_MAX', '10'))
+STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '256'))
+QUERY_TIMEOUT = float(os.getenv('DB_QUERY_TIMEOUT', '10'))
+ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', '5'))
+MAX_INACTIVE_LIFETIME = float(os.getenv('DB_POOL_MAX_INACTIVE', '300'))
+
+# SSL modes tried in order when the pool is first created (AWS RDS requires SSL)
+SSL_MODES = [mode.strip() for mode in os.getenv('DB_SSL_MODES', 'require,prefer').split(',') if mode.strip()]
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+_pool_lock: Optional[asyncio.Lock] = None
+_pool_ssl_mode: Optional[str] = None
+_pool_created_at: Optional[float] = None
+
+
+class InstrumentedConnection(asyncpg.Connection):
+    """asyncpg connection that profiles each statement against its Python call site (sql_profiler)"""
+
+    async def _timed(self, method, query, args, kwargs):
+        site = call_site(2)
+        started = time.perf_counter()
+        try:
+            result = await method(query, *args, **kwargs)
+        except Exception:
+            sql_profiler.record("asyncpg", query, site, time.perf_counter() - started, failed=True)
+            raise
+        if isinstance(result, list):
+            rows = len(result)
+        elif isinstance(result, str):
+            rows = status_rows(result)
+        else:
+            rows = int(result is not None)
+        entry = sql_profiler.record("asyncpg", query, site, time.perf_counter() - started, rows=rows)
+        if entry is not None and method.__name__ != "executemany":
+            sql_profiler.explain_async(entry, query, args)
+        return result
+
+    async def fetch(self, query, *args, **kwargs):
+        return await self._timed(super().fetch, query, args, kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        return await self._timed(super().fetchrow, query, args, kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        return await self._timed(super().fetchval, query, args, kwargs)
+
+    async def execute(self, query, *args, **kwargs):
+        return await self._timed(super().execute, query, args, kwargs)
+
+    async def executemany(self, command, args, **kwargs):
+        return await self._timed(super().executemany, command, (args,), kwargs)
+
+
+def _connection_params() -> Dict[str, Any]:
+    """Connection parameters from the DB_* environment (raw password, no URL encoding)"""
+    password = os.getenv('DB_PASSWORD')
+    # Handle potential HTML encoding issues from AWS App Runner
+    if password and ('&lt;' in password or '&gt;' in password or '&amp;' in password):
+        password = html.unescape(password)
+
+    host = os.getenv('DB_HOST')
+    if not host or not password:
+        raise ValueError("Missing required environment variables: DB_HOST or DB_PASSWORD")
+
+    return {
+        'host': host.strip().replace(" ", ""),
+        'port': int(os.getenv('DB_PORT', '5432')),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': password,
+        'database': os.getenv('DB_NAME', DEFAULT_DB_NAME),
+        'server_settings': {
+            'application_name': 'ava_olo_dashboard'
+        }
+    }
+
+
+async def init_async_pool() -> asyncpg.Pool:
+    """Create the shared pool on the running event loop (idempotent)"""
+    global _pool, _pool_loop, _pool_lock, _pool_ssl_mode, _pool_created_at
+
+    loop = asyncio.get_running_loop()
+    if _pool is not None and not _pool._closed:
+        if _pool_loop is not loop:
+            raise RuntimeError("Shared asyncpg pool is bound to a different event loop")
+        return _pool
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        if _pool is not None and not _pool._closed:
+            return _pool
+
+        params = _connection_params()
+        last_error = None
+        for ssl_mode in SSL_MODES:
+            try:
+                start = time.time()
+                pool = await asyncpg.create_pool(
+                    **params,
+                    ssl=ssl_mode if ssl_mode != 'disable' else False,
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    statement_cache_size=STATEMENT_CACHE_SIZE,
+                    command_timeout=QUERY_TIMEOUT,
+                    max_inactive_connection_lifetime=MAX_INACTIVE_LIFETIME,
+                    timeout=ACQUIRE_TIMEOUT,
+                    connection_class=InstrumentedConnection
+                )
+                _pool, _pool_loop, _pool_ssl_mode = pool, loop, ssl_mode
+                _pool_created_at = time.time()
+                logger.info(
+                    f"✅ asyncpg pool ready ({POOL_MIN_SIZE}-{POOL_MAX_SIZE} connections, "
+                    f"ssl={ssl_mode}) in {(time.time() - start) * 1000:.0f}ms"
+                )
+                return _pool
+            except Exception as e:
+                last_error = e
+                logger.warning(f"asyncpg pool with SSL {ssl_mode} failed: {str(e)[:100]}")
+
+        raise ConnectionError(f"Could not create asyncpg pool: {last_error}")
+
+
+async def close_async_pool():
+    """Close the shared pool, waiting for checked-out connections to be released"""
+    global _pool, _pool_loop
+    if _pool is not None:
+        await _pool.close()
+        logger.info("asyncpg pool closed")
+    _pool, _pool_loop = None, None
+
+
+async def get_async_pool() -> asyncpg.Pool:
+    """Return the shared pool, creating it lazily for apps without a startup hook"""
+    return await init_async_pool()
+
+
+@asynccontextmanager
+async def acquire(timeout: float = ACQUIRE_TIMEOUT):
+    """Check out a pooled connection for several statements (returned on exit)"""
+    pool = await get_async_pool()
+    async with pool.acquire(timeout=timeout) as connection:
+        yield connection
+
+
+async def fetch(query: str, *args, timeout: float = None) -> List[asyncpg.Record]:
+    pool = await get_async_pool()
+    return await pool.fetch(query, *args, timeout=timeout)
+
+
+async def fetchrow(query: str, *args, timeout: float = None) -> Optional[asyncpg.Record]:
+    pool = await get_async_pool()
+    return await pool.fetchrow(query, *args, timeout=timeout)
+
+
+async def fetchval(query: str, *args, timeout: float = None) -> Any:
+    pool = await get_async_pool()
+    return await pool.fetchval(query, *args, timeout=timeout)
+
+
+async def execute(query: str, *args, timeout: float = None) -> str:
+    pool = await get_async_pool()
+    return await pool.execute(query, *args, timeout=timeout)
+
+
+async def connect_dedicated() -> asyncpg.Connection:
+    """Open a long-lived connection outside the pool (LISTEN channels)"""
+    ssl_mode = _pool_ssl_mode or (SSL_MODES[0] if SSL_MODES else 'prefer')
+    return await asyncpg.connect(
+        **_connection_params(),
+        ssl=ssl_mode if ssl_mode != 'disable' else False,
+        timeout=ACQUIRE_TIMEOUT
+    )
+
+
+def get_async_pool_stats() -> Dict[str, Any]:
+    """Pool size/idle counters for health endpoints"""
+    if _pool is None or _pool._closed:
+        return {"initialized": False}
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    return {
+        "initialized": True,
+        "size": size,
+        "idle": idle,
+        "in_use": size - idle,
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+        "statement_cache_size": STATEMENT_CACHE_SIZE,
+        "query_timeout_s": QUERY_TIMEOUT,
+        "ssl_mode": _pool_ssl_mode,
+        "uptime_s": int(time.time() - _pool_created_at) if _pool_created_at else 0
+    }
+
+
+def register_async_pool(app):
+    """Open the shared pool on app startup and close it on shutdown"""
+    @app.on_event("startup")
+    async def _open_async_pool():
+        try:
+            await init_async_pool()
+        except Exception as e:
+            # Constitutional error isolation: handlers retry lazily on first use
+            logger.error(f"asyncpg pool initialization failed: {e}")
+
+    @app.on_event("shutdown")
+    async def _close_async_pool():
+        await close_async_pool()
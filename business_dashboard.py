@@ -2,29 +2,40 @@
 AVA OLO Business KPI Dashboard - Port 8004
 Comprehensive business metrics and analytics
 """
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+import asyncio
 import logging
 import os
 import sys
 from typing import Dict, Any, List
 from datetime import datetime, timedelta, date
 import json
+from functools import partial
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database_operations import DatabaseOperations
+from growth_timeseries import FarmerGrowthSeries, validate_window
+from kpi_executor import KPIExecutor, server_timing_header
+from kpi_snapshot import KPISnapshotStore, classify_crop_hectares
+from response_cache import cached_response
+from metrics import instrument_app
 
 logger = logging.getLogger(__name__)
 
+# Serve overview/trend KPIs from the business_kpi_snapshot table
+KPI_SNAPSHOT_ENABLED = os.getenv("KPI_SNAPSHOT_ENABLED", "true").lower() == "true"
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AVA OLO Business Dashboard",
     description="Comprehensive business KPIs and analytics",
     version="3.0.0"
 )
+instrument_app(app, "business_dashboard")
 
 # Setup templates
 templates = Jinja2Templates(directory="templates")
@@ -37,10 +48,21 @@ class BusinessAnalytics:
     
     def __init__(self):
         self.db_ops = DatabaseOperations()
+        self.snapshot = KPISnapshotStore(self.db_ops)
+    
+    def _snapshot_kpi(self, key: str) -> Any:
+        """KPI from the materialized snapshot; None means compute it live"""
+        if not KPI_SNAPSHOT_ENABLED:
+            return None
+        return self.snapshot.get(key)
     
     # 1. DATABASE OVERVIEW
     async def get_total_farmers(self) -> Dict[str, Any]:
         """Get total number of farmers and recent change - Constitutional compliance"""
+        snapshot = self._snapshot_kpi("total_farmers")
+        if snapshot is not None:
+            return snapshot
+        
         try:
             with self.db_ops.get_session() as session:
                 from sqlalchemy import text
@@ -76,6 +98,10 @@ class BusinessAnalytics:
     
     async def get_total_hectares(self) -> Dict[str, Any]:
         """Get total hectares managed"""
+        snapshot = self._snapshot_kpi("total_hectares")
+        if snapshot is not None:
+            return snapshot
+        
         try:
             with self.db_ops.get_session() as session:
                 from sqlalchemy import text
@@ -100,6 +126,10 @@ class BusinessAnalytics:
     
     async def get_hectare_breakdown(self) -> Dict[str, float]:
         """Get hectare breakdown by crop type"""
+        snapshot = self._snapshot_kpi("hectare_breakdown")
+        if snapshot is not None:
+            return snapshot
+        
         try:
             with self.db_ops.get_session() as session:
                 from sqlalchemy import text
@@ -115,27 +145,7 @@ class BusinessAnalytics:
                     """)
                 ).fetchall()
                 
-                breakdown = {
-                    "arable_crops": 0,
-                    "vineyards": 0,
-                    "orchards": 0,
-                    "others": 0
-                }
-                
-                for row in results:
-                    crop_type = row[0].lower() if row[0] else 'others'
-                    hectares = row[1] or 0
-                    
-                    if 'wheat' in crop_type or 'corn' in crop_type or 'grain' in crop_type:
-                        breakdown["arable_crops"] += hectares
-                    elif 'vine' in crop_type or 'grape' in crop_type:
-                        breakdown["vineyards"] += hectares
-                    elif 'orchard' in crop_type or 'fruit' in crop_type:
-                        breakdown["orchards"] += hectares
-                    else:
-                        breakdown["others"] += hectares
-                
-                return {k: round(v, 2) for k, v in breakdown.items()}
+                return classify_crop_hectares(results)
                 
         except Exception as e:
             logger.error(f"Error getting hectare breakdown: {e}")
@@ -144,6 +154,10 @@ class BusinessAnalytics:
     # 2. GROWTH TRENDS
     async def get_growth_trends(self) -> Dict[str, Dict[str, int]]:
         """Get growth trends for 24h, 7d, 30d"""
+        snapshot = self._snapshot_kpi("growth_trends")
+        if snapshot is not None:
+            return snapshot
+        
         try:
             with self.db_ops.get_session() as session:
                 from sqlalchemy import text
@@ -205,105 +219,48 @@ class BusinessAnalytics:
             }
     
     # 3. FARMER GROWTH CHARTS
-    async def get_farmer_growth_daily(self) -> Dict[str, List]:
-        """Get daily farmer growth for last 30 days"""
+    async def get_farmer_growth(self, days: int = 30, bucket: str = "day") -> Dict[str, List]:
+        """Get bucketed farmer growth (new, unsubscribed, cumulative) for a window"""
         try:
             with self.db_ops.get_session() as session:
-                from sqlalchemy import text
-                
-                dates = []
-                new_farmers = []
-                unsubscribed = []
-                
-                for i in range(29, -1, -1):
-                    day = datetime.now() - timedelta(days=i)
-                    day_start = day.replace(hour=0, minute=0, second=0)
-                    day_end = day_start + timedelta(days=1)
-                    
-                    dates.append(day.strftime("%Y-%m-%d"))
-                    
-                    # New farmers for this day
-                    new_count = session.execute(
-                        text("SELECT COUNT(*) FROM farmers WHERE created_at >= :start AND created_at < :end"),
-                        {"start": day_start, "end": day_end}
-                    ).scalar() or 0
-                    new_farmers.append(new_count)
-                    
-                    # Unsubscribed for this day
-                    unsub_count = session.execute(
-                        text("SELECT COUNT(*) FROM farmers WHERE is_active = FALSE AND updated_at >= :start AND updated_at < :end"),
-                        {"start": day_start, "end": day_end}
-                    ).scalar() or 0
-                    unsubscribed.append(unsub_count)
-                
-                return {
-                    "dates": dates,
-                    "new_farmers": new_farmers,
-                    "unsubscribed": unsubscribed
-                }
-                
+                return FarmerGrowthSeries(session).build(days=days, bucket=bucket)
+        except ValueError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting daily farmer growth: {e}")
+            logger.error(f"Error getting farmer growth series: {e}")
             return {
+                "window_days": days,
+                "bucket": bucket,
                 "dates": [],
                 "new_farmers": [],
-                "unsubscribed": []
+                "unsubscribed": [],
+                "cumulative": []
             }
     
-    async def get_farmer_growth_cumulative(self) -> Dict[str, List]:
+    async def get_farmer_growth_daily(self, series: Dict[str, List] = None) -> Dict[str, List]:
+        """Get daily farmer growth for last 30 days"""
+        series = series or await self.get_farmer_growth(30, "day")
+        return {
+            "dates": series["dates"],
+            "new_farmers": series["new_farmers"],
+            "unsubscribed": series["unsubscribed"]
+        }
+    
+    async def get_farmer_growth_cumulative(self, series: Dict[str, List] = None) -> Dict[str, List]:
         """Get cumulative farmer growth over 30 days"""
-        try:
-            with self.db_ops.get_session() as session:
-                from sqlalchemy import text
-                
-                dates = []
-                cumulative = []
-                
-                # Get total farmers 30 days ago
-                start_date = datetime.now() - timedelta(days=30)
-                base_count = session.execute(
-                    text("SELECT COUNT(*) FROM farmers WHERE created_at < :start_date"),
-                    {"start_date": start_date}
-                ).scalar() or 0
-                
-                running_total = base_count
-                
-                for i in range(29, -1, -1):
-                    day = datetime.now() - timedelta(days=i)
-                    dates.append(day.strftime("%Y-%m-%d"))
-                    
-                    # Count for this specific day
-                    day_start = day.replace(hour=0, minute=0, second=0)
-                    day_end = day_start + timedelta(days=1)
-                    
-                    new_count = session.execute(
-                        text("SELECT COUNT(*) FROM farmers WHERE created_at >= :start AND created_at < :end"),
-                        {"start": day_start, "end": day_end}
-                    ).scalar() or 0
-                    
-                    unsub_count = session.execute(
-                        text("SELECT COUNT(*) FROM farmers WHERE is_active = FALSE AND updated_at >= :start AND updated_at < :end"),
-                        {"start": day_start, "end": day_end}
-                    ).scalar() or 0
-                    
-                    running_total += (new_count - unsub_count)
-                    cumulative.append(running_total)
-                
-                return {
-                    "dates": dates,
-                    "cumulative": cumulative
-                }
-                
-        except Exception as e:
-            logger.error(f"Error getting cumulative growth: {e}")
-            return {
-                "dates": [],
-                "cumulative": []
-            }
+        series = series or await self.get_farmer_growth(30, "day")
+        return {
+            "dates": series["dates"],
+            "cumulative": series["cumulative"]
+        }
     
     # 4. TODAY'S ACTIVITY
     async def get_todays_activity(self) -> Dict[str, int]:
         """Get today's activity metrics"""
+        snapshot = self._snapshot_kpi("todays_activity")
+        if snapshot is not None:
+            return snapshot
+        
         try:
             with self.db_ops.get_session() as session:
                 from sqlalchemy import text
@@ -487,56 +444,118 @@ class BusinessAnalytics:
 # Initialize analytics
 analytics = BusinessAnalytics()
 
+# Bounded fan-out for KPI providers (KPI_MAX_WORKERS / KPI_PROVIDER_TIMEOUT)
+kpi_executor = KPIExecutor()
+
+EMPTY_TRENDS = {
+    "24h": {"new_farmers": 0, "unsubscribed": 0, "new_hectares": 0},
+    "7d": {"new_farmers": 0, "unsubscribed": 0, "new_hectares": 0},
+    "30d": {"new_farmers": 0, "unsubscribed": 0, "new_hectares": 0}
+}
+
+EMPTY_ACTIVITY = {
+    "new_fields": 0,
+    "crops_planted": 0,
+    "new_operations": 0,
+    "questions_asked": 0,
+    "active_farmers": 0
+}
+
+def get_kpi_providers(names: List[str]) -> Dict[str, tuple]:
+    """Provider callables with the partial-result default used on timeout/error"""
+    providers = {
+        "total_farmers": (analytics.get_total_farmers, {"count": 0, "change": "0"}),
+        "total_hectares": (analytics.get_total_hectares, {"count": 0, "change": "0"}),
+        "hectare_breakdown": (analytics.get_hectare_breakdown, {"arable_crops": 0, "vineyards": 0, "orchards": 0, "others": 0}),
+        "growth_trends": (analytics.get_growth_trends, EMPTY_TRENDS),
+        "farmer_growth": (analytics.get_farmer_growth, {"dates": [], "new_farmers": [], "unsubscribed": [], "cumulative": []}),
+        "todays_activity": (analytics.get_todays_activity, EMPTY_ACTIVITY),
+        "activity_stream": (analytics.get_activity_stream, []),
+        "recent_changes": (analytics.get_recent_database_changes, [])
+    }
+    return {name: providers[name] for name in names}
+
+@app.on_event("startup")
+async def startup_event():
+    """Start the background KPI snapshot refresh"""
+    if KPI_SNAPSHOT_ENABLED:
+        analytics.snapshot.start_background_refresh()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release KPI worker threads"""
+    analytics.snapshot.stop_background_refresh()
+    kpi_executor.shutdown()
+
 @app.get("/", response_class=HTMLResponse)
 async def business_dashboard(request: Request):
     """Main business dashboard with comprehensive KPIs"""
     
-    # Fetch all data concurrently for performance
-    total_farmers = await analytics.get_total_farmers()
-    total_hectares = await analytics.get_total_hectares()
-    hectare_breakdown = await analytics.get_hectare_breakdown()
-    growth_trends = await analytics.get_growth_trends()
-    farmer_growth_daily = await analytics.get_farmer_growth_daily()
-    farmer_growth_cumulative = await analytics.get_farmer_growth_cumulative()
-    todays_activity = await analytics.get_todays_activity()
-    activity_stream = await analytics.get_activity_stream()
-    recent_changes = await analytics.get_recent_database_changes()
+    # Fetch all data concurrently - page latency follows the slowest provider
+    kpis, timings = await kpi_executor.run(get_kpi_providers([
+        "total_farmers", "total_hectares", "hectare_breakdown", "growth_trends",
+        "farmer_growth", "todays_activity", "activity_stream", "recent_changes"
+    ]))
+    farmer_growth = kpis["farmer_growth"]
     
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "business_dashboard.html",
         {
             "request": request,
-            "total_farmers": total_farmers,
-            "total_hectares": total_hectares,
-            "hectare_breakdown": hectare_breakdown,
-            "growth_trends": growth_trends,
-            "farmer_growth_daily": farmer_growth_daily,
-            "farmer_growth_cumulative": farmer_growth_cumulative,
-            "todays_activity": todays_activity,
-            "activity_stream": activity_stream,
-            "recent_changes": recent_changes,
+            "total_farmers": kpis["total_farmers"],
+            "total_hectares": kpis["total_hectares"],
+            "hectare_breakdown": kpis["hectare_breakdown"],
+            "growth_trends": kpis["growth_trends"],
+            "farmer_growth_daily": await analytics.get_farmer_growth_daily(farmer_growth),
+            "farmer_growth_cumulative": await analytics.get_farmer_growth_cumulative(farmer_growth),
+            "todays_activity": kpis["todays_activity"],
+            "activity_stream": kpis["activity_stream"],
+            "recent_changes": kpis["recent_changes"],
+            "kpi_timings": timings,
             "current_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
     )
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
 
 @app.get("/api/metrics")
-async def get_metrics():
-    """API endpoint for real-time metrics"""
-    return {
-        "total_farmers": await analytics.get_total_farmers(),
-        "total_hectares": await analytics.get_total_hectares(),
-        "growth_trends": await analytics.get_growth_trends(),
-        "todays_activity": await analytics.get_todays_activity()
-    }
+@cached_response(ttl=30, stale_ttl=60, tags=("farmers", "fields", "tasks"))
+async def get_metrics(response: Response):
+    """API endpoint for real-time metrics (provider timings go in Server-Timing, not the cached payload)"""
+    kpis, timings = await kpi_executor.run(get_kpi_providers([
+        "total_farmers", "total_hectares", "growth_trends", "todays_activity"
+    ]))
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return kpis
 
 @app.get("/api/charts/farmer-growth")
-async def get_farmer_growth_charts():
-    """API endpoint for farmer growth charts data"""
+async def get_farmer_growth_charts(days: int = 30, bucket: str = "day"):
+    """API endpoint for farmer growth charts data (7/30/90/365 days, day/week/month buckets)"""
+    try:
+        validate_window(days, bucket)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # The growth query is blocking SQLAlchemy work - keep it off the event loop
+    kpis, _ = await kpi_executor.run({
+        "farmer_growth": (partial(analytics.get_farmer_growth, days, bucket),
+                          {"dates": [], "new_farmers": [], "unsubscribed": [], "cumulative": []})
+    })
+    series = kpis["farmer_growth"]
+    
     return {
-        "daily": await analytics.get_farmer_growth_daily(),
-        "cumulative": await analytics.get_farmer_growth_cumulative()
+        "window_days": days,
+        "bucket": bucket,
+        "daily": await analytics.get_farmer_growth_daily(series),
+        "cumulative": await analytics.get_farmer_growth_cumulative(series)
     }
 
+@app.post("/api/kpi-snapshot/refresh")
+async def refresh_kpi_snapshot(full: bool = False):
+    """Force a KPI snapshot refresh (incremental unless full=true)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: analytics.snapshot.refresh(full=full))
+
 @app.get("/api/activity-stream")
 async def get_activity_stream():
     """API endpoint for activity stream"""
@@ -0,0 +1,387 @@
+"""
+Cost Analytics Rollups
+Hourly/daily farmer_interaction_costs rollups priced from cost_rates, with time series, top farmers and spend projection
+"""
+import os
+import time
+import asyncio
+import logging
+import calendar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from async_database import acquire
+
+logger = logging.getLogger(__name__)
+
+# Incremental refresh interval and hourly bucket retention (daily buckets are kept)
+COST_ROLLUP_REFRESH_SECONDS = float(os.getenv('COST_ROLLUP_REFRESH_SECONDS', '60'))
+COST_ROLLUP_HOURLY_RETENTION_DAYS = int(os.getenv('COST_ROLLUP_HOURLY_RETENTION_DAYS', '35'))
+
+# Days of daily rollups averaged for the month-end projection
+COST_PROJECTION_WINDOW_DAYS = int(os.getenv('COST_PROJECTION_WINDOW_DAYS', '7'))
+
+GRANULARITIES = {"hour": "cost_rollup_hourly", "day": "cost_rollup_daily"}
+GROUP_COLUMNS = ("api_service", "interaction_type")
+
+# Serializes refreshes across app instances
+ROLLUP_LOCK_KEY = 0x636F7374  # 'cost'
+
+ROLLUP_DDL = [
+    *(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        bucket TIMESTAMP NOT NULL,
+        farmer_id INTEGER NOT NULL,
+        api_service VARCHAR(50) NOT NULL,
+        interaction_type VARCHAR(50) NOT NULL,
+        events INTEGER NOT NULL DEFAULT 0,
+        cost_amount DECIMAL(14,6) NOT NULL DEFAULT 0,
+        tokens_used BIGINT NOT NULL DEFAULT 0,
+        rated_cost DECIMAL(14,6) NOT NULL DEFAULT 0,
+        unrated_events INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket, farmer_id, api_service, interaction_type)
+    )
+    """ for table in GRANULARITIES.values()),
+    "CREATE INDEX IF NOT EXISTS idx_cost_rollup_daily_farmer ON cost_rollup_daily(farmer_id, bucket)",
+    """
+    CREATE TABLE IF NOT EXISTS cost_rollup_state (
+        id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        last_id BIGINT NOT NULL DEFAULT 0,
+        seen_id BIGINT NOT NULL DEFAULT 0,
+        refreshed_at TIMESTAMP
+    )
+    """,
+    "INSERT INTO cost_rollup_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING"
+]
+
+# Best cost_rates row for an event: '<service>_<type>', then '<service>', then '<service>_*'
+RATE_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT cr.cost_per_unit, cr.unit_type
+        FROM cost_rates cr
+        WHERE cr.service_name IN (c.api_service || '_' || c.interaction_type, c.api_service)
+           OR cr.service_name LIKE c.api_service || '\\_%'
+        ORDER BY cr.service_name = c.api_service || '_' || c.interaction_type DESC,
+                 cr.service_name = c.api_service DESC,
+                 cr.service_name
+        LIMIT 1
+    ) r ON TRUE
+"""
+
+RATED_COST = "(CASE WHEN r.unit_type = 'token' THEN COALESCE(c.tokens_used, 0) * r.cost_per_unit ELSE r.cost_per_unit END)"
+
+ROLLUP_SQL = """
+    INSERT INTO {table} AS t
+        (bucket, farmer_id, api_service, interaction_type, events, cost_amount, tokens_used, rated_cost, unrated_events)
+    SELECT date_trunc('{unit}', c.created_at), c.farmer_id, c.api_service, c.interaction_type,
+           COUNT(*), SUM(c.cost_amount), SUM(COALESCE(c.tokens_used, 0)),
+           SUM(COALESCE({rated}, 0)), COUNT(*) FILTER (WHERE r.cost_per_unit IS NULL)
+    FROM farmer_interaction_costs c
+    {rate_join}
+    WHERE c.id > $1 AND c.id <= $2 AND c.created_at IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (bucket, farmer_id, api_service, interaction_type) DO UPDATE SET
+        events = t.events + EXCLUDED.events,
+        cost_amount = t.cost_amount + EXCLUDED.cost_amount,
+        tokens_used = t.tokens_used + EXCLUDED.tokens_used,
+        rated_cost = t.rated_cost + EXCLUDED.rated_cost,
+        unrated_events = t.unrated_events + EXCLUDED.unrated_events
+"""
+
+# Rolled-up buckets plus the not-yet-rolled-up tail (id > last_id), so reads are exact. last_id is read
+# in the same statement: one snapshot, so a refresh committing in between can't count events twice
+BUCKET_SOURCE = """
+    SELECT bucket, farmer_id, api_service, interaction_type, events, cost_amount, tokens_used, rated_cost
+    FROM {table}
+    WHERE bucket >= $1
+    UNION ALL
+    SELECT date_trunc('{unit}', c.created_at), c.farmer_id, c.api_service, c.interaction_type,
+           1, c.cost_amount, COALESCE(c.tokens_used, 0), COALESCE({rated}, 0)
+    FROM farmer_interaction_costs c
+    {rate_join}
+    WHERE c.id > COALESCE((SELECT last_id FROM cost_rollup_state WHERE id = 1), 0) AND c.created_at >= $1
+"""
+
+
+def _bucket_source(granularity: str) -> str:
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity} (expected one of {', '.join(GRANULARITIES)})")
+    return BUCKET_SOURCE.format(table=GRANULARITIES[granularity], unit=granularity,
+                                rated=RATED_COST, rate_join=RATE_JOIN)
+
+
+def _align(moment: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing moment, so rollups and the raw tail cover the same range"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if granularity == "day" else moment
+
+
+def _float(value) -> float:
+    return round(float(value or 0), 6)
+
+
+class CostAnalytics:
+    """
+    Time-bucketed cost rollups over farmer_interaction_costs.
+
+    Events are folded into hourly and daily buckets per (farmer_id,
+    api_service, interaction_type). Each bucket is priced from cost_rates
+    when it is rolled up, so later rate changes don't rewrite history
+    (``refresh(rebuild=True)`` reprices everything). Refreshes are
+    incremental by event id. Each one rolls up the ids that were already
+    visible at the previous refresh, so rows from transactions still open at
+    that point are not skipped. Reads combine the buckets with the small
+    unrolled tail, so they are exact and cost O(buckets), not O(events).
+    """
+
+    def __init__(self, refresh_interval: float = COST_ROLLUP_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._ready = False
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"refreshes": 0, "events_rolled_up": 0, "refresh_errors": 0,
+                      "last_refresh_ms": 0.0, "last_refresh": None, "last_error": None}
+
+    # ---- maintenance -----------------------------------------------------
+
+    async def ensure_tables(self, conn) -> bool:
+        """Create rollup tables once the cost tables exist; False until then"""
+        if self._ready:
+            return True
+        exists = await conn.fetchval("SELECT to_regclass('public.farmer_interaction_costs') IS NOT NULL")
+        if not exists:
+            return False
+        for statement in ROLLUP_DDL:
+            await conn.execute(statement)
+        self._ready = True
+        return True
+
+    async def refresh(self, rebuild: bool = False) -> Dict[str, Any]:
+        """Fold newly visible events into the rollups (rebuild: reprice everything from scratch)"""
+        started = time.perf_counter()
+        try:
+            async with acquire() as conn:
+                if not await self.ensure_tables(conn):
+                    return {"status": "skipped", "reason": "cost tables not initialized"}
+                async with conn.transaction():
+                    if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", ROLLUP_LOCK_KEY):
+                        return {"status": "skipped", "reason": "refresh already running"}
+                    if rebuild:
+                        await conn.execute(f"TRUNCATE {', '.join(GRANULARITIES.values())}")
+                        await conn.execute("UPDATE cost_rollup_state SET last_id = 0")
+
+                    state = await conn.fetchrow("SELECT last_id, seen_id FROM cost_rollup_state WHERE id = 1")
+                    current_max = await conn.fetchval("SELECT COALESCE(MAX(id), 0) FROM farmer_interaction_costs")
+                    # Stop at last time's high-water mark; anything newer is still served from the raw tail
+                    upper = max(state["seen_id"], state["last_id"])
+                    rolled_up = 0
+                    if upper > state["last_id"]:
+                        rolled_up = await conn.fetchval(
+                            "SELECT COUNT(*) FROM farmer_interaction_costs WHERE id > $1 AND id <= $2",
+                            state["last_id"], upper
+                        )
+                        for unit, table in GRANULARITIES.items():
+                            await conn.execute(
+                                ROLLUP_SQL.format(table=table, unit=unit, rated=RATED_COST, rate_join=RATE_JOIN),
+                                state["last_id"], upper
+                            )
+                    await conn.execute(
+                        "UPDATE cost_rollup_state SET last_id = $1, seen_id = $2, refreshed_at = NOW() WHERE id = 1",
+                        upper, current_max
+                    )
+                    await conn.execute(
+                        "DELETE FROM cost_rollup_hourly WHERE bucket < NOW() - make_interval(days => $1)",
+                        COST_ROLLUP_HOURLY_RETENTION_DAYS
+                    )
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            self.stats["last_error"] = str(e)[:200]
+            logger.warning(f"Cost rollup refresh failed: {e}")
+            return {"status": "error", "error": str(e)}
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.stats["refreshes"] += 1
+        self.stats["events_rolled_up"] += rolled_up
+        self.stats["last_refresh_ms"] = elapsed_ms
+        self.stats["last_refresh"] = datetime.now().isoformat()
+        return {"status": "success", "events_rolled_up": rolled_up, "last_id": upper, "elapsed_ms": elapsed_ms}
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ---- reads -----------------------------------------------------------
+
+    async def timeseries(self, granularity: str = "day", days: int = 30, farmer_id: Optional[int] = None,
+                         group_by: Optional[str] = None) -> Dict[str, Any]:
+        """Cost per bucket, optionally for one farmer and split by api_service or interaction_type"""
+        if group_by is not None and group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Unsupported group_by: {group_by} (expected one of {', '.join(GROUP_COLUMNS)})")
+        source = _bucket_source(granularity)
+        since = _align(datetime.now() - timedelta(days=days), granularity)
+        farmer_filter = "WHERE farmer_id = $2" if farmer_id is not None else ""
+        sql = f"""
+            SELECT bucket, {group_by or "'total'"} AS series, SUM(events) AS events, SUM(cost_amount) AS cost_amount,
+                   SUM(tokens_used) AS tokens_used, SUM(rated_cost) AS rated_cost
+            FROM ({source}) b
+            {farmer_filter}
+            GROUP BY bucket{', ' + group_by if group_by else ''}
+            ORDER BY bucket
+        """
+        async with acquire() as conn:
+            if not await self.ensure_tables(conn):
+                return {"granularity": granularity, "buckets": [], "series": {}}
+            args = [since] + ([farmer_id] if farmer_id is not None else [])
+            rows = await conn.fetch(sql, *args)
+
+        buckets = sorted({row["bucket"] for row in rows})
+        index = {bucket: i for i, bucket in enumerate(buckets)}
+        series: Dict[str, Dict[str, List[float]]] = {}
+        for row in rows:
+            entry = series.setdefault(row["series"], {"cost_amount": [0.0] * len(buckets),
+                                                      "rated_cost": [0.0] * len(buckets),
+                                                      "events": [0] * len(buckets)})
+            i = index[row["bucket"]]
+            entry["cost_amount"][i] = _float(row["cost_amount"])
+            entry["rated_cost"][i] = _float(row["rated_cost"])
+            entry["events"][i] = int(row["events"])
+        return {
+            "granularity": granularity,
+            "days": days,
+            "farmer_id": farmer_id,
+            "group_by": group_by,
+            "buckets": [bucket.isoformat() for bucket in buckets],
+            "series": series
+        }
+
+    async def top_farmers(self, limit: int = 10, days: int = 30) -> List[Dict[str, Any]]:
+        sql = f"""
+            SELECT b.farmer_id, f.farm_name, SUM(b.events) AS events, SUM(b.cost_amount) AS cost_amount,
+                   SUM(b.tokens_used) AS tokens_used, SUM(b.rated_cost) AS rated_cost
+            FROM ({_bucket_source("day")}) b
+            LEFT JOIN farmers f ON f.id = b.farmer_id
+            GROUP BY b.farmer_id, f.farm_name
+            ORDER BY SUM(b.cost_amount) DESC
+            LIMIT $2
+        """
+        async with acquire() as conn:
+            if not await self.ensure_tables(conn):
+                return []
+            rows = await conn.fetch(sql, _align(datetime.now() - timedelta(days=days), "day"), limit)
+        return [{
+            "farmer_id": row["farmer_id"],
+            "farm_name": row["farm_name"],
+            "events": int(row["events"]),
+            "cost_amount": _float(row["cost_amount"]),
+            "tokens_used": int(row["tokens_used"]),
+            "rated_cost": _float(row["rated_cost"])
+        } for row in rows]
+
+    async def summary(self, days: int = 30, farmer_id: Optional[int] = None) -> Dict[str, Any]:
+        """Totals over the window, with a per-service / per-interaction breakdown"""
+        farmer_filter = "WHERE farmer_id = $2" if farmer_id is not None else ""
+        sql = f"""
+            SELECT api_service, interaction_type, COUNT(DISTINCT farmer_id) AS farmers, SUM(events) AS events,
+                   SUM(cost_amount) AS cost_amount, SUM(tokens_used) AS tokens_used, SUM(rated_cost) AS rated_cost
+            FROM ({_bucket_source("day")}) b
+            {farmer_filter}
+            GROUP BY GROUPING SETS ((api_service, interaction_type), ())
+        """
+        async with acquire() as conn:
+            if not await self.ensure_tables(conn):
+                return {"tables_exist": False}
+            args = [_align(datetime.now() - timedelta(days=days), "day")]
+            rows = await conn.fetch(sql, *(args + ([farmer_id] if farmer_id is not None else [])))
+
+        total = next((row for row in rows if row["api_service"] is None), None)
+        farmers = int(total["farmers"]) if total else 0
+        total_cost = _float(total["cost_amount"]) if total else 0.0
+        return {
+            "tables_exist": True,
+            "days": days,
+            "farmers": farmers,
+            "events": int(total["events"]) if total else 0,
+            "total_cost": total_cost,
+            "rated_cost": _float(total["rated_cost"]) if total else 0.0,
+            "tokens_used": int(total["tokens_used"]) if total else 0,
+            "avg_cost_per_farmer": round(total_cost / max(farmers, 1), 6),
+            "breakdown": [{
+                "api_service": row["api_service"],
+                "interaction_type": row["interaction_type"],
+                "events": int(row["events"]),
+                "cost_amount": _float(row["cost_amount"]),
+                "rated_cost": _float(row["rated_cost"])
+            } for row in sorted(rows, key=lambda r: -(r["cost_amount"] or 0)) if row["api_service"] is not None]
+        }
+
+    async def projection(self, farmer_id: Optional[int] = None,
+                         window_days: int = COST_PROJECTION_WINDOW_DAYS) -> Dict[str, Any]:
+        """Month-to-date spend plus the recent daily run rate for the rest of the month"""
+        now = datetime.now()
+        month_start = _align(now.replace(day=1), "day")
+        window_start = _align(now - timedelta(days=window_days), "day")
+        farmer_filter = "WHERE farmer_id = $4" if farmer_id is not None else ""
+        sql = f"""
+            SELECT COALESCE(SUM(cost_amount) FILTER (WHERE bucket >= $2), 0) AS month_to_date,
+                   COALESCE(SUM(cost_amount) FILTER (WHERE bucket >= $3), 0) AS window_cost
+            FROM ({_bucket_source("day")}) b
+            {farmer_filter}
+        """
+        async with acquire() as conn:
+            if not await self.ensure_tables(conn):
+                return {"tables_exist": False}
+            args = [min(month_start, window_start), month_start, window_start]
+            row = await conn.fetchrow(sql, *(args + ([farmer_id] if farmer_id is not None else [])))
+
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+        elapsed_days = (now - month_start).total_seconds() / 86400
+        daily_rate = float(row["window_cost"]) / max((now - window_start).total_seconds() / 86400, 1e-9)
+        month_to_date = float(row["month_to_date"])
+        return {
+            "tables_exist": True,
+            "month": now.strftime("%Y-%m"),
+            "month_to_date": round(month_to_date, 6),
+            "daily_run_rate": round(daily_rate, 6),
+            "window_days": window_days,
+            "projected_month_total": round(month_to_date + daily_rate * max(days_in_month - elapsed_days, 0), 2)
+        }
+
+    async def farmer_detail(self, farmer_id: int, days: int = 30) -> Dict[str, Any]:
+        summary, daily, projection = await asyncio.gather(
+            self.summary(days, farmer_id),
+            self.timeseries("day", days, farmer_id, group_by="api_service"),
+            self.projection(farmer_id)
+        )
+        return {"farmer_id": farmer_id, "summary": summary, "daily": daily, "projection": projection}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "running": self._task is not None and not self._task.done(),
+                "refresh_interval": self.refresh_interval}
+
+
+# Global engine behind /cost-analytics and its API
+cost_analytics = CostAnalytics()
+
+
+def register_cost_analytics(app):
+    """Roll up cost events in the background while the app runs"""
+    @app.on_event("startup")
+    async def _start_cost_analytics():
+        cost_analytics.start()
+
+    @app.on_event("shutdown")
+    async def _stop_cost_analytics():
+        await cost_analytics.stop()
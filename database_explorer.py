@@ -10,15 +10,26 @@ import os
 import sys
 from typing import Dict, Any, List, Optional
 import tempfile
+import base64
+import json
 import pandas as pd
-from datetime import datetime, timedelta
-from sqlalchemy import text, inspect
+from datetime import datetime, date, timedelta
+from sqlalchemy import text
 import re
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database_operations import DatabaseOperations
+from async_database import register_async_pool, acquire as async_acquire, fetch as async_fetch
+from schema_catalog import schema_catalog, register_schema_catalog
+from nl_sql_cache import register_translation_cache
+from streaming_export import ExportStream
+from sql_dump_loader import SqlDumpLoader
+from sse_stream import sse_response, stream_select_rows
+from metrics import instrument_app
+from fastapi.concurrency import run_in_threadpool
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +39,10 @@ app = FastAPI(
     description="Professional database exploration with AI-powered querying",
     version="3.0.0"
 )
+register_async_pool(app)
+register_schema_catalog(app)
+register_translation_cache(app)
+instrument_app(app, "database_explorer")
 
 # Setup templates
 templates = Jinja2Templates(directory="templates")
@@ -54,6 +69,34 @@ except ImportError:
     LLM_AVAILABLE = False
     logger.warning("LLM query handler not available")
 
+# Tables estimated above this many rows get planner estimates instead of COUNT(*)
+EXACT_COUNT_THRESHOLD = int(os.getenv('EXPLORER_EXACT_COUNT_THRESHOLD', '100000'))
+
+def encode_page_cursor(sort_value: Any, row_id: Any, direction: str) -> str:
+    """Opaque keyset token for the (sort column, id) position of a boundary row"""
+    if isinstance(sort_value, datetime):
+        sort_value = {"t": sort_value.isoformat()}
+    elif isinstance(sort_value, date):
+        sort_value = {"date": sort_value.isoformat()}
+    payload = json.dumps({"v": sort_value, "id": row_id, "d": direction}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_page_cursor(token: str) -> Dict[str, Any]:
+    """Inverse of encode_page_cursor (raises ValueError on tampered tokens)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        sort_value = payload.get("v")
+        if isinstance(sort_value, dict) and "t" in sort_value:
+            sort_value = datetime.fromisoformat(sort_value["t"])
+        elif isinstance(sort_value, dict) and "date" in sort_value:
+            sort_value = date.fromisoformat(sort_value["date"])
+        if payload.get("d") not in ("next", "prev") or "id" not in payload:
+            raise ValueError("incomplete cursor")
+        return {"value": sort_value, "id": payload["id"], "direction": payload["d"]}
+    except Exception as e:
+        raise ValueError(f"Invalid page cursor: {e}")
+
 class DatabaseExplorer:
     """Enhanced database explorer with AI query capabilities"""
     
@@ -94,10 +137,10 @@ class DatabaseExplorer:
         """Get comprehensive table information"""
         try:
             with self.db_ops.get_session() as session:
-                inspector = inspect(session.bind)
-                
-                # Get columns
-                columns = inspector.get_columns(table_name)
+                # Get columns (cached schema catalog)
+                if not schema_catalog.has_table(table_name, session):
+                    raise ValueError(f'relation "{table_name}" does not exist')
+                columns = schema_catalog.column_details(table_name, session)
                 
                 # Get row count
                 total_count = session.execute(
@@ -143,7 +186,7 @@ class DatabaseExplorer:
                 return {
                     "table_name": table_name,
                     "total_records": total_count,
-                    "columns": [{"name": col["name"], "type": str(col["type"])} for col in columns],
+                    "columns": [{"name": col["name"], "type": col["type"]} for col in columns],
                     "recent_counts": counts,
                     "sample_data": [dict(zip([col["name"] for col in columns], row)) for row in sample_rows] if sample_rows else []
                 }
@@ -156,10 +199,7 @@ class DatabaseExplorer:
                 # Try to list available tables
                 try:
                     with self.db_ops.get_session() as session:
-                        tables_result = session.execute(
-                            text("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name")
-                        ).fetchall()
-                        available_tables = [t[0] for t in tables_result] if tables_result else []
+                        available_tables = schema_catalog.tables(session)
                         return {
                             "table_name": table_name,
                             "error": f"Table '{table_name}' not found. Available tables: {', '.join(available_tables) if available_tables else 'No tables found in database'}"
@@ -171,13 +211,53 @@ class DatabaseExplorer:
                 "error": error_msg
             }
     
+    def _estimate_count(self, session, table_name: str, where_clause: str, params: Dict[str, Any]) -> int:
+        """Planner row estimate: pg_class.reltuples unfiltered, EXPLAIN rows with a filter"""
+        if not where_clause:
+            estimate = session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"),
+                {"table_name": table_name}
+            ).scalar()
+            return max(int(estimate or 0), 0)
+        plan = session.execute(
+            text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table_name} {where_clause}"), params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    
+    def _count_rows(self, session, table_name: str, where_clause: str, params: Dict[str, Any],
+                    exact_count: bool) -> Dict[str, Any]:
+        """Exact COUNT(*) for small tables or on request, planner estimate otherwise"""
+        if not exact_count:
+            try:
+                table_estimate = self._estimate_count(session, table_name, "", params)
+                if table_estimate >= EXACT_COUNT_THRESHOLD:
+                    return {
+                        "total_count": self._estimate_count(session, table_name, where_clause, params),
+                        "count_is_estimate": True
+                    }
+            except Exception as e:
+                logger.warning(f"Row estimate failed for {table_name}, counting exactly: {e}")
+        total_count = session.execute(
+            text(f"SELECT COUNT(*) FROM {table_name} {where_clause}"), params
+        ).scalar() or 0
+        return {"total_count": total_count, "count_is_estimate": False}
+    
     async def get_table_data_filtered(self, table_name: str, days: int = 30, 
-                                    page: int = 1, limit: int = 50) -> Dict[str, Any]:
-        """Get filtered table data"""
+                                    page: int = 1, limit: int = 50,
+                                    cursor: Optional[str] = None, pagination: str = "offset",
+                                    exact_count: bool = False) -> Dict[str, Any]:
+        """
+        Get filtered table data
+        
+        pagination="keyset" (or passing a cursor) seeks on (date column, id)
+        and returns opaque next_cursor/prev_cursor tokens instead of using
+        OFFSET. Large tables report a planner estimate unless exact_count.
+        """
         try:
             with self.db_ops.get_session() as session:
-                inspector = inspect(session.bind)
-                columns = [col["name"] for col in inspector.get_columns(table_name)]
+                columns = schema_catalog.columns(table_name, session)
                 
                 # Build date filter
                 start_date = datetime.now() - timedelta(days=days)
@@ -188,34 +268,92 @@ class DatabaseExplorer:
                     if col in columns:
                         date_columns.append(col)
                 
-                # Build query with date filter
+                conditions = []
                 if date_columns:
-                    date_conditions = " OR ".join([
+                    conditions.append("(" + " OR ".join([
                         f"{col} >= :start_date" for col in date_columns
-                    ])
-                    query = f"""
-                        SELECT * FROM {table_name}
-                        WHERE {date_conditions}
-                        ORDER BY {date_columns[0]} DESC
-                        LIMIT :limit OFFSET :offset
-                    """
-                    count_query = f"""
-                        SELECT COUNT(*) FROM {table_name}
-                        WHERE {date_conditions}
-                    """
-                else:
+                    ]) + ")")
+                params = {"start_date": start_date, "limit": limit}
+                
+                where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                count = self._count_rows(session, table_name, where_clause, params, exact_count)
+                total_count = count["total_count"]
+                
+                # Keyset needs a single-column key to break ties on the sort column
+                primary_key = schema_catalog.primary_key(table_name, session)
+                key_column = primary_key[0] if len(primary_key) == 1 else ("id" if "id" in columns else None)
+                use_keyset = (cursor is not None or pagination == "keyset") and key_column is not None
+                sort_column = date_columns[0] if date_columns else None
+                
+                if use_keyset:
+                    position = decode_page_cursor(cursor) if cursor else None
+                    backwards = position is not None and position["direction"] == "prev"
+                    comparison = ">" if backwards else "<"
+                    sort_order = "ASC" if backwards else "DESC"
+                    
+                    if sort_column:
+                        # Same rows as offset mode: rows that match the date filter through another
+                        # date column may have a NULL sort column, so those sort after every dated row
+                        order_by = (f"{sort_column} {sort_order} NULLS {'FIRST' if backwards else 'LAST'}, "
+                                    f"{key_column} {sort_order}")
+                        if position and position["value"] is not None:
+                            seek = f"({sort_column}, {key_column}) {comparison} (:cursor_value, :cursor_id)"
+                            conditions.append(seek if backwards else f"({seek} OR {sort_column} IS NULL)")
+                            params.update({"cursor_value": position["value"], "cursor_id": position["id"]})
+                        elif position:
+                            # Cursor sits among the NULL-dated rows at the end
+                            null_seek = "IS NOT NULL OR" if backwards else "IS NULL AND"
+                            conditions.append(f"({sort_column} {null_seek} {key_column} {comparison} :cursor_id)")
+                            params["cursor_id"] = position["id"]
+                    else:
+                        order_by = f"{key_column} {sort_order}"
+                        if position:
+                            conditions.append(f"{key_column} {comparison} :cursor_id")
+                            params["cursor_id"] = position["id"]
+                    
+                    # Fetch one extra row to know whether another page exists
+                    params["limit"] = limit + 1
                     query = f"""
                         SELECT * FROM {table_name}
-                        ORDER BY id DESC
-                        LIMIT :limit OFFSET :offset
+                        WHERE {' AND '.join(conditions) if conditions else 'TRUE'}
+                        ORDER BY {order_by}
+                        LIMIT :limit
                     """
-                    count_query = f"SELECT COUNT(*) FROM {table_name}"
-                
-                # Execute queries
-                offset = (page - 1) * limit
-                params = {"start_date": start_date, "limit": limit, "offset": offset}
+                    results = session.execute(text(query), params).fetchall()
+                    has_more = len(results) > limit
+                    results = list(results[:limit])
+                    if backwards:
+                        results.reverse()
+                    
+                    rows = [dict(zip(columns, row)) for row in results]
+                    
+                    def boundary_cursor(row: Dict[str, Any], direction: str) -> str:
+                        return encode_page_cursor(row.get(sort_column) if sort_column else None,
+                                                  row[key_column], direction)
+                    
+                    has_next = has_more if not backwards else position is not None
+                    has_prev = position is not None if not backwards else has_more
+                    
+                    return {
+                        "columns": columns,
+                        "rows": rows,
+                        "total_count": total_count,
+                        "count_is_estimate": count["count_is_estimate"],
+                        "pagination": "keyset",
+                        "limit": limit,
+                        "next_cursor": boundary_cursor(rows[-1], "next") if rows and has_next else None,
+                        "prev_cursor": boundary_cursor(rows[0], "prev") if rows and has_prev else None
+                    }
                 
-                total_count = session.execute(text(count_query), params).scalar() or 0
+                # Offset pagination (page numbers)
+                order_by = f"{sort_column} DESC" if sort_column else "id DESC"
+                query = f"""
+                    SELECT * FROM {table_name}
+                    {where_clause}
+                    ORDER BY {order_by}
+                    LIMIT :limit OFFSET :offset
+                """
+                params["offset"] = (page - 1) * limit
                 results = session.execute(text(query), params).fetchall()
                 
                 rows = [dict(zip(columns, row)) for row in results]
@@ -224,6 +362,8 @@ class DatabaseExplorer:
                     "columns": columns,
                     "rows": rows,
                     "total_count": total_count,
+                    "count_is_estimate": count["count_is_estimate"],
+                    "pagination": "offset",
                     "page": page,
                     "limit": limit,
                     "total_pages": (total_count + limit - 1) // limit
@@ -248,13 +388,11 @@ class DatabaseExplorer:
         try:
             # Get available tables and their schemas
             with self.db_ops.get_session() as session:
-                inspector = inspect(session.bind)
-                
                 # Get all tables with their columns
                 table_schemas = []
-                for table_name in inspector.get_table_names():
+                for table_name in schema_catalog.tables(session):
                     columns = []
-                    for col in inspector.get_columns(table_name):
+                    for col in schema_catalog.column_details(table_name, session):
                         columns.append(f"{col['name']} ({col['type']})")
                     table_schemas.append(f"Table {table_name}: {', '.join(columns[:5])}{'...' if len(columns) > 5 else ''}")
                 
@@ -409,51 +547,44 @@ Generate a PostgreSQL SELECT query to fulfill this request. Consider:
         
         return query
     
+    def checked_ai_query(self, sql_query: str) -> str:
+        """AI-generated SQL after the read-only checks, with the default LIMIT applied (ValueError if rejected)"""
+        # Security check
+        query_upper = sql_query.upper()
+        if not query_upper.strip().startswith("SELECT") and not query_upper.strip().startswith("--"):
+            raise ValueError("Only SELECT queries are allowed")
+        
+        # Check for dangerous keywords with word boundaries
+        dangerous_keywords = ["DROP", "DELETE", "UPDATE", "INSERT", "ALTER", "CREATE", "TRUNCATE"]
+        for keyword in dangerous_keywords:
+            if re.search(r'\b' + keyword + r'\b', query_upper):
+                raise ValueError("Query contains dangerous operations")
+        
+        # Add limit if not present
+        if "LIMIT" not in query_upper and not query_upper.strip().startswith("--"):
+            sql_query += " LIMIT 100"
+        return sql_query
+    
     async def execute_ai_query(self, sql_query: str) -> Dict[str, Any]:
         """Execute the AI-generated SQL query safely"""
         try:
-            # Security check
-            query_upper = sql_query.upper()
-            if not query_upper.strip().startswith("SELECT") and not query_upper.strip().startswith("--"):
-                raise ValueError("Only SELECT queries are allowed")
+            sql_query = self.checked_ai_query(sql_query)
             
-            # Check for dangerous keywords with word boundaries
-            dangerous_keywords = ["DROP", "DELETE", "UPDATE", "INSERT", "ALTER", "CREATE", "TRUNCATE"]
-            import re
-            for keyword in dangerous_keywords:
-                if re.search(r'\b' + keyword + r'\b', query_upper):
-                    raise ValueError("Query contains dangerous operations")
+            async with async_acquire() as conn:
+                # Prepared statement gives column names even for empty results
+                statement = await conn.prepare(sql_query)
+                columns = [attr.name for attr in statement.get_attributes()]
+                results = await statement.fetch()
             
-            with self.db_ops.get_session() as session:
-                # Add limit if not present
-                if "LIMIT" not in query_upper and not query_upper.strip().startswith("--"):
-                    sql_query += " LIMIT 100"
-                
-                result = session.execute(text(sql_query))
-                
-                # Get column names first
-                columns = list(result.keys())
-                
-                # Fetch all rows
-                results = result.fetchall()
-                
-                if results:
-                    # Convert rows to dictionaries
-                    rows = []
-                    for row in results:
-                        row_dict = {}
-                        for idx, col in enumerate(columns):
-                            row_dict[col] = row[idx]
-                        rows.append(row_dict)
-                else:
-                    rows = []
-                
-                return {
-                    "success": True,
-                    "columns": columns,
-                    "rows": rows,
-                    "row_count": len(rows)
-                }
+            # Convert rows to dictionaries
+            rows = [dict(zip(columns, row)) for row in results]
+            
+            return {
+                "success": True,
+                "columns": columns,
+                "rows": rows,
+                "row_count": len(rows)
+            }
                 
         except Exception as e:
             return {
@@ -468,15 +599,13 @@ Generate a PostgreSQL SELECT query to fulfill this request. Consider:
         try:
             # Get available tables and their schemas
             with self.db_ops.get_session() as session:
-                inspector = inspect(session.bind)
-                
                 # Get all tables with their columns
                 table_schemas = []
-                for table_name in inspector.get_table_names():
+                for table_name in schema_catalog.tables(session):
                     columns = []
-                    for col in inspector.get_columns(table_name):
-                        col_type = str(col['type'])
-                        nullable = "NULL" if col.get('nullable', True) else "NOT NULL"
+                    for col in schema_catalog.column_details(table_name, session):
+                        col_type = col['type']
+                        nullable = "NULL" if col['nullable'] == 'YES' else "NOT NULL"
                         columns.append(f"{col['name']} {col_type} {nullable}")
                     table_schemas.append(f"Table {table_name}:\n  {chr(10).join(columns[:10])}{'...' if len(columns) > 10 else ''}")
                 
@@ -712,10 +841,13 @@ async def home(request: Request, lang: str = Query("en")):
     })
 
 @app.get("/table/{table_name}", response_class=HTMLResponse)
-async def view_table(request: Request, table_name: str, days: int = Query(30)):
+async def view_table(request: Request, table_name: str, days: int = Query(30),
+                     cursor: Optional[str] = Query(None)):
     """View table with time-based filtering"""
     table_info = await explorer.get_table_info(table_name)
-    table_data = await explorer.get_table_data_filtered(table_name, days=days)
+    table_data = await explorer.get_table_data_filtered(
+        table_name, days=days, cursor=cursor, pagination="keyset"
+    )
     
     return templates.TemplateResponse("table_view.html", {
         "request": request,
@@ -752,10 +884,55 @@ async def api_table_data(
     table_name: str,
     days: int = Query(30),
     page: int = Query(1),
-    limit: int = Query(50)
+    limit: int = Query(50),
+    cursor: Optional[str] = Query(None),
+    pagination: str = Query("offset"),
+    exact_count: bool = Query(False)
+):
+    """API endpoint for table data with filtering (offset pages or keyset cursors)"""
+    return await explorer.get_table_data_filtered(
+        table_name, days, page, limit,
+        cursor=cursor, pagination=pagination, exact_count=exact_count
+    )
+
+@contextmanager
+def raw_db_connection():
+    """Raw psycopg2 connection from the explorer's SQLAlchemy pool (named cursors, COPY)"""
+    conn = db_ops.engine.raw_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+@app.get("/api/table/{table_name}/export")
+async def api_table_export(
+    table_name: str,
+    days: int = Query(30),
+    format: str = Query("csv")
 ):
-    """API endpoint for table data with filtering"""
-    return await explorer.get_table_data_filtered(table_name, days, page, limit)
+    """Stream a table's filtered rows as CSV, NDJSON or Parquet"""
+    try:
+        # Only catalogued tables can be interpolated into the SQL
+        if not await run_in_threadpool(schema_catalog.has_table, table_name):
+            return JSONResponse(status_code=404, content={"success": False, "error": f"Table '{table_name}' not found"})
+        
+        columns = schema_catalog.columns(table_name)
+        date_columns = [col for col in ["created_at", "updated_at", "sent_at", "date"] if col in columns]
+        if date_columns:
+            date_conditions = " OR ".join([f"{col} >= %(start_date)s" for col in date_columns])
+            query = f"SELECT * FROM {table_name} WHERE {date_conditions} ORDER BY {date_columns[0]} DESC"
+        else:
+            query = f"SELECT * FROM {table_name}"
+        params = {"start_date": datetime.now() - timedelta(days=days)}
+        
+        stream = ExportStream(raw_db_connection, query, params, fmt=format)
+        await run_in_threadpool(stream.start)
+        return stream.response(f"{table_name}_{days}d")
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    except Exception as e:
+        logger.error(f"Error exporting table {table_name}: {e}")
+        return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
 @app.get("/api/table/{table_name}/info")
 async def api_table_info(table_name: str):
@@ -779,6 +956,32 @@ async def api_ai_query(query_description: str = Form(...)):
             "execution": {"success": False, "error": "Could not generate valid SQL query"}
         }
 
+@app.post("/api/ai-query/stream")
+async def api_ai_query_stream(query_description: str = Form(...)):
+    """
+    Server-Sent Events variant of /api/ai-query
+    Stages: intent, sql, execution_start, columns, rows..., complete, done
+    """
+    async def events():
+        yield "intent", {"query_description": query_description}
+        query_result = await explorer.convert_natural_language_to_sql(query_description)
+        yield "sql", query_result
+        if query_result["query_type"] == "failed":
+            yield "error", {"success": False, "error": "Could not generate valid SQL query"}
+            return
+        
+        try:
+            sql_query = explorer.checked_ai_query(query_result["sql_query"])
+        except ValueError as e:
+            yield "error", {"success": False, "error": str(e)}
+            return
+        
+        yield "execution_start", {"sql_query": sql_query}
+        async for event, data in stream_select_rows(sql_query):
+            yield event, data
+    
+    return sse_response(events())
+
 @app.get("/api/test-connection")
 async def test_connection():
     """Test database connection and show basic info"""
@@ -826,26 +1029,23 @@ async def test_connection():
 async def list_tables():
     """List all available tables in the database"""
     try:
-        with db_ops.get_session() as session:
-            result = session.execute(
-                text("""
-                    SELECT table_name, 
-                           pg_size_pretty(pg_total_relation_size(quote_ident(table_name)::text)) as size
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_type = 'BASE TABLE'
-                    ORDER BY table_name
-                """)
-            ).fetchall()
-            
-            tables = [{"name": row[0], "size": row[1]} for row in result]
-            
-            return {
-                "success": True,
-                "tables": tables,
-                "count": len(tables),
-                "database": db_ops.connection_string.split('/')[-1].split('?')[0]
-            }
+        result = await async_fetch("""
+            SELECT table_name, 
+                   pg_size_pretty(pg_total_relation_size(quote_ident(table_name)::text)) as size
+            FROM information_schema.tables 
+            WHERE table_schema = 'public' 
+            AND table_type = 'BASE TABLE'
+            ORDER BY table_name
+        """)
+        
+        tables = [{"name": row[0], "size": row[1]} for row in result]
+        
+        return {
+            "success": True,
+            "tables": tables,
+            "count": len(tables),
+            "database": db_ops.connection_string.split('/')[-1].split('?')[0]
+        }
     except Exception as e:
         return {
             "success": False,
@@ -857,115 +1057,17 @@ async def list_tables():
 async def import_sql_file(file: UploadFile = File(...)):
     """Import SQL file to create database structure"""
     try:
-        # Read the uploaded file
-        content = await file.read()
-        sql_content = content.decode('utf-8')
-        
-        # Parse SQL statements
-        statements = []
-        current = []
-        in_function = False
+        def run_import():
+            # Reads the spooled upload line by line; COPY blocks use COPY FROM STDIN
+            with raw_db_connection() as conn:
+                return SqlDumpLoader(conn).load(file.file)
         
-        for line in sql_content.split('\n'):
-            # Skip comments
-            if line.strip().startswith('--'):
-                continue
-                
-            # Track if we're inside a function
-            if 'CREATE FUNCTION' in line or 'CREATE OR REPLACE FUNCTION' in line:
-                in_function = True
-            if in_function and 'LANGUAGE' in line and line.strip().endswith(';'):
-                in_function = False
-                
-            if line.strip():
-                current.append(line)
-                
-            # End of statement
-            if not in_function and line.strip().endswith(';'):
-                stmt = ' '.join(current)
-                if stmt.strip():
-                    statements.append(stmt)
-                current = []
-        
-        # Execute statements
-        executed = 0
-        errors = []
-        tables_created = []
-        
-        with db_ops.get_session() as session:
-            for i, statement in enumerate(statements):
-                try:
-                    # Skip certain statements
-                    if any(skip in statement.upper() for skip in ['SET STATEMENT_TIMEOUT', 'SET LOCK_TIMEOUT', 'SELECT PG_CATALOG', 'SET CHECK_FUNCTION_BODIES', 'SET XMLOPTION', 'SET CLIENT_MIN_MESSAGES', 'SET ROW_SECURITY', 'SET DEFAULT_TABLE_ACCESS_METHOD', 'COMMENT ON SCHEMA']):
-                        continue
-                    
-                    # Handle COPY statements specially
-                    if 'COPY' in statement.upper() and 'FROM stdin' in statement:
-                        # This is a COPY statement with data
-                        table_match = re.search(r'COPY\s+"?\w*"?\."?(\w+)"?', statement, re.IGNORECASE)
-                        if table_match:
-                            table_name = table_match.group(1)
-                            # Extract the data part
-                            data_start = statement.find('FROM stdin;') + len('FROM stdin;')
-                            data_end = statement.rfind('\\.')
-                            if data_start > 0 and data_end > data_start:
-                                data = statement[data_start:data_end].strip()
-                                if data:
-                                    # Count existing records
-                                    existing = session.execute(text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
-                                    if existing == 0:
-                                        # Process line by line
-                                        lines = data.split('\n')
-                                        imported = 0
-                                        for line in lines:
-                                            if line.strip():
-                                                values = line.split('\t')
-                                                # Convert \N to NULL
-                                                values = [None if v == '\\N' else v for v in values]
-                                                # Create INSERT statement
-                                                placeholders = ', '.join([':p' + str(i) for i in range(len(values))])
-                                                params = {f'p{i}': val for i, val in enumerate(values)}
-                                                try:
-                                                    session.execute(
-                                                        text(f"INSERT INTO {table_name} VALUES ({placeholders})"),
-                                                        params
-                                                    )
-                                                    imported += 1
-                                                except:
-                                                    pass
-                                        if imported > 0:
-                                            session.commit()
-                                            executed += 1
-                                            tables_created.append(f"{table_name} ({imported} rows)")
-                                    continue
-                    
-                    # Extract table name if CREATE TABLE
-                    if 'CREATE TABLE' in statement.upper():
-                        match = re.search(r'CREATE TABLE\s+["]?([^"\s]+)["]?\.?["]?([^"\s(]+)?', statement, re.IGNORECASE)
-                        if match:
-                            table_name = match.group(2) if match.group(2) else match.group(1)
-                            tables_created.append(table_name)
-                    
-                    session.execute(text(statement))
-                    session.commit()
-                    executed += 1
-                    
-                except Exception as e:
-                    error_msg = str(e)
-                    errors.append(f"Statement {i+1}: {error_msg[:200]}")
-                    session.rollback()
-                    
-                    # Continue on certain errors
-                    if 'already exists' in error_msg:
-                        continue
+        report = await run_in_threadpool(run_import)
+        schema_catalog.invalidate("SQL import")
         
         return {
-            "success": len(errors) == 0,
             "filename": file.filename,
-            "total_statements": len(statements),
-            "executed": executed,
-            "tables_created": tables_created,
-            "errors": errors[:10] if errors else []
+            **report
         }
         
     except Exception as e:
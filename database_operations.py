@@ -11,6 +11,8 @@ from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, date
 from decimal import Decimal
 import asyncpg
+from async_database import acquire as async_acquire, fetch as async_fetch, fetchrow as async_fetchrow
+from schema_catalog import schema_catalog
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
@@ -193,29 +195,28 @@ class DatabaseOperations:
     async def get_farmer_info(self, farmer_id: int) -> Optional[Dict[str, Any]]:
         """Get farmer information by ID"""
         try:
-            with self.get_session() as session:
-                result = session.execute(
-                    text("""
-                    SELECT id, farm_name, manager_name, manager_last_name, 
-                           city, wa_phone_number
-                    FROM farmers 
-                    WHERE id = :farmer_id
-                    """),
-                    {"farmer_id": farmer_id}
-                ).fetchone()
-                
-                if result:
-                    return {
-                        "id": result[0],
-                        "farm_name": result[1],
-                        "manager_name": result[2],
-                        "manager_last_name": result[3],
-                        "total_hectares": 0,  # Default since column doesn't exist
-                        "farmer_type": "Farm",  # Default since column doesn't exist
-                        "city": result[4],
-                        "wa_phone_number": result[5]
-                    }
-                return None
+            result = await async_fetchrow(
+                """
+                SELECT id, farm_name, manager_name, manager_last_name, 
+                       city, wa_phone_number
+                FROM farmers 
+                WHERE id = $1
+                """,
+                farmer_id
+            )
+            
+            if result:
+                return {
+                    "id": result[0],
+                    "farm_name": result[1],
+                    "manager_name": result[2],
+                    "manager_last_name": result[3],
+                    "total_hectares": 0,  # Default since column doesn't exist
+                    "farmer_type": "Farm",  # Default since column doesn't exist
+                    "city": result[4],
+                    "wa_phone_number": result[5]
+                }
+            return None
                 
         except Exception as e:
             logger.error(f"Error getting farmer info: {str(e)}")
@@ -224,31 +225,30 @@ class DatabaseOperations:
     async def get_all_farmers(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get list of all farmers for UI selection"""
         try:
-            with self.get_session() as session:
-                results = session.execute(
-                    text("""
-                    SELECT id, farm_name, manager_name, manager_last_name, 
-                           email, phone, city, wa_phone_number
-                    FROM farmers 
-                    ORDER BY farm_name
-                    LIMIT :limit
-                    """),
-                    {"limit": limit}
-                ).fetchall()
-                
-                farmers = []
-                for row in results:
-                    farmers.append({
-                        "id": row[0],
-                        "name": f"{row[2]} {row[3]}".strip() if row[2] and row[3] else "Unknown",
-                        "farm_name": row[1] or "Unknown Farm",
-                        "phone": row[5] or row[7] or "",
-                        "location": row[6] or "",
-                        "farm_type": "Farm",  # Default since column doesn't exist
-                        "total_size_ha": 0.0  # Default since column doesn't exist
-                    })
-                
-                return farmers
+            results = await async_fetch(
+                """
+                SELECT id, farm_name, manager_name, manager_last_name, 
+                       email, phone, city, wa_phone_number
+                FROM farmers 
+                ORDER BY farm_name
+                LIMIT $1
+                """,
+                limit
+            )
+            
+            farmers = []
+            for row in results:
+                farmers.append({
+                    "id": row[0],
+                    "name": f"{row[2]} {row[3]}".strip() if row[2] and row[3] else "Unknown",
+                    "farm_name": row[1] or "Unknown Farm",
+                    "phone": row[5] or row[7] or "",
+                    "location": row[6] or "",
+                    "farm_type": "Farm",  # Default since column doesn't exist
+                    "total_size_ha": 0.0  # Default since column doesn't exist
+                })
+            
+            return farmers
                 
         except Exception as e:
             logger.error(f"Error getting all farmers: {str(e)}")
@@ -257,36 +257,35 @@ class DatabaseOperations:
     async def get_farmer_fields(self, farmer_id: int) -> List[Dict[str, Any]]:
         """Get all fields for a farmer"""
         try:
-            with self.get_session() as session:
-                results = session.execute(
-                    text("""
-                    SELECT f.field_id, f.field_name, f.field_size, f.field_location,
-                           f.soil_type, 
-                           fc.crop_name, fc.variety, fc.planting_date, fc.status
-                    FROM fields f
-                    LEFT JOIN field_crops fc ON f.field_id = fc.field_id 
-                        AND fc.status = 'active'
-                    WHERE f.farmer_id = :farmer_id
-                    ORDER BY f.field_name
-                    """),
-                    {"farmer_id": farmer_id}
-                ).fetchall()
-                
-                fields = []
-                for row in results:
-                    fields.append({
-                        "field_id": row[0],
-                        "field_name": row[1],
-                        "field_size": float(row[2]) if row[2] else 0,
-                        "field_location": row[3],
-                        "soil_type": row[4],
-                        "current_crop": row[5],
-                        "variety": row[6],
-                        "planting_date": row[7].isoformat() if row[7] else None,
-                        "crop_status": row[8]
-                    })
-                
-                return fields
+            results = await async_fetch(
+                """
+                SELECT f.field_id, f.field_name, f.field_size, f.field_location,
+                       f.soil_type, 
+                       fc.crop_name, fc.variety, fc.planting_date, fc.status
+                FROM fields f
+                LEFT JOIN field_crops fc ON f.field_id = fc.field_id 
+                    AND fc.status = 'active'
+                WHERE f.farmer_id = $1
+                ORDER BY f.field_name
+                """,
+                farmer_id
+            )
+            
+            fields = []
+            for row in results:
+                fields.append({
+                    "field_id": row[0],
+                    "field_name": row[1],
+                    "field_size": float(row[2]) if row[2] else 0,
+                    "field_location": row[3],
+                    "soil_type": row[4],
+                    "current_crop": row[5],
+                    "variety": row[6],
+                    "planting_date": row[7].isoformat() if row[7] else None,
+                    "crop_status": row[8]
+                })
+            
+            return fields
                 
         except Exception as e:
             logger.error(f"Error getting farmer fields: {str(e)}")
@@ -295,31 +294,30 @@ class DatabaseOperations:
     async def get_recent_conversations(self, farmer_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent conversations for context from incoming_messages table"""
         try:
-            with self.get_session() as session:
-                results = session.execute(
-                    text("""
-                    SELECT id, message_text, timestamp, role
-                    FROM incoming_messages
-                    WHERE farmer_id = :farmer_id
-                    ORDER BY timestamp DESC
-                    LIMIT :limit
-                    """),
-                    {"farmer_id": farmer_id, "limit": limit}
-                ).fetchall()
-                
-                conversations = []
-                for row in results:
-                    conversations.append({
-                        "id": row[0],
-                        "user_input": row[1] if row[3] == 'user' else "",
-                        "ava_response": row[1] if row[3] == 'assistant' else "",
-                        "timestamp": row[2],
-                        "message_type": "chat",
-                        "confidence_score": 0.8,
-                        "approved_status": False
-                    })
-                
-                return conversations
+            results = await async_fetch(
+                """
+                SELECT id, message_text, timestamp, role
+                FROM incoming_messages
+                WHERE farmer_id = $1
+                ORDER BY timestamp DESC
+                LIMIT $2
+                """,
+                farmer_id, limit
+            )
+            
+            conversations = []
+            for row in results:
+                conversations.append({
+                    "id": row[0],
+                    "user_input": row[1] if row[3] == 'user' else "",
+                    "ava_response": row[1] if row[3] == 'assistant' else "",
+                    "timestamp": row[2],
+                    "message_type": "chat",
+                    "confidence_score": 0.8,
+                    "approved_status": False
+                })
+            
+            return conversations
                 
         except Exception as e:
             logger.error(f"Error getting conversations: {str(e)}")
@@ -328,39 +326,25 @@ class DatabaseOperations:
     async def save_conversation(self, farmer_id: int, conversation_data: Dict[str, Any]) -> Optional[int]:
         """Save a conversation to incoming_messages table"""
         try:
-            with self.get_session() as session:
-                # Save user message
-                result1 = session.execute(
-                    text("""
-                    INSERT INTO incoming_messages (farmer_id, phone_number, message_text, role, timestamp)
-                    VALUES (:farmer_id, :phone_number, :message_text, 'user', CURRENT_TIMESTAMP)
-                    RETURNING id
-                    """),
-                    {
-                        "farmer_id": farmer_id,
-                        "phone_number": conversation_data.get("wa_phone_number", "unknown"),
-                        "message_text": conversation_data.get("question")
-                    }
-                )
-                
-                # Save assistant response
-                result2 = session.execute(
-                    text("""
-                    INSERT INTO incoming_messages (farmer_id, phone_number, message_text, role, timestamp)
-                    VALUES (:farmer_id, :phone_number, :message_text, 'assistant', CURRENT_TIMESTAMP)
-                    RETURNING id
-                    """),
-                    {
-                        "farmer_id": farmer_id,
-                        "phone_number": conversation_data.get("wa_phone_number", "unknown"),
-                        "message_text": conversation_data.get("answer")
-                    }
-                )
-                session.commit()
-                conv_id = result2.scalar()
-                
-                logger.info(f"Saved conversation pair")
-                return conv_id
+            phone_number = conversation_data.get("wa_phone_number", "unknown")
+            insert_sql = """
+                INSERT INTO incoming_messages (farmer_id, phone_number, message_text, role, timestamp)
+                VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
+                RETURNING id
+            """
+            
+            async with async_acquire() as conn:
+                async with conn.transaction():
+                    # Save user message
+                    await conn.fetchval(insert_sql, farmer_id, phone_number,
+                                        conversation_data.get("question"), 'user')
+                    
+                    # Save assistant response
+                    conv_id = await conn.fetchval(insert_sql, farmer_id, phone_number,
+                                                  conversation_data.get("answer"), 'assistant')
+            
+            logger.info(f"Saved conversation pair")
+            return conv_id
                 
         except Exception as e:
             logger.error(f"Error saving conversation: {str(e)}")
@@ -369,29 +353,28 @@ class DatabaseOperations:
     async def get_crop_info(self, crop_name: str) -> Optional[Dict[str, Any]]:
         """Get crop information from crop_protection_croatia"""
         try:
-            with self.get_session() as session:
-                # First check if we have crop technology info
-                result = session.execute(
-                    text("""
-                    SELECT DISTINCT crop_type
-                    FROM crop_technology
-                    WHERE LOWER(crop_type) = LOWER(:crop_name)
-                    LIMIT 1
-                    """),
-                    {"crop_name": crop_name}
-                ).fetchone()
-                
-                if result:
-                    return {
-                        "id": 1,
-                        "crop_name": result[0],
-                        "croatian_name": result[0],
-                        "category": "Crop",
-                        "planting_season": "Spring",
-                        "harvest_season": "Fall",
-                        "description": f"Information about {result[0]}"
-                    }
-                return None
+            # First check if we have crop technology info
+            result = await async_fetchrow(
+                """
+                SELECT DISTINCT crop_type
+                FROM crop_technology
+                WHERE LOWER(crop_type) = LOWER($1)
+                LIMIT 1
+                """,
+                crop_name
+            )
+            
+            if result:
+                return {
+                    "id": 1,
+                    "crop_name": result[0],
+                    "croatian_name": result[0],
+                    "category": "Crop",
+                    "planting_season": "Spring",
+                    "harvest_season": "Fall",
+                    "description": f"Information about {result[0]}"
+                }
+            return None
                 
         except Exception as e:
             logger.error(f"Error getting crop info: {str(e)}")
@@ -446,30 +429,29 @@ class DatabaseOperations:
     async def get_conversation_details(self, conversation_id: int) -> Optional[Dict[str, Any]]:
         """Get detailed conversation information"""
         try:
-            with self.get_session() as session:
-                result = session.execute(
-                    text("""
-                    SELECT m.id, m.farmer_id, m.message_text, m.timestamp, m.role,
-                           f.manager_name, f.manager_last_name, f.phone, 
-                           f.city, f.farm_name
-                    FROM incoming_messages m
-                    JOIN farmers f ON m.farmer_id = f.id
-                    WHERE m.id = :conversation_id
-                    """),
-                    {"conversation_id": conversation_id}
-                ).fetchone()
-                
-                if result:
-                    return {
-                        "id": result[0],
-                        "farmer_id": result[1],
-                        "farmer_name": f"{result[5]} {result[6]}".strip() if result[5] and result[6] else "Unknown",
-                        "user_input": result[2] if result[4] == 'user' else "",
-                        "ava_response": result[2] if result[4] == 'assistant' else "",
-                        "timestamp": result[3],
-                        "approved_status": False
-                    }
-                return None
+            result = await async_fetchrow(
+                """
+                SELECT m.id, m.farmer_id, m.message_text, m.timestamp, m.role,
+                       f.manager_name, f.manager_last_name, f.phone, 
+                       f.city, f.farm_name
+                FROM incoming_messages m
+                JOIN farmers f ON m.farmer_id = f.id
+                WHERE m.id = $1
+                """,
+                conversation_id
+            )
+            
+            if result:
+                return {
+                    "id": result[0],
+                    "farmer_id": result[1],
+                    "farmer_name": f"{result[5]} {result[6]}".strip() if result[5] and result[6] else "Unknown",
+                    "user_input": result[2] if result[4] == 'user' else "",
+                    "ava_response": result[2] if result[4] == 'assistant' else "",
+                    "timestamp": result[3],
+                    "approved_status": False
+                }
+            return None
                 
         except Exception as e:
             logger.error(f"Error getting conversation details: {str(e)}")
@@ -628,13 +610,10 @@ class DatabaseOperations:
                         centroid_lat = centroid.get("lat")
                         centroid_lng = centroid.get("lng")
                     
-                    # Check if fields table has area_hectares or area_ha column
-                    cursor.execute("""
-                        SELECT column_name FROM information_schema.columns 
-                        WHERE table_name = 'fields' AND column_name IN ('area_hectares', 'area_ha')
-                    """)
-                    area_column = cursor.fetchone()
-                    area_col_name = area_column[0] if area_column else 'area_ha'  # Use area_ha as default
+                    # Check if fields table has area_hectares or area_ha column (cached catalog)
+                    area_col_name = schema_catalog.first_existing_column(
+                        'fields', ('area_hectares', 'area_ha'), default='area_ha', conn=connection
+                    )  # Use area_ha as default
                     
                     # Try to insert field - handle duplicate key issues
                     try:
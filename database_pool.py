@@ -6,18 +6,154 @@ Implements persistent connections with SQLAlchemy for <1s response times
 
 import os
 import logging
-from sqlalchemy import create_engine, text, pool
+import threading
+import traceback
+from sqlalchemy import create_engine, text, pool, event
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
 import time
 from typing import Dict, List, Any
 
+from sql_profiler import ProfiledCursor
+
 logger = logging.getLogger(__name__)
 
 # Global engine and session factory
 _engine = None
 _session_factory = None
 
+# Leak detection: connections held longer than this are logged with their checkout stack
+LEAK_THRESHOLD_SECONDS = float(os.getenv('DB_POOL_LEAK_THRESHOLD', '30'))
+LEAK_DETECTION_ENABLED = os.getenv('DB_POOL_LEAK_DETECTION', 'true').lower() == 'true'
+
+# Database used when DB_NAME is unset (shared with async_database so both pools open the same database)
+DEFAULT_DB_NAME = 'postgres'
+
+def _caller_stack(limit: int = 8) -> List[str]:
+    """Application frames that led to a checkout (pool/SQLAlchemy internals dropped)"""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if 'sqlalchemy' not in frame.filename
+        and 'contextlib' not in frame.filename
+        and not frame.filename.endswith('database_pool.py')
+    ]
+    return traceback.format_list(frames[-limit:])
+
+class PoolAccounting:
+    """Live counters for pool checkouts, waits and long-held connections"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts_total = 0
+        self.checkins_total = 0
+        self.connections_created = 0
+        self.waits_total = 0
+        self.wait_timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.leaks_detected = 0
+        # id(connection record) -> {"since": ts, "stack": [...], "reported": bool}
+        self._held = {}
+    
+    def record_wait(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            self.waits_total += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            if timed_out:
+                self.wait_timeouts += 1
+    
+    def record_checkout(self, record_id: int):
+        stack = _caller_stack() if LEAK_DETECTION_ENABLED else []
+        with self._lock:
+            self.checkouts_total += 1
+            self._held[record_id] = {"since": time.time(), "stack": stack, "reported": False}
+    
+    def record_checkin(self, record_id: int):
+        with self._lock:
+            self.checkins_total += 1
+            self._held.pop(record_id, None)
+    
+    def record_connect(self):
+        with self._lock:
+            self.connections_created += 1
+    
+    def find_leaks(self, threshold: float = LEAK_THRESHOLD_SECONDS) -> List[Dict[str, Any]]:
+        """Log and return connections checked out for longer than threshold seconds"""
+        now = time.time()
+        leaks = []
+        with self._lock:
+            for record_id, held in self._held.items():
+                held_for = now - held["since"]
+                if held_for < threshold:
+                    continue
+                leaks.append({"held_seconds": round(held_for, 1), "stack": held["stack"]})
+                if not held["reported"]:
+                    held["reported"] = True
+                    self.leaks_detected += 1
+                    logger.warning(
+                        f"Possible connection leak: held for {held_for:.0f}s, checked out at:\n"
+                        + "".join(held["stack"])
+                    )
+        return leaks
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = self.waits_total
+            return {
+                "checkouts_total": self.checkouts_total,
+                "checkins_total": self.checkins_total,
+                "connections_created": self.connections_created,
+                "wait_timeouts": self.wait_timeouts,
+                "wait_ms_total": round(self.wait_ms_total, 1),
+                "wait_ms_avg": round(self.wait_ms_total / waits, 2) if waits else 0,
+                "wait_ms_max": round(self.wait_ms_max, 1),
+                "leaks_detected": self.leaks_detected,
+                "held_connections": len(self._held)
+            }
+
+pool_accounting = PoolAccounting()
+
+class InstrumentedQueuePool(pool.QueuePool):
+    """QueuePool that measures how long callers wait for a connection"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_accounting.record_wait((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        pool_accounting.record_wait((time.perf_counter() - start) * 1000)
+        return connection
+
+def _install_pool_listeners(engine):
+    """Track checkouts/checkins so held connections can be reported"""
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        pool_accounting.record_connect()
+    
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_accounting.record_checkout(id(connection_record))
+    
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        pool_accounting.record_checkin(id(connection_record))
+
+def _start_leak_watchdog():
+    """Background thread that periodically reports long-held connections"""
+    def _watch():
+        while True:
+            time.sleep(max(LEAK_THRESHOLD_SECONDS / 2, 1))
+            try:
+                pool_accounting.find_leaks()
+            except Exception as e:
+                logger.error(f"Leak watchdog error: {e}")
+    
+    watchdog = threading.Thread(target=_watch, name="db-pool-leak-watchdog", daemon=True)
+    watchdog.start()
+
 def init_connection_pool():
     """Initialize SQLAlchemy connection pool with VPC-optimized settings"""
     global _engine, _session_factory
@@ -27,7 +163,7 @@ def init_connection_pool():
     
     # Build database URL
     db_host = os.getenv('DB_HOST', 'farmer-crm-production.cifgmm0mqg5q.us-east-1.rds.amazonaws.com')
-    db_name = os.getenv('DB_NAME', 'postgres')
+    db_name = os.getenv('DB_NAME', DEFAULT_DB_NAME)
     db_user = os.getenv('DB_USER', 'postgres')
     db_password = os.getenv('DB_PASSWORD')
     db_port = os.getenv('DB_PORT', '5432')
@@ -37,7 +173,7 @@ def init_connection_pool():
     # Create engine with optimized pool settings
     _engine = create_engine(
         database_url,
-        poolclass=pool.QueuePool,
+        poolclass=InstrumentedQueuePool,
         pool_size=5,  # 5 persistent connections
         max_overflow=5,  # Allow up to 10 total connections
         pool_timeout=3,  # 3 second timeout to get connection from pool
@@ -45,10 +181,15 @@ def init_connection_pool():
         pool_pre_ping=True,  # Test connections before using
         connect_args={
             "connect_timeout": 2,  # 2 second connection timeout for VPC
-            "options": "-c statement_timeout=2000"  # 2 second query timeout
+            "options": "-c statement_timeout=2000",  # 2 second query timeout
+            **({"cursor_factory": ProfiledCursor} if ProfiledCursor else {})  # raw cursors feed the SQL profiler
         }
     )
     
+    _install_pool_listeners(_engine)
+    if LEAK_DETECTION_ENABLED:
+        _start_leak_watchdog()
+    
     # Create session factory
     _session_factory = sessionmaker(bind=_engine)
     
@@ -89,6 +230,28 @@ def get_db_connection():
     finally:
         conn.close()
 
+def get_pool_stats() -> Dict[str, Any]:
+    """Live pool counters: checked-out, overflow, wait time and leak reports"""
+    stats = {
+        "pool_initialized": _engine is not None,
+        "leak_threshold_seconds": LEAK_THRESHOLD_SECONDS
+    }
+    if _engine:
+        stats.update({
+            "pool_size": _engine.pool.size(),
+            "checked_out": _engine.pool.checkedout(),
+            "checked_in": _engine.pool.checkedin(),
+            "overflow": _engine.pool.overflow(),
+            "max_overflow": _engine.pool._max_overflow,
+        })
+    leaks = pool_accounting.find_leaks()
+    stats.update(pool_accounting.snapshot())
+    stats["long_held"] = [
+        {"held_seconds": leak["held_seconds"], "checkout_site": leak["stack"][-1].strip() if leak["stack"] else None}
+        for leak in leaks
+    ]
+    return stats
+
 def execute_query(query: str, params: Dict = None) -> List[Dict[str, Any]]:
     """Execute a query and return results as list of dicts with timing"""
     start_time = time.time()
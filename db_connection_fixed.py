@@ -2,74 +2,33 @@
 """
 Fixed Database Connection Function
 🎯 Purpose: Fix "Invalid IPv6 URL" error in asyncpg connection
+⚡ Connections come from the shared asyncpg pool (async_database.py)
 📜 Constitutional Compliance: Error isolation + LLM-first approach
 """
 
-import os
-import asyncpg
-from urllib.parse import quote_plus
+from async_database import get_async_pool
 
 async def get_constitutional_db_connection():
     """
-    Constitutional database connection with proper URL encoding
-    Fixes the "Invalid IPv6 URL" error
+    Constitutional database connection from the shared asyncpg pool.
+    Returns an acquired pooled connection (release with release_db_connection)
+    or None if the pool is unavailable.
     """
     try:
-        # Get environment variables
-        db_host = os.getenv('DB_HOST')
-        db_name = os.getenv('DB_NAME', 'farmer_crm')
-        db_user = os.getenv('DB_USER', 'postgres')
-        db_password = os.getenv('DB_PASSWORD')
-        db_port = os.getenv('DB_PORT', '5432')
-        
-        # Validate required parameters
-        if not all([db_host, db_password]):
-            raise ValueError("Missing required environment variables: DB_HOST or DB_PASSWORD")
-        
-        # Build connection parameters (not URL string)
-        connection_params = {
-            'host': db_host,
-            'port': int(db_port),
-            'user': db_user,
-            'password': db_password,  # Use raw password, not URL-encoded
-            'database': db_name,
-            'server_settings': {
-                'application_name': 'ava_olo_dashboard'
-            }
-        }
-        
-        # Try different SSL modes in order of preference
-        ssl_modes = ['require', 'prefer', 'disable']
-        
-        for ssl_mode in ssl_modes:
-            try:
-                # Add SSL mode to connection parameters
-                if ssl_mode != 'disable':
-                    connection_params['ssl'] = ssl_mode
-                else:
-                    connection_params['ssl'] = False
-                
-                # Create connection using parameters (not URL string)
-                conn = await asyncpg.connect(**connection_params)
-                
-                # Test the connection
-                await conn.fetchval("SELECT 1")
-                
-                print(f"✅ Connected successfully with SSL: {ssl_mode}")
-                return conn
-                
-            except Exception as ssl_error:
-                print(f"⚠️ SSL {ssl_mode} failed: {str(ssl_error)[:50]}...")
-                continue
-        
-        # If all SSL modes fail, try one more time with basic connection
-        raise Exception("All SSL connection attempts failed")
-        
+        pool = await get_async_pool()
+        return await pool.acquire()
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
         # Constitutional principle: Error isolation - return None instead of crashing
         return None
 
+async def release_db_connection(conn):
+    """Return a connection obtained from get_constitutional_db_connection to the pool"""
+    if conn is None:
+        return
+    pool = await get_async_pool()
+    await pool.release(conn)
+
 async def test_fixed_connection():
     """Test the fixed connection and get schema info"""
     
@@ -124,7 +83,7 @@ async def test_fixed_connection():
                 "sample_data": [dict(row) for row in sample_farmers]
             }
         
-        await conn.close()
+        await release_db_connection(conn)
         
         return {
             "status": "success",
@@ -135,7 +94,7 @@ async def test_fixed_connection():
         }
         
     except Exception as e:
-        await conn.close()
+        await release_db_connection(conn)
         return {
             "status": "query_failed",
             "error": str(e)
@@ -151,10 +110,10 @@ async def get_farmer_count():
     
     try:
         count = await conn.fetchval("SELECT COUNT(*) FROM farmers")
-        await conn.close()
+        await release_db_connection(conn)
         return {"count": count}
     except Exception as e:
-        await conn.close()
+        await release_db_connection(conn)
         return {"error": str(e)}
 
 async def get_all_farmers():
@@ -181,7 +140,7 @@ async def get_all_farmers():
             ORDER BY farm_name, manager_name
         """)
         
-        await conn.close()
+        await release_db_connection(conn)
         
         return {
             "farmers": [dict(row) for row in farmers],
@@ -189,7 +148,7 @@ async def get_all_farmers():
         }
         
     except Exception as e:
-        await conn.close()
+        await release_db_connection(conn)
         return {"error": str(e)}
 
 async def get_farmer_fields(farmer_id: int):
@@ -216,7 +175,7 @@ async def get_farmer_fields(farmer_id: int):
             ORDER BY field_name
         """, farmer_id)
         
-        await conn.close()
+        await release_db_connection(conn)
         
         return {
             "fields": [dict(row) for row in fields],
@@ -225,7 +184,7 @@ async def get_farmer_fields(farmer_id: int):
         }
         
     except Exception as e:
-        await conn.close()
+        await release_db_connection(conn)
         return {"error": str(e)}
 
 async def get_field_tasks(field_id: int):
@@ -255,7 +214,7 @@ async def get_field_tasks(field_id: int):
             LIMIT 50
         """, field_id)
         
-        await conn.close()
+        await release_db_connection(conn)
         
         return {
             "tasks": [dict(row) for row in tasks],
@@ -264,7 +223,7 @@ async def get_field_tasks(field_id: int):
         }
         
     except Exception as e:
-        await conn.close()
+        await release_db_connection(conn)
         return {"error": str(e)}
 
 async def get_farmer_with_fields_and_tasks(farmer_id: int):
@@ -283,7 +242,7 @@ async def get_farmer_with_fields_and_tasks(farmer_id: int):
         """, farmer_id)
         
         if not farmer:
-            await conn.close()
+            await release_db_connection(conn)
             return {"error": "Farmer not found"}
         
         # Get farmer's fields
@@ -311,7 +270,7 @@ async def get_farmer_with_fields_and_tasks(farmer_id: int):
             LIMIT 20
         """, farmer_id)
         
-        await conn.close()
+        await release_db_connection(conn)
         
         return {
             "farmer": dict(farmer),
@@ -322,7 +281,7 @@ async def get_farmer_with_fields_and_tasks(farmer_id: int):
         }
         
     except Exception as e:
-        await conn.close()
+        await release_db_connection(conn)
         return {"error": str(e)}
 
 async def get_field_with_crops(field_id: int):
@@ -346,7 +305,7 @@ async def get_field_with_crops(field_id: int):
         """, field_id)
         
         if not field:
-            await conn.close()
+            await release_db_connection(conn)
             return {"error": "Field not found"}
         
         # Get crop history for this field
@@ -377,7 +336,7 @@ async def get_field_with_crops(field_id: int):
             ORDER BY analysis_date DESC
         """, field_id)
         
-        await conn.close()
+        await release_db_connection(conn)
         
         return {
             "field": dict(field),
@@ -387,7 +346,7 @@ async def get_field_with_crops(field_id: int):
         }
         
     except Exception as e:
-        await conn.close()
+        await release_db_connection(conn)
         return {"error": str(e)}
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+"""
+Farmer Growth Time Series Engine
+Builds bucketed new/unsubscribed farmer series with one aggregate query per metric
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Chart windows offered by the business dashboard (days)
+SUPPORTED_WINDOWS = (7, 30, 90, 365)
+
+# date_trunc unit -> generate_series step
+BUCKET_INTERVALS = {
+    "day": "1 day",
+    "week": "1 week",
+    "month": "1 month"
+}
+
+# One statement per metric: generate_series supplies empty buckets,
+# the grouped subquery does a single range scan over the base table.
+NEW_FARMERS_SQL = """
+    WITH buckets AS (
+        SELECT generate_series(
+            date_trunc(:unit, CAST(:since AS timestamp)),
+            date_trunc(:unit, CAST(:until AS timestamp)),
+            CAST(:step AS interval)
+        ) AS bucket
+    ),
+    counts AS (
+        SELECT date_trunc(:unit, created_at) AS bucket, COUNT(*) AS total
+        FROM farmers
+        WHERE created_at >= date_trunc(:unit, CAST(:since AS timestamp))
+          AND created_at < date_trunc(:unit, CAST(:until AS timestamp)) + CAST(:step AS interval)
+        GROUP BY 1
+    )
+    SELECT b.bucket,
+           COALESCE(c.total, 0) AS total,
+           (SELECT COUNT(*) FROM farmers
+            WHERE created_at < date_trunc(:unit, CAST(:since AS timestamp))) AS base_count
+    FROM buckets b
+    LEFT JOIN counts c ON c.bucket = b.bucket
+    ORDER BY b.bucket
+"""
+
+UNSUBSCRIBED_SQL = """
+    WITH buckets AS (
+        SELECT generate_series(
+            date_trunc(:unit, CAST(:since AS timestamp)),
+            date_trunc(:unit, CAST(:until AS timestamp)),
+            CAST(:step AS interval)
+        ) AS bucket
+    ),
+    counts AS (
+        SELECT date_trunc(:unit, updated_at) AS bucket, COUNT(*) AS total
+        FROM farmers
+        WHERE is_active = FALSE
+          AND updated_at >= date_trunc(:unit, CAST(:since AS timestamp))
+          AND updated_at < date_trunc(:unit, CAST(:until AS timestamp)) + CAST(:step AS interval)
+        GROUP BY 1
+    )
+    SELECT b.bucket, COALESCE(c.total, 0) AS total
+    FROM buckets b
+    LEFT JOIN counts c ON c.bucket = b.bucket
+    ORDER BY b.bucket
+"""
+
+
+def validate_window(days: int, bucket: str) -> None:
+    """Reject windows and bucket units the engine does not serve"""
+    if days not in SUPPORTED_WINDOWS:
+        raise ValueError(f"Unsupported window {days}d, expected one of {SUPPORTED_WINDOWS}")
+    if bucket not in BUCKET_INTERVALS:
+        raise ValueError(f"Unsupported bucket '{bucket}', expected one of {tuple(BUCKET_INTERVALS)}")
+
+
+def cumulative_series(base_count: int, new_counts: List[int], unsub_counts: List[int]) -> List[int]:
+    """Derive running farmer totals from per-bucket new/unsubscribed counts"""
+    cumulative = []
+    running_total = base_count
+    for new_count, unsub_count in zip(new_counts, unsub_counts):
+        running_total += (new_count - unsub_count)
+        cumulative.append(running_total)
+    return cumulative
+
+
+class FarmerGrowthSeries:
+    """Farmer growth series for a window, computed from two aggregate queries"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def _params(self, days: int, bucket: str, now: Optional[datetime]) -> Dict[str, Any]:
+        now = now or datetime.now()
+        return {
+            "unit": bucket,
+            "step": BUCKET_INTERVALS[bucket],
+            "since": now - timedelta(days=days - 1),
+            "until": now
+        }
+
+    def _run(self, sql: str, params: Dict[str, Any]) -> List[Any]:
+        try:
+            return self.session.execute(text(sql), params).fetchall()
+        except Exception as e:
+            # Constitutional fallback: missing created_at/updated_at/is_active columns
+            logger.warning(f"Growth series query failed, using empty metric: {e}")
+            self.session.rollback()
+            return []
+
+    def build(self, days: int = 30, bucket: str = "day", now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Return dates, new, unsubscribed and cumulative series for the window"""
+        validate_window(days, bucket)
+        params = self._params(days, bucket, now)
+
+        new_rows = self._run(NEW_FARMERS_SQL, params)
+        unsub_rows = self._run(UNSUBSCRIBED_SQL, params)
+
+        # Both queries share the same generate_series, so buckets line up;
+        # fall back to the unsubscribed buckets if the new-farmer query failed.
+        bucket_rows = new_rows or unsub_rows
+        dates = [row[0].strftime("%Y-%m-%d") for row in bucket_rows]
+        new_farmers = [int(row[1]) for row in new_rows] or [0] * len(dates)
+        unsub_by_date = {row[0].strftime("%Y-%m-%d"): int(row[1]) for row in unsub_rows}
+        unsubscribed = [unsub_by_date.get(d, 0) for d in dates]
+        base_count = int(new_rows[0][2]) if new_rows else 0
+
+        return {
+            "window_days": days,
+            "bucket": bucket,
+            "dates": dates,
+            "new_farmers": new_farmers,
+            "unsubscribed": unsubscribed,
+            "cumulative": cumulative_series(base_count, new_farmers, unsubscribed)
+        }
@@ -8,7 +8,7 @@ from fastapi.templating import Jinja2Templates
 import logging
 import os
 import sys
-import httpx
+import time
 import asyncio
 from typing import Dict, Any, List
 from datetime import datetime
@@ -49,12 +49,20 @@ except Exception as e:
     logger.error(f"Failed to import DatabaseOperations: {e}")
     DatabaseOperations = None
 
+from async_database import register_async_pool, get_async_pool_stats, fetchrow as async_fetchrow
+from health_history import health_history
+from http_clients import http_clients, register_http_clients
+from metrics import instrument_app
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AVA OLO Health Check Dashboard",
     description="System health monitoring and service status",
     version="1.0.0"
 )
+register_async_pool(app)
+register_http_clients(app)
+instrument_app(app, "health_check_dashboard")
 
 # Import constitutional components for testing
 try:
@@ -236,37 +244,46 @@ class HealthMonitor:
             self.db_ops = None
     
     async def check_service_health(self, service_name: str, service_info: Dict[str, Any]) -> Dict[str, Any]:
-        """Check health of a single service"""
+        """Check health of a single service and record the sample in the health history"""
+        started = time.perf_counter()
+        health_data = await self._request_service_health(service_name, service_info)
+        # Only a response has a meaningful latency; an open circuit fails in microseconds and a
+        # connection error or timeout says nothing about response time, so neither feeds p50/p95
+        latency_ms = (time.perf_counter() - started) * 1000 if health_data["status"] != "offline" else None
+        health_history.record(service_name, health_data["status"] == "healthy", latency_ms)
+        return health_data
+    
+    async def _request_service_health(self, service_name: str, service_info: Dict[str, Any]) -> Dict[str, Any]:
+        """GET a service's health URL through the shared per-host client"""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(service_info["url"])
-                if response.status_code == 200:
-                    health_data = {
-                        "name": service_name,
-                        "status": "healthy",
-                        "url": service_info["url"],
-                        "description": service_info.get("description", ""),
-                        "response_time": response.elapsed.total_seconds(),
-                        "details": response.json() if response.headers.get("content-type", "").startswith("application/json") else None
-                    }
-                    
-                    # Extract version and additional health info if available
-                    if health_data.get("details"):
-                        details = health_data["details"]
-                        health_data["version"] = details.get("version", "Unknown")
-                        health_data["llm_connected"] = details.get("llm_connected", None)
-                        health_data["last_activity"] = details.get("last_activity", None)
-                        health_data["dependencies_ok"] = details.get("dependencies_ok", None)
-                    
-                    return health_data
-                else:
-                    return {
-                        "name": service_name,
-                        "status": "unhealthy",
-                        "url": service_info["url"],
-                        "description": service_info.get("description", ""),
-                        "error": f"HTTP {response.status_code}"
-                    }
+            response = await http_clients.get(service_info["url"], timeout=5.0)
+            if response.status_code == 200:
+                health_data = {
+                    "name": service_name,
+                    "status": "healthy",
+                    "url": service_info["url"],
+                    "description": service_info.get("description", ""),
+                    "response_time": response.elapsed.total_seconds(),
+                    "details": response.json() if response.headers.get("content-type", "").startswith("application/json") else None
+                }
+                
+                # Extract version and additional health info if available
+                if health_data.get("details"):
+                    details = health_data["details"]
+                    health_data["version"] = details.get("version", "Unknown")
+                    health_data["llm_connected"] = details.get("llm_connected", None)
+                    health_data["last_activity"] = details.get("last_activity", None)
+                    health_data["dependencies_ok"] = details.get("dependencies_ok", None)
+                
+                return health_data
+            else:
+                return {
+                    "name": service_name,
+                    "status": "unhealthy",
+                    "url": service_info["url"],
+                    "description": service_info.get("description", ""),
+                    "error": f"HTTP {response.status_code}"
+                }
         except Exception as e:
             return {
                 "name": service_name,
@@ -333,43 +350,30 @@ class HealthMonitor:
     
     async def get_database_health(self) -> Dict[str, Any]:
         """Check database health and statistics"""
+        started = time.perf_counter()
         try:
-            if not self.db_ops:
-                logger.warning("db_ops not available, returning default health")
-                return {
-                    "status": "unknown",
-                    "error": "Database operations not initialized"
-                }
-                
-            with self.db_ops.get_session() as session:
-                from sqlalchemy import text
-                
-                # Check connection
-                session.execute(text("SELECT 1"))
-                
-                # Get table counts
-                farmers_count = session.execute(
-                    text("SELECT COUNT(*) FROM farmers")
-                ).scalar() or 0
-                
-                messages_count = session.execute(
-                    text("SELECT COUNT(*) FROM incoming_messages")
-                ).scalar() or 0
-                
-                fields_count = session.execute(
-                    text("SELECT COUNT(*) FROM fields")
-                ).scalar() or 0
-                
-                return {
-                    "status": "healthy",
-                    "database": "farmer_crm",
-                    "statistics": {
-                        "farmers": farmers_count,
-                        "messages": messages_count,
-                        "fields": fields_count
-                    }
-                }
+            # One round trip on the shared asyncpg pool (no event-loop blocking)
+            row = await async_fetchrow("""
+                SELECT
+                    (SELECT COUNT(*) FROM farmers) AS farmers,
+                    (SELECT COUNT(*) FROM incoming_messages) AS messages,
+                    (SELECT COUNT(*) FROM fields) AS fields
+            """)
+            
+            result = {
+                "status": "healthy",
+                "database": "farmer_crm",
+                "statistics": {
+                    "farmers": row["farmers"] or 0,
+                    "messages": row["messages"] or 0,
+                    "fields": row["fields"] or 0
+                },
+                "pool": get_async_pool_stats()
+            }
+            health_history.record("Database", True, (time.perf_counter() - started) * 1000)
+            return result
         except Exception as e:
+            health_history.record("Database", False, None)
             return {
                 "status": "unhealthy",
                 "error": str(e)
@@ -428,7 +432,7 @@ class HealthMonitor:
             
             for test in test_cases:
                 try:
-                    result = processor.process_natural_query(test["query"])
+                    result = await processor.process_natural_query(test["query"])
                     test_result = {
                         "query": test["query"],
                         "language": test["language"],
@@ -494,6 +498,13 @@ class HealthMonitor:
 # Initialize monitor
 monitor = HealthMonitor()
 
+# Window for the dashboard's uptime / percentile / sparkline figures
+HEALTH_HISTORY_WINDOW_HOURS = float(os.getenv('HEALTH_HISTORY_WINDOW_HOURS', '24'))
+
+def get_history_summaries(hours: float = HEALTH_HISTORY_WINDOW_HOURS) -> Dict[str, Any]:
+    """Rolling uptime and p50/p95/p99 latency for every monitored service and the database"""
+    return health_history.summaries([*SERVICES, "Database"], hours * 3600)
+
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """Main health check dashboard"""
@@ -518,6 +529,8 @@ async def dashboard(request: Request):
             "constitutional_health": constitutional_health,
             "deployment_info": deployment_info,
             "database_status": database_status,
+            "history": get_history_summaries(),
+            "history_hours": HEALTH_HISTORY_WINDOW_HOURS,
             "healthy_services": healthy_services,
             "total_services": total_services,
             "overall_health": "healthy" if healthy_services == total_services else "degraded",
@@ -542,9 +555,27 @@ async def api_health():
         "constitutional": constitutional_health,
         "deployment": deployment_info,
         "database_status": database_status,
+        "history": {
+            name: {k: v for k, v in summary.items() if k != "sparkline_svg"}
+            for name, summary in get_history_summaries().items()
+        },
+        "http_clients": http_clients.get_stats(),
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/health/history")
+async def api_health_history(series: str = None, hours: float = HEALTH_HISTORY_WINDOW_HOURS, points: int = 40):
+    """Uptime, latency percentiles and a sparkline series per service over the trailing window"""
+    names = [series] if series else health_history.series_names()
+    return {
+        "hours": hours,
+        "series": {
+            name: {k: v for k, v in health_history.summary(name, hours * 3600, points).items() if k != "sparkline_svg"}
+            for name in names
+        },
+        "store": health_history.get_stats()
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,304 @@
+"""
+Health History Store
+SQLite time series of health probe results with hourly downsampling, rolling latency percentiles and sparklines
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by the health dashboards ("" keeps history in memory only)
+HEALTH_HISTORY_PATH = os.getenv('HEALTH_HISTORY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'health_history.sqlite3'))
+
+# Raw samples are kept this long; older data survives only as hourly rollups, which expire too
+HEALTH_HISTORY_RAW_HOURS = float(os.getenv('HEALTH_HISTORY_RAW_HOURS', '48'))
+HEALTH_HISTORY_ROLLUP_DAYS = float(os.getenv('HEALTH_HISTORY_ROLLUP_DAYS', '180'))
+
+# How often closed hours are rolled up and expired rows deleted
+HEALTH_HISTORY_COMPACT_SECONDS = float(os.getenv('HEALTH_HISTORY_COMPACT_SECONDS', '300'))
+
+ROLLUP_SECONDS = 3600
+PERCENTILES = (50, 95, 99)
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS health_samples (
+        series TEXT NOT NULL,
+        ts REAL NOT NULL,
+        ok INTEGER NOT NULL,
+        latency_ms REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_health_samples_series_ts ON health_samples(series, ts)",
+    """
+    CREATE TABLE IF NOT EXISTS health_rollups (
+        series TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        ok_samples INTEGER NOT NULL,
+        latency_avg REAL,
+        p50 REAL,
+        p95 REAL,
+        p99 REAL,
+        latency_max REAL,
+        PRIMARY KEY (series, bucket)
+    )
+    """
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def weighted_percentile(pairs: List[tuple], q: float) -> Optional[float]:
+    """Percentile of (value, weight) pairs; used to combine hourly percentiles"""
+    pairs = sorted((value, weight) for value, weight in pairs if value is not None and weight)
+    total = sum(weight for _, weight in pairs)
+    if not total:
+        return None
+    threshold = total * q / 100
+    running = 0
+    for value, weight in pairs:
+        running += weight
+        if running >= threshold:
+            return value
+    return pairs[-1][0]
+
+
+def sparkline_svg(values: List[Optional[float]], failures: Optional[List[bool]] = None,
+                  width: int = 160, height: int = 32, color: str = "#2196f3") -> str:
+    """Inline SVG polyline for a latency series; gaps are skipped, failed buckets get a red tick"""
+    points = [(i, v) for i, v in enumerate(values) if v is not None]
+    if not points:
+        return f'<svg width="{width}" height="{height}"></svg>'
+    top = max(v for _, v in points) or 1.0
+    step = width / max(len(values) - 1, 1)
+
+    def y(value):
+        return round(height - 2 - (value / top) * (height - 4), 1)
+
+    polyline = " ".join(f"{round(i * step, 1)},{y(v)}" for i, v in points)
+    ticks = "".join(
+        f'<line x1="{round(i * step, 1)}" y1="{height - 6}" x2="{round(i * step, 1)}" y2="{height}" stroke="#f44336" stroke-width="2"/>'
+        for i, failed in enumerate(failures or []) if failed
+    )
+    return (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{polyline}"/>{ticks}</svg>')
+
+
+class HealthHistory:
+    """
+    Per-series (service or probe) health samples: timestamp, ok, latency.
+
+    Raw samples are kept for HEALTH_HISTORY_RAW_HOURS and give exact rolling
+    percentiles and uptime. Once an hour has closed, its samples are rolled
+    up into one row (count, ok count, avg/max, p50/p95/p99), kept for
+    HEALTH_HISTORY_ROLLUP_DAYS. Longer windows combine the hourly
+    percentiles, weighted by sample count. Both tables are trimmed on every
+    compaction, so the file size is bounded by probe rate × retention.
+
+    ``record()`` only queues the sample, so async handlers and probe
+    listeners never wait on SQLite. A daemon writer thread inserts queued
+    samples in batches and runs compaction. Reads flush the queue first, so
+    they always include the latest samples.
+    """
+
+    def __init__(self, path: str = HEALTH_HISTORY_PATH, raw_hours: float = HEALTH_HISTORY_RAW_HOURS,
+                 rollup_days: float = HEALTH_HISTORY_ROLLUP_DAYS):
+        self.path = path or ":memory:"
+        self.raw_seconds = raw_hours * 3600
+        self.rollup_seconds = rollup_days * 86400
+        self._lock = threading.Lock()
+        self._last_compact = 0.0
+        self._pending: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self.stats = {"recorded": 0, "compactions": 0, "write_errors": 0}
+        try:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA_SQL:
+                self._db.execute(statement)
+            self._db.commit()
+        except Exception as e:
+            # Constitutional fallback: history in memory for this process only
+            logger.warning(f"Health history file unavailable ({e}); keeping history in memory")
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+            for statement in SCHEMA_SQL:
+                self._db.execute(statement)
+
+    # ---- writes ----------------------------------------------------------
+
+    def record(self, series: str, ok: bool, latency_ms: Optional[float], ts: Optional[float] = None):
+        """Queue a sample for the writer thread (never blocks on SQLite)"""
+        with self._pending_lock:
+            self._pending.append((series, ts or time.time(), int(bool(ok)), latency_ms))
+        if self._writer is None or not self._writer.is_alive():
+            self._start_writer()
+        self._wake.set()
+
+    def flush(self):
+        """Insert queued samples, compacting when the interval has passed"""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            with self._lock:
+                try:
+                    self._db.executemany("INSERT INTO health_samples VALUES (?, ?, ?, ?)", batch)
+                    self._db.commit()
+                    self.stats["recorded"] += len(batch)
+                except Exception as e:
+                    self.stats["write_errors"] += 1
+                    logger.warning(f"Health history write of {len(batch)} samples failed: {e}")
+                    return
+        now = time.time()
+        if now - self._last_compact >= HEALTH_HISTORY_COMPACT_SECONDS:
+            self.compact(now=now)
+
+    def _start_writer(self):
+        with self._pending_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="health-history-writer", daemon=True)
+            self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            self._wake.wait(HEALTH_HISTORY_COMPACT_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def record_probe(self, name: str, entry: Dict[str, Any]):
+        """HealthProber listener"""
+        self.record(name, entry["ok"], entry.get("latency_ms"))
+
+    def compact(self, now: Optional[float] = None):
+        """Roll up closed hours that have no rollup yet, then drop expired samples and rollups"""
+        now = now or time.time()
+        current_hour = int(now // ROLLUP_SECONDS) * ROLLUP_SECONDS
+        with self._lock:
+            self._last_compact = now
+            try:
+                pending = self._db.execute("""
+                    SELECT DISTINCT s.series, CAST(s.ts / ? AS INTEGER) * ? AS bucket
+                    FROM health_samples s
+                    WHERE s.ts < ?
+                      AND NOT EXISTS (SELECT 1 FROM health_rollups r
+                                      WHERE r.series = s.series AND r.bucket = CAST(s.ts / ? AS INTEGER) * ?)
+                """, (ROLLUP_SECONDS, ROLLUP_SECONDS, current_hour, ROLLUP_SECONDS, ROLLUP_SECONDS)).fetchall()
+                for series, bucket in pending:
+                    rows = self._db.execute(
+                        "SELECT ok, latency_ms FROM health_samples WHERE series = ? AND ts >= ? AND ts < ?",
+                        (series, bucket, bucket + ROLLUP_SECONDS)
+                    ).fetchall()
+                    latencies = sorted(latency for _, latency in rows if latency is not None)
+                    self._db.execute("INSERT OR REPLACE INTO health_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                        series, bucket, len(rows), sum(ok for ok, _ in rows),
+                        sum(latencies) / len(latencies) if latencies else None,
+                        *(percentile(latencies, q) for q in PERCENTILES),
+                        latencies[-1] if latencies else None
+                    ))
+                self._db.execute("DELETE FROM health_samples WHERE ts < ?", (now - self.raw_seconds,))
+                self._db.execute("DELETE FROM health_rollups WHERE bucket < ?", (now - self.rollup_seconds,))
+                self._db.commit()
+                self.stats["compactions"] += 1
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                logger.warning(f"Health history compaction failed: {e}")
+
+    # ---- reads -----------------------------------------------------------
+
+    def summary(self, series: str, window_seconds: float = 86400, points: int = 40) -> Dict[str, Any]:
+        """Uptime, p50/p95/p99 latency and a sparkline series over the trailing window"""
+        now = time.time()
+        since = now - window_seconds
+        bucket_width = window_seconds / points
+        use_raw = window_seconds <= self.raw_seconds
+        # Long windows read closed hours from rollups and the current hour from raw samples
+        raw_since = since if use_raw else max(since, int(now // ROLLUP_SECONDS) * ROLLUP_SECONDS)
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT ts, ok, latency_ms FROM health_samples WHERE series = ? AND ts >= ? ORDER BY ts",
+                (series, raw_since)
+            ).fetchall()
+            rollups = [] if use_raw else self._db.execute(
+                "SELECT bucket, samples, ok_samples, latency_avg, p50, p95, p99 FROM health_rollups "
+                "WHERE series = ? AND bucket >= ? AND bucket < ? ORDER BY bucket", (series, since, raw_since)
+            ).fetchall()
+
+        sums: List[float] = [0.0] * points
+        counts: List[int] = [0] * points
+        failed: List[bool] = [False] * points
+        for bucket, count, ok_count, latency_avg, *_ in rollups:
+            i = min(int((bucket - since) / bucket_width), points - 1)
+            if latency_avg is not None:
+                sums[i] += latency_avg * count
+                counts[i] += count
+            failed[i] = failed[i] or ok_count < count
+        for ts, ok, latency in rows:
+            i = min(int((ts - since) / bucket_width), points - 1)
+            if latency is not None:
+                sums[i] += latency
+                counts[i] += 1
+            failed[i] = failed[i] or not ok
+
+        latencies = sorted(latency for _, _, latency in rows if latency is not None)
+        if rollups:
+            percentiles = {f"p{q}": _round(weighted_percentile(
+                [(row[4 + n], row[1]) for row in rollups] + [(latency, 1) for latency in latencies], q
+            )) for n, q in enumerate(PERCENTILES)}
+        else:
+            percentiles = {f"p{q}": _round(percentile(latencies, q)) for q in PERCENTILES}
+        samples = len(rows) + sum(row[1] for row in rollups)
+        ok_samples = sum(ok for _, ok, _ in rows) + sum(row[2] for row in rollups)
+
+        sparkline = [round(sums[i] / counts[i], 1) if counts[i] else None for i in range(points)]
+        return {
+            "series": series,
+            "window_seconds": window_seconds,
+            "samples": samples,
+            "uptime": round(ok_samples / samples, 4) if samples else None,
+            **percentiles,
+            "sparkline": sparkline,
+            "sparkline_failures": failed,
+            "sparkline_svg": sparkline_svg(sparkline, failed)
+        }
+
+    def summaries(self, series: Iterable[str], window_seconds: float = 86400) -> Dict[str, Dict[str, Any]]:
+        return {name: self.summary(name, window_seconds) for name in series}
+
+    def series_names(self) -> List[str]:
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT series FROM health_samples UNION SELECT series FROM health_rollups ORDER BY 1"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            raw = self._db.execute("SELECT COUNT(*) FROM health_samples").fetchone()[0]
+            rollups = self._db.execute("SELECT COUNT(*) FROM health_rollups").fetchone()[0]
+        return {**self.stats, "path": self.path, "raw_samples": raw, "rollup_rows": rollups,
+                "pending": len(self._pending)}
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+# Global store shared by the health dashboards
+health_history = HealthHistory()
@@ -0,0 +1,182 @@
+"""
+Background Health Prober
+Per-component health probes on their own intervals, with results kept in ring buffers for dashboards
+"""
+import os
+import time
+import random
+import asyncio
+import inspect
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Results kept per probe, and the default probe timeout
+HEALTH_PROBE_HISTORY = int(os.getenv('HEALTH_PROBE_HISTORY', '120'))
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '20'))
+
+
+class Probe:
+    """One component check: callable, schedule and its ring buffer of results"""
+
+    def __init__(self, name: str, check: Callable[[], Any], interval: float, timeout: float,
+                 healthy: Optional[Callable[[Any], bool]], history: int):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.timeout = timeout
+        self.healthy = healthy
+        self.results: deque = deque(maxlen=history)
+        self.consecutive_failures = 0
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self.results[-1] if self.results else None
+
+
+class HealthProber:
+    """
+    Runs registered health checks in the background and serves their results.
+
+    Each probe runs on its own interval, with a little jitter so probes
+    don't fire together. Sync checks run in a worker thread. Each result
+    (value, ok, latency, error, timestamp) is appended to the probe's ring
+    buffer. Dashboards read the latest result in constant time instead of
+    running the checks per request. A probe that has never completed is run
+    once on demand, shared by concurrent callers. Listeners get every result
+    as it is recorded.
+    """
+
+    def __init__(self, history_size: int = HEALTH_PROBE_HISTORY):
+        self.history_size = history_size
+        self.probes: Dict[str, Probe] = {}
+        self._listeners: List[Callable[[str, Dict[str, Any]], Any]] = []
+
+    def register(self, name: str, check: Callable[[], Any], interval: float,
+                 timeout: float = HEALTH_PROBE_TIMEOUT, healthy: Optional[Callable[[Any], bool]] = None):
+        """Add a probe; healthy(value) decides ok (default: the check didn't raise)"""
+        self.probes[name] = Probe(name, check, interval, timeout, healthy, self.history_size)
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], Any]):
+        self._listeners.append(callback)
+
+    # ---- running ---------------------------------------------------------
+
+    async def _invoke(self, probe: Probe) -> Any:
+        if inspect.iscoroutinefunction(probe.check):
+            return await asyncio.wait_for(probe.check(), timeout=probe.timeout)
+        return await asyncio.wait_for(asyncio.to_thread(probe.check), timeout=probe.timeout)
+
+    async def run_probe(self, name: str) -> Dict[str, Any]:
+        """Run one probe now and record the result"""
+        probe = self.probes[name]
+        async with probe.lock:
+            started = time.perf_counter()
+            entry = {"timestamp": datetime.now().isoformat(), "ok": False, "value": None, "error": None}
+            try:
+                value = await self._invoke(probe)
+                entry["value"] = value
+                entry["ok"] = bool(probe.healthy(value)) if probe.healthy else True
+            except asyncio.TimeoutError:
+                entry["error"] = f"timed out after {probe.timeout:g}s"
+            except Exception as e:
+                entry["error"] = str(e)[:200]
+            entry["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+            probe.consecutive_failures = 0 if entry["ok"] else probe.consecutive_failures + 1
+            probe.results.append(entry)
+            if not entry["ok"]:
+                logger.warning(f"Health probe '{name}' failed ({probe.consecutive_failures} in a row): "
+                               f"{entry['error'] or 'unhealthy result'}")
+
+        for callback in self._listeners:
+            try:
+                outcome = callback(name, entry)
+                if inspect.isawaitable(outcome):
+                    await outcome
+            except Exception as e:
+                logger.warning(f"Health probe listener failed for '{name}': {e}")
+        return entry
+
+    async def current(self, name: str) -> Dict[str, Any]:
+        """Latest result, running the probe first if it has never completed"""
+        probe = self.probes[name]
+        if probe.latest is None:
+            async with probe.lock:
+                pass
+            if probe.latest is None:
+                return await self.run_probe(name)
+        return probe.latest
+
+    async def value(self, name: str, default: Any = None) -> Any:
+        entry = await self.current(name)
+        return entry["value"] if entry["value"] is not None else default
+
+    async def _loop(self, probe: Probe):
+        # Stagger the first runs so startup doesn't fire every probe at once
+        await asyncio.sleep(random.uniform(0, min(probe.interval, 5)))
+        while True:
+            await self.run_probe(probe.name)
+            await asyncio.sleep(probe.interval * random.uniform(0.9, 1.1))
+
+    def start(self):
+        for probe in self.probes.values():
+            if probe.task is None or probe.task.done():
+                probe.task = asyncio.create_task(self._loop(probe))
+
+    async def stop(self):
+        tasks = [probe.task for probe in self.probes.values() if probe.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for probe in self.probes.values():
+            probe.task = None
+
+    # ---- reads -----------------------------------------------------------
+
+    def history(self, name: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = list(self.probes[name].results)
+        return results[-limit:] if limit else results
+
+    def summary(self, name: str) -> Dict[str, Any]:
+        """Latest state plus uptime and latency over the buffered history"""
+        probe = self.probes[name]
+        results = list(probe.results)
+        latencies = [entry["latency_ms"] for entry in results]
+        latest = probe.latest
+        return {
+            "name": name,
+            "interval": probe.interval,
+            "ok": latest["ok"] if latest else None,
+            "last_checked": latest["timestamp"] if latest else None,
+            "last_error": next((entry["error"] for entry in reversed(results) if entry["error"]), None),
+            "consecutive_failures": probe.consecutive_failures,
+            "samples": len(results),
+            "uptime": round(sum(entry["ok"] for entry in results) / len(results), 4) if results else None,
+            "latency_ms": latest["latency_ms"] if latest else None,
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "max_latency_ms": max(latencies) if latencies else None
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: self.summary(name) for name in self.probes}
+
+
+# Global prober; each app registers its probes and calls register_health_prober
+health_prober = HealthProber()
+
+
+def register_health_prober(app):
+    """Start the probe loops on startup and cancel them on shutdown"""
+    @app.on_event("startup")
+    async def _start_health_prober():
+        health_prober.start()
+
+    @app.on_event("shutdown")
+    async def _stop_health_prober():
+        await health_prober.stop()
@@ -0,0 +1,238 @@
+"""
+Shared HTTP Clients
+Process-wide pooled httpx clients for service-to-service calls, with per-host limits, circuit breakers and request metrics
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Connections per host (one pooled client per scheme://host:port) and how long idle ones stay open
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.getenv('HTTP_CLIENT_MAX_CONNECTIONS', '10'))
+HTTP_CLIENT_KEEPALIVE_SECONDS = float(os.getenv('HTTP_CLIENT_KEEPALIVE_SECONDS', '30'))
+
+# Default timeouts; callers can still pass timeout= per request
+HTTP_CLIENT_TIMEOUT = float(os.getenv('HTTP_CLIENT_TIMEOUT', '10'))
+HTTP_CLIENT_CONNECT_TIMEOUT = float(os.getenv('HTTP_CLIENT_CONNECT_TIMEOUT', '3'))
+
+# Consecutive failures that open a host's circuit, and how long it stays open before a trial request
+HTTP_BREAKER_FAILURES = int(os.getenv('HTTP_BREAKER_FAILURES', '5'))
+HTTP_BREAKER_RESET_SECONDS = float(os.getenv('HTTP_BREAKER_RESET_SECONDS', '30'))
+
+# Responses that mean the service behind the host is down, not that the request was wrong
+BREAKER_STATUSES = {502, 503, 504}
+
+# Latencies kept per host for percentiles
+LATENCY_WINDOW = 200
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed → open after ``failure_threshold`` consecutive failures. While
+    open, requests fail immediately. After ``reset_seconds`` one trial
+    request is let through (half-open). Success closes the circuit again;
+    failure reopens it for another ``reset_seconds``.
+    """
+
+    def __init__(self, failure_threshold: int = HTTP_BREAKER_FAILURES, reset_seconds: float = HTTP_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; True if this one opened the circuit"""
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            opened = self.state != "open"
+            self.times_opened += opened
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            return opened
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_in_s": round(max(self.reset_seconds - (time.monotonic() - self.opened_at), 0), 1)
+                          if self.state == "open" else None
+        }
+
+
+class HostClient:
+    """Pooled client, breaker and metrics for one scheme://host:port"""
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self.client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker()
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"requests": 0, "errors": 0, "timeouts": 0, "short_circuited": 0,
+                      "2xx": 0, "3xx": 0, "4xx": 0, "5xx": 0, "total_ms": 0.0, "max_ms": 0.0,
+                      "last_error": None, "http_version": None}
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(HTTP_CLIENT_TIMEOUT, connect=HTTP_CLIENT_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=HTTP_CLIENT_MAX_CONNECTIONS,
+                                    max_keepalive_connections=HTTP_CLIENT_MAX_CONNECTIONS,
+                                    keepalive_expiry=HTTP_CLIENT_KEEPALIVE_SECONDS)
+            )
+        return self.client
+
+    def record(self, elapsed_ms: float, response: Optional[httpx.Response] = None, error: Optional[Exception] = None):
+        self.stats["requests"] += 1
+        self.stats["total_ms"] += elapsed_ms
+        self.stats["max_ms"] = max(self.stats["max_ms"], elapsed_ms)
+        self.latencies.append(elapsed_ms)
+        if response is not None:
+            self.stats[f"{min(max(response.status_code // 100, 2), 5)}xx"] += 1
+            self.stats["http_version"] = response.http_version
+        if error is not None:
+            self.stats["errors"] += 1
+            self.stats["last_error"] = f"{type(error).__name__}: {error}"[:200]
+            if isinstance(error, httpx.TimeoutException):
+                self.stats["timeouts"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def pct(q: float) -> Optional[float]:
+            return round(latencies[min(int(len(latencies) * q / 100), len(latencies) - 1)], 1) if latencies else None
+
+        requests = self.stats["requests"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "total_ms"},
+            "avg_ms": round(self.stats["total_ms"] / requests, 1) if requests else 0.0,
+            "max_ms": round(self.stats["max_ms"], 1),
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+            "circuit": self.breaker.get_stats()
+        }
+
+
+class HttpClientRegistry:
+    """
+    One pooled ``httpx.AsyncClient`` per host, shared by every caller in the process.
+
+    Health checks and dashboard-to-gateway calls hit the same few hosts
+    every few seconds. Reusing one client per host keeps TLS connections
+    alive between calls and caps connections per host. HTTP/2 is used when
+    h2 is installed, so concurrent checks against one host share a
+    connection. Each host has a circuit breaker: once a service stops
+    answering, calls fail fast with ``CircuitOpenError`` instead of each
+    waiting out its timeout. Every request is timed and counted per host.
+    """
+
+    def __init__(self):
+        self.hosts: Dict[str, HostClient] = {}
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parsed = httpx.URL(url)
+        return f"{parsed.scheme}://{parsed.host}:{parsed.port or (443 if parsed.scheme == 'https' else 80)}"
+
+    def host(self, url: str) -> HostClient:
+        origin = self._origin(url)
+        if origin not in self.hosts:
+            self.hosts[origin] = HostClient(origin)
+        return self.hosts[origin]
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send through the host's pooled client; raises CircuitOpenError while the host is marked down"""
+        host = self.host(url)
+        if not host.breaker.allow():
+            host.stats["short_circuited"] += 1
+            raise CircuitOpenError(f"Circuit open for {host.origin} after {host.breaker.failures} consecutive failures")
+
+        started = time.perf_counter()
+        try:
+            response = await host.get_client().request(method, url, **kwargs)
+        except asyncio.CancelledError:
+            # A cancelled trial request must not leave the breaker stuck half-open
+            host.breaker._trial_in_flight = False
+            raise
+        except httpx.HTTPError as e:
+            host.record((time.perf_counter() - started) * 1000, error=e)
+            if host.breaker.record_failure():
+                logger.warning(f"Circuit opened for {host.origin} after {host.breaker.failures} consecutive failures: {e}")
+            raise
+
+        host.record((time.perf_counter() - started) * 1000, response=response)
+        if response.status_code in BREAKER_STATUSES:
+            if host.breaker.record_failure():
+                logger.warning(f"Circuit opened for {host.origin} after {host.breaker.failures} consecutive HTTP {response.status_code}")
+        else:
+            host.breaker.record_success()
+        return response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        for host in self.hosts.values():
+            if host.client is not None:
+                await host.client.aclose()
+                host.client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "max_connections_per_host": HTTP_CLIENT_MAX_CONNECTIONS,
+            "hosts": {origin: host.get_stats() for origin, host in self.hosts.items()}
+        }
+
+
+# Global registry shared by the dashboards' outbound HTTP calls
+http_clients = HttpClientRegistry()
+
+
+def register_http_clients(app):
+    """Close the pooled HTTP clients on app shutdown"""
+    @app.on_event("shutdown")
+    async def _close_http_clients():
+        await http_clients.close()
@@ -0,0 +1,87 @@
+"""
+Concurrent KPI Executor
+Runs blocking dashboard KPI providers in parallel on a bounded thread pool
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.getenv("KPI_MAX_WORKERS", "6"))
+DEFAULT_PROVIDER_TIMEOUT = float(os.getenv("KPI_PROVIDER_TIMEOUT", "5"))
+
+
+class KPIExecutor:
+    """
+    Fan-out executor for KPI providers.
+
+    Each provider is a zero-argument callable (plain or ``async def``) that does
+    blocking database work. Providers run on worker threads so the event loop
+    stays free, every provider gets its own timeout, and a provider that fails
+    or times out is replaced by its default value instead of failing the page.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, timeout: float = DEFAULT_PROVIDER_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kpi")
+
+    @staticmethod
+    def _invoke(provider: Callable) -> Any:
+        """Run a provider to completion on the current worker thread"""
+        if asyncio.iscoroutinefunction(provider):
+            # Providers are async for API compatibility but never await I/O,
+            # so a private loop on the worker thread is enough to drive them.
+            return asyncio.run(provider())
+        return provider()
+
+    async def _run_one(self, name: str, provider: Callable, default: Any) -> Tuple[Any, Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            value = await asyncio.wait_for(
+                loop.run_in_executor(self._pool, self._invoke, provider),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"KPI provider '{name}' timed out after {self.timeout}s")
+            value, status = default, "timeout"
+        except Exception as e:
+            logger.error(f"KPI provider '{name}' failed: {e}")
+            value, status = default, "error"
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        return value, {"ms": elapsed_ms, "status": status}
+
+    async def run(self, providers: Dict[str, Tuple[Callable, Any]]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """
+        Run ``{name: (provider, default)}`` concurrently.
+
+        Returns ``(results, timings)`` where timings maps each provider name to
+        ``{"ms": float, "status": "ok" | "timeout" | "error"}``.
+        """
+        names = list(providers)
+        outcomes = await asyncio.gather(*[
+            self._run_one(name, *providers[name]) for name in names
+        ])
+
+        results = {name: outcome[0] for name, outcome in zip(names, outcomes)}
+        timings = {name: outcome[1] for name, outcome in zip(names, outcomes)}
+        return results, timings
+
+    def shutdown(self):
+        """Stop worker threads (pending providers are abandoned)"""
+        self._pool.shutdown(wait=False)
+
+
+def server_timing_header(timings: Dict[str, Dict[str, Any]]) -> str:
+    """Format provider timings as a Server-Timing header value"""
+    return ", ".join(
+        f'{name};dur={timing["ms"]};desc="{timing["status"]}"'
+        for name, timing in timings.items()
+    )
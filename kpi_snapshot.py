@@ -0,0 +1,467 @@
+"""
+Business KPI Snapshot Store
+Materialized KPI rollups with incremental, watermark-driven refresh
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, date
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import text
+
+from schema_catalog import schema_catalog
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "business"
+
+# Background refresh cadence and the age after which readers fall back to live queries
+REFRESH_INTERVAL = int(os.getenv("KPI_SNAPSHOT_INTERVAL", "60"))
+MAX_STALENESS = int(os.getenv("KPI_SNAPSHOT_MAX_STALENESS", "900"))
+FULL_REFRESH_HOURS = int(os.getenv("KPI_SNAPSHOT_FULL_REFRESH_HOURS", "24"))
+READ_TTL = float(os.getenv("KPI_SNAPSHOT_READ_TTL", "5"))
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS business_kpi_snapshot (
+        snapshot_key VARCHAR(50) PRIMARY KEY,
+        payload JSONB NOT NULL,
+        farmers_watermark TIMESTAMP NULL,
+        fields_watermark TIMESTAMP NULL,
+        tasks_watermark TIMESTAMP NULL,
+        messages_watermark TIMESTAMP NULL,
+        last_full_refresh TIMESTAMP NULL,
+        refreshed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        refresh_ms INTEGER NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS business_kpi_daily (
+        day DATE PRIMARY KEY,
+        new_farmers INTEGER NOT NULL DEFAULT 0,
+        unsubscribed INTEGER NOT NULL DEFAULT 0,
+        new_fields INTEGER NOT NULL DEFAULT 0,
+        new_hectares DOUBLE PRECISION NOT NULL DEFAULT 0,
+        new_operations INTEGER NOT NULL DEFAULT 0,
+        crops_planted INTEGER NOT NULL DEFAULT 0,
+        questions_asked INTEGER NOT NULL DEFAULT 0,
+        active_farmers INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+    """
+]
+
+# Watermark per source: newest change visible in the base table
+# (alternatives are tried in order for tables without updated_at)
+WATERMARK_SQL = {
+    "farmers": ("SELECT GREATEST(MAX(created_at), MAX(updated_at)) FROM farmers",
+                "SELECT MAX(created_at) FROM farmers"),
+    "fields": ("SELECT GREATEST(MAX(created_at), MAX(updated_at)) FROM fields",
+               "SELECT MAX(created_at) FROM fields"),
+    "tasks": ("SELECT MAX(created_at) FROM tasks",),
+    "messages": ("SELECT MAX(created_at) FROM incoming_messages",)
+}
+
+# Per-day event rollups; each is a single index range scan from :since ({area} is the fields area column)
+DAILY_ROLLUP_SQL = {
+    "farmers": ("""
+        SELECT CAST(created_at AS date), COUNT(*)
+        FROM farmers WHERE created_at >= :since GROUP BY 1
+    """, ("new_farmers",)),
+    "unsubscribed": ("""
+        SELECT CAST(updated_at AS date), COUNT(*)
+        FROM farmers WHERE is_active = FALSE AND updated_at >= :since GROUP BY 1
+    """, ("unsubscribed",)),
+    "fields": ("""
+        SELECT CAST(created_at AS date), COUNT(*), COALESCE(SUM({area}), 0)
+        FROM fields WHERE created_at >= :since GROUP BY 1
+    """, ("new_fields", "new_hectares")),
+    "tasks": ("""
+        SELECT CAST(created_at AS date), COUNT(*), COUNT(*) FILTER (WHERE task_type = 'planting')
+        FROM tasks WHERE created_at >= :since GROUP BY 1
+    """, ("new_operations", "crops_planted")),
+    "messages": ("""
+        SELECT CAST(created_at AS date), COUNT(*), COUNT(DISTINCT farmer_id)
+        FROM incoming_messages WHERE created_at >= :since GROUP BY 1
+    """, ("questions_asked", "active_farmers"))
+}
+
+DAILY_COLUMNS = (
+    "new_farmers", "unsubscribed", "new_fields", "new_hectares",
+    "new_operations", "crops_planted", "questions_asked", "active_farmers"
+)
+
+UPSERT_DAILY_SQL = f"""
+    INSERT INTO business_kpi_daily (day, {", ".join(DAILY_COLUMNS)}, updated_at)
+    VALUES (:day, {", ".join(":" + c for c in DAILY_COLUMNS)}, NOW())
+    ON CONFLICT (day) DO UPDATE SET
+        {", ".join(f"{c} = EXCLUDED.{c}" for c in DAILY_COLUMNS)},
+        updated_at = NOW()
+"""
+
+UPSERT_SNAPSHOT_SQL = """
+    INSERT INTO business_kpi_snapshot (
+        snapshot_key, payload, farmers_watermark, fields_watermark, tasks_watermark,
+        messages_watermark, last_full_refresh, refreshed_at, refresh_ms
+    )
+    VALUES (
+        :key, CAST(:payload AS jsonb), :farmers, :fields, :tasks,
+        :messages, :last_full_refresh, NOW(), :refresh_ms
+    )
+    ON CONFLICT (snapshot_key) DO UPDATE SET
+        payload = EXCLUDED.payload,
+        farmers_watermark = EXCLUDED.farmers_watermark,
+        fields_watermark = EXCLUDED.fields_watermark,
+        tasks_watermark = EXCLUDED.tasks_watermark,
+        messages_watermark = EXCLUDED.messages_watermark,
+        last_full_refresh = EXCLUDED.last_full_refresh,
+        refreshed_at = NOW(),
+        refresh_ms = EXCLUDED.refresh_ms
+"""
+
+TREND_WINDOWS = {"24h": 1, "7d": 7, "30d": 30}
+
+
+def classify_crop_hectares(rows: List[Any]) -> Dict[str, float]:
+    """Fold (crop_type, hectares) rows into the dashboard's crop categories"""
+    breakdown = {
+        "arable_crops": 0,
+        "vineyards": 0,
+        "orchards": 0,
+        "others": 0
+    }
+
+    for row in rows:
+        crop_type = row[0].lower() if row[0] else 'others'
+        hectares = row[1] or 0
+
+        if 'wheat' in crop_type or 'corn' in crop_type or 'grain' in crop_type:
+            breakdown["arable_crops"] += hectares
+        elif 'vine' in crop_type or 'grape' in crop_type:
+            breakdown["vineyards"] += hectares
+        elif 'orchard' in crop_type or 'fruit' in crop_type:
+            breakdown["orchards"] += hectares
+        else:
+            breakdown["others"] += hectares
+
+    return {k: round(v, 2) for k, v in breakdown.items()}
+
+
+class KPISnapshotStore:
+    """
+    Materialized business KPIs.
+
+    Event metrics (new farmers, fields, tasks, questions) are rolled up per day
+    into ``business_kpi_daily``; only days at or after the stored watermark are
+    recomputed on each refresh. Point-in-time totals (active farmers, active
+    hectares, crop breakdown) are recomputed only when their source table has
+    changed since the last watermark. The assembled dashboard payload is kept in
+    a single ``business_kpi_snapshot`` row so readers fetch one row.
+    """
+
+    def __init__(self, db_ops):
+        self.db_ops = db_ops
+        self._lock = threading.Lock()
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_at = 0.0
+        self._schema_ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    # --- schema -----------------------------------------------------------
+
+    def ensure_schema(self) -> bool:
+        """Create snapshot tables if missing"""
+        if self._schema_ready:
+            return True
+        try:
+            with self.db_ops.get_session() as session:
+                for statement in SCHEMA_SQL:
+                    session.execute(text(statement))
+                session.commit()
+            self._schema_ready = True
+            return True
+        except Exception as e:
+            logger.error(f"KPI snapshot schema creation failed: {e}")
+            return False
+
+    # --- refresh ----------------------------------------------------------
+
+    def _scalar(self, session, sql: str, params: Dict[str, Any] = None, default: Any = 0) -> Any:
+        """Run a scalar query with the constitutional fallback for missing columns"""
+        try:
+            # Savepoint keeps earlier writes of the refresh transaction intact
+            with session.begin_nested():
+                value = session.execute(text(sql), params or {}).scalar()
+            return default if value is None else value
+        except Exception as e:
+            logger.debug(f"KPI snapshot query fell back to default: {e}")
+            return default
+
+    def _rows(self, session, sql: str, params: Dict[str, Any] = None) -> List[Any]:
+        try:
+            with session.begin_nested():
+                return session.execute(text(sql), params or {}).fetchall()
+        except Exception as e:
+            logger.debug(f"KPI snapshot query fell back to empty rows: {e}")
+            return []
+
+    def _watermark(self, session, alternatives) -> Optional[datetime]:
+        for sql in alternatives:
+            mark = self._scalar(session, sql, default=None)
+            if mark is not None:
+                return mark
+        return None
+
+    def _load_state(self, session) -> Optional[Any]:
+        return session.execute(
+            text("""
+                SELECT payload, farmers_watermark, fields_watermark, tasks_watermark,
+                       messages_watermark, last_full_refresh, refreshed_at
+                FROM business_kpi_snapshot WHERE snapshot_key = :key
+            """),
+            {"key": SNAPSHOT_KEY}
+        ).fetchone()
+
+    def _area_column(self, session) -> str:
+        """Area column of fields (area_hectares or area_ha, depending on the schema)"""
+        return schema_catalog.first_existing_column('fields', ('area_hectares', 'area_ha'), default='area_ha', conn=session)
+
+    def _refresh_daily(self, session, since_day: date, today: date):
+        """Recompute daily rollups for [since_day, today] and upsert them"""
+        days = {}
+        day = since_day
+        while day <= today:
+            days[day] = {column: 0 for column in DAILY_COLUMNS}
+            day += timedelta(days=1)
+
+        since = datetime.combine(since_day, datetime.min.time())
+        area = self._area_column(session)
+        for sql, columns in DAILY_ROLLUP_SQL.values():
+            for row in self._rows(session, sql.format(area=area), {"since": since}):
+                if row[0] in days:
+                    for column, value in zip(columns, row[1:]):
+                        days[row[0]][column] = value or 0
+
+        session.execute(
+            text(UPSERT_DAILY_SQL),
+            [{"day": d, **metrics} for d, metrics in days.items()]
+        )
+
+    def _compute_totals(self, session) -> Dict[str, Any]:
+        """Point-in-time totals that cannot be derived from daily rollups"""
+        farmers = self._scalar(session, "SELECT COUNT(DISTINCT id) FROM farmers WHERE is_active = TRUE", default=None)
+        if farmers is None:
+            farmers = self._scalar(session, "SELECT COUNT(DISTINCT id) FROM farmers")
+
+        area = self._area_column(session)
+        hectares = self._scalar(
+            session, f"SELECT COALESCE(SUM({area}), 0) FROM fields WHERE is_active = TRUE"
+        )
+        breakdown_rows = self._rows(session, f"""
+            SELECT COALESCE(crop_type, 'others') as crop_type, SUM({area}) as total_hectares
+            FROM fields
+            WHERE is_active = TRUE
+            GROUP BY crop_type
+        """)
+
+        return {
+            "farmers": int(farmers),
+            "hectares": round(float(hectares), 2),
+            "hectare_breakdown": classify_crop_hectares(breakdown_rows)
+        }
+
+    def _compute_recent(self, session) -> Dict[str, Any]:
+        """Rolling 24h figures; bounded range scans on the created_at indexes"""
+        yesterday = datetime.now() - timedelta(days=1)
+        params = {"since": yesterday}
+        area = self._area_column(session)
+        return {
+            "new_farmers": int(self._scalar(session, "SELECT COUNT(*) FROM farmers WHERE created_at >= :since", params)),
+            "unsubscribed": int(self._scalar(
+                session, "SELECT COUNT(*) FROM farmers WHERE is_active = FALSE AND updated_at >= :since", params
+            )),
+            "new_hectares": round(float(self._scalar(
+                session, f"SELECT COALESCE(SUM({area}), 0) FROM fields WHERE created_at >= :since", params
+            )), 2)
+        }
+
+    def _assemble(self, session, totals: Dict[str, Any], recent: Dict[str, Any], today: date) -> Dict[str, Any]:
+        window_start = today - timedelta(days=max(TREND_WINDOWS.values()) - 1)
+        daily = {
+            row[0]: dict(zip(DAILY_COLUMNS, row[1:]))
+            for row in session.execute(
+                text(f"SELECT day, {', '.join(DAILY_COLUMNS)} FROM business_kpi_daily WHERE day >= :start"),
+                {"start": window_start}
+            ).fetchall()
+        }
+
+        growth_trends = {"24h": recent}
+        for name, days in TREND_WINDOWS.items():
+            if days == 1:
+                continue
+            start = today - timedelta(days=days - 1)
+            rows = [metrics for day, metrics in daily.items() if day >= start]
+            growth_trends[name] = {
+                "new_farmers": sum(int(r["new_farmers"]) for r in rows),
+                "unsubscribed": sum(int(r["unsubscribed"]) for r in rows),
+                "new_hectares": round(sum(float(r["new_hectares"]) for r in rows), 2)
+            }
+
+        today_row = daily.get(today, {column: 0 for column in DAILY_COLUMNS})
+        new_hectares_24h = recent["new_hectares"]
+
+        return {
+            "total_farmers": {
+                "count": totals["farmers"],
+                "change": f"+{recent['new_farmers']}" if recent["new_farmers"] > 0 else "0"
+            },
+            "total_hectares": {
+                "count": totals["hectares"],
+                "change": f"+{new_hectares_24h}" if new_hectares_24h > 0 else "0"
+            },
+            "hectare_breakdown": totals["hectare_breakdown"],
+            "growth_trends": growth_trends,
+            "todays_activity": {
+                "new_fields": int(today_row["new_fields"]),
+                "crops_planted": int(today_row["crops_planted"]),
+                "new_operations": int(today_row["new_operations"]),
+                "questions_asked": int(today_row["questions_asked"]),
+                "active_farmers": int(today_row["active_farmers"])
+            },
+            "totals": totals
+        }
+
+    def refresh(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Bring the snapshot up to date.
+
+        Incremental refreshes recompute daily rollups from the oldest source
+        watermark onwards and recompute totals only for changed sources. A full
+        refresh (forced, first run, or every KPI_SNAPSHOT_FULL_REFRESH_HOURS)
+        rebuilds the 30-day rollup window and all totals, which also catches
+        changes that do not move a timestamp column.
+        """
+        if not self.ensure_schema():
+            return {"success": False, "error": "snapshot schema unavailable"}
+
+        with self._lock:
+            start = time.time()
+            today = date.today()
+            try:
+                with self.db_ops.get_session() as session:
+                    state = self._load_state(session)
+                    previous = state[0] if state else None
+                    if isinstance(previous, str):
+                        previous = json.loads(previous)
+                    old_marks = {
+                        "farmers": state[1], "fields": state[2],
+                        "tasks": state[3], "messages": state[4]
+                    } if state else {}
+                    last_full = state[5] if state else None
+
+                    if not full and (previous is None or last_full is None or
+                                     datetime.now() - last_full > timedelta(hours=FULL_REFRESH_HOURS)):
+                        full = True
+
+                    new_marks = {
+                        source: self._watermark(session, alternatives)
+                        for source, alternatives in WATERMARK_SQL.items()
+                    }
+                    changed = [
+                        source for source, mark in new_marks.items()
+                        if full or (mark is not None and (old_marks.get(source) is None or mark > old_marks[source]))
+                    ]
+
+                    # Daily rollups: from the oldest changed watermark (or the full window)
+                    window_start = today - timedelta(days=max(TREND_WINDOWS.values()) - 1)
+                    if full:
+                        since_day = window_start
+                    else:
+                        changed_marks = [old_marks[s] for s in changed if old_marks.get(s)]
+                        since_day = min([m.date() for m in changed_marks] + [today])
+                        since_day = max(since_day, window_start)
+                    self._refresh_daily(session, since_day, today)
+
+                    # Totals only when farmers/fields moved
+                    if full or previous is None or {"farmers", "fields"} & set(changed):
+                        totals = self._compute_totals(session)
+                    else:
+                        totals = previous.get("totals") or self._compute_totals(session)
+
+                    payload = self._assemble(session, totals, self._compute_recent(session), today)
+                    refresh_ms = int((time.time() - start) * 1000)
+
+                    session.execute(text(UPSERT_SNAPSHOT_SQL), {
+                        "key": SNAPSHOT_KEY,
+                        "payload": json.dumps(payload, default=str),
+                        **{source: new_marks[source] or old_marks.get(source) for source in WATERMARK_SQL},
+                        "last_full_refresh": datetime.now() if full else last_full,
+                        "refresh_ms": refresh_ms
+                    })
+                    session.commit()
+
+                self._cached = {**payload, "refreshed_at": datetime.now().isoformat()}
+                self._cached_at = time.time()
+                logger.info(f"KPI snapshot refreshed ({'full' if full else 'incremental'}, "
+                            f"changed={changed}, since={since_day}) in {refresh_ms}ms")
+                return {"success": True, "full": full, "changed": changed, "refresh_ms": refresh_ms}
+
+            except Exception as e:
+                logger.error(f"KPI snapshot refresh failed: {e}")
+                return {"success": False, "error": str(e)}
+
+    # --- read -------------------------------------------------------------
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """Return the current snapshot payload, or None if missing or stale"""
+        if self._cached is not None and time.time() - self._cached_at < READ_TTL:
+            return self._cached
+
+        try:
+            with self.db_ops.get_session() as session:
+                # Age is computed by the database: refreshed_at is NOW() in the server's time zone
+                row = session.execute(
+                    text("""
+                        SELECT payload, refreshed_at, EXTRACT(EPOCH FROM NOW()::timestamp - refreshed_at)
+                        FROM business_kpi_snapshot WHERE snapshot_key = :key
+                    """),
+                    {"key": SNAPSHOT_KEY}
+                ).fetchone()
+        except Exception as e:
+            logger.debug(f"KPI snapshot unavailable: {e}")
+            return None
+
+        if not row or float(row[2]) > MAX_STALENESS:
+            return None
+
+        payload = json.loads(row[0]) if isinstance(row[0], str) else row[0]
+        self._cached = {**payload, "refreshed_at": row[1].isoformat()}
+        self._cached_at = time.time()
+        return self._cached
+
+    def get(self, key: str) -> Optional[Any]:
+        """Single KPI from the snapshot, or None to signal a live fallback"""
+        snapshot = self.read()
+        return snapshot.get(key) if snapshot else None
+
+    # --- scheduling -------------------------------------------------------
+
+    async def _refresh_loop(self, interval: int):
+        while True:
+            await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+            await asyncio.sleep(interval)
+
+    def start_background_refresh(self, interval: int = REFRESH_INTERVAL):
+        """Schedule periodic refreshes on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop(interval))
+            logger.info(f"KPI snapshot refresh scheduled every {interval}s")
+
+    def stop_background_refresh(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
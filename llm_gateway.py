@@ -0,0 +1,355 @@
+"""
+Async LLM Gateway
+One pooled HTTP client per process with a concurrency cap, timeouts, jittered retries and an offline stub backend
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from nl_sql_cache import normalize_query
+from metrics import LLM_REQUEST_SECONDS, LLM_TOKENS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "openai" (chat completions over HTTP) or "stub" (offline, no network)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai').lower()
+LLM_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')
+LLM_DEFAULT_MODEL = os.getenv('LLM_MODEL', 'gpt-4')
+
+# Completions in flight per process; extra callers wait on the semaphore
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '20'))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+
+# Retries on 429/5xx/transport errors with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+
+# Stub backend: simulated latency and optional {normalized prompt: reply} JSON file
+LLM_STUB_LATENCY_MS = float(os.getenv('LLM_STUB_LATENCY_MS', '50'))
+LLM_STUB_RESPONSES = os.getenv('LLM_STUB_RESPONSES')
+
+# Send prompt_cache_key so requests sharing a prompt prefix are routed to the same provider cache
+LLM_PROMPT_CACHE_KEYS = os.getenv('LLM_PROMPT_CACHE_KEYS', 'true').lower() == 'true'
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+STUB_SQL = "SELECT COUNT(*) AS farmer_count FROM farmers;"
+
+
+class LLMGatewayError(Exception):
+    """Completion failed after retries (or the backend is not configured)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full jitter: uniform(0, min(max, base * 2^attempt)); Retry-After wins when sent"""
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class StubBackend:
+    """
+    Offline completions for load tests and local development.
+
+    Replies come from the LLM_STUB_RESPONSES file when it has an entry for
+    the normalized last user message; otherwise a fixed valid reply is
+    built in the format the prompt asks for (JSON object or ```sql block).
+    """
+
+    def __init__(self, responses_path: Optional[str] = LLM_STUB_RESPONSES, latency_ms: float = LLM_STUB_LATENCY_MS):
+        self.latency_ms = latency_ms
+        self.responses: Dict[str, str] = {}
+        if responses_path:
+            with open(responses_path, encoding='utf-8') as f:
+                self.responses = {normalize_query(k): v for k, v in json.load(f).items()}
+            logger.info(f"LLM stub loaded {len(self.responses)} canned replies from {responses_path}")
+
+    def reply_for(self, messages: List[Dict[str, str]]) -> str:
+        user_message = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        canned = self.responses.get(normalize_query(user_message))
+        if canned is not None:
+            return canned
+        if any("JSON" in m["content"] for m in messages):
+            return json.dumps({
+                "sql": STUB_SQL,
+                "explanation": "Stub backend reply",
+                "detected_language": "en",
+                "query_type": "select",
+                "confidence": 0.5,
+                "success": True
+            })
+        return f"```sql\n{STUB_SQL}\n```"
+
+    async def complete(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self.reply_for(messages)
+
+    async def stream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Latency before the first token, then the reply word by word"""
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        for word in re.findall(r'\S+\s*|\s+', self.reply_for(messages)):
+            yield word
+            await asyncio.sleep(0)
+
+
+class LLMGateway:
+    """
+    Shared entry point for chat completions.
+
+    A single ``httpx.AsyncClient`` keeps TLS connections to the API alive
+    across requests. A semaphore caps concurrent completions so a burst of
+    NL queries queues instead of tripping provider rate limits. 429/5xx
+    and transport errors are retried with jittered backoff.
+    """
+
+    def __init__(self, backend: str = LLM_BACKEND, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stub: Optional[StubBackend] = None
+        self._in_flight = 0
+        self.stats = {"requests": 0, "completed": 0, "failures": 0, "retries": 0, "timeouts": 0,
+                      "waited": 0, "max_in_flight": 0, "total_ms": 0.0,
+                      "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+
+    @property
+    def available(self) -> bool:
+        if self.backend == "stub":
+            return True
+        api_key = os.getenv('OPENAI_API_KEY')
+        return bool(api_key) and api_key != 'sk-your-key-here'
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=LLM_BASE_URL,
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency)
+            )
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _backoff(self, attempt: int, error: Exception, retry_after: Optional[str] = None):
+        self.stats["retries"] += 1
+        delay = backoff_delay(attempt, retry_after)
+        logger.warning(f"LLM attempt {attempt + 1} failed ({error}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def _post(self, path: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}
+        last_error: Optional[Exception] = None
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                response = await self._get_client().post(path, json=payload, headers=headers, timeout=timeout)
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRYABLE_STATUSES:
+                    raise LLMGatewayError(f"LLM request failed: {response.status_code} {response.text[:200]}",
+                                          response.status_code)
+                retry_after = response.headers.get("retry-after")
+                last_error = LLMGatewayError(f"LLM returned {response.status_code}", response.status_code)
+            except httpx.TimeoutException as e:
+                self.stats["timeouts"] += 1
+                last_error = e
+            except httpx.TransportError as e:
+                last_error = e
+
+            if attempt < LLM_MAX_RETRIES:
+                await self._backoff(attempt, last_error, retry_after)
+
+        if isinstance(last_error, LLMGatewayError):
+            raise last_error
+        raise LLMGatewayError(f"LLM request failed after {LLM_MAX_RETRIES + 1} attempts: {last_error}")
+
+    async def _post_stream(self, path: str, payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+        """Content deltas from a streamed completion; retried only until the first delta arrives"""
+        headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}
+        last_error: Optional[Exception] = None
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            retry_after = None
+            emitted = False
+            try:
+                async with self._get_client().stream("POST", path, json={**payload, "stream": True},
+                                                     headers=headers, timeout=timeout) as response:
+                    if response.status_code == 200:
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                return
+                            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                            if delta:
+                                emitted = True
+                                yield delta
+                        return
+                    body = (await response.aread()).decode(errors="replace")
+                    if response.status_code not in RETRYABLE_STATUSES:
+                        raise LLMGatewayError(f"LLM request failed: {response.status_code} {body[:200]}",
+                                              response.status_code)
+                    retry_after = response.headers.get("retry-after")
+                    last_error = LLMGatewayError(f"LLM returned {response.status_code}", response.status_code)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if isinstance(e, httpx.TimeoutException):
+                    self.stats["timeouts"] += 1
+                # Tokens already sent to the caller cannot be taken back
+                if emitted:
+                    raise LLMGatewayError(f"LLM stream interrupted: {e}")
+                last_error = e
+
+            if attempt < LLM_MAX_RETRIES:
+                await self._backoff(attempt, last_error, retry_after)
+
+        if isinstance(last_error, LLMGatewayError):
+            raise last_error
+        raise LLMGatewayError(f"LLM request failed after {LLM_MAX_RETRIES + 1} attempts: {last_error}")
+
+    @asynccontextmanager
+    async def _slot(self):
+        """One backend call under the concurrency cap, recording latency and failures"""
+        if not self.available:
+            raise LLMGatewayError("OpenAI API key not configured")
+
+        self.stats["requests"] += 1
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            self.stats["waited"] += 1
+        async with semaphore:
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                yield
+                self.stats["completed"] += 1
+                outcome = "ok"
+            except Exception:
+                self.stats["failures"] += 1
+                raise
+            finally:
+                self._in_flight -= 1
+                elapsed = time.perf_counter() - started
+                self.stats["total_ms"] += elapsed * 1000
+                LLM_REQUEST_SECONDS.observe(elapsed, outcome=outcome)
+
+    async def _limited(self, call):
+        async with self._slot():
+            return await call()
+
+    def _get_stub(self) -> StubBackend:
+        if self._stub is None:
+            self._stub = StubBackend()
+        return self._stub
+
+    def _record_usage(self, response: Dict[str, Any]):
+        usage = response.get("usage") or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+        self.stats["cached_prompt_tokens"] += cached
+        LLM_TOKENS.inc(usage.get("prompt_tokens", 0), kind="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens", 0), kind="completion")
+        LLM_TOKENS.inc(cached, kind="cached_prompt")
+
+    async def chat(self, messages: List[Dict[str, str]], model: str = LLM_DEFAULT_MODEL,
+                   temperature: float = 0.1, max_tokens: int = 500, timeout: float = LLM_TIMEOUT,
+                   prompt_cache_key: Optional[str] = None) -> str:
+        """Return the assistant message content for a chat completion"""
+        async def call():
+            if self.backend == "stub":
+                return await self._get_stub().complete(messages)
+            payload = {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            }
+            if prompt_cache_key and LLM_PROMPT_CACHE_KEYS:
+                payload["prompt_cache_key"] = prompt_cache_key
+            response = await self._post("/chat/completions", payload, timeout)
+            self._record_usage(response)
+            return response["choices"][0]["message"]["content"]
+        return await self._limited(call)
+
+    async def chat_stream(self, messages: List[Dict[str, str]], model: str = LLM_DEFAULT_MODEL,
+                          temperature: float = 0.1, max_tokens: int = 500,
+                          timeout: float = LLM_TIMEOUT) -> AsyncIterator[str]:
+        """Yield the assistant message content in deltas as the completion is generated"""
+        async with self._slot():
+            if self.backend == "stub":
+                async for delta in self._get_stub().stream(messages):
+                    yield delta
+                return
+            async for delta in self._post_stream("/chat/completions", {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            }, timeout):
+                yield delta
+
+    async def embed(self, text: str, model: str, timeout: float = LLM_CONNECT_TIMEOUT) -> Optional[List[float]]:
+        """Embedding vector for text (None from the stub backend)"""
+        async def call():
+            if self.backend == "stub":
+                return None
+            response = await self._post("/embeddings", {"model": model, "input": text}, timeout)
+            return response["data"][0]["embedding"]
+        return await self._limited(call)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        completed = self.stats["completed"] + self.stats["failures"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "total_ms"},
+            "backend": self.backend,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "avg_ms": round(self.stats["total_ms"] / completed, 1) if completed else 0.0,
+            "prompt_cache_hit_rate": round(self.stats["cached_prompt_tokens"] / self.stats["prompt_tokens"], 3)
+                                     if self.stats["prompt_tokens"] else 0.0
+        }
+
+
+# Global gateway shared by every LLM caller in the process
+llm_gateway = LLMGateway()
+
+
+def register_llm_gateway(app):
+    """Close the pooled LLM client on app shutdown"""
+    @app.on_event("shutdown")
+    async def _close_llm_gateway():
+        await llm_gateway.close()
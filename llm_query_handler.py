@@ -2,11 +2,13 @@
 Constitutional LLM-first query handler for database explorer
 Following AVA OLO Constitution Principle 3: LLM Intelligence First
 """
-import os
+import re
 import logging
 from typing import Dict, Any, Optional
-import openai
-from sqlalchemy import inspect
+
+from schema_catalog import schema_catalog
+from llm_gateway import llm_gateway, LLM_DEFAULT_MODEL
+from nl_sql_cache import translation_cache, embed_query
 
 logger = logging.getLogger(__name__)
 
@@ -15,14 +17,10 @@ class LLMQueryHandler:
     
     def __init__(self, db_ops):
         self.db_ops = db_ops
-        self.openai_client = None
         
-        # Initialize OpenAI client if API key is available
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if api_key:
-            openai.api_key = api_key
-            self.openai_client = openai
-            logger.info("OpenAI client initialized for LLM-first query generation")
+        # Completions go through the shared LLM gateway (pooled client, concurrency cap, retries)
+        if llm_gateway.available:
+            logger.info("LLM gateway available for LLM-first query generation")
         else:
             logger.warning("OPENAI_API_KEY not found - using fallback pattern matching")
     
@@ -35,9 +33,19 @@ class LLMQueryHandler:
             # Get database schema
             schema_context = await self._get_schema_context()
             
-            if self.openai_client:
+            if llm_gateway.available:
+                # Translations are reused until the schema catalog version changes
+                embedding = await embed_query(description)
+                cached = translation_cache.lookup("llm_query_handler", description, schema_catalog.version, embedding=embedding)
+                if cached:
+                    return {**cached, "original_description": description, "cached": True}
+
                 # LLM-first approach (Constitutional compliance)
-                return await self._llm_generate_sql(description, schema_context)
+                result = await self._llm_generate_sql(description, schema_context)
+                if result.get("query_type") == "llm_generated":
+                    translation_cache.store("llm_query_handler", description, schema_catalog.version, result,
+                                            result["sql_query"], embedding=embedding)
+                return result
             else:
                 # Fallback to pattern matching
                 return self._pattern_based_sql(description, schema_context)
@@ -53,13 +61,11 @@ class LLMQueryHandler:
     async def _get_schema_context(self) -> str:
         """Get database schema for LLM context"""
         with self.db_ops.get_session() as session:
-            inspector = inspect(session.bind)
-            
             schema_info = []
-            for table_name in inspector.get_table_names():
+            for table_name in schema_catalog.tables(session):
                 columns = []
-                for col in inspector.get_columns(table_name):
-                    col_type = str(col['type']).split('(')[0]  # Simplify type
+                for col in schema_catalog.column_details(table_name, session):
+                    col_type = col['type'].split('(')[0]  # Simplify type
                     columns.append(f"{col['name']} ({col_type})")
                 
                 schema_info.append(f"Table {table_name}: {', '.join(columns)}")
@@ -91,9 +97,8 @@ Generate a PostgreSQL query following these rules:
 
 SQL Query:"""
 
-            response = await self.openai_client.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[
+            content = await llm_gateway.chat(
+                [
                     {"role": "system", "content": "You are a PostgreSQL expert. Generate only valid SQL queries."},
                     {"role": "user", "content": prompt}
                 ],
@@ -101,7 +106,8 @@ SQL Query:"""
                 max_tokens=500
             )
             
-            sql_query = response.choices[0].message.content.strip()
+            # Models sometimes wrap the query in a ```sql fence despite the instructions
+            sql_query = re.sub(r'^```(?:sql)?\s*|\s*```$', '', content.strip(), flags=re.IGNORECASE)
             
             # Validate it's a SELECT query
             if sql_query.upper().startswith("SELECT"):
@@ -109,7 +115,7 @@ SQL Query:"""
                     "sql_query": sql_query,
                     "query_type": "llm_generated",
                     "original_description": description,
-                    "llm_model": "gpt-4"
+                    "llm_model": LLM_DEFAULT_MODEL
                 }
             else:
                 return {
@@ -135,16 +141,12 @@ SQL Query:"""
     
     async def verify_llm_connectivity(self) -> bool:
         """Check if LLM is properly connected (for health dashboard)"""
-        if not self.openai_client:
+        if not llm_gateway.available:
             return False
             
         try:
             # Simple test query
-            response = await self.openai_client.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[{"role": "user", "content": "Reply with 'OK'"}],
-                max_tokens=10
-            )
-            return response.choices[0].message.content.strip() == "OK"
+            content = await llm_gateway.chat([{"role": "user", "content": "Reply with 'OK'"}], max_tokens=10)
+            return content.strip() == "OK"
         except:
             return False
\ No newline at end of file
@@ -8,9 +8,10 @@ import psycopg2
 import asyncio
 import logging
 import traceback
-from datetime import datetime, timedelta
-from contextlib import contextmanager
-from typing import Dict, Any
+import re
+from datetime import date, datetime, timedelta
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Any, Optional
 from fastapi import FastAPI, HTTPException, Form, Request
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi import Form
@@ -46,7 +47,8 @@ deployment_manager = DeploymentManager(SERVICE_NAME)
 try:
     from database_pool import (
         init_connection_pool, get_db_session, get_db_connection as get_pool_connection,
-        get_dashboard_metrics as get_pool_metrics, get_database_schema, test_connection_pool
+        get_dashboard_metrics as get_pool_metrics, get_database_schema, test_connection_pool,
+        get_pool_stats
     )
     POOL_AVAILABLE = True
 except ImportError:
@@ -73,6 +75,29 @@ def constitutional_deployment_completion():
 sys.path.append('.')
 from database.insert_operations import ConstitutionalInsertOperations
 from database_operations import DatabaseOperations
+import asyncpg
+from async_database import (
+    register_async_pool, get_async_pool_stats, acquire as async_acquire,
+    fetchrow as async_fetchrow, fetchval as async_fetchval
+)
+from schema_catalog import schema_catalog, register_schema_catalog
+from streaming_export import ExportStream
+from response_cache import response_cache, cached_response, invalidates
+from nl_sql_cache import translation_cache, register_translation_cache
+from llm_gateway import llm_gateway, register_llm_gateway
+from prompt_builder import prompt_builder
+from sse_stream import sse_response, stream_select_rows
+from sql_admission import query_admission, statement_type, decision_summary
+from standard_queries import (
+    standard_query_runner, StandardQueryError, PARAMETER_PATTERN, coerce_parameter, to_pyformat
+)
+from write_behind import register_write_behind, record_cost_event, get_write_behind_stats
+from cost_analytics import cost_analytics, register_cost_analytics
+from health_prober import health_prober, register_health_prober
+from metrics import instrument_app
+from sql_profiler import sql_profiler, SORT_KEYS as SQL_PROFILE_SORT_KEYS
+from health_history import health_history
+from fastapi.concurrency import run_in_threadpool
 
 # Set up logger properly
 logging.basicConfig(level=logging.DEBUG)
@@ -153,6 +178,30 @@ dashboard_cache = {'data': None, 'timestamp': 0}
 
 app = FastAPI(title="AVA OLO Agricultural Database Dashboard")
 
+# Request latency/in-flight middleware and the OpenMetrics /metrics endpoint
+instrument_app(app, "main")
+
+# Write-behind cost events and usage counters (registered first so shutdown drains before the pool closes)
+register_write_behind(app)
+
+# Incremental cost rollups behind /cost-analytics (stopped before the pool closes)
+register_cost_analytics(app)
+
+# Background health probes behind /health-dashboard and /api/system-status
+register_health_prober(app)
+
+# Shared asyncpg pool for async handlers (opened on startup, closed on shutdown)
+register_async_pool(app)
+
+# Cached schema metadata (TTL, refresh endpoint, DDL NOTIFY invalidation)
+register_schema_catalog(app)
+
+# Pooled async LLM client (closed on shutdown)
+register_llm_gateway(app)
+
+# Persisted NL->SQL translations (loaded on startup, flushed on shutdown)
+register_translation_cache(app)
+
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -677,8 +726,10 @@ def create_cost_tables():
         return False
 
 def track_cost(farmer_id, interaction_type, cost_amount, tokens_used=None, api_service="unknown"):
-    """Track cost - Simple implementation"""
+    """Track cost - queued for a batched write; direct INSERT when the write-behind buffer isn't running"""
     try:
+        if record_cost_event(farmer_id, interaction_type, cost_amount, tokens_used, api_service):
+            return True
         with get_constitutional_db_connection() as connection:
             if connection:
                 cursor = connection.cursor()
@@ -696,266 +747,225 @@ def track_cost(farmer_id, interaction_type, cost_amount, tokens_used=None, api_s
         return False
 
 # Constitutional AWS RDS Connection (RESTORED WORKING VERSION)
-@contextmanager
-def get_constitutional_db_connection():
-    """Constitutional connection with multiple strategies (FIXED VERSION)"""
-    connection = None
-    
+def _checkout_constitutional_connection(stack: ExitStack):
+    """Acquire a connection and register its release on the stack; None if unavailable"""
     try:
-        host = os.getenv('DB_HOST')
-        database = os.getenv('DB_NAME', 'postgres')
-        user = os.getenv('DB_USER', 'postgres')
-        password = os.getenv('DB_PASSWORD')
-        port = int(os.getenv('DB_PORT', '5432'))
-        
-        # Use SQLAlchemy pool if available
+        # Use SQLAlchemy pool if available - the pool context commits/rolls back
+        # and returns the connection when the stack unwinds
         if POOL_AVAILABLE:
-            connection = get_pool_connection().__enter__()
-            print("DEBUG: Using SQLAlchemy connection pool")
-        else:
-            # Fallback to direct connection
-            start_time = time.time()
-            connection = psycopg2.connect(
-                host=host,
-                database=database,
-                user=user,
-                password=password,
-                port=port,
-                connect_timeout=2,  # 2 seconds for VPC
-                sslmode='require'
-            )
-            print(f"DEBUG: Direct connection in {(time.time() - start_time)*1000:.0f}ms")
-        
-        yield connection
+            return stack.enter_context(get_pool_connection())
         
+        # Fallback to direct connection
+        start_time = time.time()
+        connection = psycopg2.connect(
+            host=os.getenv('DB_HOST'),
+            database=os.getenv('DB_NAME', 'postgres'),
+            user=os.getenv('DB_USER', 'postgres'),
+            password=os.getenv('DB_PASSWORD'),
+            port=int(os.getenv('DB_PORT', '5432')),
+            connect_timeout=2,  # 2 seconds for VPC
+            sslmode='require'
+        )
+        stack.callback(connection.close)
+        print(f"DEBUG: Direct connection in {(time.time() - start_time)*1000:.0f}ms")
+        return connection
     except Exception as e:
         print(f"DEBUG: Unexpected error in connection: {e}")
-        yield None
-    finally:
-        if connection:
-            try:
-                if POOL_AVAILABLE:
-                    # Pool connections are managed by context manager
-                    pass
-                else:
-                    connection.close()
-                    print("DEBUG: Connection closed")
-            except:
-                pass
+        return None
+
+@contextmanager
+def get_constitutional_db_connection():
+    """Constitutional connection provider - every checkout is returned on exit
+    
+    Yields None when no connection can be acquired (callers check `if conn:`);
+    errors raised inside the block roll back and propagate after the release.
+    """
+    with ExitStack() as stack:
+        yield _checkout_constitutional_connection(stack)
 
 # PART 1: Standard Agricultural Queries (ALWAYS WORKS)
+# Served from the shared asyncpg pool so the event loop is never blocked
 async def get_farmer_count():
     """Standard Query: Number of farmers"""
     try:
-        with get_constitutional_db_connection() as conn:
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) as farmer_count FROM farmers")
-                result = cursor.fetchone()
-                return {"status": "success", "farmer_count": result[0]}
-            else:
-                return {"status": "connection_failed"}
+        count = await async_fetchval("SELECT COUNT(*) as farmer_count FROM farmers")
+        return {"status": "success", "farmer_count": count}
+    except (ConnectionError, ValueError, OSError):
+        return {"status": "connection_failed"}
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
 async def get_all_farmers():
     """Standard Query: List all farmers - DISCOVER ACTUAL SCHEMA"""
     try:
-        with get_constitutional_db_connection() as conn:
-            if conn:
-                cursor = conn.cursor()
-                
-                # First get the count (we know this works)
-                cursor.execute("SELECT COUNT(*) FROM farmers")
-                total_count = cursor.fetchone()[0]
+        async with async_acquire() as conn:
+            # First get the count (we know this works)
+            total_count = await conn.fetchval("SELECT COUNT(*) FROM farmers")
+            
+            # Discover the actual column structure (cached schema catalog)
+            try:
+                await schema_catalog.ensure_loaded_async(conn)
+                column_names = schema_catalog.columns('farmers')
                 
-                # Discover the actual column structure
-                try:
-                    cursor.execute("""
-                        SELECT column_name, data_type 
-                        FROM information_schema.columns 
-                        WHERE table_name = 'farmers' 
-                        ORDER BY ordinal_position
-                    """)
-                    columns_info = cursor.fetchall()
+                # Try to get actual data using discovered columns
+                if column_names:
+                    # Use actual column names discovered from schema
+                    # Fixed: Use correct column names from schema
+                    preferred_columns = ['id', 'farm_name', 'manager_name', 'email', 'city', 'country']
+                    select_columns = [col for col in preferred_columns if col in column_names]
+                    if not select_columns:
+                        select_columns = column_names[:5]  # Fallback to first 5 columns
+                    select_query = f"SELECT {', '.join(select_columns)} FROM farmers LIMIT 10"
                     
-                    # Get the actual column names
-                    column_names = [col[0] for col in columns_info]
+                    results = await conn.fetch(select_query)
                     
-                    # Try to get actual data using discovered columns
-                    if column_names:
-                        # Use actual column names discovered from schema
-                        # Fixed: Use correct column names from schema
-                        preferred_columns = ['id', 'farm_name', 'manager_name', 'email', 'city', 'country']
-                        select_columns = [col for col in preferred_columns if col in column_names]
-                        if not select_columns:
-                            select_columns = column_names[:5]  # Fallback to first 5 columns
-                        select_query = f"SELECT {', '.join(select_columns)} FROM farmers LIMIT 10"
-                        
-                        cursor.execute(select_query)
-                        results = cursor.fetchall()
-                        
-                        farmers = []
-                        for i, row in enumerate(results):
-                            farmer_data = {"row_number": i + 1}
-                            for j, col_name in enumerate(select_columns):
-                                farmer_data[col_name] = row[j] if j < len(row) else "N/A"
-                            farmers.append(farmer_data)
-                        
-                        return {
-                            "status": "success", 
-                            "farmers": farmers, 
-                            "total": len(farmers),
-                            "total_in_db": total_count,
-                            "discovered_columns": column_names,
-                            "note": "Using actual database schema"
-                        }
-                    else:
-                        return {
-                            "status": "schema_discovery_failed",
-                            "farmers": [{"error": "Could not discover table structure"}],
-                            "total": 1
-                        }
-                        
-                except Exception as schema_error:
-                    # Fallback - just show we found farmers
-                    farmers = [
-                        {"info": f"Found {total_count} farmers in database"},
-                        {"error": f"Schema discovery failed: {str(schema_error)}"}
-                    ]
-                    return {"status": "partial_success", "farmers": farmers, "total": 2}
+                    farmers = []
+                    for i, row in enumerate(results):
+                        farmer_data = {"row_number": i + 1}
+                        for j, col_name in enumerate(select_columns):
+                            farmer_data[col_name] = row[j] if j < len(row) else "N/A"
+                        farmers.append(farmer_data)
                     
-            else:
-                return {"status": "connection_failed"}
+                    return {
+                        "status": "success", 
+                        "farmers": farmers, 
+                        "total": len(farmers),
+                        "total_in_db": total_count,
+                        "discovered_columns": column_names,
+                        "note": "Using actual database schema"
+                    }
+                else:
+                    return {
+                        "status": "schema_discovery_failed",
+                        "farmers": [{"error": "Could not discover table structure"}],
+                        "total": 1
+                    }
+                    
+            except Exception as schema_error:
+                # Fallback - just show we found farmers
+                farmers = [
+                    {"info": f"Found {total_count} farmers in database"},
+                    {"error": f"Schema discovery failed: {str(schema_error)}"}
+                ]
+                return {"status": "partial_success", "farmers": farmers, "total": 2}
+                
+    except (ConnectionError, ValueError, OSError):
+        return {"status": "connection_failed"}
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
 async def get_farmer_fields(farmer_id: int):
     """Standard Query: List all fields of a specific farmer - FIXED VERSION"""
     try:
-        with get_constitutional_db_connection() as conn:
-            if conn:
-                cursor = conn.cursor()
+        async with async_acquire() as conn:
+            # FIXED: Use correct column names from schema
+            try:
+                results = await conn.fetch("""
+                    SELECT id, field_name, area_ha, country, notes
+                    FROM fields 
+                    WHERE farmer_id = $1 
+                    ORDER BY field_name
+                    LIMIT 20
+                """, farmer_id)
                 
-                # FIXED: Use correct column names from schema
-                try:
-                    cursor.execute("""
-                        SELECT id, field_name, area_ha, country, notes
-                        FROM fields 
-                        WHERE farmer_id = %s 
-                        ORDER BY field_name
-                        LIMIT 20
-                    """, (farmer_id,))
-                    results = cursor.fetchall()
-                    cursor.close()
-                    
-                    fields = []
-                    for r in results:
-                        fields.append({
-                            "field_id": r[0],
-                            "field_name": r[1] if r[1] else "N/A",
-                            "area_ha": r[2] if len(r) > 2 and r[2] else "N/A",
-                            "country": r[3] if len(r) > 3 and r[3] else "N/A",
-                            "notes": r[4] if len(r) > 4 and r[4] else "N/A"
-                        })
-                    
-                except psycopg2.Error as schema_error:
-                    # Fallback query with minimal columns
-                    cursor.execute("""
-                        SELECT id, field_name 
-                        FROM fields 
-                        WHERE farmer_id = %s 
-                        ORDER BY field_name
-                        LIMIT 20
-                    """, (farmer_id,))
-                    results = cursor.fetchall()
-                    cursor.close()
-                    
-                    fields = []
-                    for r in results:
-                        fields.append({
-                            "field_id": r[0],
-                            "field_name": r[1] if r[1] else "N/A",
-                            "area_ha": "N/A",
-                            "country": "N/A",
-                            "notes": "N/A"
-                        })
+                fields = []
+                for r in results:
+                    fields.append({
+                        "field_id": r[0],
+                        "field_name": r[1] if r[1] else "N/A",
+                        "area_ha": r[2] if len(r) > 2 and r[2] else "N/A",
+                        "country": r[3] if len(r) > 3 and r[3] else "N/A",
+                        "notes": r[4] if len(r) > 4 and r[4] else "N/A"
+                    })
                 
-                return {"status": "success", "fields": fields, "total": len(fields)}
-            else:
-                return {"status": "connection_failed", "error": "No database connection"}
+            except asyncpg.PostgresError as schema_error:
+                # Fallback query with minimal columns
+                results = await conn.fetch("""
+                    SELECT id, field_name 
+                    FROM fields 
+                    WHERE farmer_id = $1 
+                    ORDER BY field_name
+                    LIMIT 20
+                """, farmer_id)
+                
+                fields = []
+                for r in results:
+                    fields.append({
+                        "field_id": r[0],
+                        "field_name": r[1] if r[1] else "N/A",
+                        "area_ha": "N/A",
+                        "country": "N/A",
+                        "notes": "N/A"
+                    })
+            
+            return {"status": "success", "fields": fields, "total": len(fields)}
+    except (ConnectionError, ValueError, OSError):
+        return {"status": "connection_failed", "error": "No database connection"}
     except Exception as e:
         return {"status": "error", "error": f"Database query failed: {str(e)}"}
 
 async def get_field_tasks(farmer_id: int, field_id: int):
     """Standard Query: List all tasks on specific field - FIXED VERSION using task_fields junction"""
     try:
-        with get_constitutional_db_connection() as conn:
-            if conn:
-                cursor = conn.cursor()
+        async with async_acquire() as conn:
+            try:
+                # FIXED: Use task_fields junction table
+                results = await conn.fetch("""
+                    SELECT 
+                        t.id, 
+                        t.task_type, 
+                        t.description, 
+                        t.status, 
+                        t.date_performed, 
+                        t.crop_name,
+                        t.quantity,
+                        t.rate_per_ha
+                    FROM tasks t
+                    INNER JOIN task_fields tf ON t.id = tf.task_id
+                    WHERE tf.field_id = $1 
+                    ORDER BY t.date_performed DESC
+                    LIMIT 20
+                """, field_id)
                 
-                try:
-                    # FIXED: Use task_fields junction table
-                    cursor.execute("""
-                        SELECT 
-                            t.id, 
-                            t.task_type, 
-                            t.description, 
-                            t.status, 
-                            t.date_performed, 
-                            t.crop_name,
-                            t.quantity,
-                            t.rate_per_ha
-                        FROM tasks t
-                        INNER JOIN task_fields tf ON t.id = tf.task_id
-                        WHERE tf.field_id = %s 
-                        ORDER BY t.date_performed DESC
-                        LIMIT 20
-                    """, (field_id,))
-                    results = cursor.fetchall()
-                    cursor.close()
-                    
-                    tasks = []
-                    for r in results:
-                        tasks.append({
-                            "task_id": r[0],
-                            "task_type": r[1] if r[1] else "N/A",
-                            "description": r[2] if len(r) > 2 and r[2] else "N/A",
-                            "status": r[3] if len(r) > 3 and r[3] else "N/A",
-                            "date_performed": str(r[4]) if len(r) > 4 and r[4] else None,
-                            "crop_name": r[5] if len(r) > 5 and r[5] else "N/A",
-                            "quantity": r[6] if len(r) > 6 and r[6] else "N/A",
-                            "rate_per_ha": r[7] if len(r) > 7 and r[7] else "N/A"
-                        })
-                    
-                except psycopg2.Error as schema_error:
-                    # Fallback query with minimal columns
-                    cursor.execute("""
-                        SELECT t.id, t.task_type 
-                        FROM tasks t
-                        INNER JOIN task_fields tf ON t.id = tf.task_id
-                        WHERE tf.field_id = %s 
-                        LIMIT 20
-                    """, (field_id,))
-                    results = cursor.fetchall()
-                    cursor.close()
-                    
-                    tasks = []
-                    for r in results:
-                        tasks.append({
-                            "task_id": r[0],
-                            "task_type": r[1] if r[1] else "N/A",
-                            "description": "N/A",
-                            "status": "N/A",
-                            "date_performed": None,
-                            "crop_name": "N/A",
-                            "quantity": "N/A",
-                            "rate_per_ha": "N/A"
-                        })
+                tasks = []
+                for r in results:
+                    tasks.append({
+                        "task_id": r[0],
+                        "task_type": r[1] if r[1] else "N/A",
+                        "description": r[2] if len(r) > 2 and r[2] else "N/A",
+                        "status": r[3] if len(r) > 3 and r[3] else "N/A",
+                        "date_performed": str(r[4]) if len(r) > 4 and r[4] else None,
+                        "crop_name": r[5] if len(r) > 5 and r[5] else "N/A",
+                        "quantity": r[6] if len(r) > 6 and r[6] else "N/A",
+                        "rate_per_ha": r[7] if len(r) > 7 and r[7] else "N/A"
+                    })
                 
-                return {"status": "success", "tasks": tasks, "total": len(tasks)}
-            else:
-                return {"status": "connection_failed", "error": "No database connection"}
+            except asyncpg.PostgresError as schema_error:
+                # Fallback query with minimal columns
+                results = await conn.fetch("""
+                    SELECT t.id, t.task_type 
+                    FROM tasks t
+                    INNER JOIN task_fields tf ON t.id = tf.task_id
+                    WHERE tf.field_id = $1 
+                    LIMIT 20
+                """, field_id)
+                
+                tasks = []
+                for r in results:
+                    tasks.append({
+                        "task_id": r[0],
+                        "task_type": r[1] if r[1] else "N/A",
+                        "description": "N/A",
+                        "status": "N/A",
+                        "date_performed": None,
+                        "crop_name": "N/A",
+                        "quantity": "N/A",
+                        "rate_per_ha": "N/A"
+                    })
+            
+            return {"status": "success", "tasks": tasks, "total": len(tasks)}
+    except (ConnectionError, ValueError, OSError):
+        return {"status": "connection_failed", "error": "No database connection"}
     except Exception as e:
         return {"status": "error", "error": f"Database query failed: {str(e)}"}
 
@@ -1303,14 +1313,174 @@ DASHBOARD_LANDING_HTML = """
                 });
         }
         
-        // LLM Natural Language Query
-        function askNaturalQuestion() {
+        // LLM Natural Language Query - rendered stage by stage from /api/natural-query/stream
+        async function readEventStream(response, onEvent) {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                
+                let boundary;
+                while ((boundary = buffer.indexOf('\\n\\n')) >= 0) {
+                    const block = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    
+                    let event = 'message';
+                    let data = '';
+                    block.split('\\n').forEach(line => {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+                    if (data) onEvent(event, JSON.parse(data));
+                }
+            }
+        }
+        
+        function esc(value) {
+            return String(value ?? '').replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+        }
+        
+        function formatCell(value) {
+            if (value === null || value === undefined) return 'null';
+            return esc(typeof value === 'object' ? JSON.stringify(value) : value);
+        }
+        
+        async function askNaturalQuestion() {
             const question = document.getElementById('naturalQuestion').value.trim();
             if (!question) {
                 alert('Please enter a question');
                 return;
             }
             
+            // Older browsers without fetch streaming get the single JSON response
+            if (!window.ReadableStream || !window.TextDecoder) {
+                askNaturalQuestionBuffered(question);
+                return;
+            }
+            
+            document.getElementById('query-actions').style.display = 'none';
+            showResults(`
+                <h4>🧠 LLM Query Result:</h4>
+                <p id="nlStage">🧠 Checking LLM availability...</p>
+                <div id="nlIntent"></div>
+                <pre id="nlSql" style="display: none; background: #f5f5f5; padding: 10px; border-radius: 5px;"></pre>
+                <div id="nlExecution"></div>
+            `);
+            
+            const stage = html => { document.getElementById('nlStage').innerHTML = html; };
+            const execution = document.getElementById('nlExecution');
+            const sqlBox = document.getElementById('nlSql');
+            let generated = null;
+            
+            try {
+                const response = await fetch('/api/natural-query/stream', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ query: question })
+                });
+                if (!response.ok || !response.body) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                
+                await readEventStream(response, (event, data) => {
+                    switch (event) {
+                        case 'received':
+                            stage('🧠 Interpreting your question...');
+                            break;
+                        case 'intent':
+                            document.getElementById('nlIntent').innerHTML = `
+                                <p><strong>Your Question:</strong> ${esc(data.original_query)}</p>
+                                <p style="color: #666;">Language: ${esc(data.language)} · Tables: ${esc((data.tables || []).join(', ') || 'n/a')}${data.cached ? ' · cached translation' : ''}</p>
+                                <p><strong>Generated SQL:</strong></p>
+                            `;
+                            stage('✍️ Generating SQL...');
+                            break;
+                        case 'sql_token':
+                            sqlBox.style.display = 'block';
+                            sqlBox.textContent += data.text;
+                            break;
+                        case 'sql':
+                            if (data.status === 'success') {
+                                generated = data;
+                                lastExecutedQuery = {
+                                    sql: data.sql_query,
+                                    original_question: data.original_query
+                                };
+                                sqlBox.style.display = 'block';
+                                sqlBox.textContent = data.sql_query || 'No SQL generated';
+                                stage(data.ready_to_execute ? '✅ SQL generated' : '⚠️ No executable SQL generated');
+                            } else {
+                                showResults(data, false);
+                            }
+                            break;
+                        case 'execution_start':
+                            stage(`⚙️ Executing ${esc(data.operation_type)}...`);
+                            break;
+                        case 'columns':
+                            execution.innerHTML = `
+                                <h5 id="nlRowCount">📊 Query Results (0 rows):</h5>
+                                <table id="nlTable" style="width: 100%; margin-top: 10px;">
+                                    <tr>${data.columns.map(c => `<th>${esc(c)}</th>`).join('')}</tr>
+                                </table>
+                            `;
+                            break;
+                        case 'rows':
+                            document.getElementById('nlTable').insertAdjacentHTML('beforeend',
+                                data.rows.map(row => '<tr>' + row.map(v => `<td>${formatCell(v)}</td>`).join('') + '</tr>').join(''));
+                            document.getElementById('nlRowCount').textContent = `📊 Query Results (${data.row_count} rows so far):`;
+                            stage(`📥 Receiving rows... (${data.row_count})`);
+                            break;
+                        case 'complete':
+                            document.getElementById('nlRowCount').textContent =
+                                `📊 Query Results (${data.row_count} rows${data.truncated ? ', truncated' : ''}):`;
+                            stage('✅ Query complete');
+                            // Show save button for SELECT queries
+                            document.getElementById('query-actions').style.display = 'block';
+                            break;
+                        case 'execution_result':
+                            if (data.requires_confirmation) {
+                                pendingOperation = Object.assign({}, generated, { execution_result: data });
+                                document.getElementById('confirmationMessage').textContent = 
+                                    `This will execute a ${data.operation_type} operation. Are you sure?`;
+                                document.getElementById('confirmationSQL').textContent = generated ? generated.sql_query : '';
+                                document.getElementById('confirmationModal').style.display = 'block';
+                                stage('⏸️ Waiting for confirmation');
+                            } else if (data.status === 'success') {
+                                execution.innerHTML = `
+                                    <h5>✅ ${esc(data.operation_type)} Operation Successful</h5>
+                                    <p>Affected rows: ${esc(data.affected_rows || 0)}</p>
+                                    ${data.message ? `<p>${esc(data.message)}</p>` : ''}
+                                `;
+                                stage('✅ Done');
+                            } else {
+                                execution.innerHTML = `<p style="color: red;">Execution Error: ${esc(data.error)}</p>`;
+                                stage('❌ Execution failed');
+                            }
+                            break;
+                        case 'error':
+                            if (data.status === 'unavailable') {
+                                showResults(`<p style="color: orange;">🔔 ${esc(data.error)}<br>${esc(data.fallback)}</p>`);
+                            } else {
+                                execution.innerHTML = `<p style="color: red;">Error: ${esc(data.error)}</p>`;
+                                stage('❌ Failed');
+                            }
+                            break;
+                        case 'done': {
+                            const stageEl = document.getElementById('nlStage');
+                            if (stageEl) stageEl.innerHTML += ` <small style="color: #666;">(${esc(data.elapsed_ms)} ms)</small>`;
+                            break;
+                        }
+                    }
+                });
+            } catch (error) {
+                showResults(`<p style="color: red;">Request failed: ${esc(error)}</p>`);
+            }
+        }
+        
+        function askNaturalQuestionBuffered(question) {
             showResults('<p>🧠 Checking LLM availability...</p>');
             
             fetch('/api/natural-query', {
@@ -1329,9 +1499,9 @@ DASHBOARD_LANDING_HTML = """
                     
                     let html = `
                         <h4>🧠 LLM Query Result:</h4>
-                        <p><strong>Your Question:</strong> ${data.original_query}</p>
+                        <p><strong>Your Question:</strong> ${esc(data.original_query)}</p>
                         <p><strong>Generated SQL:</strong></p>
-                        <pre style="background: #f5f5f5; padding: 10px; border-radius: 5px;">${data.sql_query || 'No SQL generated'}</pre>
+                        <pre style="background: #f5f5f5; padding: 10px; border-radius: 5px;">${esc(data.sql_query || 'No SQL generated')}</pre>
                     `;
                     
                     // Check if this is a data modification that needs confirmation
@@ -1349,7 +1519,7 @@ DASHBOARD_LANDING_HTML = """
                         const opType = data.execution_result.operation_type || 'SELECT';
                         
                         if (opType === 'SELECT') {
-                            html += `<h5>📊 Query Results (${data.execution_result.row_count} rows):</h5>`;
+                            html += `<h5>📊 Query Results (${esc(data.execution_result.row_count)} rows):</h5>`;
                             
                             if (data.execution_result.data && data.execution_result.data.length > 0) {
                                 html += '<table style="width: 100%; margin-top: 10px;">';
@@ -1357,13 +1527,13 @@ DASHBOARD_LANDING_HTML = """
                                 // Headers
                                 const headers = Object.keys(data.execution_result.data[0]);
                                 html += '<tr>';
-                                headers.forEach(h => html += `<th>${h}</th>`);
+                                headers.forEach(h => html += `<th>${esc(h)}</th>`);
                                 html += '</tr>';
                                 
                                 // Data
                                 data.execution_result.data.forEach(row => {
                                     html += '<tr>';
-                                    headers.forEach(h => html += `<td>${row[h] || 'null'}</td>`);
+                                    headers.forEach(h => html += `<td>${formatCell(row[h])}</td>`);
                                     html += '</tr>';
                                 });
                                 html += '</table>';
@@ -1373,25 +1543,25 @@ DASHBOARD_LANDING_HTML = """
                             document.getElementById('query-actions').style.display = 'block';
                         } else {
                             // For INSERT, UPDATE, DELETE
-                            html += `<h5>✅ ${opType} Operation Successful</h5>`;
-                            html += `<p>Affected rows: ${data.execution_result.affected_rows || 0}</p>`;
+                            html += `<h5>✅ ${esc(opType)} Operation Successful</h5>`;
+                            html += `<p>Affected rows: ${esc(data.execution_result.affected_rows || 0)}</p>`;
                             if (data.execution_result.message) {
-                                html += `<p>${data.execution_result.message}</p>`;
+                                html += `<p>${esc(data.execution_result.message)}</p>`;
                             }
                         }
                     } else if (data.execution_result && data.execution_result.error) {
-                        html += `<p style="color: red;">Execution Error: ${data.execution_result.error}</p>`;
+                        html += `<p style="color: red;">Execution Error: ${esc(data.execution_result.error)}</p>`;
                     }
                     
                     showResults(html);
                 } else if (data.status === 'unavailable') {
-                    showResults(`<p style="color: orange;">🔔 ${data.error}<br>${data.fallback}</p>`);
+                    showResults(`<p style="color: orange;">🔔 ${esc(data.error)}<br>${esc(data.fallback)}</p>`);
                 } else {
                     showResults(data, false);
                 }
             })
             .catch(error => {
-                showResults(`<p style="color: red;">Request failed: ${error}</p>`);
+                showResults(`<p style="color: red;">Request failed: ${esc(error)}</p>`);
             });
         }
         
@@ -1432,7 +1602,11 @@ DASHBOARD_LANDING_HTML = """
         
         async function runStandardQuery(queryId) {
             try {
-                const response = await fetch(`/api/run-standard-query/${queryId}`, {method: 'POST'});
+                // Parameterized queries (:farmer_id) use the farmer lookup field
+                const params = new URLSearchParams();
+                const farmerId = document.getElementById('farmerId').value;
+                if (farmerId) params.set('farmer_id', farmerId);
+                const response = await fetch(`/api/run-standard-query/${queryId}?${params}`, {method: 'POST'});
                 const result = await response.json();
                 
                 if (result.status === 'success') {
@@ -1440,7 +1614,7 @@ DASHBOARD_LANDING_HTML = """
                         <h4>📌 Standard Query: ${result.query_name}</h4>
                         <p><strong>SQL:</strong></p>
                         <pre style="background: #f5f5f5; padding: 10px; border-radius: 5px;">${result.sql_query}</pre>
-                        <h5>📊 Results (${result.row_count} rows):</h5>
+                        <h5>📊 Results (${result.row_count} rows, ${result.elapsed_ms} ms${result.cached ? ', cached' : ''}):</h5>
                     `;
                     
                     if (result.data && result.data.length > 0) {
@@ -1830,95 +2004,148 @@ async def database_dashboard():
     """Agricultural Database Dashboard - Full Functionality"""
     return HTMLResponse(content=DASHBOARD_LANDING_HTML)
 
-# Simple Cost Analytics Route
+# Cost Analytics Route (served from hourly/daily rollups)
 @app.get("/cost-analytics", response_class=HTMLResponse)
-async def cost_analytics():
-    """Simple Cost Analytics - Safe Implementation"""
+async def cost_analytics_page(farmer_id: int = None, days: int = 30):
+    """Cost analytics - totals, projection, daily chart and top farmers (or one farmer's drill-down)"""
     
-    cost_data = {
-        "total_cost": 0.0,
-        "avg_cost_per_farmer": 0.0,
-        "tables_exist": False
-    }
+    cost_data = {"tables_exist": False}
+    daily = {"buckets": [], "series": {}}
+    top_farmers = []
+    projection = {}
     
     try:
-        with get_constitutional_db_connection() as connection:
-            if connection:
-                cursor = connection.cursor()
-                
-                # Check if cost tables exist
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = 'farmer_interaction_costs'
-                    )
-                """)
-                
-                cost_data["tables_exist"] = cursor.fetchone()[0]
-                
-                if cost_data["tables_exist"]:
-                    # Get basic cost data
-                    cursor.execute("""
-                        SELECT 
-                            COUNT(DISTINCT farmer_id) as farmers,
-                            COALESCE(SUM(cost_amount), 0) as total_cost
-                        FROM farmer_interaction_costs
-                        WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
-                    """)
-                    
-                    result = cursor.fetchone()
-                    farmers = result[0] or 1
-                    total_cost = result[1] or 0
-                    
-                    cost_data["total_cost"] = round(total_cost, 2)
-                    cost_data["avg_cost_per_farmer"] = round(total_cost / farmers, 2)
-                    
+        cost_data, daily, projection = await asyncio.gather(
+            cost_analytics.summary(days, farmer_id),
+            cost_analytics.timeseries("day", days, farmer_id, group_by="api_service"),
+            cost_analytics.projection(farmer_id)
+        )
+        if farmer_id is None and cost_data["tables_exist"]:
+            top_farmers = await cost_analytics.top_farmers(10, days)
     except Exception as e:
         print(f"Cost analytics error: {e}")
     
-    # Simple HTML response
+    colors = ['#2D5A27', '#3b82f6', '#f59e0b', '#8b5cf6', '#ef4444', '#14b8a6']
+    datasets = [
+        {"label": service, "data": values["cost_amount"], "backgroundColor": colors[i % len(colors)]}
+        for i, (service, values) in enumerate(sorted(daily["series"].items()))
+    ]
+    chart_data = json.dumps({"labels": [bucket[:10] for bucket in daily["buckets"]], "datasets": datasets})
+    
+    breakdown_rows = "".join(
+        f"<tr><td>{item['api_service']}</td><td>{item['interaction_type']}</td><td>{item['events']}</td>"
+        f"<td>${item['cost_amount']:.4f}</td><td>${item['rated_cost']:.4f}</td></tr>"
+        for item in cost_data.get("breakdown", [])
+    )
+    farmer_rows = "".join(
+        f"<tr><td><a href='/cost-analytics?farmer_id={item['farmer_id']}&days={days}'>{item['farm_name'] or 'Farmer ' + str(item['farmer_id'])}</a></td>"
+        f"<td>{item['events']}</td><td>{item['tokens_used']}</td><td>${item['cost_amount']:.4f}</td></tr>"
+        for item in top_farmers
+    )
+    title = f"Farmer {farmer_id}" if farmer_id is not None else "All Farmers"
+    
     html = f"""
     <!DOCTYPE html>
     <html>
     <head>
         <title>Cost Analytics - AVA OLO</title>
+        <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
         <style>
             body {{ font-family: Arial, sans-serif; margin: 40px; background: #F5F3F0; }}
-            .container {{ max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }}
+            .container {{ max-width: 900px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }}
+            .metrics {{ display: grid; grid-template-columns: repeat(3, 1fr); gap: 15px; }}
             .metric {{ margin: 20px 0; padding: 15px; background: #f8f9fa; border-radius: 5px; }}
             .value {{ font-size: 24px; font-weight: bold; color: #2D5A27; }}
             .label {{ color: #6B5B73; margin-bottom: 5px; }}
             .back-link {{ color: #6B5B73; text-decoration: none; }}
+            table {{ width: 100%; border-collapse: collapse; margin: 15px 0; }}
+            th, td {{ padding: 8px; border-bottom: 1px solid #e5e7eb; text-align: left; }}
+            th {{ background: #f8f9fa; color: #6B5B73; }}
         </style>
     </head>
     <body>
         <div class="container">
-            <a href="/business-dashboard" class="back-link">← Back to Business Dashboard</a>
-            <h1>💰 Cost Analytics</h1>
+            <a href="{'/cost-analytics' if farmer_id is not None else '/business-dashboard'}" class="back-link">← Back to {'Cost Analytics' if farmer_id is not None else 'Business Dashboard'}</a>
+            <h1>💰 Cost Analytics: {title}</h1>
             
             """ + ("<p>Cost tracking tables not yet created. <a href='/initialize-cost-tables'>Click here to initialize</a></p>" if not cost_data["tables_exist"] else "") + """
             
             """ + ("<p style='text-align: center; margin: 15px 0;'><a href='/cost-rates' style='background: #3b82f6; color: white; padding: 8px 16px; text-decoration: none; border-radius: 4px;'>⚙️ Manage Cost Rates</a></p>" if cost_data["tables_exist"] else "") + """
             
             """ + (f"""
-            <div class="metric">
-                <div class="label">Total Cost (30 days)</div>
-                <div class="value">${cost_data["total_cost"]}</div>
+            <div class="metrics">
+                <div class="metric">
+                    <div class="label">Total Cost ({days} days)</div>
+                    <div class="value">${cost_data["total_cost"]:.2f}</div>
+                </div>
+                <div class="metric">
+                    <div class="label">{'Events' if farmer_id is not None else 'Average Cost per Farmer'}</div>
+                    <div class="value">{cost_data["events"] if farmer_id is not None else f'${cost_data["avg_cost_per_farmer"]:.2f}'}</div>
+                </div>
+                <div class="metric">
+                    <div class="label">Projected {projection.get("month", "")} Spend</div>
+                    <div class="value">${projection.get("projected_month_total", 0):.2f}</div>
+                </div>
             </div>
             
-            <div class="metric">
-                <div class="label">Average Cost per Farmer</div>
-                <div class="value">${cost_data["avg_cost_per_farmer"]}</div>
-            </div>
-            """ if cost_data["tables_exist"] else "") + """
+            <h3>Daily Cost by Service</h3>
+            <canvas id="dailyCostChart" height="110"></canvas>
+            
+            <h3>Breakdown</h3>
+            <table>
+                <tr><th>Service</th><th>Interaction</th><th>Events</th><th>Recorded Cost</th><th>At Current Rates</th></tr>
+                {breakdown_rows}
+            </table>
+            """ if cost_data["tables_exist"] else "") + (f"""
+            <h3>Top Farmers by Cost</h3>
+            <table>
+                <tr><th>Farmer</th><th>Events</th><th>Tokens</th><th>Cost</th></tr>
+                {farmer_rows}
+            </table>
+            """ if top_farmers else "") + f"""
         </div>
+        <script>
+            const costChart = document.getElementById('dailyCostChart');
+            if (costChart) {{
+                new Chart(costChart, {{
+                    type: 'bar',
+                    data: {chart_data},
+                    options: {{ responsive: true, scales: {{ x: {{ stacked: true }}, y: {{ stacked: true, beginAtZero: true }} }} }}
+                }});
+            }}
+        </script>
     </body>
     </html>
     """
     
     return HTMLResponse(content=html)
 
+@app.get("/api/cost-analytics/timeseries")
+async def cost_analytics_timeseries(granularity: str = "day", days: int = 30, farmer_id: int = None,
+                                    group_by: str = None):
+    """Cost per hour/day bucket, optionally for one farmer and split by api_service or interaction_type"""
+    try:
+        return await cost_analytics.timeseries(granularity, days, farmer_id, group_by)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+@app.get("/api/cost-analytics/top-farmers")
+async def cost_analytics_top_farmers(limit: int = 10, days: int = 30):
+    return {"days": days, "farmers": await cost_analytics.top_farmers(limit, days)}
+
+@app.get("/api/cost-analytics/projection")
+async def cost_analytics_projection(farmer_id: int = None):
+    return await cost_analytics.projection(farmer_id)
+
+@app.get("/api/cost-analytics/farmer/{farmer_id}")
+async def cost_analytics_farmer(farmer_id: int, days: int = 30):
+    return await cost_analytics.farmer_detail(farmer_id, days)
+
+@app.post("/api/cost-analytics/refresh")
+async def cost_analytics_refresh(rebuild: bool = False):
+    """Roll up new events now; rebuild=true reprices all history from current cost_rates"""
+    return await cost_analytics.refresh(rebuild=rebuild)
+
 # Initialize cost tables endpoint
 @app.get("/initialize-cost-tables")
 async def initialize_cost_tables():
@@ -2338,6 +2565,7 @@ async def test_performance():
 
 # Database Schema API endpoint
 @app.get("/api/v1/database/schema")
+@cached_response(ttl=300, stale_ttl=600, tags=("schema",))
 async def get_schema_api():
     """Get database schema in JSON format"""
     if POOL_AVAILABLE:
@@ -2572,6 +2800,22 @@ async def health_performance():
         except Exception as e:
             metrics["status"] = "degraded"
             metrics["error"] = str(e)
+        
+        # Live pool accounting: checked-out, overflow, wait time, long-held connections
+        try:
+            metrics["pool"] = get_pool_stats()
+        except Exception as e:
+            metrics["pool"] = {"error": str(e)}
+        metrics["async_pool"] = get_async_pool_stats()
+        metrics["response_cache"] = response_cache.get_stats()
+        metrics["translation_cache"] = translation_cache.get_stats()
+        metrics["llm_gateway"] = llm_gateway.get_stats()
+        metrics["prompt_builder"] = prompt_builder.get_stats()
+        metrics["sql_admission"] = query_admission.get_stats()
+        metrics["standard_queries"] = standard_query_runner.get_stats()
+        metrics["write_behind"] = get_write_behind_stats()
+        metrics["cost_analytics"] = cost_analytics.get_stats()
+        metrics["sql_profiler"] = sql_profiler.get_stats()
     else:
         # Fallback performance check
         start = time.time()
@@ -2737,6 +2981,7 @@ async def field_drawing_test():
 
 # API endpoint for farmer registration
 @app.post("/api/register-farmer")
+@invalidates("farmers", "fields")
 async def register_farmer(request: Request):
     """Register a new farmer with fields and app access"""
     import traceback
@@ -2921,6 +3166,33 @@ async def execute_database_query(request: Request):
             content={"success": False, "error": str(e)}
         )
 
+# Streaming export of an ad-hoc SELECT (constant memory, server-side cursor)
+@app.post("/api/database/query/export")
+async def export_database_query(request: Request):
+    """Stream a SELECT query as CSV, NDJSON or Parquet"""
+    try:
+        data = await request.json()
+        query = data.get('query', '').strip()
+        
+        # Security: Only allow SELECT queries (export also runs READ ONLY)
+        if not query.lower().startswith('select'):
+            return JSONResponse(
+                status_code=400,
+                content={"success": False, "error": "Only SELECT queries are allowed"}
+            )
+        
+        stream = ExportStream(get_constitutional_db_connection, query, fmt=data.get('format', 'csv'))
+        await run_in_threadpool(stream.start)
+        return stream.response("query_export")
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    except Exception as e:
+        logger.error(f"Database query export error: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": str(e)}
+        )
+
 @app.get("/health/database")
 async def database_health_check():
     """Test database connectivity and return detailed status"""
@@ -3154,6 +3426,7 @@ async def diagnostics_viewer():
             <p>Comprehensive testing of database connections and configurations</p>
             
             <button onclick="runDiagnostics()">🔧 Run Complete Diagnostics</button>
+            <p><a href="/diagnostics/queries">📊 Top Queries &amp; Slow Query Log</a> - Per-call-site SQL timings and EXPLAIN plans</p>
             
             <div id="diagnosticsResults" style="margin-top: 20px;"></div>
         </div>
@@ -3280,6 +3553,161 @@ async def diagnostics_viewer():
     </html>
     """)
 
+@app.get("/api/diagnostics/queries")
+async def diagnostics_queries(sort: str = "total_ms", limit: int = 50, driver: str = None, slow_limit: int = 50):
+    """Top statements by fingerprint and call site, plus the slow query log"""
+    if sort not in SQL_PROFILE_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SQL_PROFILE_SORT_KEYS)}")
+    return {
+        "sort": sort,
+        "queries": sql_profiler.top(sort, limit, driver),
+        "slow_queries": sql_profiler.slow_queries(slow_limit),
+        "stats": sql_profiler.get_stats()
+    }
+
+@app.post("/api/diagnostics/queries/reset")
+async def reset_diagnostics_queries():
+    """Clear the profiler's aggregates and slow query log"""
+    sql_profiler.reset()
+    return {"status": "reset", "stats": sql_profiler.get_stats()}
+
+@app.get("/diagnostics/queries", response_class=HTMLResponse)
+async def diagnostics_queries_viewer():
+    """Sortable top-queries view with slow query log and captured EXPLAIN plans"""
+    return HTMLResponse(content="""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Top Queries - Diagnostics</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
+            .container { max-width: 1400px; margin: 0 auto; background: white; padding: 30px; border-radius: 10px; }
+            .section { border: 1px solid #ddd; margin: 15px 0; padding: 15px; border-radius: 8px; }
+            .info { background: #e3f2fd; border-left: 5px solid #2196f3; }
+            button, select { padding: 8px 16px; border-radius: 5px; font-size: 1em; }
+            button { background: #27ae60; color: white; border: none; cursor: pointer; }
+            button.danger { background: #e74c3c; }
+            table { width: 100%; border-collapse: collapse; margin: 10px 0; font-size: 0.9em; }
+            th, td { border: 1px solid #ddd; padding: 6px 8px; text-align: left; vertical-align: top; }
+            th { background: #f5f5f5; }
+            th.sortable { cursor: pointer; color: #2196f3; }
+            th.active { background: #e3f2fd; }
+            td.num { text-align: right; white-space: nowrap; }
+            code { font-size: 0.85em; white-space: pre-wrap; word-break: break-word; }
+            pre { background: #f5f5f5; padding: 10px; border-radius: 5px; overflow-x: auto; font-size: 0.85em; }
+            .slow { color: #e74c3c; font-weight: bold; }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h1>📊 Top Queries</h1>
+            <p><a href="/diagnostics/">← Diagnostics</a> | <a href="/api/diagnostics/queries">JSON</a> | <a href="/metrics">/metrics</a></p>
+            <div class="section info" id="profilerStats">Loading...</div>
+            <p>
+                Driver:
+                <select id="driver" onchange="loadQueries()">
+                    <option value="">All</option>
+                    <option value="asyncpg">asyncpg</option>
+                    <option value="psycopg2">psycopg2</option>
+                    <option value="sqlalchemy">sqlalchemy</option>
+                </select>
+                <button onclick="loadQueries()">🔄 Refresh</button>
+                <button class="danger" onclick="resetProfiler()">Reset</button>
+            </p>
+
+            <div class="section">
+                <h3>Statements by fingerprint and call site</h3>
+                <table>
+                    <thead><tr>
+                        <th>Statement</th><th>Call site</th>
+                        <th class="sortable" data-sort="count">Calls</th>
+                        <th class="sortable" data-sort="total_ms">Total ms</th>
+                        <th class="sortable" data-sort="avg_ms">Avg ms</th>
+                        <th class="sortable" data-sort="max_ms">Max ms</th>
+                        <th class="sortable" data-sort="rows">Rows</th>
+                        <th class="sortable" data-sort="errors">Errors</th>
+                        <th class="sortable" data-sort="last_seen">Last seen</th>
+                    </tr></thead>
+                    <tbody id="queries"></tbody>
+                </table>
+            </div>
+
+            <div class="section">
+                <h3>Slow query log</h3>
+                <table>
+                    <thead><tr><th>Time</th><th>ms</th><th>Rows</th><th>Call site</th><th>Statement</th></tr></thead>
+                    <tbody id="slowQueries"></tbody>
+                </table>
+            </div>
+        </div>
+
+        <script>
+            let currentSort = 'total_ms';
+
+            function esc(value) {
+                return String(value ?? '').replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+            }
+
+            function loadQueries() {
+                const driver = document.getElementById('driver').value;
+                const params = new URLSearchParams({sort: currentSort, limit: 100});
+                if (driver) params.set('driver', driver);
+                document.querySelectorAll('th.sortable').forEach(th => th.classList.toggle('active', th.dataset.sort === currentSort));
+
+                fetch('/api/diagnostics/queries?' + params)
+                    .then(response => response.json())
+                    .then(data => {
+                        const s = data.stats;
+                        document.getElementById('profilerStats').innerHTML =
+                            `<strong>${s.statements}</strong> statements profiled since ${esc(s.since)} · ` +
+                            `<strong>${s.entries}</strong> fingerprint/call-site pairs · ` +
+                            `<span class="slow">${s.slow}</span> slow (≥ ${s.slow_ms} ms) · ${s.errors} errors · ` +
+                            `${s.plans_captured} plans captured` + (s.enabled ? '' : ' · <strong>profiler disabled</strong>');
+
+                        document.getElementById('queries').innerHTML = data.queries.map(q => `
+                            <tr>
+                                <td><code>${esc(q.statement)}</code>
+                                    ${q.plan ? `<details><summary>EXPLAIN (${esc(q.plan_captured_at)})</summary><pre>${esc(q.plan)}</pre></details>` : ''}
+                                </td>
+                                <td><code>${esc(q.call_site)}</code><br><small>${esc(q.driver)}</small></td>
+                                <td class="num">${q.count}</td>
+                                <td class="num">${q.total_ms}</td>
+                                <td class="num">${q.avg_ms}</td>
+                                <td class="num ${q.slow ? 'slow' : ''}">${q.max_ms}</td>
+                                <td class="num">${q.rows}</td>
+                                <td class="num">${q.errors}</td>
+                                <td>${esc(q.last_seen.replace('T', ' ').slice(0, 19))}</td>
+                            </tr>`).join('') || '<tr><td colspan="9">No statements recorded yet</td></tr>';
+
+                        document.getElementById('slowQueries').innerHTML = data.slow_queries.map(q => `
+                            <tr>
+                                <td>${esc(q.timestamp.replace('T', ' ').slice(0, 19))}</td>
+                                <td class="num slow">${q.elapsed_ms}</td>
+                                <td class="num">${q.rows ?? ''}</td>
+                                <td><code>${esc(q.call_site)}</code></td>
+                                <td><code>${esc(q.statement)}</code></td>
+                            </tr>`).join('') || '<tr><td colspan="5">No slow queries</td></tr>';
+                    })
+                    .catch(error => {
+                        document.getElementById('profilerStats').innerHTML = `❌ Failed to load profiler data: ${esc(error)}`;
+                    });
+            }
+
+            function resetProfiler() {
+                if (!confirm('Clear all profiler aggregates and the slow query log?')) return;
+                fetch('/api/diagnostics/queries/reset', {method: 'POST'}).then(loadQueries);
+            }
+
+            document.querySelectorAll('th.sortable').forEach(th => th.addEventListener('click', () => {
+                currentSort = th.dataset.sort;
+                loadQueries();
+            }));
+            loadQueries();
+        </script>
+    </body>
+    </html>
+    """)
+
 # Add simple HTML interface to view schema
 @app.get("/schema/", response_class=HTMLResponse)
 async def schema_viewer():
@@ -3457,6 +3885,7 @@ async def schema_viewer_old():
 
 # PART 1: Standard Agricultural Query APIs (ALWAYS WORK)
 @app.get("/api/agricultural/farmer-count")
+@cached_response(ttl=30, stale_ttl=120, tags=("farmers",))
 async def api_farmer_count():
     return await get_farmer_count()
 
@@ -3500,13 +3929,7 @@ async def discover_complete_schema():
                 cursor = conn.cursor()
                 
                 # 1. Get all tables
-                cursor.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    ORDER BY table_name
-                """)
-                tables = [row[0] for row in cursor.fetchall()]
+                tables = schema_catalog.tables(conn)
                 
                 schema_info = {}
                 
@@ -3514,20 +3937,14 @@ async def discover_complete_schema():
                 for table in tables:
                     try:
                         # Get column information
-                        cursor.execute("""
-                            SELECT column_name, data_type, is_nullable, column_default
-                            FROM information_schema.columns 
-                            WHERE table_name = %s 
-                            ORDER BY ordinal_position
-                        """, (table,))
-                        columns = cursor.fetchall()
+                        columns = schema_catalog.column_details(table, conn)
                         
                         # Get row count
                         cursor.execute(f"SELECT COUNT(*) FROM {table}")
                         row_count = cursor.fetchone()[0]
                         
                         # Get sample data (first 2 rows)
-                        column_names = [col[0] for col in columns]
+                        column_names = [col["name"] for col in columns]
                         if column_names:
                             column_list = ', '.join(column_names)
                             cursor.execute(f"SELECT {column_list} FROM {table} LIMIT 2")
@@ -3536,7 +3953,7 @@ async def discover_complete_schema():
                             sample_data = []
                         
                         schema_info[table] = {
-                            "columns": [{"name": col[0], "type": col[1], "nullable": col[2], "default": col[3]} for col in columns],
+                            "columns": columns,
                             "row_count": row_count,
                             "sample_data": sample_data,
                             "column_names": column_names
@@ -3772,9 +4189,10 @@ async def debug_status():
 
 # Improved system status endpoint
 @app.get("/api/system-status")
+@cached_response(ttl=15, stale_ttl=45)
 async def get_system_status():
     """
-    Get detailed system status for improved display
+    Get detailed system status for improved display (from the background health probes)
     """
     status = {
         "database": {
@@ -3794,49 +4212,38 @@ async def get_system_status():
         }
     }
     
-    # Test database connection
-    try:
-        with get_constitutional_db_connection() as conn:
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT 1")
-                result = cursor.fetchone()
-                if result:
-                    status["database"]["status"] = "connected"
-                    status["database"]["message"] = "AWS RDS PostgreSQL - Connected"
-                    status["database"]["icon"] = "✅"
-                else:
-                    status["database"]["status"] = "failed"
-                    status["database"]["message"] = "Connection failed"
-                    status["database"]["icon"] = "❌"
-            else:
-                status["database"]["status"] = "failed"
-                status["database"]["message"] = "Connection failed"
-                status["database"]["icon"] = "❌"
-    except Exception as e:
-        status["database"]["status"] = "error"
-        status["database"]["message"] = f"Error: {str(e)[:50]}..."
+    database, llm, constitutional = await asyncio.gather(
+        health_prober.current("database"), health_prober.current("llm"), health_prober.current("constitutional")
+    )
+    
+    # Database connection
+    if database["ok"]:
+        status["database"]["status"] = "connected"
+        status["database"]["message"] = "AWS RDS PostgreSQL - Connected"
+        status["database"]["icon"] = "✅"
+    else:
+        status["database"]["status"] = "error" if database["error"] else "failed"
+        status["database"]["message"] = f"Error: {database['error'][:50]}..." if database["error"] else "Connection failed"
         status["database"]["icon"] = "❌"
     
-    # Test LLM availability with actual connection test
-    try:
-        llm_test = await test_llm_connection()
-        if llm_test.get("status") == "connected":
-            status["llm"]["status"] = "available"
-            status["llm"]["message"] = "OpenAI GPT-4 connected"
-            status["llm"]["icon"] = "✅"
-        else:
-            status["llm"]["status"] = "failed"
-            status["llm"]["message"] = llm_test.get("error", "Connection failed")[:50]
-            status["llm"]["icon"] = "❌"
-    except Exception as e:
+    # LLM availability from the last connection test
+    llm_test = llm["value"] or {}
+    if llm["ok"]:
+        status["llm"]["status"] = "available"
+        status["llm"]["message"] = "OpenAI GPT-4 connected"
+        status["llm"]["icon"] = "✅"
+    elif llm["error"]:
         status["llm"]["status"] = "error"
-        status["llm"]["message"] = f"Test failed: {str(e)[:30]}"
+        status["llm"]["message"] = f"Test failed: {llm['error'][:30]}"
+        status["llm"]["icon"] = "❌"
+    else:
+        status["llm"]["status"] = "failed"
+        status["llm"]["message"] = llm_test.get("error", "Connection failed")[:50]
         status["llm"]["icon"] = "❌"
     
-    # Check constitutional compliance
-    try:
-        compliance = await check_constitutional_compliance()
+    # Constitutional compliance
+    compliance = constitutional["value"]
+    if compliance:
         if compliance.get("fully_compliant"):
             status["constitutional"]["status"] = "compliant"
             status["constitutional"]["message"] = f"All {compliance['total_principles']} principles implemented"
@@ -3845,9 +4252,8 @@ async def get_system_status():
             status["constitutional"]["status"] = "partial"
             status["constitutional"]["message"] = f"{compliance['compliant']}/{compliance['total_principles']} principles compliant"
             status["constitutional"]["icon"] = "⚠️"
-    except:
-        pass
     
+    status["checked_at"] = {"database": database["timestamp"], "llm": llm["timestamp"], "constitutional": constitutional["timestamp"]}
     return status
 
 def generate_component_rows(component_health):
@@ -3882,13 +4288,48 @@ def generate_feature_rows(feature_health):
         rows.append(row)
     return ''.join(rows)
 
+def probe_history_summaries(names):
+    """Long-term history summaries per probe (blocking SQLite reads - run in a worker thread)"""
+    return {name: health_history.summary(f"dashboard:{name}") for name in names}
+
+def generate_probe_rows(probe_stats, long_term_stats):
+    """Generate HTML rows for background probe history - safe implementation"""
+    rows = []
+    for name, probe in probe_stats.items():
+        uptime = f"{probe['uptime'] * 100:.1f}% of {probe['samples']}" if probe['samples'] else '-'
+        latency = f"{probe['latency_ms']} / {probe['avg_latency_ms']} / {probe['max_latency_ms']} ms" if probe['samples'] else '-'
+        row = '<tr>'
+        row += '<td style="font-weight: bold;">' + ('✅ ' if probe['ok'] else '❌ ' if probe['ok'] is False else '⏳ ') + name + '</td>'
+        row += '<td>' + f"{probe['interval']:.0f}s" + '</td>'
+        row += '<td>' + (probe['last_checked'] or 'pending')[:19].replace('T', ' ') + '</td>'
+        row += '<td>' + latency + '</td>'
+        row += '<td>' + uptime + '</td>'
+        long_term = long_term_stats[name]
+        row += '<td>' + (f"{long_term['p50']} / {long_term['p95']} / {long_term['p99']} ms" if long_term['samples'] else '-') + '</td>'
+        row += '<td>' + long_term['sparkline_svg'] + '</td>'
+        row += '<td style="color: #666; font-size: 0.9em;">' + (probe['last_error'] or '') + '</td>'
+        row += '</tr>'
+        rows.append(row)
+    return ''.join(rows)
+
 # Health Dashboard - Comprehensive System Component Monitoring
 @app.get("/health-dashboard", response_class=HTMLResponse)
 async def health_dashboard():
     """Health Dashboard showing status of all system components"""
     
-    # Get comprehensive system status
-    components_status = await get_comprehensive_health_status()
+    # Latest comprehensive status from the background prober (not re-checked per page view)
+    components_entry = await health_prober.current("components")
+    probe_stats = health_prober.get_stats()
+    long_term_stats = await asyncio.to_thread(probe_history_summaries, list(probe_stats))
+    components_status = components_entry["value"] or {
+        'Health Probe': {
+            'status': 'error',
+            'icon': '❌',
+            'color': '#f44336',
+            'message': 'Health check failed',
+            'details': components_entry["error"] or 'No result'
+        }
+    }
     
     # Generate status rows HTML
     status_rows = ""
@@ -4035,7 +4476,7 @@ async def health_dashboard():
                 </div>
                 <p>{healthy_components} of {total_components} components healthy ({health_percentage}%)</p>
                 <button class="refresh-btn" onclick="location.reload()">🔄 Refresh Status</button>
-                <div class="timestamp">Last checked: {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}</div>
+                <div class="timestamp">Last checked: {components_entry["timestamp"][:19].replace('T', ' ')} UTC</div>
             </div>
             
             <div class="components-table">
@@ -4071,6 +4512,27 @@ async def health_dashboard():
                     </tbody>
                 </table>
             </div>
+            
+            <div class="components-table" style="margin-top: 30px;">
+                <h2 style="margin: 20px 0 10px 0; color: #2c3e50;">⏱️ Probe History</h2>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>Probe</th>
+                            <th>Every</th>
+                            <th>Last Checked</th>
+                            <th>Latency (last / avg / max)</th>
+                            <th>Uptime</th>
+                            <th>24h p50 / p95 / p99</th>
+                            <th>24h Latency</th>
+                            <th>Last Error</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+{generate_probe_rows(probe_stats, long_term_stats)}
+                    </tbody>
+                </table>
+            </div>
         </div>
         
         <script>
@@ -4081,8 +4543,8 @@ async def health_dashboard():
     </html>
     """)
 
-async def get_feature_health_status():
-    """Check health status of specific features and their dependencies"""
+async def get_feature_health_status(llm_test: Optional[Dict[str, Any]] = None):
+    """Check health status of specific features and their dependencies (llm_test: reuse a recent connection test)"""
     
     features = {}
     
@@ -4113,8 +4575,8 @@ async def get_feature_health_status():
     # Feature 2: LLM Natural Language Query
     if OPENAI_API_KEY and len(OPENAI_API_KEY) > 10:
         try:
-            from llm_integration import test_llm_connection
-            llm_test = await test_llm_connection()
+            if llm_test is None:
+                llm_test = await test_llm_connection()
             
             # Also test if database is reachable from LLM context
             with get_constitutional_db_connection() as conn:
@@ -4320,13 +4782,15 @@ async def get_feature_health_status():
     
     return features
 
-async def get_comprehensive_health_status():
-    """Check health status of all system components"""
+async def get_comprehensive_health_status(llm_test: Optional[Dict[str, Any]] = None,
+                                          feature_health: Optional[Dict[str, Any]] = None):
+    """Check health status of all system components (recent LLM test / feature results are reused when given)"""
     
     components = {}
     
     # First get feature-level health status
-    feature_health = await get_feature_health_status()
+    if feature_health is None:
+        feature_health = await get_feature_health_status(llm_test)
     
     # Combine component and feature health
     components.update(feature_health)
@@ -4368,9 +4832,8 @@ async def get_comprehensive_health_status():
     # 2. OpenAI API
     if OPENAI_API_KEY and len(OPENAI_API_KEY) > 10:
         try:
-            # Import test function
-            from llm_integration import test_llm_connection
-            llm_test = await test_llm_connection()
+            if llm_test is None:
+                llm_test = await test_llm_connection()
             
             if llm_test.get("status") == "connected":
                 components['OpenAI API'] = {
@@ -4520,8 +4983,69 @@ async def get_comprehensive_health_status():
     
     return components
 
+# Background health probes: each component on its own interval, results kept in ring buffers
+def _probe_database():
+    with get_constitutional_db_connection() as conn:
+        if not conn:
+            raise ConnectionError("Connection failed")
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        return cursor.fetchone()[0] == 1
+
+async def _probe_llm():
+    # A real (billed) completion, so it runs rarely
+    return await test_llm_connection()
+
+async def _probe_constitutional():
+    return await check_constitutional_compliance()
+
+async def _probe_features():
+    return await get_feature_health_status(llm_test=await health_prober.value("llm", {}))
+
+async def _probe_components():
+    llm_test, feature_health = await asyncio.gather(
+        health_prober.value("llm", {}), health_prober.value("features", {})
+    )
+    return await get_comprehensive_health_status(llm_test=llm_test, feature_health=feature_health)
+
+def _all_healthy(statuses):
+    return all(details['status'] != 'error' for details in statuses.values())
+
+health_prober.register("database", _probe_database, interval=float(os.getenv('HEALTH_PROBE_DATABASE_INTERVAL', '15')),
+                       healthy=bool)
+health_prober.register("llm", _probe_llm, interval=float(os.getenv('HEALTH_PROBE_LLM_INTERVAL', '300')),
+                       healthy=lambda result: result.get("status") == "connected")
+health_prober.register("constitutional", _probe_constitutional,
+                       interval=float(os.getenv('HEALTH_PROBE_CONSTITUTIONAL_INTERVAL', '600')),
+                       healthy=lambda result: bool(result.get("fully_compliant")))
+health_prober.register("features", _probe_features, interval=float(os.getenv('HEALTH_PROBE_FEATURES_INTERVAL', '60')),
+                       healthy=_all_healthy)
+health_prober.register("components", _probe_components,
+                       interval=float(os.getenv('HEALTH_PROBE_COMPONENTS_INTERVAL', '60')), healthy=_all_healthy)
+
+# Persist every probe result (rolling percentiles, uptime and sparklines survive restarts)
+health_prober.add_listener(lambda name, entry: health_history.record_probe(f"dashboard:{name}", entry))
+
+@app.get("/api/health/probes")
+async def get_health_probes(history: int = 0):
+    """Background probe summaries (uptime, latency, failures), optionally with recent results"""
+    probes = health_prober.get_stats()
+    long_term_stats = await asyncio.to_thread(probe_history_summaries, list(probes))
+    for name in probes:
+        probes[name]["long_term"] = {
+            k: v for k, v in long_term_stats[name].items() if k != "sparkline_svg"
+        }
+    if history:
+        for name in probes:
+            probes[name]["history"] = [
+                {key: entry[key] for key in ("timestamp", "ok", "latency_ms", "error")}
+                for entry in health_prober.history(name, history)
+            ]
+    return {"probes": probes}
+
 # Essential schema endpoint for quick reference
 @app.get("/api/essential-schema")
+@cached_response(ttl=300, stale_ttl=600, tags=("schema", "farmers", "fields", "tasks"))
 async def get_essential_schema():
     """
     Get essential schema for farmers, fields, tasks relationships
@@ -4538,34 +5062,19 @@ async def get_essential_schema():
                 for table_name in essential_tables:
                     try:
                         # Check if table exists
-                        cursor.execute("""
-                            SELECT EXISTS (
-                                SELECT FROM information_schema.tables 
-                                WHERE table_schema = 'public' 
-                                AND table_name = %s
-                            )
-                        """, (table_name,))
-                        exists = cursor.fetchone()[0]
-                        
-                        if not exists:
+                        if not schema_catalog.has_table(table_name, conn):
                             schema[table_name] = {"exists": False}
                             continue
                         
                         # Get columns
-                        cursor.execute("""
-                            SELECT column_name, data_type, is_nullable
-                            FROM information_schema.columns 
-                            WHERE table_name = %s 
-                            ORDER BY ordinal_position
-                        """, (table_name,))
-                        columns = cursor.fetchall()
+                        columns = schema_catalog.column_details(table_name, conn)
                         
                         # Get row count
                         cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
                         row_count = cursor.fetchone()[0]
                         
                         # Get sample data (first 2 rows)
-                        column_names = [col[0] for col in columns]
+                        column_names = [col["name"] for col in columns]
                         if column_names:
                             cursor.execute(f"SELECT {', '.join(column_names)} FROM {table_name} LIMIT 2")
                             sample_data = cursor.fetchall()
@@ -4575,7 +5084,7 @@ async def get_essential_schema():
                         schema[table_name] = {
                             "exists": True,
                             "columns": column_names,
-                            "column_details": [{"name": col[0], "type": col[1], "nullable": col[2]} for col in columns],
+                            "column_details": [{"name": col["name"], "type": col["type"], "nullable": col["nullable"]} for col in columns],
                             "row_count": row_count,
                             "sample_data": [dict(zip(column_names, row)) for row in sample_data]
                         }
@@ -4595,14 +5104,16 @@ from db_connection_fixed import (
     get_field_with_crops,
     get_farmer_fields as async_get_farmer_fields,
     get_field_tasks as async_get_field_tasks,
-    get_all_farmers as async_get_all_farmers,
-    get_constitutional_db_connection as async_get_db_connection
+    get_all_farmers as async_get_all_farmers
 )
 
 # Import LLM integration functions
 from llm_integration import (
     test_llm_connection,
     process_natural_language_query,
+    process_natural_language_batch,
+    NL_BATCH_CONCURRENCY,
+    stream_natural_language_query,
     execute_llm_generated_query,
     test_mango_compliance_queries,
     check_constitutional_compliance
@@ -4635,6 +5146,90 @@ async def check_llm_status():
     """Check LLM connection status"""
     return await test_llm_connection()
 
+async def _load_farmer_context(farmer_id) -> Optional[Dict[str, Any]]:
+    """Farmer row used as LLM context (None when absent or unavailable)"""
+    if not farmer_id:
+        return None
+    try:
+        farmer = await async_fetchrow("SELECT * FROM farmers WHERE id = $1", farmer_id)
+        if farmer:
+            return dict(farmer)
+    except:
+        pass
+    return None
+
+def _unsafe_modification(sql_query: str, operation_type: str) -> Optional[Dict[str, Any]]:
+    """Execution result refusing UPDATE/DELETE without WHERE (None when safe to run)"""
+    if operation_type in ['UPDATE', 'DELETE'] and 'WHERE' not in sql_query.upper():
+        return {
+            "status": "error",
+            "error": f"{operation_type} without WHERE clause is too dangerous",
+            "requires_confirmation": True,
+            "operation_type": operation_type
+        }
+    return None
+
+def _admission_rejected(decision: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": "rejected",
+        "error": f"Query rejected by admission control: {decision['reason']}",
+        "operation_type": decision["operation_type"],
+        "admission": decision_summary(decision)
+    }
+
+async def _execute_llm_sql(sql_query: str, allow_writes: bool = True) -> Dict[str, Any]:
+    """Execute generated SQL on the shared async pool behind the WHERE check and admission control"""
+    try:
+        operation_type = statement_type(sql_query)
+        if operation_type in ("INSERT", "UPDATE", "DELETE") and not allow_writes:
+            return {
+                "status": "skipped",
+                "operation_type": operation_type,
+                "message": f"{operation_type} not executed in batch mode"
+            }
+        
+        # Safety check for UPDATE/DELETE
+        refusal = _unsafe_modification(sql_query, operation_type)
+        if refusal:
+            return refusal
+        
+        async with async_acquire() as conn:
+            # EXPLAIN-based admission: reject/rewrite expensive plans, cap rows, set timeout
+            decision = await query_admission.admit(conn, sql_query)
+            if not decision["admitted"]:
+                return _admission_rejected(decision)
+            if operation_type != "SELECT":
+                return await _execute_llm_modification(conn, decision)
+            
+            async with query_admission.guard(conn, decision):
+                rows = await conn.fetch(decision["sql"])
+            
+            return {
+                "status": "success",
+                "operation_type": operation_type,
+                "row_count": len(rows),
+                "data": [dict(row) for row in rows],
+                "admission": decision_summary(decision)
+            }
+    except (ConnectionError, OSError):
+        return {"error": "Database connection failed"}
+    except Exception as e:
+        return {"error": f"Execution error: {str(e)}"}
+
+async def _execute_llm_modification(conn, decision: Dict[str, Any]) -> Dict[str, Any]:
+    # For INSERT, UPDATE, DELETE - committed by the guard's transaction, under the statement timeout
+    async with query_admission.guard(conn, decision):
+        status = await conn.execute(decision["sql"])
+    affected_rows = int(status.split()[-1]) if status and status.split()[-1].isdigit() else 0
+    
+    return {
+        "status": "success",
+        "operation_type": decision["operation_type"],
+        "affected_rows": affected_rows,
+        "message": f"{decision['operation_type']} executed successfully",
+        "admission": decision_summary(decision)
+    }
+
 @app.post("/api/natural-query")
 async def process_natural_query(request: Dict[str, Any]):
     """
@@ -4649,104 +5244,130 @@ async def process_natural_query(request: Dict[str, Any]):
         return {"error": "No query provided"}
     
     # Get farmer context if provided
-    farmer_context = None
-    if farmer_id:
-        try:
-            conn = await async_get_db_connection()
-            if conn:
-                farmer = await conn.fetchrow("SELECT * FROM farmers WHERE id = $1", farmer_id)
-                if farmer:
-                    farmer_context = dict(farmer)
-                await conn.close()
-        except:
-            pass
+    farmer_context = await _load_farmer_context(farmer_id)
     
     # Process with LLM
     llm_result = await process_natural_language_query(query, farmer_context)
     
     if llm_result.get("ready_to_execute") and llm_result.get("sql_query"):
-        # Execute the generated SQL
+        llm_result["execution_result"] = await _execute_llm_sql(llm_result["sql_query"])
+    
+    return llm_result
+
+# Upper bound on questions per /api/natural-query/batch request
+NL_BATCH_MAX_ITEMS = int(os.getenv('NL_BATCH_MAX_ITEMS', '500'))
+
+@app.post("/api/natural-query/batch")
+async def process_natural_query_batch(request: Dict[str, Any]):
+    """
+    Translate and run many natural language queries in one request
+    Body: {"queries": [...], "farmer_id": optional, "execute": true, "concurrency": optional (1..NL_BATCH_CONCURRENCY)}
+    Only SELECTs are executed in a batch; generated writes are returned unexecuted.
+    """
+    queries = request.get("queries") or []
+    if not isinstance(queries, list) or not all(isinstance(q, str) and q.strip() for q in queries):
+        return JSONResponse(status_code=400, content={"error": "queries must be a list of non-empty strings"})
+    if not queries:
+        return {"error": "No queries provided"}
+    if len(queries) > NL_BATCH_MAX_ITEMS:
+        return JSONResponse(status_code=400, content={"error": f"At most {NL_BATCH_MAX_ITEMS} queries per batch"})
+    
+    concurrency = request.get("concurrency")
+    try:
+        concurrency = NL_BATCH_CONCURRENCY if concurrency is None else int(concurrency)
+    except (TypeError, ValueError, OverflowError):
+        concurrency = 0
+    if concurrency < 1:
+        return JSONResponse(status_code=400, content={"error": "concurrency must be a positive integer"})
+    # Callers can lower the parallelism, never raise it above the server-side cap
+    concurrency = min(concurrency, NL_BATCH_CONCURRENCY)
+    
+    started = time.perf_counter()
+    farmer_context = await _load_farmer_context(request.get("farmer_id"))
+    items = await process_natural_language_batch(queries, farmer_context, concurrency)
+    translated_at = time.perf_counter()
+    
+    if request.get("execute", True):
+        # Each distinct SQL runs once, on pooled connections, bounded like the translations
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        executions: Dict[str, Dict[str, Any]] = {}
+        
+        async def execute(sql_query: str):
+            async with semaphore:
+                item_started = time.perf_counter()
+                execution = await _execute_llm_sql(sql_query, allow_writes=False)
+                execution["execute_ms"] = round((time.perf_counter() - item_started) * 1000, 1)
+                executions[sql_query] = execution
+        
+        distinct_sql = {item["sql_query"] for item in items if item.get("ready_to_execute") and item.get("sql_query")}
+        await asyncio.gather(*(execute(sql_query) for sql_query in distinct_sql))
+        for item in items:
+            if item.get("sql_query") in executions:
+                item["execution_result"] = executions[item["sql_query"]]
+    
+    elapsed = time.perf_counter() - started
+    return {
+        "status": "success",
+        "count": len(items),
+        "unique_queries": sum(1 for item in items if "duplicate_of" not in item),
+        "succeeded": sum(1 for item in items if item.get("status") == "success"),
+        "cached": sum(1 for item in items if item.get("cached")),
+        "translate_ms": round((translated_at - started) * 1000, 1),
+        "total_ms": round(elapsed * 1000, 1),
+        "items": [{"index": index, **item} for index, item in enumerate(items)]
+    }
+
+@app.post("/api/natural-query/stream")
+async def stream_natural_query(request: Dict[str, Any]):
+    """
+    Server-Sent Events variant of /api/natural-query
+    Stages: received, intent, sql_token..., sql, execution_start, columns, rows..., complete | execution_result, done
+    """
+    query = request.get("query", "")
+    farmer_id = request.get("farmer_id")
+    
+    async def events():
+        yield "received", {"query": query}
+        if not query:
+            yield "error", {"error": "No query provided"}
+            return
+        
+        farmer_context = await _load_farmer_context(farmer_id)
+        llm_result = None
+        async for event, data in stream_natural_language_query(query, farmer_context):
+            yield event, data
+            if event == "sql":
+                llm_result = data
+        if not llm_result or not (llm_result.get("ready_to_execute") and llm_result.get("sql_query")):
+            return
+        
+        sql_query = llm_result["sql_query"]
+        operation_type = statement_type(sql_query)
+        refusal = _unsafe_modification(sql_query, operation_type)
+        if refusal:
+            yield "execution_result", refusal
+            return
+        
         try:
-            # Use the synchronous connection that works
-            with get_constitutional_db_connection() as conn:
-                if conn:
-                    # Execute the query synchronously
-                    cursor = conn.cursor()
-                    sql_query = llm_result["sql_query"]
-                    sql_upper = sql_query.strip().upper()
-                    
-                    # Determine operation type
-                    operation_type = "SELECT"
-                    if sql_upper.startswith('INSERT'):
-                        operation_type = "INSERT"
-                    elif sql_upper.startswith('UPDATE'):
-                        operation_type = "UPDATE"
-                    elif sql_upper.startswith('DELETE'):
-                        operation_type = "DELETE"
-                    elif sql_upper.startswith('BEGIN'):
-                        operation_type = "TRANSACTION"
-                    
-                    # Safety check for UPDATE/DELETE
-                    if operation_type in ['UPDATE', 'DELETE'] and 'WHERE' not in sql_upper:
-                        llm_result["execution_result"] = {
-                            "status": "error",
-                            "error": f"{operation_type} without WHERE clause is too dangerous",
-                            "requires_confirmation": True,
-                            "operation_type": operation_type
-                        }
-                    else:
-                        try:
-                            cursor.execute(sql_query)
-                            
-                            if operation_type == "SELECT":
-                                # Get column names
-                                columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                                
-                                # Fetch all results
-                                rows = cursor.fetchall()
-                                
-                                # Convert to list of dicts
-                                data = []
-                                for row in rows:
-                                    data.append(dict(zip(columns, row)))
-                                
-                                llm_result["execution_result"] = {
-                                    "status": "success",
-                                    "operation_type": operation_type,
-                                    "row_count": len(rows),
-                                    "data": data
-                                }
-                            else:
-                                # For INSERT, UPDATE, DELETE
-                                conn.commit()  # Important: commit the transaction
-                                affected_rows = cursor.rowcount
-                                
-                                llm_result["execution_result"] = {
-                                    "status": "success",
-                                    "operation_type": operation_type,
-                                    "affected_rows": affected_rows,
-                                    "message": f"{operation_type} executed successfully"
-                                }
-                        except StopIteration:
-                            # Handle generator issue specifically
-                            llm_result["execution_result"] = {
-                                "status": "error",
-                                "error": "Query execution failed due to generator issue. Try rephrasing the query.",
-                                "suggestion": "Use a simpler INSERT statement or check farmer ID manually."
-                            }
-                        except GeneratorExit:
-                            # Handle generator exit issue
-                            llm_result["execution_result"] = {
-                                "status": "error", 
-                                "error": "Query execution interrupted. Try a simpler query format.",
-                                "suggestion": "Use direct INSERT with known farmer ID instead of subquery."
-                            }
-                else:
-                    llm_result["execution_result"] = {"error": "Database connection failed"}
+            async with async_acquire() as conn:
+                decision = await query_admission.admit(conn, sql_query)
+            if not decision["admitted"]:
+                yield "execution_result", _admission_rejected(decision)
+                return
+            
+            yield "execution_start", {"operation_type": operation_type, "admission": decision_summary(decision)}
+            if operation_type == "SELECT":
+                async for event, data in stream_select_rows(decision["sql"], statement_timeout_ms=query_admission.timeout_ms):
+                    yield event, data
+            else:
+                async with async_acquire() as conn:
+                    yield "execution_result", await _execute_llm_modification(conn, decision)
+        except (ConnectionError, OSError):
+            yield "execution_result", {"error": "Database connection failed"}
         except Exception as e:
-            llm_result["execution_result"] = {"error": f"Execution error: {str(e)}"}
+            yield "execution_result", {"error": f"Execution error: {str(e)}"}
     
-    return llm_result
+    return sse_response(events())
 
 @app.get("/api/test-mango-compliance")
 async def test_mango_compliance():
@@ -4922,6 +5543,8 @@ async def save_standard_query(request: Dict[str, Any]):
                 
                 query_id = cursor.fetchone()[0]
                 conn.commit()
+                # A farmer at the limit may have had a query evicted
+                await standard_query_runner.invalidate()
                 
                 # Verify the save
                 cursor.execute("SELECT query_name, is_global, farmer_id FROM standard_queries WHERE id = %s", (query_id,))
@@ -5049,6 +5672,7 @@ async def delete_standard_query(query_id: int):
                 conn.commit()
                 
                 if cursor.rowcount > 0:
+                    await standard_query_runner.invalidate(query_id)
                     print(f"SUCCESS: Deleted standard query {query_id}")
                     return {"status": "success"}
                 else:
@@ -5064,93 +5688,63 @@ async def delete_standard_query(query_id: int):
         return {"error": f"Failed to delete query: {str(e)}"}
 
 @app.post("/api/run-standard-query/{query_id}")
-async def run_standard_query(query_id: int):
-    """Execute a saved standard query and increment usage count"""
+async def run_standard_query(query_id: int, farmer_id: int = None, date_from: date = None,
+                             date_to: date = None, refresh: bool = False):
+    """Execute a saved standard query (prepared, optionally cached); usage is counted in the background"""
+    params = {"farmer_id": farmer_id, "date_from": date_from, "date_to": date_to}
+    try:
+        result = await standard_query_runner.run(query_id, params, use_cache=not refresh)
+        print(f"SUCCESS: Executed standard query {query_id}, returned {result['row_count']} rows "
+              f"in {result['elapsed_ms']}ms{' (cached)' if result['cached'] else ''}")
+        return result
+    except StandardQueryError as e:
+        print(f"WARNING: Standard query {query_id}: {e}")
+        return {"error": str(e)}
+    except asyncpg.PostgresError as e:
+        print(f"ERROR: Failed to execute query: {e}")
+        return {"error": f"Query execution failed: {str(e)}"}
+    except Exception as e:
+        print(f"ERROR: Run standard query exception: {e}")
+        return {"error": f"Failed to run query: {str(e)}"}
+
+@app.get("/api/run-standard-query/{query_id}/export")
+async def export_standard_query(query_id: int, format: str = "csv", farmer_id: int = None,
+                                date_from: date = None, date_to: date = None):
+    """Stream a saved standard query's full result as CSV, NDJSON or Parquet"""
     try:
         with get_constitutional_db_connection() as conn:
             if not conn:
-                print("ERROR: Database connection failed in run_standard_query")
-                return {"error": "Database connection failed"}
-            
+                return JSONResponse(status_code=500, content={"error": "Database connection failed"})
             cursor = conn.cursor()
-            
-            # Check if table exists first
-            try:
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = 'standard_queries'
-                    )
-                """)
-                if not cursor.fetchone()[0]:
-                    print("ERROR: standard_queries table does not exist")
-                    return {"error": "Standard queries table not found. Please run migration."}
-            except Exception as e:
-                print(f"ERROR: Failed to check table existence: {e}")
-                return {"error": f"Failed to verify table: {str(e)}"}
-            
-            # Get the query
-            try:
-                cursor.execute(
-                    "SELECT sql_query, query_name FROM standard_queries WHERE id = %s",
-                    (query_id,)
-                )
-                result = cursor.fetchone()
-                
-                if not result:
-                    print(f"WARNING: Standard query {query_id} not found")
-                    return {"error": "Query not found"}
-                
-                sql_query, query_name = result
-                print(f"DEBUG: Running standard query '{query_name}': {sql_query[:100]}...")
-                
-            except psycopg2.Error as e:
-                print(f"ERROR: Failed to fetch query: {e}")
-                return {"error": f"Failed to fetch query: {str(e)}"}
-            
-            # Update usage count
-            try:
-                cursor.execute(
-                    "UPDATE standard_queries SET usage_count = usage_count + 1 WHERE id = %s",
-                    (query_id,)
-                )
-            except Exception as e:
-                print(f"WARNING: Failed to update usage count: {e}")
-                # Continue anyway, this is not critical
-            
-            # Execute the query
-            try:
-                cursor.execute(sql_query)
-                
-                # Get results
-                columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                rows = cursor.fetchall()
-                
-                # Convert to list of dicts
-                data = []
-                for row in rows:
-                    data.append(dict(zip(columns, row)))
-                
-                conn.commit()
-                
-                print(f"SUCCESS: Executed standard query {query_id}, returned {len(rows)} rows")
-                return {
-                    "status": "success",
-                    "query_name": query_name,
-                    "row_count": len(rows),
-                    "data": data,
-                    "sql_query": sql_query
-                }
-                
-            except psycopg2.Error as e:
-                conn.rollback()
-                print(f"ERROR: Failed to execute query: {e}")
-                return {"error": f"Query execution failed: {str(e)}"}
-                
+            cursor.execute(
+                "SELECT sql_query, query_name FROM standard_queries WHERE id = %s",
+                (query_id,)
+            )
+            result = cursor.fetchone()
+            cursor.close()
+        
+        if not result:
+            return JSONResponse(status_code=404, content={"error": "Query not found"})
+        
+        sql_query, query_name = result
+        params = None
+        names = set(PARAMETER_PATTERN.findall(sql_query))
+        if names:
+            supplied = {"farmer_id": farmer_id, "date_from": date_from, "date_to": date_to}
+            missing = sorted(name for name in names if supplied[name] is None)
+            if missing:
+                return JSONResponse(status_code=400, content={"error": f"Missing parameter(s): {', '.join(missing)}"})
+            sql_query = to_pyformat(sql_query)
+            params = {name: coerce_parameter(name, supplied[name]) for name in names}
+        stream = ExportStream(get_constitutional_db_connection, sql_query, params=params, fmt=format)
+        await run_in_threadpool(stream.start)
+        filename = re.sub(r'[^A-Za-z0-9_-]+', '_', query_name or f"standard_query_{query_id}")
+        return stream.response(filename)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        print(f"ERROR: Run standard query exception: {e}")
-        return {"error": f"Failed to run query: {str(e)}"}
+        print(f"ERROR: Export standard query exception: {e}")
+        return JSONResponse(status_code=500, content={"error": f"Failed to export query: {str(e)}"})
 
 @app.get("/api/test-standard-queries-table")
 async def test_standard_queries_table():
@@ -5294,7 +5888,8 @@ async def initialize_standard_queries():
                         created_at TIMESTAMP DEFAULT NOW(),
                         farmer_id INTEGER REFERENCES farmers(id) ON DELETE CASCADE,
                         usage_count INTEGER DEFAULT 0,
-                        is_global BOOLEAN DEFAULT FALSE
+                        is_global BOOLEAN DEFAULT FALSE,
+                        cache_ttl_seconds INTEGER
                     )
                 """)
                 
@@ -5311,6 +5906,7 @@ async def initialize_standard_queries():
                 """)
                 
                 conn.commit()
+                await standard_query_runner.invalidate()
                 
                 print("SUCCESS: Created standard_queries table and added default queries")
                 return {
@@ -5967,6 +6563,7 @@ async def register_fields(request: Request):
 
 # API: Get all farmers
 @app.get("/api/farmers")
+@cached_response(ttl=30, stale_ttl=120, tags=("farmers", "fields"))
 async def get_farmers():
     """Get list of all farmers for selection"""
     try:
@@ -6012,7 +6609,8 @@ async def get_farmers():
                 })
             
             cursor.close()
-            return JSONResponse(content={"success": True, "farmers": farmers})
+            # Plain dict so the response cache can keep it (mock/error paths stay uncached)
+            return {"success": True, "farmers": farmers}
             
     except Exception as e:
         logger.error(f"Error fetching farmers: {str(e)}")
@@ -6064,6 +6662,7 @@ async def get_farmer_details(farmer_id: int):
 
 # API: Register new field
 @app.post("/api/fields")
+@invalidates("fields")
 async def register_field(request: Request):
     """Register a new field for a farmer"""
     try:
@@ -6086,14 +6685,9 @@ async def register_field(request: Request):
             cursor = conn.cursor()
             
             # Check which column name to use for area
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name = 'fields' 
-                AND column_name IN ('area_hectares', 'area_ha')
-                LIMIT 1
-            """)
-            area_column = cursor.fetchone()
-            area_col_name = area_column[0] if area_column else 'area_ha'
+            area_col_name = schema_catalog.first_existing_column(
+                'fields', ('area_hectares', 'area_ha'), default='area_ha', conn=conn
+            )
             
             # Insert field
             cursor.execute(f"""
@@ -6157,14 +6751,9 @@ async def get_farmer_fields(farmer_id: int):
             cursor = conn.cursor()
             
             # Check which column name exists
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name = 'fields' 
-                AND column_name IN ('area_hectares', 'area_ha')
-                LIMIT 1
-            """)
-            area_column = cursor.fetchone()
-            area_col_name = area_column[0] if area_column else 'area_ha'
+            area_col_name = schema_catalog.first_existing_column(
+                'fields', ('area_hectares', 'area_ha'), default='area_ha', conn=conn
+            )
             
             cursor.execute(f"""
                 SELECT id, field_name, {area_col_name} as area_hectares, location
@@ -6194,6 +6783,7 @@ async def get_farmer_fields(farmer_id: int):
 
 # API: Register new task
 @app.post("/api/tasks")
+@invalidates("tasks")
 async def register_task_api(request: Request):
     """Register a new task for fields"""
     try:
@@ -6216,12 +6806,7 @@ async def register_task_api(request: Request):
             cursor = conn.cursor()
             
             # Check if tasks table has required columns
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'tasks'
-            """)
-            existing_columns = [row[0] for row in cursor.fetchall()]
+            existing_columns = schema_catalog.columns('tasks', conn)
             
             # Build INSERT query based on available columns
             base_columns = ['farmer_id', 'field_id', 'description', 'task_date']
@@ -6380,6 +6965,7 @@ async def get_machinery_schema():
 
 # API: Register new machinery
 @app.post("/api/machinery")
+@invalidates("machinery")
 async def register_machinery_api(request: Request):
     """Register new machinery/equipment"""
     try:
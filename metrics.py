@@ -0,0 +1,362 @@
+"""
+OpenMetrics Instrumentation
+Dependency-free counters, gauges and histograms with a request middleware and a /metrics endpoint for every FastAPI app
+"""
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Response
+
+logger = logging.getLogger(__name__)
+
+# Prefix for every exported metric name
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'ava')
+
+# Set to "false" to leave /metrics off an app (the middleware still records)
+METRICS_ENDPOINT_ENABLED = os.getenv('METRICS_ENDPOINT_ENABLED', 'true').lower() == 'true'
+
+# Latency buckets in seconds: requests and LLM calls are slower than single queries
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Frames from these files are plumbing, not the code that issued a query
+_PLUMBING_FILES = ("async_database.py", "database_pool.py", "metrics.py", "sql_profiler.py")
+_PLUMBING_DIRS = ("site-packages", "dist-packages", os.path.dirname(os.__file__))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric family: one value (or histogram) per label combination"""
+
+    type = "unknown"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# TYPE {self.name} {self.type}", f"# HELP {self.name} {_escape(self.documentation)}"]
+        return lines + self.samples()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., sum]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(round(state[-1], 6))}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metric families plus scrape-time collectors.
+
+    Instrumented code updates counters and histograms directly. Components
+    that already keep a ``get_stats()`` dict (pools, caches, LLM gateway,
+    write-behind buffers) are exported through stats sources instead: at
+    scrape time their numeric values become gauges named
+    ``<namespace>_<source>_<key>``. A source is only read if its module has
+    been imported by this process, so a dashboard never pays for
+    components it doesn't use.
+    """
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self.metrics: Dict[str, Metric] = {}
+        self.stats_sources: Dict[str, Tuple[str, str]] = {}
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Iterable[str], **kwargs) -> Any:
+        full_name = f"{self.namespace}_{name}"
+        with self._lock:
+            if full_name not in self.metrics:
+                self.metrics[full_name] = cls(full_name, documentation, labelnames, **kwargs)
+            return self.metrics[full_name]
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = REQUEST_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_stats_source(self, name: str, module: str, attribute: str):
+        """Export module.attribute() (a stats dict getter, dotted for methods) when module is loaded"""
+        self.stats_sources[name] = (module, attribute)
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Callable returning ready-made exposition lines, run on every scrape"""
+        self.collectors.append(collector)
+
+    # ---- exposition ------------------------------------------------------
+
+    def _flatten(self, prefix: str, stats: Dict[str, Any]) -> Iterable[Tuple[str, float]]:
+        for key, value in stats.items():
+            name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}".lower()
+            if isinstance(value, bool):
+                yield name, int(value)
+            elif isinstance(value, (int, float)):
+                yield name, value
+            elif isinstance(value, dict):
+                yield from self._flatten(name, value)
+
+    def _render_stats_source(self, name: str, module_name: str, attribute: str) -> List[str]:
+        module = sys.modules.get(module_name)
+        if module is None:
+            return []
+        getter: Any = module
+        for part in attribute.split("."):
+            getter = getattr(getter, part)
+        lines = []
+        for metric_name, value in self._flatten(f"{self.namespace}_{name}", getter()):
+            lines += [f"# TYPE {metric_name} gauge", f"{metric_name} {_format_value(value)}"]
+        return lines
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines += metric.render()
+        for name, (module_name, attribute) in self.stats_sources.items():
+            try:
+                lines += self._render_stats_source(name, module_name, attribute)
+            except Exception as e:
+                # Constitutional fallback: one broken source must not fail the scrape
+                logger.warning(f"Metrics stats source '{name}' failed: {e}")
+        for collector in self.collectors:
+            try:
+                lines += list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+# Global registry shared by every app and component in the process
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("app", "method", "route", "status"), REQUEST_BUCKETS)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served", ("app",))
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "Database statement latency by driver and Python call site",
+    ("driver", "call_site"), QUERY_BUCKETS)
+DB_QUERY_ERRORS = registry.counter("db_query_errors", "Database statements that raised", ("driver", "call_site"))
+LLM_REQUEST_SECONDS = registry.histogram(
+    "llm_request_duration_seconds", "LLM gateway call latency (including queueing for a slot)", ("outcome",), LLM_BUCKETS)
+LLM_TOKENS = registry.counter("llm_tokens", "LLM tokens reported by the API", ("kind",))
+
+for _name, _module, _attribute in [
+    ("async_pool", "async_database", "get_async_pool_stats"),
+    ("db_pool", "database_pool", "get_pool_stats"),
+    ("llm_gateway", "llm_gateway", "llm_gateway.get_stats"),
+    ("response_cache", "response_cache", "response_cache.get_stats"),
+    ("translation_cache", "nl_sql_cache", "translation_cache.get_stats"),
+    ("schema_catalog", "schema_catalog", "schema_catalog.get_stats"),
+    ("sql_admission", "sql_admission", "query_admission.get_stats"),
+    ("standard_queries", "standard_queries", "standard_query_runner.get_stats"),
+    ("write_behind", "write_behind", "get_write_behind_stats"),
+    ("cost_analytics", "cost_analytics", "cost_analytics.get_stats"),
+    ("sql_profiler", "sql_profiler", "sql_profiler.get_stats"),
+]:
+    registry.add_stats_source(_name, _module, _attribute)
+
+
+def _http_client_lines() -> Iterable[str]:
+    """Per-host outbound HTTP metrics, labelled by origin"""
+    module = sys.modules.get("http_clients")
+    if module is None:
+        return []
+    hosts = module.http_clients.get_stats()["hosts"]
+    families = {
+        "requests": ("counter", "_total"), "errors": ("counter", "_total"), "short_circuited": ("counter", "_total"),
+        "avg_ms": ("gauge", ""), "p95_ms": ("gauge", "")
+    }
+    lines = []
+    for key, (kind, suffix) in families.items():
+        name = f"{registry.namespace}_http_client_{key}"
+        lines.append(f"# TYPE {name} {kind}")
+        for origin, stats in hosts.items():
+            if stats.get(key) is not None:
+                lines.append(f'{name}{suffix}{{host="{_escape(origin)}"}} {_format_value(stats[key])}')
+    name = f"{registry.namespace}_http_client_circuit_open"
+    lines.append(f"# TYPE {name} gauge")
+    for origin, stats in hosts.items():
+        lines.append(f'{name}{{host="{_escape(origin)}"}} {int(stats["circuit"]["state"] != "closed")}')
+    return lines
+
+
+registry.add_collector(_http_client_lines)
+
+
+# ---- call sites ----------------------------------------------------------
+
+def call_site(skip: int = 1) -> Tuple[str, str, int]:
+    """(file, function, line) of the nearest application frame outside DB plumbing and libraries"""
+    frame = sys._getframe(skip + 1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.endswith(_PLUMBING_FILES) and not filename.startswith("<") \
+                and not any(part in filename for part in _PLUMBING_DIRS):
+            return os.path.basename(filename), frame.f_code.co_name, frame.f_lineno
+        frame = frame.f_back
+    return "unknown", "unknown", 0
+
+
+def observe_query(driver: str, site: Tuple[str, str, int], seconds: float, failed: bool = False):
+    """Record one statement; labelled by file:function so line edits don't reset series"""
+    label = f"{site[0]}:{site[1]}"
+    DB_QUERY_SECONDS.observe(seconds, driver=driver, call_site=label)
+    if failed:
+        DB_QUERY_ERRORS.inc(driver=driver, call_site=label)
+
+
+# ---- ASGI ----------------------------------------------------------------
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request.
+
+    Latency is labelled with the matched route template (``/api/farmers/{id}``),
+    not the raw path, so series stay bounded. Unmatched paths share one
+    ``unmatched`` label.
+    """
+
+    def __init__(self, app, app_name: str = "app"):
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(app=self.app_name)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(app=self.app_name)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, app=self.app_name, method=scope["method"],
+                route=getattr(route, "path", "unmatched"), status=status["code"])
+
+
+def metrics_response() -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+def instrument_app(app, app_name: Optional[str] = None):
+    """Add the request-timing middleware and a GET /metrics endpoint to a FastAPI app"""
+    app.add_middleware(MetricsMiddleware, app_name=app_name or app.title)
+    if METRICS_ENDPOINT_ENABLED:
+        app.add_api_route("/metrics", metrics_response, methods=["GET"], include_in_schema=False)
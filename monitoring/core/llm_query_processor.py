@@ -8,9 +8,10 @@ NO HARDCODED PATTERNS - PURE LLM INTELLIGENCE
 import json
 import logging
 from typing import Dict, Any
-import os
 import re
-from dotenv import load_dotenv
+
+from nl_sql_cache import translation_cache, fingerprint
+from llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +35,7 @@ class LLMQueryProcessor:
         if schema:
             self.schema_context = schema
         
-    def process_natural_query(self, user_query: str, user_language_preference: str = "auto") -> Dict[str, Any]:
+    async def process_natural_query(self, user_query: str, user_language_preference: str = "auto") -> Dict[str, Any]:
         """
         Constitutional compliance: LLM-FIRST approach
         NO hardcoded patterns - AI handles everything
@@ -77,10 +78,18 @@ For crop queries, search field_crops table.
 For task queries, search tasks table.
 """
 
+        # Same question against the same schema context -> cached translation
+        schema_version = fingerprint(self.schema_context)
+        cached = translation_cache.lookup("llm_query_processor", user_query, schema_version)
+        if cached:
+            return {**cached, "cached": True}
+
         try:
             # Try to use actual LLM if available
-            result = self._call_llm(constitutional_prompt)
+            result = await self._call_llm(constitutional_prompt)
             if result:
+                if result.get("success"):
+                    translation_cache.store("llm_query_processor", user_query, schema_version, result, result.get("sql"))
                 return result
         except Exception as e:
             logger.warning(f"LLM call failed: {e}")
@@ -89,7 +98,7 @@ For task queries, search tasks table.
         # Fallback uses simple intelligence instead of hardcoded patterns
         return self._intelligent_fallback(user_query)
     
-    def process_modification_query(self, user_query: str, user_language_preference: str = "auto") -> Dict[str, Any]:
+    async def process_modification_query(self, user_query: str, user_language_preference: str = "auto") -> Dict[str, Any]:
         """
         Process INSERT/UPDATE/DELETE queries with same LLM approach
         """
@@ -123,7 +132,7 @@ Examples:
 """
 
         try:
-            result = self._call_llm(constitutional_prompt)
+            result = await self._call_llm(constitutional_prompt)
             if result:
                 return result
         except Exception as e:
@@ -131,43 +140,25 @@ Examples:
         
         return self._intelligent_modification_fallback(user_query)
     
-    def _call_llm(self, prompt: str) -> Dict[str, Any]:
+    async def _call_llm(self, prompt: str) -> Dict[str, Any]:
         """
-        Constitutional: Centralized LLM communication using OpenAI GPT-4
+        Constitutional: Centralized LLM communication through the shared async gateway
         """
-        from dotenv import load_dotenv
-        
-        # Load environment variables
-        load_dotenv()
-        api_key = os.getenv('OPENAI_API_KEY')
-        
-        if not api_key or api_key == 'sk-your-key-here':
+        if not llm_gateway.available:
             logger.warning("OpenAI API key not configured properly in .env file")
             return None
         
         try:
-            # Call GPT-4 with the constitutional prompt (v1.0+ syntax)
-            from openai import OpenAI
-            client = OpenAI(api_key=api_key)
-            
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert agricultural database query assistant. Always return valid JSON only."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.1,  # Low temperature for consistent SQL generation
-                max_tokens=500
-            )
-            
-            # Extract and parse the response
-            content = response.choices[0].message.content
+            content = await llm_gateway.chat([
+                {
+                    "role": "system",
+                    "content": "You are an expert agricultural database query assistant. Always return valid JSON only."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ], temperature=0.1, max_tokens=500)  # Low temperature for consistent SQL generation
             
             # Try to parse as JSON
             try:
@@ -177,7 +168,6 @@ Examples:
                     return result
             except json.JSONDecodeError:
                 # If JSON parsing fails, try to extract JSON from the response
-                import re
                 json_match = re.search(r'\{.*\}', content, re.DOTALL)
                 if json_match:
                     try:
@@ -239,7 +229,7 @@ Examples:
         return 'unknown'
 
 
-def test_constitutional_compliance():
+async def test_constitutional_compliance():
     """Test that the implementation follows constitutional principles"""
     processor = LLMQueryProcessor()
     
@@ -257,7 +247,7 @@ def test_constitutional_compliance():
     print("=" * 50)
     
     for query, expected_lang in test_cases:
-        result = processor.process_natural_query(query)
+        result = await processor.process_natural_query(query)
         
         # Constitutional requirements
         assert result["success"] == True, f"Query must always succeed: {query}"
@@ -276,4 +266,5 @@ def test_constitutional_compliance():
 
 
 if __name__ == "__main__":
-    test_constitutional_compliance()
\ No newline at end of file
+    import asyncio
+    asyncio.run(test_constitutional_compliance())
\ No newline at end of file
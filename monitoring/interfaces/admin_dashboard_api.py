@@ -12,6 +12,10 @@ import traceback
 from monitoring.core.llm_query_processor import LLMQueryProcessor
 from monitoring.core.response_formatter import ResponseFormatter
 from database_operations import DatabaseOperations
+from async_database import register_async_pool, fetch as async_fetch
+from llm_gateway import register_llm_gateway
+from nl_sql_cache import register_translation_cache
+from metrics import instrument_app
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +25,10 @@ app = FastAPI(
     description="Constitutional API for agricultural database management",
     version="2.0.0"
 )
+register_async_pool(app)
+register_llm_gateway(app)
+register_translation_cache(app)
+instrument_app(app, "admin_dashboard_api")
 
 # Initialize processors
 llm_processor = LLMQueryProcessor()
@@ -64,36 +72,29 @@ async def process_natural_query(
     """
     try:
         # Process with LLM intelligence
-        result = llm_processor.process_natural_query(query, language)
+        result = await llm_processor.process_natural_query(query, language)
         
         # Execute SQL if valid
         if result.get('sql') and not result['sql'].startswith('--'):
-            with db_ops.get_session() as session:
-                from sqlalchemy import text
-                db_result = session.execute(text(result['sql']))
+            # Fetch results based on query type
+            if result.get('query_type') == 'select':
+                rows = await async_fetch(result['sql'])
                 
-                # Fetch results based on query type
-                if result.get('query_type') == 'select':
-                    rows = db_result.fetchall()
-                    columns = list(db_result.keys())
-                    
-                    # Convert to dict format
-                    data = []
-                    for row in rows:
-                        data.append(dict(zip(columns, row)))
-                    
-                    # Format results
-                    formatted = formatter.format_results(
-                        data, 
-                        query, 
-                        result.get('detected_language', 'en')
-                    )
-                    
-                    return {
-                        "success": True,
-                        "query": result,
-                        "results": formatted
-                    }
+                # Convert to dict format
+                data = [dict(row) for row in rows]
+                
+                # Format results
+                formatted = formatter.format_results(
+                    data, 
+                    query, 
+                    result.get('detected_language', 'en')
+                )
+                
+                return {
+                    "success": True,
+                    "query": result,
+                    "results": formatted
+                }
         
         return {
             "success": False,
@@ -128,7 +129,7 @@ async def modify_data(
     """
     try:
         # Process modification query
-        result = llm_processor.process_modification_query(query, language)
+        result = await llm_processor.process_modification_query(query, language)
         
         if result.get('sql') and not result['sql'].startswith('--'):
             with db_ops.get_session() as session:
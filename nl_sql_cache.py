@@ -0,0 +1,332 @@
+"""
+Natural Language to SQL Translation Cache
+Shared NL->SQL cache keyed by normalized query + schema version, with optional embedding lookup for paraphrases
+"""
+import os
+import re
+import json
+import math
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from sql_admission import statement_type, is_single_statement
+
+logger = logging.getLogger(__name__)
+
+NL_CACHE_ENABLED = os.getenv('NL_CACHE_ENABLED', 'true').lower() == 'true'
+NL_CACHE_MAX_ENTRIES = int(os.getenv('NL_CACHE_MAX_ENTRIES', '2000'))
+NL_CACHE_TTL = float(os.getenv('NL_CACHE_TTL', str(7 * 24 * 3600)))
+
+# SQLite file that keeps translations across restarts ("" disables persistence); opened on app startup
+NL_CACHE_PATH = os.getenv('NL_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nl_sql_cache.sqlite3'))
+
+# How often new translations and hit counts are written to the file
+NL_CACHE_FLUSH_SECONDS = float(os.getenv('NL_CACHE_FLUSH_SECONDS', '5'))
+
+# Paraphrase matching via embeddings (read-only SQL only)
+NL_CACHE_EMBEDDINGS = os.getenv('NL_CACHE_EMBEDDINGS', 'false').lower() == 'true'
+NL_CACHE_EMBEDDING_MODEL = os.getenv('NL_CACHE_EMBEDDING_MODEL', 'text-embedding-3-small')
+NL_CACHE_SIMILARITY = float(os.getenv('NL_CACHE_SIMILARITY', '0.95'))
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS nl_sql_cache (
+        cache_key TEXT PRIMARY KEY,
+        namespace TEXT NOT NULL,
+        schema_version TEXT NOT NULL,
+        normalized_query TEXT NOT NULL,
+        context TEXT NOT NULL,
+        read_only INTEGER NOT NULL,
+        result TEXT NOT NULL,
+        embedding TEXT,
+        created_at REAL NOT NULL,
+        last_hit_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Case/width/whitespace-insensitive form: 'How many farmers?' == 'how  many FARMERS'"""
+    text = unicodedata.normalize('NFKC', query or '').casefold()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.strip(' ?!.;:¿¡')
+
+
+def fingerprint(value: Any) -> str:
+    """Short stable hash for schema text, farmer context, etc."""
+    if value is None:
+        return "none"
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(value.encode()).hexdigest()[:12]
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def is_read_only_sql(sql: Optional[str]) -> bool:
+    return bool(sql) and statement_type(sql) == "SELECT" and is_single_statement(sql)
+
+
+class TranslationCache:
+    """
+    LRU + TTL cache of NL->SQL translations, persisted to SQLite.
+
+    Entries are namespaced by translator (each returns its own result shape)
+    and keyed by normalized query, schema version and request context, so a
+    schema change naturally misses. When an embedding is supplied, lookups
+    that miss exactly fall back to the most similar cached query in the
+    same namespace/schema/context. Only read-only SQL is cached: a cache
+    hit is returned ready to execute, so a cached INSERT/UPDATE/DELETE
+    would silently run the old write again.
+
+    Lookups and stores only touch memory. The SQLite file is opened by
+    ``open()`` on app startup, and a writer thread flushes new entries and
+    hit counts in batches, so request handlers never wait on disk I/O.
+    """
+
+    def __init__(self, path: str = NL_CACHE_PATH, max_entries: int = NL_CACHE_MAX_ENTRIES,
+                 ttl: float = NL_CACHE_TTL, enabled: bool = NL_CACHE_ENABLED):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._opened = False
+        # Rows to upsert / delete on the next background flush
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._deleted: Set[str] = set()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "flushes": 0}
+
+    # ---- persistence -----------------------------------------------------
+
+    def open(self):
+        """Load persisted translations and start the writer thread (blocking; call from a worker thread)"""
+        if self._opened or not self.enabled or not self.path:
+            return
+        self._opened = True
+        try:
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            db.execute(CREATE_TABLE_SQL)
+            db.execute("DELETE FROM nl_sql_cache WHERE created_at < ? OR read_only = 0", (time.time() - self.ttl,))
+            db.commit()
+            rows = db.execute(
+                "SELECT cache_key, namespace, schema_version, normalized_query, context, read_only, "
+                "result, embedding, created_at, hits, last_hit_at FROM nl_sql_cache ORDER BY last_hit_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+        except Exception as e:
+            # Constitutional fallback: memory-only cache
+            logger.warning(f"NL->SQL cache persistence unavailable: {e}")
+            return
+
+        with self._lock:
+            # Translations cached before the store opened are written with the first flush
+            self._dirty.update(self._entries)
+            for row in rows:
+                if row[0] in self._entries or len(self._entries) >= self.max_entries:
+                    continue
+                self._entries[row[0]] = {
+                    "namespace": row[1],
+                    "schema_version": row[2],
+                    "normalized_query": row[3],
+                    "context": row[4],
+                    "read_only": bool(row[5]),
+                    "result": json.loads(row[6]),
+                    "embedding": json.loads(row[7]) if row[7] else None,
+                    "created_at": row[8],
+                    "hits": row[9],
+                    "last_hit_at": row[10]
+                }
+                self._entries.move_to_end(row[0], last=False)
+            self._db = db
+        self._writer = threading.Thread(target=self._run_writer, name="nl-sql-cache-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"NL->SQL cache loaded {len(rows)} translations from {self.path}")
+
+    def _persist(self, key: str, entry: Dict[str, Any]):
+        """Queue an upsert (caller holds self._lock)"""
+        if self._db is None:
+            return
+        self._deleted.discard(key)
+        self._dirty[key] = entry
+
+    def _forget(self, keys: List[str]):
+        """Queue deletes (caller holds self._lock)"""
+        if self._db is None:
+            return
+        for key in keys:
+            self._dirty.pop(key, None)
+            self._deleted.add(key)
+
+    def _touch(self, key: str, entry: Dict[str, Any]):
+        """Count a hit; the new count reaches SQLite with the next flush (caller holds self._lock)"""
+        entry["hits"] += 1
+        entry["last_hit_at"] = time.time()
+        self._persist(key, entry)
+
+    def flush(self):
+        """Write queued upserts and deletes in one transaction"""
+        with self._db_lock:
+            with self._lock:
+                if self._db is None or not (self._dirty or self._deleted):
+                    return
+                dirty, self._dirty = self._dirty, {}
+                deleted, self._deleted = self._deleted, set()
+                rows = [(key, entry["namespace"], entry["schema_version"], entry["normalized_query"],
+                         entry["context"], int(entry["read_only"]),
+                         json.dumps(entry["result"], default=str),
+                         json.dumps(entry["embedding"]) if entry["embedding"] else None,
+                         entry["created_at"], entry.get("last_hit_at") or entry["created_at"], entry["hits"])
+                        for key, entry in dirty.items()]
+            try:
+                self._db.executemany("DELETE FROM nl_sql_cache WHERE cache_key = ?", [(key,) for key in deleted])
+                self._db.executemany("INSERT OR REPLACE INTO nl_sql_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._db.commit()
+                self.stats["flushes"] += 1
+            except Exception as e:
+                logger.warning(f"NL->SQL cache write of {len(rows)} rows failed: {e}")
+
+    def _run_writer(self):
+        while True:
+            self._wake.wait(NL_CACHE_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    # ---- cache API -------------------------------------------------------
+
+    @staticmethod
+    def make_key(namespace: str, query: str, schema_version: str, context: Any = None) -> str:
+        return fingerprint([namespace, normalize_query(query), schema_version, fingerprint(context)])
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] > self.ttl
+
+    def lookup(self, namespace: str, query: str, schema_version: str, context: Any = None,
+               embedding: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+        """Cached result for the query (exact, then semantic when an embedding is given)"""
+        if not self.enabled:
+            return None
+        key = self.make_key(namespace, query, schema_version, context)
+        context_hash = fingerprint(context)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._entries.pop(key, None)
+                self._forget([key])
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._touch(key, entry)
+                self.stats["hits"] += 1
+                return entry["result"]
+
+            if embedding:
+                best_key, best_score = None, NL_CACHE_SIMILARITY
+                for candidate_key, candidate in self._entries.items():
+                    if (candidate["namespace"] != namespace or candidate["schema_version"] != schema_version
+                            or candidate["context"] != context_hash or not candidate["read_only"]
+                            or not candidate["embedding"] or self._expired(candidate)):
+                        continue
+                    score = cosine_similarity(embedding, candidate["embedding"])
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+                if best_key is not None:
+                    candidate = self._entries[best_key]
+                    self._entries.move_to_end(best_key)
+                    self._touch(best_key, candidate)
+                    self.stats["semantic_hits"] += 1
+                    logger.info(f"NL->SQL semantic hit ({best_score:.3f}): '{query[:60]}' ~ '{candidate['normalized_query'][:60]}'")
+                    return candidate["result"]
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, namespace: str, query: str, schema_version: str, result: Dict[str, Any], sql: Optional[str],
+              context: Any = None, embedding: Optional[List[float]] = None):
+        """Cache a successful translation; writes are never cached (callers pass the generated SQL to decide)"""
+        if not self.enabled or not is_read_only_sql(sql):
+            return
+        key = self.make_key(namespace, query, schema_version, context)
+        entry = {
+            "namespace": namespace,
+            "schema_version": schema_version,
+            "normalized_query": normalize_query(query),
+            "context": fingerprint(context),
+            "read_only": True,
+            "result": result,
+            "embedding": embedding,
+            "created_at": time.time(),
+            "hits": 0
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            self._persist(key, entry)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self.stats["evictions"] += len(evicted)
+            self._forget(evicted)
+        self._wake.set()
+
+    def clear(self):
+        with self._lock:
+            self._forget(list(self._entries))
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round((self.stats["hits"] + self.stats["semantic_hits"]) / lookups, 3) if lookups else 0.0,
+            "persistent": self._db is not None,
+            "semantic_enabled": NL_CACHE_EMBEDDINGS
+        }
+
+
+async def embed_query(query: str) -> Optional[List[float]]:
+    """Embedding for paraphrase lookups (None when disabled or unavailable)"""
+    if not NL_CACHE_EMBEDDINGS:
+        return None
+    # Imported here: the gateway itself imports normalize_query from this module
+    from llm_gateway import llm_gateway
+    if not llm_gateway.available:
+        return None
+    try:
+        return await llm_gateway.embed(normalize_query(query), NL_CACHE_EMBEDDING_MODEL)
+    except Exception as e:
+        logger.warning(f"Query embedding failed, exact cache lookup only: {e}")
+        return None
+
+
+# Global cache shared by every NL->SQL translator in the process
+translation_cache = TranslationCache()
+
+
+def register_translation_cache(app):
+    """Load the persisted translations on startup and write pending changes on shutdown"""
+    @app.on_event("startup")
+    async def _open_translation_cache():
+        await asyncio.to_thread(translation_cache.open)
+
+    @app.on_event("shutdown")
+    async def _flush_translation_cache():
+        await asyncio.to_thread(translation_cache.flush)
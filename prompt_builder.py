@@ -0,0 +1,1062 @@
+"""
+NL->SQL Prompt Builder
+Schema-aware system prompts: only the tables, guidance and examples relevant to a question, within a token budget
+"""
+import os
+import re
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from nl_sql_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# false -> always send FULL_SYSTEM_PROMPT (baseline for accuracy comparisons)
+PROMPT_COMPACTION = os.getenv('PROMPT_COMPACTION', 'true').lower() == 'true'
+
+# Target size of the compacted system prompt; seed tables and core rules are never dropped
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '1500'))
+PROMPT_MAX_EXAMPLES = int(os.getenv('PROMPT_MAX_EXAMPLES', '2'))
+
+# ---- prompt sections (joined in this order they form FULL_SYSTEM_PROMPT) ----
+
+PROMPT_HEADER = """# 🧠 WORLD'S BEST AGRICULTURAL DATABASE QUERY GENERATOR
+
+You are the **ULTIMATE AI AGRICULTURAL SQL EXPERT** - combining the knowledge of a master agronomist, database architect, and farming operations specialist.
+
+## 🎯 SUPREME MISSION
+Transform ANY natural language agricultural question into perfect PostgreSQL queries that understand farming like a 30-year veteran agronomist and optimize like a database performance expert.
+"""
+
+AGRICULTURAL_CORE = """## 🌾 AGRICULTURAL INTELLIGENCE CORE
+
+### **Seasonal Calendar Awareness**
+- **Growing Seasons**: Spring (Mar-May), Summer (Jun-Aug), Fall (Sep-Nov), Winter (Dec-Feb)
+- **Critical Periods**: Pre-planting, Planting, Growing, Pre-harvest, Harvest, Post-harvest
+- **Regional Variations**: Northern/Southern hemisphere adjustments
+- **Crop-Specific Timing**: Corn (Apr-Oct), Wheat (Sep-Jul), Soybeans (May-Oct)
+
+### **Growth Stage Intelligence**
+```sql
+-- Growth stage context for timing queries
+CASE 
+  WHEN EXTRACT(DOY FROM CURRENT_DATE) BETWEEN 60 AND 120 THEN 'PLANTING_SEASON'
+  WHEN EXTRACT(DOY FROM CURRENT_DATE) BETWEEN 121 AND 240 THEN 'GROWING_SEASON'  
+  WHEN EXTRACT(DOY FROM CURRENT_DATE) BETWEEN 241 AND 330 THEN 'HARVEST_SEASON'
+  ELSE 'WINTER_PREP'
+END
+```
+
+### **Pre-Harvest Interval (PHI) Intelligence**
+```sql
+-- Automatic PHI compliance checking
+WHERE t.date_performed <= (
+  COALESCE(fc.end_date, fc.start_date + INTERVAL '120 days') 
+  - INTERVAL '1 day' * COALESCE(cp.pre_harvest_interval, 0)
+)
+```
+
+### **Agricultural Activity Recognition**
+- **Spraying**: task_type/description ILIKE ANY(ARRAY['%spray%', '%application%', '%treatment%', '%pesticide%', '%herbicide%', '%fungicide%', '%insecticide%'])
+- **Fertilization**: task_type ILIKE ANY(ARRAY['%fertiliz%', '%nutrition%', '%nutrient%']) OR group_name ILIKE '%fertilizer%'
+- **Soil Management**: task_type ILIKE ANY(ARRAY['%till%', '%cultivat%', '%plow%', '%disc%'])
+- **Harvest**: task_type ILIKE ANY(ARRAY['%harvest%', '%combine%', '%pick%', '%gather%'])
+"""
+
+STATIC_SCHEMA = """## 📊 **COMPLETE DATABASE STRUCTURE**
+
+### **CORE TABLES:**
+
+**farmers** (4 records)
+- id, farm_name, manager_name, manager_last_name, city, country, phone, wa_phone_number, email, state_farm_number
+
+**fields** (53 records) 
+- id, farmer_id (FK to farmers.id), field_name, area_ha, latitude, longitude, country, notes, blok_id, raba
+
+**field_crops** (46 records)
+- id, field_id (FK to fields.id), start_year_int, crop_name, variety, expected_yield_t_ha, start_date, end_date
+
+**tasks** (194 records) - **KEY FOR COMPLEX QUERIES**
+- id, task_type, description, quantity, date_performed, status, inventory_id, notes, crop_name, machinery_id, rate_per_ha, rate_unit
+
+**task_fields** (junction table)
+- task_id (FK to tasks.id), field_id (FK to fields.id)
+
+**inventory** (49 records) - **MATERIALS/PRODUCTS**
+- id, farmer_id, material_id, quantity, unit, purchase_date, purchase_price, notes
+
+**material_catalog** (40 records) - **PRODUCT NAMES**
+- id, name, brand, group_name, formulation, unit, notes
+
+**inventory_deductions** (128 records) - **USAGE TRACKING**
+- id, task_id, inventory_id, quantity_used, created_at
+
+**fertilizers** (10 records)
+- id, product_name, npk_composition, producer, country
+
+**cp_products** (1 record) - **CROP PROTECTION PRODUCTS**
+- id, product_name, application_rate, target_issue, approved_crops, dose, pre_harvest_interval, country
+
+**crop_technology** (60 records) - **BEST PRACTICES**
+- id, crop_name, stage, action, timing, inputs, notes
+
+**fertilizing_plans** (15 records)
+- field_id, year, crop_name, p2o5_kg_ha, k2o_kg_ha, n_kg_ha, fertilizer_recommendation
+
+**incoming_messages** (73 records) - **FARMER COMMUNICATIONS**
+- id, farmer_id, phone_number, message_text, timestamp, role
+
+**weather_data** (3 records)
+- id, field_id, fetch_date, current_temp_c, current_soil_temp_10cm_c, current_precip_mm, forecast
+
+**field_soil_data** (soil analysis results)
+- field_id, analysis_date, ph, p2o5_mg_100g, k2o_mg_100g, organic_matter_percent, analysis_institution
+"""
+
+PATTERNS_HEADING = """## 📊 ULTIMATE QUERY PATTERNS
+"""
+
+EXAMPLE_TRACEABILITY = """### **Pattern A: Advanced Traceability**
+*"Show fields sprayed with Product X in last 14 days with rates and weather"*
+```sql
+SELECT DISTINCT 
+  f.field_name,
+  f.area_ha,
+  fc.crop_name,
+  t.date_performed,
+  mc.name AS product_used,
+  id.quantity_used,
+  ROUND(id.quantity_used / f.area_ha, 2) AS rate_per_ha,
+  t.description,
+  wd.current_temp_c,
+  wd.current_humidity,
+  CASE 
+    WHEN t.date_performed >= CURRENT_DATE - INTERVAL '7 days' THEN 'RECENT'
+    WHEN t.date_performed >= CURRENT_DATE - INTERVAL '14 days' THEN 'LAST_2_WEEKS'
+    ELSE 'OLDER'
+  END AS recency
+FROM fields f
+JOIN task_fields tf ON f.id = tf.field_id  
+JOIN tasks t ON tf.task_id = t.id
+JOIN inventory_deductions id ON t.id = id.task_id
+JOIN inventory i ON id.inventory_id = i.id
+JOIN material_catalog mc ON i.material_id = mc.id
+LEFT JOIN field_crops fc ON f.id = fc.field_id 
+  AND fc.start_year_int = EXTRACT(YEAR FROM t.date_performed)
+LEFT JOIN weather_data wd ON f.id = wd.field_id 
+  AND DATE(wd.fetch_date) = t.date_performed
+WHERE LOWER(mc.name) LIKE LOWER('%' || ? || '%')
+  AND t.date_performed >= CURRENT_DATE - INTERVAL '14 days'
+  AND (t.task_type ILIKE ANY(ARRAY['%spray%', '%application%', '%treatment%'])
+       OR t.description ILIKE ANY(ARRAY['%spray%', '%application%', '%treatment%']))
+ORDER BY t.date_performed DESC, f.field_name;
+```
+"""
+
+EXAMPLE_PHI = """### **Pattern B: PHI Compliance Analysis**
+*"Which crops might violate PHI if harvested in next 21 days?"*
+```sql
+WITH harvest_predictions AS (
+  SELECT 
+    fc.field_id, 
+    fc.crop_name,
+    f.field_name,
+    CASE fc.crop_name
+      WHEN 'corn' THEN fc.start_date + INTERVAL '120 days'
+      WHEN 'soybeans' THEN fc.start_date + INTERVAL '100 days'  
+      WHEN 'wheat' THEN fc.start_date + INTERVAL '90 days'
+      ELSE fc.start_date + INTERVAL '100 days'
+    END AS estimated_harvest_date
+  FROM field_crops fc 
+  JOIN fields f ON fc.field_id = f.id
+  WHERE fc.start_year_int = EXTRACT(YEAR FROM CURRENT_DATE)
+    AND fc.end_date IS NULL  -- Still growing
+),
+recent_applications AS (
+  SELECT 
+    tf.field_id,
+    mc.name AS product_name,
+    t.date_performed,
+    COALESCE(cp.pre_harvest_interval, 14) AS phi_days  -- Default 14 days if unknown
+  FROM task_fields tf
+  JOIN tasks t ON tf.task_id = t.id  
+  JOIN inventory_deductions id ON t.id = id.task_id
+  JOIN inventory i ON id.inventory_id = i.id
+  JOIN material_catalog mc ON i.material_id = mc.id
+  LEFT JOIN cp_products cp ON LOWER(cp.product_name) = LOWER(mc.name)
+  WHERE t.date_performed >= CURRENT_DATE - INTERVAL '60 days'
+    AND (t.task_type ILIKE '%spray%' OR t.description ILIKE '%spray%')
+)
+SELECT 
+  hp.field_name,
+  hp.crop_name,
+  ra.product_name,
+  ra.date_performed,
+  hp.estimated_harvest_date,
+  ra.phi_days,
+  (hp.estimated_harvest_date - ra.date_performed) AS days_since_application,
+  CASE 
+    WHEN (hp.estimated_harvest_date - ra.date_performed) < INTERVAL '1 day' * ra.phi_days 
+    THEN '❌ PHI VIOLATION RISK'
+    ELSE '✅ PHI COMPLIANT'
+  END AS compliance_status
+FROM harvest_predictions hp
+JOIN recent_applications ra ON hp.field_id = ra.field_id  
+WHERE hp.estimated_harvest_date <= CURRENT_DATE + INTERVAL '21 days'
+ORDER BY hp.estimated_harvest_date ASC, compliance_status DESC;
+```
+"""
+
+EXAMPLE_NUTRIENTS = """### **Pattern C: Nutrient Management Intelligence**
+*"Show fields with low phosphorus that need fertilization before planting"*
+```sql
+WITH soil_status AS (
+  SELECT 
+    fsd.field_id,
+    f.field_name,
+    f.area_ha,
+    fsd.ph,
+    fsd.p2o5_mg_100g,
+    fsd.k2o_mg_100g,
+    fsd.organic_matter_percent,
+    fsd.analysis_date,
+    CASE 
+      WHEN fsd.p2o5_mg_100g < 10 THEN 'VERY_LOW'
+      WHEN fsd.p2o5_mg_100g < 15 THEN 'LOW'  
+      WHEN fsd.p2o5_mg_100g < 25 THEN 'MEDIUM'
+      ELSE 'HIGH'
+    END AS phosphorus_status,
+    CASE
+      WHEN fsd.analysis_date >= CURRENT_DATE - INTERVAL '2 years' THEN 'RECENT'
+      WHEN fsd.analysis_date >= CURRENT_DATE - INTERVAL '3 years' THEN 'ACCEPTABLE'
+      ELSE 'OUTDATED'
+    END AS analysis_freshness
+  FROM field_soil_data fsd
+  JOIN fields f ON fsd.field_id = f.id
+  WHERE fsd.analysis_date = (
+    SELECT MAX(analysis_date) 
+    FROM field_soil_data fsd2 
+    WHERE fsd2.field_id = fsd.field_id
+  )
+),
+recent_fertilization AS (
+  SELECT DISTINCT tf.field_id
+  FROM task_fields tf
+  JOIN tasks t ON tf.task_id = t.id
+  WHERE t.task_type ILIKE ANY(ARRAY['%fertiliz%', '%phosphor%', '%p2o5%'])
+    AND t.date_performed >= CURRENT_DATE - INTERVAL '6 months'
+)
+SELECT 
+  ss.field_name,
+  ss.area_ha,
+  ss.phosphorus_status,
+  ss.p2o5_mg_100g AS current_p2o5,
+  ss.analysis_freshness,
+  CASE 
+    WHEN ss.phosphorus_status = 'VERY_LOW' THEN '🔴 URGENT - Apply 80-100 kg P2O5/ha'
+    WHEN ss.phosphorus_status = 'LOW' THEN '🟡 RECOMMENDED - Apply 40-60 kg P2O5/ha'
+    ELSE '✅ ADEQUATE - Maintenance only'
+  END AS fertilizer_recommendation,
+  CASE 
+    WHEN rf.field_id IS NOT NULL THEN '✅ Recently Fertilized'
+    ELSE '❌ Needs Fertilization'
+  END AS recent_fertilization_status
+FROM soil_status ss
+LEFT JOIN recent_fertilization rf ON ss.field_id = rf.field_id
+WHERE ss.phosphorus_status IN ('VERY_LOW', 'LOW')
+  AND rf.field_id IS NULL  -- Haven't been fertilized recently
+ORDER BY 
+  CASE ss.phosphorus_status 
+    WHEN 'VERY_LOW' THEN 1 
+    WHEN 'LOW' THEN 2 
+    ELSE 3 
+  END,
+  ss.area_ha DESC;
+```
+"""
+
+MULTILINGUAL = """## 🌍 MULTILINGUAL & MULTICULTURAL INTELLIGENCE
+
+### **Universal Crop Recognition**
+```sql
+-- Smart crop matching across languages and synonyms
+WHERE (
+  LOWER(crop_name) LIKE LOWER('%' || ? || '%')
+  OR LOWER(crop_name) IN (
+    -- English variations
+    CASE LOWER(?)
+      WHEN 'corn' THEN 'maize'
+      WHEN 'maize' THEN 'corn'
+      WHEN 'soy' THEN 'soybeans'
+      WHEN 'soybeans' THEN 'soy'
+    END,
+    -- Bulgarian translations  
+    CASE LOWER(?)
+      WHEN 'царевица' THEN 'corn'
+      WHEN 'пшеница' THEN 'wheat'
+      WHEN 'слънчоглед' THEN 'sunflower'
+    END,
+    -- Slovenian translations
+    CASE LOWER(?)
+      WHEN 'koruza' THEN 'corn'
+      WHEN 'pšenica' THEN 'wheat'  
+      WHEN 'soja' THEN 'soybeans'
+    END,
+    -- Croatian translations
+    CASE LOWER(?)
+      WHEN 'kukuruz' THEN 'corn'
+      WHEN 'pšenica' THEN 'wheat'
+      WHEN 'soja' THEN 'soybeans'
+    END
+  )
+)
+```
+
+### **Global Agricultural Terms**
+- **Spraying**: spray, prskanje, škropljenje, пръскане
+- **Fertilizing**: fertilize, đubrenje, gnojenje, торене  
+- **Harvest**: harvest, žetva, žetev, жътва
+- **Field**: field, polje, njiva, поле
+"""
+
+PHONE_RULES = """## 📱 INTERNATIONAL PHONE NUMBER INTELLIGENCE
+
+### **Column Selection Rules**
+When users ask about phone numbers, contact information, or communication:
+
+```sql
+-- "WhatsApp number" / "WA number" queries:
+WHERE wa_phone_number LIKE '+387%'
+
+-- "phone number" queries (check both columns):
+WHERE wa_phone_number LIKE '+387%' OR phone LIKE '+387%'
+
+-- "contact number" / "contact info" queries (prioritize WhatsApp):
+WHERE COALESCE(wa_phone_number, phone) LIKE '+387%'
+```
+
+### **Country Code Intelligence**
+Always include the **+ prefix** for international phone numbers:
+
+```sql
+-- European Agricultural Regions:
+Bosnia Herzegovina: +387
+Croatia: +385
+Slovenia: +386  
+Bulgaria: +359
+Serbia: +381
+North Macedonia: +389
+Montenegro: +382
+Hungary: +36
+Austria: +43
+Germany: +49
+Italy: +39
+
+-- Usage examples:
+WHERE wa_phone_number LIKE '+387%'  -- Bosnia
+WHERE wa_phone_number LIKE '+385%'  -- Croatia
+WHERE wa_phone_number LIKE '+386%'  -- Slovenia
+```
+
+### **Regional Query Patterns**
+Handle regional and multi-country queries intelligently:
+
+```sql
+-- "Balkan farmers" / "Balkan region":
+WHERE wa_phone_number LIKE ANY(ARRAY['+387%', '+385%', '+386%', '+381%', '+389%', '+382%'])
+
+-- "EU farmers" (common agricultural EU countries):
+WHERE wa_phone_number LIKE ANY(ARRAY['+385%', '+386%', '+359%', '+36%', '+43%', '+49%', '+39%'])
+
+-- "Regional neighbors" (for context-specific queries):
+WHERE wa_phone_number ~ '^\\+38[1-9]'  -- Former Yugoslavia region
+```
+
+### **Smart Pattern Recognition**
+Understand various ways users might ask about phone numbers:
+
+**User Query Examples → SQL Pattern:**
+- "Bosnian farmers" → `wa_phone_number LIKE '+387%'`
+- "farmers from Bosnia" → `wa_phone_number LIKE '+387%'`
+- "WA numbers starting with +387" → `wa_phone_number LIKE '+387%'`
+- "Croatian phone numbers" → `wa_phone_number LIKE '+385%' OR phone LIKE '+385%'`
+- "contact info for Slovenia" → `COALESCE(wa_phone_number, phone) LIKE '+386%'`
+
+### **Phone Number Validation Intelligence**
+Include validation context when helpful:
+
+```sql
+-- Valid international format check:
+WHERE wa_phone_number ~ '^\\+[1-9]\\d{1,14}$'
+
+-- Incomplete/invalid numbers:
+WHERE wa_phone_number IS NULL OR wa_phone_number = '' 
+   OR NOT (wa_phone_number ~ '^\\+[1-9]\\d{1,14}$')
+
+-- Missing WhatsApp but has phone:
+WHERE (wa_phone_number IS NULL OR wa_phone_number = '') 
+  AND phone IS NOT NULL
+```
+"""
+
+EXAMPLE_PHONE_ACTIVITY = """### **Agricultural Context Integration**
+Combine phone intelligence with farming operations:
+
+```sql
+-- Example: "Show Bosnian farmers who sprayed fungicide this month"
+SELECT f_data.manager_name, f_data.wa_phone_number, spray_info.product_name
+FROM farmers f_data
+JOIN (
+  SELECT DISTINCT tf.field_id, mc.name as product_name
+  FROM task_fields tf
+  JOIN tasks t ON tf.task_id = t.id
+  JOIN inventory_deductions id ON t.id = id.task_id  
+  JOIN inventory i ON id.inventory_id = i.id
+  JOIN material_catalog mc ON i.material_id = mc.id
+  WHERE t.task_type ILIKE '%spray%' 
+    AND t.date_performed >= DATE_TRUNC('month', CURRENT_DATE)
+) spray_info ON f_data.id = (SELECT farmer_id FROM fields WHERE id = spray_info.field_id)
+WHERE f_data.wa_phone_number LIKE '+387%';
+```
+"""
+
+QUERY_OPTIMIZATION = """## 🧠 INTELLIGENT QUERY OPTIMIZATION
+
+### **Performance Rules**
+1. **Use indexed columns first**: farmer_id, field_id, date_performed
+2. **Limit result sets automatically**:
+   ```sql
+   LIMIT CASE 
+     WHEN ? ILIKE '%all%' THEN 1000
+     WHEN ? ILIKE '%summary%' THEN 50  
+     ELSE 100 
+   END
+   ```
+3. **Optimize JOINs**: Start with most selective table
+4. **Use CTEs for complex logic**: Break down complex queries for readability
+
+### **Query Complexity Intelligence**
+```sql
+-- For simple queries (1-2 tables): Direct SELECT
+-- For medium queries (3-5 tables): Strategic JOINs with indexes
+-- For complex queries (6+ tables): Use CTEs and subqueries
+-- For ultra-complex: Break into multiple queries with UNION
+```
+
+## 🔧 ADVANCED ERROR HANDLING
+
+### **Agricultural Context Validation**
+- Validate date ranges against farming seasons
+- Check crop + climate compatibility  
+- Verify realistic yield expectations
+- Confirm equipment + field size compatibility
+
+### **Intelligent Suggestions**
+```sql
+-- When no results found, suggest alternatives:
+-- "No corn fields found" → "Did you mean: maize, sweet corn, grain corn?"
+-- "No spraying last week" → "Showing last 30 days instead"
+-- "Unknown product X" → "Similar products: [list from material_catalog]"
+```
+
+### **Ambiguity Resolution**
+- Product name variations: Handle Prosaro vs ProSaro vs "Prosaro 421 SC"
+- Activity clarification: Distinguish spraying vs fertilizing vs seeding
+- Date interpretation: "last week" vs "past 7 days" vs "previous work week"
+"""
+
+OUTPUT_RULES = """## 🎯 ULTIMATE OUTPUT RULES
+
+### **SQL Excellence Standards**
+1. **Always use explicit JOINs** with clear foreign key relationships
+2. **Handle NULLs gracefully** with COALESCE, NULLIF, proper LEFT JOINs
+3. **Include meaningful calculations** (rates per hectare, days since application)
+4. **Add agricultural context** (compliance status, urgency levels, recommendations)
+5. **Use proper ordering** (date DESC, priority fields first, alphabetical for ties)
+"""
+
+RESULT_FORMATTING = """### **Result Formatting Standards**
+```sql
+-- Include helpful status indicators
+CASE 
+  WHEN condition THEN '✅ GOOD'
+  WHEN warning_condition THEN '⚠️ WARNING'  
+  WHEN critical_condition THEN '🔴 URGENT'
+  ELSE '❓ UNKNOWN'
+END AS status_indicator
+
+-- Add contextual calculations
+ROUND(quantity / area, 2) AS rate_per_hectare,
+CURRENT_DATE - date_performed AS days_ago,
+estimated_harvest - CURRENT_DATE AS days_to_harvest
+```
+
+### **Agricultural Intelligence in Results**
+```sql
+-- Include farming-relevant context
+SELECT 
+  f.field_name,
+  fc.crop_name,
+  t.date_performed,
+  mc.name AS product,
+  CASE 
+    WHEN EXTRACT(DOY FROM t.date_performed) BETWEEN 90 AND 150 THEN 'PLANTING_SEASON'
+    WHEN EXTRACT(DOY FROM t.date_performed) BETWEEN 151 AND 240 THEN 'GROWING_SEASON'
+    WHEN EXTRACT(DOY FROM t.date_performed) BETWEEN 241 AND 300 THEN 'HARVEST_SEASON'
+    ELSE 'OFF_SEASON'
+  END AS agricultural_season,
+  CASE 
+    WHEN wd.current_temp_c > 25 AND wd.current_humidity < 60 THEN '🌡️ HOT_DRY'
+    WHEN wd.current_temp_c < 15 THEN '❄️ COOL'
+    WHEN wd.current_humidity > 80 THEN '💧 HUMID'
+    ELSE '✅ GOOD_CONDITIONS'
+  END AS weather_context
+```
+"""
+
+DATA_MODIFICATION = """## 🔧 **DATA MODIFICATION OPERATIONS**
+
+You can generate INSERT, UPDATE, and DELETE statements in addition to SELECT queries.
+
+### **Data Entry Examples:**
+- "Add farmer John Smith from Croatia" → Generate INSERT INTO farmers with ALL required fields:
+  ```sql
+  INSERT INTO farmers (farm_name, manager_name, manager_last_name, city, country, phone, wa_phone_number, email, state_farm_number)
+  VALUES ('Smith Farm', 'John', 'Smith', 'Zagreb', 'Croatia', NULL, NULL, NULL, NULL);
+  ```
+- "Add farmer Nazif Avdić wa number 334556" → Generate:
+  ```sql
+  INSERT INTO farmers (farm_name, manager_name, manager_last_name, city, country, phone, wa_phone_number, email, state_farm_number)
+  VALUES ('Avdić Farm', 'Nazif', 'Avdić', NULL, NULL, NULL, '334556', NULL, NULL);
+  ```
+- "I sprayed Prosaro on Field A today using 2.5L" → Generate INSERT INTO tasks + inventory_deductions + task_fields
+- "Update my corn yield expectation to 12 t/ha" → Generate UPDATE field_crops
+- "Remove task 123" → Generate DELETE FROM tasks WHERE id = 123
+
+IMPORTANT: For farmers table, ALWAYS include these columns in INSERT:
+- farm_name (can be derived from manager name + ' Farm' if not specified)
+- manager_name (first name)
+- manager_last_name (last name if provided, otherwise NULL)
+- Other fields can be NULL if not specified
+
+### **Multi-table Operations:**
+For complex entries like recording activities, generate multiple related INSERTs wrapped in a transaction:
+```sql
+BEGIN;
+-- 1. Insert the task
+INSERT INTO tasks (task_type, description, date_performed, quantity, status, crop_name)
+VALUES ('spray', 'Prosaro application', CURRENT_DATE, 2.5, 'completed', 'wheat')
+RETURNING id;
+
+-- 2. Link to field (assuming we know field_id)
+INSERT INTO task_fields (task_id, field_id)
+VALUES (currval('tasks_id_seq'), 5);
+
+-- 3. Record inventory usage (assuming we know inventory_id)
+INSERT INTO inventory_deductions (task_id, inventory_id, quantity_used)
+VALUES (currval('tasks_id_seq'), 23, 2.5);
+COMMIT;
+```
+
+### **Smart Defaults:**
+- Use CURRENT_DATE for date_performed when "today" is mentioned
+- Use NOW() for timestamps
+- Generate appropriate foreign key lookups with subqueries when IDs are unknown
+- Handle farmer_id context (current logged-in farmer if provided)
+- Use RETURNING id for multi-table inserts
+
+### **Safety Rules:**
+- For UPDATEs, ALWAYS include specific WHERE clauses
+- For DELETEs, be very specific about what to delete
+- Use transactions (BEGIN/COMMIT) for multi-table operations
+- When field/product names are ambiguous, use LIKE matching with confirmation
+"""
+
+FARMER_CONTEXT_RULES = """### **Context-Aware Queries:**
+If farmer context is provided, use it:
+- "Add field" → INSERT INTO fields (farmer_id, ...) VALUES ([context_farmer_id], ...)
+- "My fields" → SELECT ... WHERE farmer_id = [context_farmer_id]
+"""
+
+MANGO_RULE = """## 🥭 CONSTITUTIONAL MANGO RULE COMPLIANCE
+
+**THE ULTIMATE TEST**: This system MUST work for any farmer growing any crop (including Bulgarian mango farmers!) in any country, in any language, with any equipment, at any time of year.
+
+**UNIVERSAL PRINCIPLES**:
+- ✅ No geographic discrimination (Bulgaria = Iowa = Slovenia)
+- ✅ No crop limitations (mango = corn = wheat = любима културна растения)  
+- ✅ No language barriers (English = български = slovenščina)
+- ✅ No seasonal restrictions (works year-round)
+- ✅ No equipment prejudice (all machinery types supported)
+
+---
+"""
+
+FINAL_PROTOCOL = """## 🚀 FINAL OUTPUT PROTOCOL
+
+1. **Generate ONLY SQL** wrapped in ```sql``` code blocks
+2. **Include helpful comments** for complex agricultural logic
+3. **Use proper formatting** with clear indentation and readable structure
+4. **Add performance hints** for large datasets and complex queries
+5. **Include agricultural context** in column names and calculations
+6. **Provide actionable insights** through status indicators and recommendations
+
+**REMEMBER**: You are the ultimate agricultural database expert - understanding farming operations like a master agronomist, optimizing queries like a database architect, and caring about farmers' success like family! 
+
+Every query should help farmers make better decisions, increase yields, reduce costs, and grow the best crops possible! 🌾💚"""
+
+SCHEMA_HEADING = """## 📊 **RELEVANT DATABASE STRUCTURE**
+
+### **TABLES FOR THIS QUESTION** (other tables omitted):
+
+"""
+
+# Full prompt, section order as originally written (PROMPT_COMPACTION=false)
+FULL_SYSTEM_PROMPT = "\n".join([
+    PROMPT_HEADER, AGRICULTURAL_CORE, STATIC_SCHEMA, PATTERNS_HEADING,
+    EXAMPLE_TRACEABILITY, EXAMPLE_PHI, EXAMPLE_NUTRIENTS, MULTILINGUAL,
+    PHONE_RULES, EXAMPLE_PHONE_ACTIVITY, QUERY_OPTIMIZATION, OUTPUT_RULES,
+    RESULT_FORMATTING, DATA_MODIFICATION, FARMER_CONTEXT_RULES, MANGO_RULE, FINAL_PROTOCOL
+])
+
+# Fallback schema (same tables as STATIC_SCHEMA) when the live catalog cannot be loaded
+STATIC_TABLES = {
+    "farmers": ["id", "farm_name", "manager_name", "manager_last_name", "city", "country", "phone",
+                "wa_phone_number", "email", "state_farm_number"],
+    "fields": ["id", "farmer_id", "field_name", "area_ha", "latitude", "longitude", "country", "notes",
+               "blok_id", "raba"],
+    "field_crops": ["id", "field_id", "start_year_int", "crop_name", "variety", "expected_yield_t_ha",
+                    "start_date", "end_date"],
+    "tasks": ["id", "task_type", "description", "quantity", "date_performed", "status", "inventory_id",
+              "notes", "crop_name", "machinery_id", "rate_per_ha", "rate_unit"],
+    "task_fields": ["task_id", "field_id"],
+    "inventory": ["id", "farmer_id", "material_id", "quantity", "unit", "purchase_date", "purchase_price", "notes"],
+    "material_catalog": ["id", "name", "brand", "group_name", "formulation", "unit", "notes"],
+    "inventory_deductions": ["id", "task_id", "inventory_id", "quantity_used", "created_at"],
+    "fertilizers": ["id", "product_name", "npk_composition", "producer", "country"],
+    "cp_products": ["id", "product_name", "application_rate", "target_issue", "approved_crops", "dose",
+                    "pre_harvest_interval", "country"],
+    "crop_technology": ["id", "crop_name", "stage", "action", "timing", "inputs", "notes"],
+    "fertilizing_plans": ["field_id", "year", "crop_name", "p2o5_kg_ha", "k2o_kg_ha", "n_kg_ha",
+                          "fertilizer_recommendation"],
+    "incoming_messages": ["id", "farmer_id", "phone_number", "message_text", "timestamp", "role"],
+    "weather_data": ["id", "field_id", "fetch_date", "current_temp_c", "current_soil_temp_10cm_c",
+                     "current_precip_mm", "forecast"],
+    "field_soil_data": ["field_id", "analysis_date", "ph", "p2o5_mg_100g", "k2o_mg_100g",
+                        "organic_matter_percent", "analysis_institution"],
+}
+
+STATIC_FOREIGN_KEYS = {
+    "fields": [("farmer_id", "farmers", "id")],
+    "field_crops": [("field_id", "fields", "id")],
+    "task_fields": [("task_id", "tasks", "id"), ("field_id", "fields", "id")],
+    "inventory": [("farmer_id", "farmers", "id"), ("material_id", "material_catalog", "id")],
+    "inventory_deductions": [("task_id", "tasks", "id"), ("inventory_id", "inventory", "id")],
+    "incoming_messages": [("farmer_id", "farmers", "id")],
+    "weather_data": [("field_id", "fields", "id")],
+    "field_soil_data": [("field_id", "fields", "id")],
+    "fertilizing_plans": [("field_id", "fields", "id")],
+}
+
+# Short notes carried over from STATIC_SCHEMA
+TABLE_NOTES = {
+    "tasks": "KEY FOR COMPLEX QUERIES",
+    "task_fields": "junction table",
+    "inventory": "MATERIALS/PRODUCTS",
+    "material_catalog": "PRODUCT NAMES",
+    "inventory_deductions": "USAGE TRACKING",
+    "cp_products": "CROP PROTECTION PRODUCTS",
+    "crop_technology": "BEST PRACTICES",
+    "incoming_messages": "FARMER COMMUNICATIONS",
+    "field_soil_data": "soil analysis results",
+}
+
+# Word stems (English, Slovenian/Croatian/Bosnian, Bulgarian, Spanish) that point at a table.
+# A question token matches a stem when it starts with it.
+TABLE_KEYWORDS = {
+    "farmers": ["farmer", "farm", "grower", "manager", "owner", "kmet", "poljoprivred", "фермер",
+                "земедел", "стопан", "agricultor", "granjer"],
+    "fields": ["field", "parcel", "plot", "hectare", "area", "polj", "njiv", "поле", "полет",
+               "парцел", "campo", "finca"],
+    "field_crops": ["crop", "plant", "variety", "yield", "sow", "grow", "kultur", "pridel",
+                    "култур", "реколт", "cultivo", "cosecha", "mango", "манго", "corn", "maize", "wheat",
+                    "soy", "sunflower", "barley", "durian", "coffee", "grape", "koruz", "pšenic", "psenic",
+                    "soja", "suncokret", "царевиц", "пшениц", "слънчоглед", "maíz", "maiz", "trigo"],
+    "tasks": ["task", "spray", "fertiliz", "harvest", "activit", "operation", "work", "treat", "applied",
+              "application", "till", "plow", "sow", "nalog", "opravil", "prskan", "škropl", "gnoj",
+              "đubr", "žetv", "žetev", "задач", "пръска", "торен", "жътв", "tarea", "fumig"],
+    "task_fields": [],  # join table, added through the FK graph only
+    "inventory": ["inventory", "stock", "purchase", "bought", "warehouse", "zalog", "skladišt",
+                  "склад", "наличност", "inventario", "almacén"],
+    "material_catalog": ["material", "product", "brand", "pesticide", "herbicide", "fungicide",
+                         "insecticide", "prosaro", "sredstv", "препарат", "producto"],
+    "inventory_deductions": ["usage", "used", "consum", "deduct", "porab", "потреб", "uso"],
+    "fertilizers": ["fertilizer", "npk", "manure", "gnojil", "đubriv", "тор", "fertilizant", "abono"],
+    "cp_products": ["protection", "pesticide", "phi", "pre-harvest", "preharvest", "dose", "approved",
+                    "karenc", "карантин"],
+    "crop_technology": ["technolog", "practice", "recommend", "stage", "timing", "tehnolog", "технолог"],
+    "fertilizing_plans": ["fertilizing plan", "fertilization plan", "plans", "recommend", "nutrient", "phosphor", "potass", "nitrogen", "dušik",
+                          "fosfor", "kalij", "азот", "фосфор"],
+    "incoming_messages": ["message", "sms", "whatsapp", "chat", "convers", "sporoč", "poruk", "съобщ",
+                          "mensaje"],
+    "weather_data": ["weather", "temperatur", "rain", "precip", "forecast", "vreme", "vrijeme", "време",
+                     "дъжд", "clima", "lluvia"],
+    "field_soil_data": ["soil", "ph", "phosphor", "potass", "organic", "analys", "tla", "zemlj", "почв",
+                        "suelo"],
+}
+
+# Tables used when nothing in the question points anywhere
+DEFAULT_TABLES = ["farmers", "fields", "field_crops"]
+
+# Optional guidance sections in priority order: (name, text, trigger stems)
+# data_modification is always kept once triggered; a write without its rules is unsafe.
+# Its triggers are explicit write verbs only: generic words such as "new", "set", "change" or
+# "created" appear in plenty of read questions ("how many new farmers", "fields created this week").
+SECTIONS = [
+    ("data_modification", DATA_MODIFICATION,
+     ["add", "insert", "update", "delete", "remove", "create a", "create new", "register a", "register new",
+      "change the", "set the", "i sprayed", "i applied", "i harvested", "i planted", "dodaj", "vnes", "unes",
+      "izbriš", "obriš", "добави", "запиш", "изтрий", "añad", "agreg", "borr", "elimin", "actualiz"]),
+    ("agricultural_core", AGRICULTURAL_CORE,
+     ["spray", "fertiliz", "harvest", "season", "phi", "growth", "stage", "plant", "till", "treat",
+      "prskan", "škropl", "gnoj", "đubr", "žetv", "žetev", "пръска", "торен", "жътв", "fumig", "cosech"]),
+    ("multilingual", MULTILINGUAL, []),
+    ("phone", PHONE_RULES,
+     ["phone", "whatsapp", "wa number", "contact", "mobile", "telefon", "телефон", "номер", "broj",
+      "številk", "número", "bosn", "croat", "sloven", "bulgar", "serb", "macedon", "monten", "hungar",
+      "austri", "german", "ital", "balkan", "eu", "+3", "+4"]),
+]
+
+# Query quality guidance included only when the budget leaves room
+FILLER_SECTIONS = [
+    ("result_formatting", RESULT_FORMATTING),
+    ("query_optimization", QUERY_OPTIMIZATION),
+]
+
+# Example bank: (name, text, trigger stems)
+EXAMPLE_BANK = [
+    ("traceability", EXAMPLE_TRACEABILITY,
+     ["spray", "sprayed", "product", "applied", "application", "trace", "rate", "prskan", "škropl",
+      "пръска", "fumig", "prosaro"]),
+    ("phi_compliance", EXAMPLE_PHI,
+     ["phi", "pre-harvest", "preharvest", "interval", "violat", "complian", "harvest", "karenc", "жътв",
+      "žetv", "cosech"]),
+    ("nutrient_management", EXAMPLE_NUTRIENTS,
+     ["phosphor", "potass", "nutrient", "soil", "fertiliz", "p2o5", "k2o", "gnoj", "đubr", "торен",
+      "почв", "fosfor"]),
+    ("phone_activity", EXAMPLE_PHONE_ACTIVITY,
+     ["phone", "whatsapp", "contact", "bosn", "croat", "sloven", "telefon", "телефон"]),
+]
+
+TOKEN_PATTERN = re.compile(r"[+\w][\w'-]*")
+
+# Column-name parts too common to say anything about relevance
+GENERIC_COLUMN_PARTS = {"name", "date", "notes", "unit", "type", "status", "description", "created",
+                        "quantity", "year", "start", "end", "current", "last"}
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens via tiktoken when installed, else the ~4 characters/token estimate"""
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def question_terms(query: str) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize_query(query))
+
+
+def stem_matches(term: str, stem: str) -> bool:
+    # Short stems ('ph', 'add', 'eu') must match a whole word; '+38' style prefixes match numbers
+    if len(stem) <= 3 and not stem.startswith('+'):
+        return term == stem
+    return term.startswith(stem)
+
+
+def matches(terms: List[str], text: str, stems: Iterable[str]) -> int:
+    """Number of stems found in the question (multi-word stems match as substrings)"""
+    hits = 0
+    for stem in stems:
+        if ' ' in stem:
+            hits += stem in text
+        elif any(stem_matches(term, stem) for term in terms):
+            hits += 1
+    return hits
+
+
+def is_non_english(query: str) -> bool:
+    """Accents, Cyrillic etc. mean the crop/term translation section is worth its tokens"""
+    return any(ch.isalpha() and not ch.isascii() for ch in query)
+
+
+def static_catalog() -> Dict[str, Dict[str, Any]]:
+    """STATIC_TABLES in the schema_catalog snapshot shape"""
+    return {
+        table: {
+            "columns": [{"name": name} for name in columns],
+            "primary_key": [],
+            "foreign_keys": [
+                {"column": column, "foreign_table": foreign_table, "foreign_column": foreign_column}
+                for column, foreign_table, foreign_column in STATIC_FOREIGN_KEYS.get(table, [])
+            ]
+        }
+        for table, columns in STATIC_TABLES.items()
+    }
+
+
+def fk_graph(catalog: Dict[str, Dict[str, Any]]) -> Dict[str, Set[str]]:
+    graph: Dict[str, Set[str]] = {table: set() for table in catalog}
+    for table, info in catalog.items():
+        for fk in info["foreign_keys"]:
+            if fk["foreign_table"] in graph and fk["foreign_table"] != table:
+                graph[table].add(fk["foreign_table"])
+                graph[fk["foreign_table"]].add(table)
+    return graph
+
+
+def join_path(graph: Dict[str, Set[str]], start: str, target: str, max_between: int = 2) -> Optional[List[str]]:
+    """Tables between start and target on the shortest FK path (None if further apart)"""
+    queue = deque([(start, [])])
+    seen = {start}
+    while queue:
+        table, path = queue.popleft()
+        for neighbour in sorted(graph.get(table, ())):
+            if neighbour == target:
+                return path
+            if neighbour not in seen and len(path) < max_between:
+                seen.add(neighbour)
+                queue.append((neighbour, path + [neighbour]))
+    return None
+
+
+class PromptBuilder:
+    """
+    Builds the NL->SQL system prompt for one question.
+
+    Tables are scored by multilingual keyword stems and column names, then
+    connected through the FK graph so the needed join tables are present.
+    Guidance sections and examples are added only when the question
+    triggers them, in priority order, until PROMPT_TOKEN_BUDGET is used up.
+    The header, output rules, mango rule, output protocol, relevant tables
+    and (for writes) the data modification rules are always included.
+    """
+
+    def __init__(self, token_budget: int = PROMPT_TOKEN_BUDGET, max_examples: int = PROMPT_MAX_EXAMPLES,
+                 compaction: bool = PROMPT_COMPACTION):
+        self.token_budget = token_budget
+        self.max_examples = max_examples
+        self.compaction = compaction
+        self.full_prompt_tokens = count_tokens(FULL_SYSTEM_PROMPT)
+        self.stats = {"builds": 0, "total_tokens": 0, "over_budget": 0}
+
+    # ---- relevance -------------------------------------------------------
+
+    def score_tables(self, query: str, catalog: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        terms = question_terms(query)
+        text = normalize_query(query)
+        # Column parts naming a table (field_id, crop_name) are join noise, not relevance
+        table_words = {part.rstrip('s') for table in catalog for part in table.split('_')}
+        scores: Dict[str, int] = {}
+        for table, info in catalog.items():
+            if table in TABLE_KEYWORDS:
+                stems = TABLE_KEYWORDS[table]
+            else:
+                stems = [part.rstrip('s') for part in table.split('_') if len(part) >= 4]
+            score = 3 * matches(terms, text, stems)
+            foreign = {fk["column"] for fk in info["foreign_keys"]}
+            for column in info["columns"]:
+                if column["name"] in foreign:
+                    continue
+                parts = [part for part in column["name"].split('_')
+                         if len(part) >= 4 and part not in GENERIC_COLUMN_PARTS and part.rstrip('s') not in table_words]
+                score += matches(terms, text, parts)
+            if score:
+                scores[table] = score
+        return scores
+
+    def select_tables(self, query: str, catalog: Dict[str, Dict[str, Any]],
+                      farmer_context: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[str]]:
+        """(seed tables by relevance, join tables added from the FK graph)"""
+        scores = self.score_tables(query, catalog)
+        seeds = sorted(scores, key=lambda table: (-scores[table], table))
+        if not seeds:
+            seeds = [table for table in DEFAULT_TABLES if table in catalog] or sorted(catalog)[:3]
+        if farmer_context and "farmers" in catalog and "farmers" not in seeds:
+            seeds.append("farmers")
+
+        # Every pair of seeds gets the tables on its shortest FK path (e.g. fields-tasks -> task_fields)
+        graph = fk_graph(catalog)
+        joins: List[str] = []
+        for i, first in enumerate(seeds):
+            for second in seeds[i + 1:]:
+                for intermediate in join_path(graph, first, second) or []:
+                    if intermediate not in seeds and intermediate not in joins:
+                        joins.append(intermediate)
+        return seeds, joins
+
+    # ---- rendering -------------------------------------------------------
+
+    @staticmethod
+    def render_table(table: str, info: Dict[str, Any]) -> str:
+        foreign = {fk["column"]: f"{fk['foreign_table']}.{fk['foreign_column']}" for fk in info["foreign_keys"]}
+        columns = [
+            f"{column['name']} (FK to {foreign[column['name']]})" if column["name"] in foreign else column["name"]
+            for column in info["columns"]
+        ]
+        note = f" - **{TABLE_NOTES[table]}**" if table in TABLE_NOTES else ""
+        return f"**{table}**{note}\n- {', '.join(columns)}\n"
+
+    def build(self, query: str, catalog: Optional[Dict[str, Dict[str, Any]]] = None,
+              farmer_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """System prompt plus what went into it: tables, sections, examples, prompt_tokens"""
+        if not self.compaction:
+            return self._record({
+                "system_prompt": FULL_SYSTEM_PROMPT,
+                "tables": sorted(STATIC_TABLES),
+                "sections": ["full"],
+                "examples": [name for name, _, _ in EXAMPLE_BANK],
+                "prompt_tokens": self.full_prompt_tokens
+            })
+
+        catalog = catalog or static_catalog()
+        terms = question_terms(query)
+        text = normalize_query(query)
+        seeds, joins = self.select_tables(query, catalog, farmer_context)
+
+        core = [PROMPT_HEADER, OUTPUT_RULES, MANGO_RULE, FINAL_PROTOCOL]
+        if farmer_context:
+            core.append(FARMER_CONTEXT_RULES)
+        used = sum(count_tokens(part) for part in core) + count_tokens(SCHEMA_HEADING)
+
+        # Seed tables are always described; join tables only while the budget allows
+        table_blocks: List[str] = []
+        tables: List[str] = []
+        for table in seeds + joins:
+            block = self.render_table(table, catalog[table])
+            cost = count_tokens(block)
+            if table in joins and used + cost > self.token_budget:
+                continue
+            table_blocks.append(block)
+            tables.append(table)
+            used += cost
+
+        # Priority: write rules (required once triggered) > examples > other triggered sections > fillers
+        triggered = {}
+        for name, section_text, stems in SECTIONS:
+            if name == "multilingual":
+                hit = is_non_english(query)
+            elif name == "agricultural_core":
+                hit = matches(terms, text, stems) > 0 or "tasks" in tables
+            else:
+                hit = matches(terms, text, stems) > 0
+            if hit:
+                triggered[name] = section_text
+
+        sections: Dict[str, str] = {}
+        if "data_modification" in triggered:
+            sections["data_modification"] = triggered.pop("data_modification")
+            used += count_tokens(sections["data_modification"])
+
+        ranked = sorted(
+            ((matches(terms, text, stems), name, example) for name, example, stems in EXAMPLE_BANK),
+            key=lambda item: -item[0]
+        )
+        examples: Dict[str, str] = {}
+        for score, name, example in ranked:
+            if score == 0 or len(examples) >= self.max_examples:
+                break
+            cost = count_tokens(example)
+            if used + cost <= self.token_budget:
+                examples[name] = example
+                used += cost
+
+        for name, section_text in triggered.items():
+            cost = count_tokens(section_text)
+            if used + cost <= self.token_budget:
+                sections[name] = section_text
+                used += cost
+
+        for name, section_text in FILLER_SECTIONS:
+            cost = count_tokens(section_text)
+            if used + cost <= self.token_budget:
+                sections[name] = section_text
+                used += cost
+
+        parts = [PROMPT_HEADER]
+        if "agricultural_core" in sections:
+            parts.append(sections["agricultural_core"])
+        parts.append(SCHEMA_HEADING + "\n".join(table_blocks))
+        if examples:
+            parts.append(PATTERNS_HEADING)
+            parts.extend(examples.values())
+        for name in ("multilingual", "phone", "query_optimization"):
+            if name in sections:
+                parts.append(sections[name])
+        parts.append(OUTPUT_RULES)
+        if "result_formatting" in sections:
+            parts.append(sections["result_formatting"])
+        if "data_modification" in sections:
+            parts.append(sections["data_modification"])
+        if farmer_context:
+            parts.append(FARMER_CONTEXT_RULES)
+        parts.extend([MANGO_RULE, FINAL_PROTOCOL])
+
+        system_prompt = "\n".join(parts)
+        return self._record({
+            "system_prompt": system_prompt,
+            "tables": tables,
+            "sections": list(sections),
+            "examples": list(examples),
+            "prompt_tokens": count_tokens(system_prompt)
+        })
+
+    def _record(self, prompt: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats["builds"] += 1
+        self.stats["total_tokens"] += prompt["prompt_tokens"]
+        if self.compaction and prompt["prompt_tokens"] > self.token_budget:
+            self.stats["over_budget"] += 1
+        return prompt
+
+    def get_stats(self) -> Dict[str, Any]:
+        builds = self.stats["builds"]
+        avg = round(self.stats["total_tokens"] / builds, 1) if builds else 0.0
+        return {
+            "builds": builds,
+            "avg_prompt_tokens": avg,
+            "full_prompt_tokens": self.full_prompt_tokens,
+            "token_budget": self.token_budget,
+            "over_budget": self.stats["over_budget"],
+            "compaction": self.compaction,
+            "token_counter": "tiktoken" if _encoding else "estimate"
+        }
+
+
+# Global builder shared by the NL query endpoints
+prompt_builder = PromptBuilder()
+
+
+async def build_nl_sql_prompt(query: str, farmer_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Prompt for one question against the live schema catalog (static schema if unavailable)"""
+    catalog = None
+    if prompt_builder.compaction:
+        try:
+            from schema_catalog import schema_catalog
+            catalog = await schema_catalog.ensure_loaded_async()
+        except Exception as e:
+            # Constitutional fallback: documented static schema
+            logger.warning(f"Prompt builder using static schema: {e}")
+    return prompt_builder.build(query, catalog, farmer_context)
@@ -0,0 +1,293 @@
+"""
+Response Cache for Read-Only Dashboard APIs
+Per-route TTLs, single-flight misses, stale-while-revalidate and tag invalidation from write endpoints
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from fastapi import Response
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '512'))
+
+# Optional shared backend (e.g. redis://host:6379/0) so every dashboard process
+# sees the same entries and invalidations; unset -> in-process LRU stand-in.
+RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL')
+
+# Payloads that must never be cached (transient failures)
+ERROR_STATUSES = {"error", "connection_failed", "query_failed"}
+
+
+class LRUCacheBackend:
+    """In-process LRU store; also the local stand-in for the shared backend"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    async def set(self, key: str, entry: Dict[str, Any], tags: Iterable[str] = ()):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def invalidate_tag(self, tag: str) -> int:
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            return len(keys)
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class RedisCacheBackend:
+    """Shared backend: JSON entries plus one Redis set of keys per tag"""
+
+    def __init__(self, url: str, prefix: str = "ava:response_cache:"):
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._client.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, entry: Dict[str, Any], tags: Iterable[str] = ()):
+        expire = int(entry["ttl"] + entry["stale_ttl"]) + 1
+        pipe = self._client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(entry, default=str), ex=expire)
+        for tag in tags:
+            pipe.sadd(f"{self.prefix}tag:{tag}", key)
+        await pipe.execute()
+
+    async def invalidate_tag(self, tag: str) -> int:
+        tag_key = f"{self.prefix}tag:{tag}"
+        keys = [k.decode() if isinstance(k, bytes) else k for k in await self._client.smembers(tag_key)]
+        if keys:
+            await self._client.delete(*[self.prefix + key for key in keys])
+        await self._client.delete(tag_key)
+        return len(keys)
+
+    async def clear(self):
+        async for key in self._client.scan_iter(match=self.prefix + "*"):
+            await self._client.delete(key)
+
+
+def create_backend():
+    """Shared backend when RESPONSE_CACHE_URL is set and reachable by the client library"""
+    if RESPONSE_CACHE_URL and redis_asyncio is not None:
+        logger.info("Response cache using shared backend")
+        return RedisCacheBackend(RESPONSE_CACHE_URL)
+    if RESPONSE_CACHE_URL:
+        logger.warning("RESPONSE_CACHE_URL set but redis client not installed, using in-process LRU")
+    return LRUCacheBackend()
+
+
+def is_cacheable(value: Any) -> bool:
+    """Only plain payloads without error markers are cached"""
+    if not isinstance(value, (dict, list)):
+        return False
+    if isinstance(value, dict):
+        if value.get("error") or value.get("status") in ERROR_STATUSES:
+            return False
+    return True
+
+
+class ResponseCache:
+    """
+    Cache of handler results keyed by route + parameters.
+
+    Fresh entries are returned directly. Entries past their TTL but within
+    ``stale_ttl`` are returned immediately while one background task
+    recomputes them (stale-while-revalidate). Concurrent misses for the same
+    key await a single computation (single-flight). Write endpoints drop
+    entries by tag through ``invalidate``.
+    """
+
+    def __init__(self, backend=None, enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.backend = backend or create_backend()
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[str] = set()
+        self._generation: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale_served": 0, "coalesced": 0,
+                      "refreshes": 0, "invalidations": 0, "errors": 0}
+
+    async def _compute(self, key: str, producer: Callable[[], Awaitable[Any]],
+                       ttl: float, stale_ttl: float, tags: Iterable[str]) -> Any:
+        """Single-flight computation: later callers await the first caller's future"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = {tag: self._generation.get(tag, 0) for tag in tags}
+        try:
+            value = await producer()
+            # Skip the write if a tag was invalidated while we were computing
+            unchanged = all(self._generation.get(tag, 0) == seen for tag, seen in generation.items())
+            if unchanged and is_cacheable(value):
+                try:
+                    await self.backend.set(key, {
+                        "value": value,
+                        "stored_at": time.time(),
+                        "ttl": ttl,
+                        "stale_ttl": stale_ttl
+                    }, tags)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.warning(f"Response cache write failed: {e}")
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Mark retrieved so an unawaited future does not log a warning
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _refresh(self, key, producer, ttl, stale_ttl, tags):
+        try:
+            self.stats["refreshes"] += 1
+            await self._compute(key, producer, ttl, stale_ttl, tags)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def get_or_compute(self, key: str, producer: Callable[[], Awaitable[Any]],
+                             ttl: float, stale_ttl: float = 0, tags: Iterable[str] = ()) -> Any:
+        if not self.enabled:
+            return await producer()
+
+        tags = tuple(tags)
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            # Constitutional fallback: a broken cache never breaks the endpoint
+            self.stats["errors"] += 1
+            logger.warning(f"Response cache read failed: {e}")
+            return await producer()
+
+        if entry is not None:
+            age = time.time() - entry["stored_at"]
+            if age < entry["ttl"]:
+                self.stats["hits"] += 1
+                return entry["value"]
+            if age < entry["ttl"] + entry["stale_ttl"]:
+                self.stats["stale_served"] += 1
+                # The refresh task starts later, so track it from scheduling on
+                if key not in self._inflight and key not in self._refreshing:
+                    self._refreshing.add(key)
+                    asyncio.create_task(self._refresh(key, producer, ttl, stale_ttl, tags))
+                return entry["value"]
+
+        self.stats["misses"] += 1
+        return await self._compute(key, producer, ttl, stale_ttl, tags)
+
+    async def invalidate(self, *tags: str):
+        """Drop every entry carrying one of the tags"""
+        for tag in tags:
+            self._generation[tag] = self._generation.get(tag, 0) + 1
+            try:
+                dropped = await self.backend.invalidate_tag(tag)
+                self.stats["invalidations"] += 1
+                logger.debug(f"Response cache invalidated '{tag}' ({dropped} entries)")
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Response cache invalidation of '{tag}' failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "enabled": self.enabled, "backend": type(self.backend).__name__}
+
+
+# Global cache instance shared by the dashboards in this process
+response_cache = ResponseCache()
+
+
+def _cache_key(func: Callable, kwargs: Dict[str, Any]) -> str:
+    # Request/Response objects and other non-scalar arguments are not part of the key
+    params = sorted(
+        (name, value) for name, value in kwargs.items()
+        if isinstance(value, (str, int, float, bool)) or value is None
+    )
+    return f"{func.__module__}.{func.__name__}:" + "&".join(f"{name}={value}" for name, value in params)
+
+
+def cached_response(ttl: float, stale_ttl: float = 0, tags: Iterable[str] = ()):
+    """
+    Cache an async route handler's JSON payload (register below the route decorator).
+
+    Headers the handler sets on its ``Response`` parameter are not cached; when
+    the payload comes from the cache, a ``Server-Timing: cache;desc="hit"``
+    entry is set instead, so per-request timings are never replayed.
+    """
+    tags = tuple(tags)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = _cache_key(func, kwargs)
+            computed = False
+
+            async def producer():
+                nonlocal computed
+                computed = True
+                return await func(*args, **kwargs)
+
+            value = await response_cache.get_or_compute(key, producer, ttl=ttl, stale_ttl=stale_ttl, tags=tags)
+            response = next((arg for arg in kwargs.values() if isinstance(arg, Response)), None)
+            if not computed and response is not None:
+                response.headers["Server-Timing"] = 'cache;desc="hit"'
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidates(*tags: str):
+    """Invalidate cache tags after a write handler runs (register below the route decorator)"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                await response_cache.invalidate(*tags)
+        return wrapper
+    return decorator
@@ -0,0 +1,316 @@
+"""
+Schema Metadata Catalog
+Process-wide cache of table columns, primary keys and foreign keys loaded from pg_catalog
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Catalog lifetime before the next lookup reloads it (seconds)
+SCHEMA_CACHE_TTL = float(os.getenv('SCHEMA_CACHE_TTL', '300'))
+
+# NOTIFY channel fired by the DDL event trigger
+SCHEMA_CHANGE_CHANNEL = os.getenv('SCHEMA_CHANGE_CHANNEL', 'schema_catalog_changed')
+
+# Install the DDL event trigger on startup (opt-in: needs rds_superuser / superuser and affects every session)
+INSTALL_DDL_TRIGGER = os.getenv('SCHEMA_CACHE_INSTALL_TRIGGER', 'false').lower() == 'true'
+
+# Ordered columns of every ordinary/partitioned table in the public schema.
+# data_type and is_nullable follow information_schema.columns ('character varying',
+# 'ARRAY', 'USER-DEFINED', YES/NO), which the schema APIs returned before the catalog.
+COLUMNS_SQL = """
+    SELECT c.relname AS table_name,
+           a.attname AS column_name,
+           CASE WHEN t.typtype = 'd' THEN
+                    CASE WHEN bt.typelem <> 0 AND bt.typlen = -1 THEN 'ARRAY'
+                         WHEN bn.nspname = 'pg_catalog' THEN format_type(t.typbasetype, NULL)
+                         ELSE 'USER-DEFINED' END
+                ELSE
+                    CASE WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+                         WHEN tn.nspname = 'pg_catalog' THEN format_type(a.atttypid, NULL)
+                         ELSE 'USER-DEFINED' END
+           END AS data_type,
+           CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END AS is_nullable,
+           pg_get_expr(d.adbin, d.adrelid) AS column_default
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    JOIN pg_type t ON t.oid = a.atttypid
+    JOIN pg_namespace tn ON tn.oid = t.typnamespace
+    LEFT JOIN pg_type bt ON t.typtype = 'd' AND bt.oid = t.typbasetype
+    LEFT JOIN pg_namespace bn ON bn.oid = bt.typnamespace
+    LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname, a.attnum
+"""
+
+# Primary key ('p') and foreign key ('f') columns, one row per key column
+CONSTRAINTS_SQL = """
+    SELECT c.relname AS table_name,
+           con.contype AS constraint_type,
+           a.attname AS column_name,
+           fc.relname AS foreign_table_name,
+           fa.attname AS foreign_column_name
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, ref_attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+    LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+    LEFT JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.ref_attnum
+    WHERE n.nspname = 'public' AND con.contype IN ('p', 'f')
+    ORDER BY c.relname, con.conname, k.ord
+"""
+
+# DDL event trigger that tells every listening process to drop its catalog
+DDL_TRIGGER_SQL = f"""
+    CREATE OR REPLACE FUNCTION notify_schema_catalog_change() RETURNS event_trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{SCHEMA_CHANGE_CHANNEL}', tg_tag);
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'schema_catalog_ddl') THEN
+            CREATE EVENT TRIGGER schema_catalog_ddl ON ddl_command_end
+                EXECUTE FUNCTION notify_schema_catalog_change();
+        END IF;
+    END $$;
+"""
+
+
+def build_catalog(column_rows: Iterable[Any], constraint_rows: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+    """Group COLUMNS_SQL / CONSTRAINTS_SQL rows into {table: {columns, primary_key, foreign_keys}}"""
+    tables: Dict[str, Dict[str, Any]] = {}
+    for row in column_rows:
+        table = tables.setdefault(row[0], {"columns": [], "primary_key": [], "foreign_keys": []})
+        table["columns"].append({
+            "name": row[1],
+            "type": row[2],
+            "nullable": row[3],
+            "default": row[4]
+        })
+
+    for row in constraint_rows:
+        table = tables.get(row[0])
+        if table is None:
+            continue
+        if row[1] == 'p':
+            table["primary_key"].append(row[2])
+        else:
+            table["foreign_keys"].append({
+                "column": row[2],
+                "foreign_table": row[3],
+                "foreign_column": row[4]
+            })
+    return tables
+
+
+class SchemaCatalog:
+    """
+    In-memory schema metadata shared by every request in the process.
+
+    Lookups are served from an immutable snapshot. The snapshot is reloaded
+    when it is older than the TTL, after ``invalidate()`` (refresh endpoint),
+    or when the DDL event trigger sends a NOTIFY on SCHEMA_CHANGE_CHANNEL.
+    Loads reuse the caller's connection when one is passed in.
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL):
+        self.ttl = ttl
+        self._tables: Optional[Dict[str, Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+        self.version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._listen_conn = None
+        self.stats = {"loads": 0, "hits": 0, "invalidations": 0, "load_errors": 0, "last_load_ms": 0.0}
+
+    # ---- freshness -------------------------------------------------------
+
+    def is_fresh(self) -> bool:
+        return self._tables is not None and (time.time() - self._loaded_at) < self.ttl
+
+    def invalidate(self, reason: str = "manual"):
+        """Drop the snapshot; the next lookup reloads it"""
+        self._loaded_at = 0.0
+        self.stats["invalidations"] += 1
+        logger.info(f"Schema catalog invalidated ({reason})")
+
+    def _store(self, column_rows, constraint_rows, started: float):
+        self._tables = build_catalog(column_rows, constraint_rows)
+        # Content hash: changes only when the schema itself changes
+        self.version = hashlib.sha1(json.dumps(self._tables, sort_keys=True, default=str).encode()).hexdigest()[:12]
+        self._loaded_at = time.time()
+        self.stats["loads"] += 1
+        self.stats["last_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Schema catalog loaded: {len(self._tables)} tables in {self.stats['last_load_ms']}ms")
+
+    # ---- loading ---------------------------------------------------------
+
+    def _load(self, conn=None):
+        """Reload from pg_catalog using a DB-API connection, a SQLAlchemy session, or the pool"""
+        started = time.perf_counter()
+        if conn is None:
+            from database_pool import get_db_connection
+            with get_db_connection() as pooled:
+                return self._load(pooled)
+
+        if hasattr(conn, 'cursor'):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(COLUMNS_SQL)
+                column_rows = cursor.fetchall()
+                cursor.execute(CONSTRAINTS_SQL)
+                constraint_rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        else:
+            column_rows = conn.execute(text(COLUMNS_SQL)).fetchall()
+            constraint_rows = conn.execute(text(CONSTRAINTS_SQL)).fetchall()
+        self._store(column_rows, constraint_rows, started)
+
+    def _ensure_loaded(self, conn=None) -> Dict[str, Dict[str, Any]]:
+        if self.is_fresh():
+            self.stats["hits"] += 1
+            return self._tables
+        with self._lock:
+            if not self.is_fresh():
+                try:
+                    self._load(conn)
+                except Exception as e:
+                    self.stats["load_errors"] += 1
+                    if self._tables is None:
+                        raise
+                    # Constitutional fallback: keep serving the stale snapshot
+                    logger.warning(f"Schema catalog reload failed, serving stale copy: {e}")
+        return self._tables
+
+    async def ensure_loaded_async(self, conn=None) -> Dict[str, Dict[str, Any]]:
+        """Async-handler variant: reload over asyncpg (given connection or the shared pool)"""
+        if self.is_fresh():
+            self.stats["hits"] += 1
+            return self._tables
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                from async_database import acquire
+                async with acquire() as pooled:
+                    column_rows = await pooled.fetch(COLUMNS_SQL)
+                    constraint_rows = await pooled.fetch(CONSTRAINTS_SQL)
+            else:
+                column_rows = await conn.fetch(COLUMNS_SQL)
+                constraint_rows = await conn.fetch(CONSTRAINTS_SQL)
+            self._store(column_rows, constraint_rows, started)
+        except Exception as e:
+            self.stats["load_errors"] += 1
+            if self._tables is None:
+                raise
+            logger.warning(f"Schema catalog reload failed, serving stale copy: {e}")
+        return self._tables
+
+    # ---- lookups ---------------------------------------------------------
+
+    def tables(self, conn=None) -> List[str]:
+        return sorted(self._ensure_loaded(conn))
+
+    def has_table(self, table_name: str, conn=None) -> bool:
+        return table_name in self._ensure_loaded(conn)
+
+    def column_details(self, table_name: str, conn=None) -> List[Dict[str, Any]]:
+        """[{name, type, nullable, default}] in ordinal order ([] for unknown tables)"""
+        table = self._ensure_loaded(conn).get(table_name)
+        return list(table["columns"]) if table else []
+
+    def columns(self, table_name: str, conn=None) -> List[str]:
+        return [col["name"] for col in self.column_details(table_name, conn)]
+
+    def primary_key(self, table_name: str, conn=None) -> List[str]:
+        table = self._ensure_loaded(conn).get(table_name)
+        return list(table["primary_key"]) if table else []
+
+    def foreign_keys(self, table_name: str, conn=None) -> List[Dict[str, str]]:
+        table = self._ensure_loaded(conn).get(table_name)
+        return list(table["foreign_keys"]) if table else []
+
+    def first_existing_column(self, table_name: str, candidates: Iterable[str],
+                              default: Optional[str] = None, conn=None) -> Optional[str]:
+        """First candidate column present on the table, e.g. area_hectares vs area_ha"""
+        existing = set(self.columns(table_name, conn))
+        for candidate in candidates:
+            if candidate in existing:
+                return candidate
+        return default
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "tables": len(self._tables) if self._tables is not None else 0,
+            "version": self.version,
+            "age_seconds": round(time.time() - self._loaded_at, 1) if self._loaded_at else None,
+            "ttl_seconds": self.ttl,
+            "listening": self._listen_conn is not None
+        }
+
+    # ---- LISTEN/NOTIFY ---------------------------------------------------
+
+    def _on_schema_notify(self, connection, pid, channel, payload):
+        self.invalidate(f"NOTIFY {payload}")
+
+    async def start_listener(self):
+        """LISTEN for DDL notifications on a dedicated (non-pooled) connection"""
+        from async_database import connect_dedicated
+
+        self._listen_conn = await connect_dedicated()
+        if INSTALL_DDL_TRIGGER:
+            try:
+                await self._listen_conn.execute(DDL_TRIGGER_SQL)
+            except Exception as e:
+                # Event triggers need superuser; TTL and the refresh endpoint still apply
+                logger.warning(f"Could not install schema DDL trigger: {e}")
+        await self._listen_conn.add_listener(SCHEMA_CHANGE_CHANNEL, self._on_schema_notify)
+        logger.info(f"Schema catalog listening on '{SCHEMA_CHANGE_CHANNEL}'")
+
+    async def stop_listener(self):
+        if self._listen_conn is not None:
+            try:
+                await self._listen_conn.close()
+            finally:
+                self._listen_conn = None
+
+
+# Global catalog instance
+schema_catalog = SchemaCatalog()
+
+
+def register_schema_catalog(app):
+    """Attach the DDL listener to the app lifecycle and expose a refresh endpoint"""
+    @app.on_event("startup")
+    async def _start_schema_listener():
+        try:
+            await schema_catalog.start_listener()
+        except Exception as e:
+            # Constitutional error isolation: fall back to TTL invalidation only
+            logger.error(f"Schema catalog listener unavailable: {e}")
+
+    @app.on_event("shutdown")
+    async def _stop_schema_listener():
+        await schema_catalog.stop_listener()
+
+    @app.post("/api/schema-cache/refresh")
+    async def refresh_schema_cache():
+        """Drop and reload the schema catalog (e.g. after a manual migration)"""
+        schema_catalog.invalidate("refresh endpoint")
+        try:
+            await schema_catalog.ensure_loaded_async()
+            return {"success": True, "stats": schema_catalog.get_stats()}
+        except Exception as e:
+            return {"success": False, "error": str(e), "stats": schema_catalog.get_stats()}
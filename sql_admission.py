@@ -0,0 +1,340 @@
+"""
+SQL Admission Control
+EXPLAIN-based cost/row guard, LIMIT injection and statement timeouts for LLM-generated SQL
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SQL_ADMISSION_ENABLED = os.getenv('SQL_ADMISSION_ENABLED', 'true').lower() == 'true'
+
+# Planner estimates above which a statement is rewritten (SELECT) or rejected
+SQL_ADMISSION_MAX_COST = float(os.getenv('SQL_ADMISSION_MAX_COST', '100000'))
+SQL_ADMISSION_MAX_ROWS = float(os.getenv('SQL_ADMISSION_MAX_ROWS', '50000'))
+
+# LIMIT forced onto every admitted SELECT, and the per-statement timeout
+SQL_ADMISSION_ROW_LIMIT = int(os.getenv('SQL_ADMISSION_ROW_LIMIT', '1000'))
+SQL_ADMISSION_TIMEOUT_MS = int(os.getenv('SQL_ADMISSION_TIMEOUT_MS', '5000'))
+
+# JSON-lines decision log with plans, for tuning the thresholds (off unless a path is set,
+# e.g. sql_admission_log.jsonl); entries are appended by a background writer thread
+SQL_ADMISSION_LOG_PATH = os.getenv('SQL_ADMISSION_LOG_PATH', '')
+SQL_ADMISSION_LOG_FLUSH_SECONDS = float(os.getenv('SQL_ADMISSION_LOG_FLUSH_SECONDS', '2'))
+SQL_ADMISSION_HISTORY = int(os.getenv('SQL_ADMISSION_HISTORY', '200'))
+
+# Trailing top-level LIMIT (optionally followed by OFFSET); inner subquery limits don't match
+TRAILING_LIMIT = re.compile(r'\bLIMIT\s+(\d+|ALL)(\s+OFFSET\s+\d+)?\s*;?\s*$', re.IGNORECASE)
+
+# String literals, quoted identifiers and comments, so keywords and ';' inside them are ignored
+SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+# Statement types the NL query paths may run; everything else is rejected before planning
+ADMITTED_TYPES = ("SELECT", "INSERT", "UPDATE", "DELETE")
+TRANSACTION_VERBS = {"BEGIN", "START", "COMMIT", "END", "ROLLBACK", "ABORT", "SAVEPOINT", "RELEASE"}
+
+# Keywords that make a SELECT/WITH statement write (WITH d AS (DELETE ...) SELECT ..., SELECT ... INTO) or change the schema
+WRITING_KEYWORDS = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|DROP|ALTER|CREATE|GRANT|REVOKE|COPY|CALL|DO|INTO)\b', re.IGNORECASE)
+ROW_LOCKING = re.compile(r'\bFOR\s+(NO\s+KEY\s+)?UPDATE\b', re.IGNORECASE)
+
+
+def strip_comments(sql: str) -> str:
+    """Remove -- and /* */ comments, leaving string literals intact"""
+    return SQL_TOKENS.sub(lambda m: m.group(0) if m.group(0)[0] in "'\"" else " ", sql)
+
+
+def _mask_literals(sql: str) -> str:
+    """Comments removed and literals/quoted identifiers blanked, for keyword and ';' scans"""
+    return SQL_TOKENS.sub(lambda m: {"'": "''", '"': '""'}.get(m.group(0)[0], " "), sql)
+
+
+def leading_keyword(sql: str) -> str:
+    words = _mask_literals(sql).split(None, 1)
+    return words[0].upper().rstrip(';(') if words else ""
+
+
+def statement_type(sql: str) -> str:
+    """
+    SELECT / INSERT / UPDATE / DELETE, TRANSACTION for transaction control,
+    or UNSUPPORTED for anything else (DDL, data-modifying WITH, COPY ...)
+    """
+    verb = leading_keyword(sql)
+    if verb in ("INSERT", "UPDATE", "DELETE"):
+        return verb
+    if verb in TRANSACTION_VERBS:
+        return "TRANSACTION"
+    if verb in ("SELECT", "WITH"):
+        scanned = ROW_LOCKING.sub(" ", _mask_literals(sql))
+        return "UNSUPPORTED" if WRITING_KEYWORDS.search(scanned) else "SELECT"
+    return "UNSUPPORTED"
+
+
+def unsupported_reason(sql: str) -> Optional[str]:
+    """Why the statement may not run at all (None for a single SELECT/INSERT/UPDATE/DELETE)"""
+    operation_type = statement_type(sql)
+    if operation_type == "TRANSACTION":
+        return "transaction control statements are not allowed"
+    if operation_type == "UNSUPPORTED":
+        verb = leading_keyword(sql)
+        if verb in ("SELECT", "WITH"):
+            return f"{verb} statements that modify data or schema are not allowed"
+        return f"{verb or 'empty'} statements are not allowed (only {', '.join(ADMITTED_TYPES)})"
+    if not is_single_statement(sql):
+        return "multiple statements are not allowed"
+    return None
+
+
+def strip_statement(sql: str) -> str:
+    return sql.strip().rstrip(';').strip()
+
+
+def is_single_statement(sql: str) -> bool:
+    """No ';' before the end, ignoring string literals and comments"""
+    return ';' not in strip_statement(_mask_literals(sql))
+
+
+def inject_limit(sql: str, row_limit: int) -> str:
+    """Cap a SELECT at row_limit rows, lowering an existing trailing LIMIT if it is larger"""
+    # A trailing -- comment would swallow an appended LIMIT
+    sql = strip_statement(strip_comments(sql))
+    match = TRAILING_LIMIT.search(sql)
+    if not match:
+        return f"{sql} LIMIT {row_limit}"
+    current = match.group(1).upper()
+    if current != 'ALL' and int(current) <= row_limit:
+        return sql
+    return sql[:match.start()] + f"LIMIT {row_limit}" + (match.group(2) or "")
+
+
+def plan_estimates(plan_json: Any) -> Dict[str, Any]:
+    """Top-node total cost / row estimate from EXPLAIN (FORMAT JSON) output"""
+    if isinstance(plan_json, str):
+        plan_json = json.loads(plan_json)
+    plan = plan_json[0]["Plan"]
+    return {
+        "cost": float(plan.get("Total Cost", 0.0)),
+        "rows": float(plan.get("Plan Rows", 0.0)),
+        "node": plan.get("Node Type"),
+        "plan": plan_json
+    }
+
+
+def decision_summary(decision: Dict[str, Any]) -> Dict[str, Any]:
+    """Decision fields returned to API clients (no plans or original SQL)"""
+    return {key: decision[key] for key in ("action", "reason", "cost", "rows")}
+
+
+class QueryAdmission:
+    """
+    Admission stage in front of LLM-generated SQL.
+
+    Only a single SELECT, INSERT, UPDATE or DELETE is accepted; transaction
+    control, DDL and data-modifying WITH statements are rejected up front.
+    Each statement is planned with EXPLAIN (FORMAT JSON) under the statement
+    timeout. SELECTs always get a LIMIT. If the unlimited plan is over the
+    cost or row budget, the limited form is re-planned and admitted only if
+    it fits. Writes over budget are rejected, since they cannot be rewritten.
+    Admitted statements run via ``guard()``, which sets a read-only
+    transaction for SELECTs plus ``SET LOCAL statement_timeout``. Every
+    decision is kept in memory with its plan; when ``log_path`` is set the
+    decisions are also appended to a JSON-lines file by a writer thread, so
+    the request path never touches the disk.
+    """
+
+    def __init__(self, max_cost: float = SQL_ADMISSION_MAX_COST, max_rows: float = SQL_ADMISSION_MAX_ROWS,
+                 row_limit: int = SQL_ADMISSION_ROW_LIMIT, timeout_ms: int = SQL_ADMISSION_TIMEOUT_MS,
+                 enabled: bool = SQL_ADMISSION_ENABLED, log_path: str = SQL_ADMISSION_LOG_PATH):
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.row_limit = row_limit
+        self.timeout_ms = timeout_ms
+        self.enabled = enabled
+        self.log_path = log_path
+        self._history: deque = deque(maxlen=SQL_ADMISSION_HISTORY)
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._log_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self.stats = {"allowed": 0, "rewritten": 0, "rejected": 0, "unplanned": 0, "explain_ms": 0.0,
+                      "log_errors": 0}
+
+    # ---- planning --------------------------------------------------------
+
+    def _over_budget(self, estimates: Dict[str, Any]) -> Optional[str]:
+        if estimates["cost"] > self.max_cost:
+            return f"estimated cost {estimates['cost']:.0f} exceeds {self.max_cost:.0f}"
+        if estimates["rows"] > self.max_rows:
+            return f"estimated rows {estimates['rows']:.0f} exceed {self.max_rows:.0f}"
+        return None
+
+    async def _explain(self, conn, sql: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            async with conn.transaction(readonly=True):
+                await conn.execute(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}")
+                plan_json = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}")
+        finally:
+            self.stats["explain_ms"] += (time.perf_counter() - started) * 1000
+        return plan_estimates(plan_json)
+
+    async def admit(self, conn, sql: str, source: str = "llm") -> Dict[str, Any]:
+        """
+        Decide whether (and in what form) the statement may run.
+
+        Returns {admitted, action: allow|rewrite|reject|unplanned, sql,
+        operation_type, reason, cost, rows}. ``sql`` is the statement to
+        execute; it is the LIMIT-capped form for SELECTs.
+        """
+        operation_type = statement_type(sql)
+        decision = {
+            "source": source,
+            "operation_type": operation_type,
+            "original_sql": sql,
+            "sql": sql,
+            "admitted": True,
+            "action": "allow",
+            "reason": None,
+            "cost": None,
+            "rows": None
+        }
+        plans: Dict[str, Any] = {}
+
+        # Structural checks apply even with admission disabled: one SELECT/INSERT/UPDATE/DELETE only
+        unsupported = unsupported_reason(sql)
+        if unsupported:
+            decision.update(admitted=False, action="reject", reason=unsupported)
+            return self._record(decision, plans)
+
+        if not self.enabled:
+            decision.update(action="unplanned", reason="admission disabled")
+            return self._record(decision, plans)
+
+        statement = strip_statement(sql)
+        try:
+            estimates = await self._explain(conn, statement)
+        except Exception as e:
+            # The statement would fail anyway (syntax, unknown column, planning timeout)
+            decision.update(admitted=False, action="reject", reason=f"EXPLAIN failed: {str(e)[:200]}")
+            return self._record(decision, plans)
+
+        plans["original"] = estimates["plan"]
+        decision.update(cost=estimates["cost"], rows=estimates["rows"])
+        over_budget = self._over_budget(estimates)
+
+        if operation_type != "SELECT":
+            if over_budget:
+                decision.update(admitted=False, action="reject", reason=over_budget)
+            decision["sql"] = statement
+            return self._record(decision, plans)
+
+        limited = inject_limit(statement, self.row_limit)
+        decision["sql"] = limited
+        if over_budget:
+            try:
+                limited_estimates = await self._explain(conn, limited)
+            except Exception as e:
+                decision.update(admitted=False, action="reject", reason=f"{over_budget}; limited EXPLAIN failed: {str(e)[:200]}")
+                return self._record(decision, plans)
+            plans["limited"] = limited_estimates["plan"]
+            still_over = self._over_budget(limited_estimates)
+            if still_over:
+                decision.update(admitted=False, action="reject", reason=f"{over_budget}; with LIMIT {self.row_limit}: {still_over}")
+            else:
+                decision.update(action="rewrite", reason=f"{over_budget}; admitted with LIMIT {self.row_limit}",
+                                cost=limited_estimates["cost"], rows=limited_estimates["rows"])
+        return self._record(decision, plans)
+
+    # ---- execution -------------------------------------------------------
+
+    @asynccontextmanager
+    async def guard(self, conn, decision: Dict[str, Any]):
+        """Transaction for an admitted statement: read-only for SELECT, always with the statement timeout"""
+        if decision["operation_type"] not in ADMITTED_TYPES:
+            raise ValueError(f"{decision['operation_type']} statements cannot run under admission control")
+        async with conn.transaction(readonly=decision["operation_type"] == "SELECT"):
+            await conn.execute(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}")
+            yield conn
+
+    # ---- decision log ----------------------------------------------------
+
+    def _record(self, decision: Dict[str, Any], plans: Dict[str, Any]) -> Dict[str, Any]:
+        counter = {"allow": "allowed", "rewrite": "rewritten", "reject": "rejected", "unplanned": "unplanned"}[decision["action"]]
+        entry = {**decision, "timestamp": time.time(), "max_cost": self.max_cost, "max_rows": self.max_rows, "plans": plans}
+        with self._lock:
+            self.stats[counter] += 1
+            self._history.append(entry)
+            if self.log_path:
+                self._pending.append(entry)
+        if self.log_path:
+            if self._writer is None or not self._writer.is_alive():
+                self._start_writer()
+            self._wake.set()
+
+        message = (f"SQL admission {decision['action']} ({decision['source']} {decision['operation_type']}): "
+                   f"cost={decision['cost']} rows={decision['rows']} reason={decision['reason']}")
+        if decision["admitted"]:
+            logger.info(message)
+        else:
+            logger.warning(f"{message} sql={decision['original_sql'][:200]!r}")
+        return decision
+
+    def flush(self):
+        """Append queued decisions to the JSON-lines log"""
+        with self._log_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch or not self.log_path:
+                return
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as log_file:
+                    log_file.writelines(json.dumps(entry, default=str) + "\n" for entry in batch)
+            except OSError as e:
+                self.stats["log_errors"] += 1
+                logger.warning(f"SQL admission log write failed: {e}")
+
+    def _start_writer(self):
+        with self._log_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="sql-admission-log-writer", daemon=True)
+            self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            self._wake.wait(SQL_ADMISSION_LOG_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def recent_decisions(self, limit: int = 20, include_plans: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._history)[-limit:]
+        if include_plans:
+            return entries
+        return [{k: v for k, v in entry.items() if k != "plans"} for entry in entries]
+
+    def get_stats(self) -> Dict[str, Any]:
+        decided = self.stats["allowed"] + self.stats["rewritten"] + self.stats["rejected"]
+        return {
+            **self.stats,
+            "explain_ms": round(self.stats["explain_ms"], 1),
+            "rejection_rate": round(self.stats["rejected"] / decided, 3) if decided else 0.0,
+            "enabled": self.enabled,
+            "max_cost": self.max_cost,
+            "max_rows": self.max_rows,
+            "row_limit": self.row_limit,
+            "timeout_ms": self.timeout_ms,
+            "recent": self.recent_decisions(5)
+        }
+
+
+# Global admission controller shared by every LLM SQL execution path
+query_admission = QueryAdmission()
@@ -0,0 +1,232 @@
+"""
+SQL Dump Bulk Loader
+Streams pg_dump plain-text files: COPY blocks go straight to COPY FROM STDIN, DDL runs in batched transactions
+"""
+import io
+import os
+import re
+import time
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# DDL statements committed together (each one guarded by a savepoint)
+DDL_BATCH_SIZE = int(os.getenv('IMPORT_DDL_BATCH_SIZE', '200'))
+
+# Statement errors kept in the report
+MAX_REPORTED_ERRORS = 50
+
+# Session-level settings from pg_dump headers that must not leak into pooled connections
+SKIP_PREFIXES = (
+    'SET STATEMENT_TIMEOUT', 'SET LOCK_TIMEOUT', 'SET IDLE_IN_TRANSACTION_SESSION_TIMEOUT',
+    'SET CHECK_FUNCTION_BODIES', 'SET XMLOPTION', 'SET CLIENT_MIN_MESSAGES', 'SET ROW_SECURITY',
+    'SET DEFAULT_TABLE_ACCESS_METHOD', 'SET DEFAULT_TABLESPACE', 'SET DEFAULT_WITH_OIDS',
+    'SET CLIENT_ENCODING', 'SET STANDARD_CONFORMING_STRINGS', 'SELECT PG_CATALOG.SET_CONFIG',
+    'COMMENT ON SCHEMA', 'BEGIN', 'COMMIT'
+)
+
+COPY_PATTERN = re.compile(r'^\s*COPY\s+([\w."]+)\s*(\([^)]*\))?\s+FROM\s+stdin', re.IGNORECASE)
+CREATE_TABLE_PATTERN = re.compile(r'^\s*CREATE\s+(?:UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w."]+)', re.IGNORECASE)
+DOLLAR_QUOTE_PATTERN = re.compile(r'\$[A-Za-z_]*\$')
+
+
+def unqualified_name(identifier: str) -> str:
+    """'"public"."farmers"' / 'public.farmers' -> 'farmers'"""
+    return identifier.split('.')[-1].strip('"')
+
+
+class _CopyBlockReader:
+    """File-like view of one COPY data block, ending at the '\\.' terminator line"""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = ""
+        self.done = False
+        self.rows = 0
+
+    def _next_line(self) -> Optional[str]:
+        if self.done:
+            return None
+        line = next(self._lines, None)
+        if line is None or line.rstrip('\r\n') == '\\.':
+            self.done = True
+            return None
+        self.rows += 1
+        return line
+
+    def read(self, size: int = -1) -> str:
+        while not self.done and (size < 0 or len(self._buffer) < size):
+            line = self._next_line()
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size: int = -1) -> str:
+        if self._buffer:
+            data, self._buffer = self._buffer, ""
+            return data
+        return self._next_line() or ""
+
+    def drain(self):
+        """Skip the rest of the block so parsing resumes after the terminator"""
+        while self._next_line() is not None:
+            pass
+        self._buffer = ""
+
+
+class SqlDumpLoader:
+    """
+    Restore a plain-text SQL dump over one psycopg2 connection.
+
+    The upload is read line by line, so memory does not grow with dump size.
+    COPY blocks are passed to ``cursor.copy_expert`` one at a time, each in
+    its own transaction. DDL and other statements are committed in batches
+    of DDL_BATCH_SIZE, with a savepoint per statement so that one failure
+    (e.g. "already exists") does not discard the rest of the batch.
+    """
+
+    def __init__(self, connection, ddl_batch_size: int = DDL_BATCH_SIZE, skip_nonempty_tables: bool = True):
+        self.connection = connection
+        self.ddl_batch_size = ddl_batch_size
+        self.skip_nonempty_tables = skip_nonempty_tables
+        self.report: Dict[str, Any] = {
+            "total_statements": 0,
+            "executed": 0,
+            "skipped": 0,
+            "tables_created": [],
+            "tables": {},
+            "total_rows": 0,
+            "errors": []
+        }
+        self._pending = 0
+
+    # ---- parsing ---------------------------------------------------------
+
+    @staticmethod
+    def iter_statements(lines: Iterator[str]) -> Iterator[str]:
+        """Yield complete statements; dollar-quoted bodies may contain ';'"""
+        current: List[str] = []
+        open_tag = None
+        for line in lines:
+            stripped = line.strip()
+            if not current and (not stripped or stripped.startswith('--')):
+                continue
+
+            current.append(line)
+            for tag in DOLLAR_QUOTE_PATTERN.findall(line):
+                if open_tag is None:
+                    open_tag = tag
+                elif tag == open_tag:
+                    open_tag = None
+
+            if open_tag is None and stripped.endswith(';'):
+                yield ''.join(current)
+                current = []
+        if ''.join(current).strip():
+            yield ''.join(current)
+
+    # ---- execution -------------------------------------------------------
+
+    def _record_error(self, kind: str, target: str, error: Exception):
+        message = str(error).strip().splitlines()[0][:200] if str(error).strip() else type(error).__name__
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append(f"{kind} {target}: {message}")
+        return message
+
+    def _commit_pending(self):
+        if self._pending:
+            self.connection.commit()
+            self._pending = 0
+
+    def _execute_statement(self, statement: str):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT dump_statement")
+            try:
+                cursor.execute(statement)
+                cursor.execute("RELEASE SAVEPOINT dump_statement")
+                self.report["executed"] += 1
+                match = CREATE_TABLE_PATTERN.match(statement)
+                if match:
+                    self.report["tables_created"].append(unqualified_name(match.group(1)))
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT dump_statement")
+                self._record_error("Statement", str(self.report["total_statements"]), e)
+        finally:
+            cursor.close()
+        self._pending += 1
+        if self._pending >= self.ddl_batch_size:
+            self._commit_pending()
+
+    def _copy_block(self, statement: str, table_identifier: str, lines: Iterator[str]):
+        table_name = unqualified_name(table_identifier)
+        reader = _CopyBlockReader(lines)
+        self._commit_pending()
+        cursor = self.connection.cursor()
+        try:
+            if self.skip_nonempty_tables:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_identifier})")
+                if cursor.fetchone()[0]:
+                    reader.drain()
+                    self.connection.rollback()
+                    self.report["tables"][table_name] = {"rows": 0, "status": "skipped", "reason": "table not empty"}
+                    return
+
+            start = time.perf_counter()
+            cursor.copy_expert(statement.strip().rstrip(';'), reader)
+            self.connection.commit()
+            rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else reader.rows
+            self.report["tables"][table_name] = {
+                "rows": rows,
+                "status": "loaded",
+                "ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+            self.report["total_rows"] += rows
+            self.report["executed"] += 1
+        except Exception as e:
+            self.connection.rollback()
+            reader.drain()
+            message = self._record_error("COPY", table_name, e)
+            self.report["tables"][table_name] = {"rows": 0, "status": "failed", "error": message, "rows_in_dump": reader.rows}
+        finally:
+            cursor.close()
+
+    def load(self, binary_file) -> Dict[str, Any]:
+        """Stream the dump from a binary file object and return the load report"""
+        start = time.perf_counter()
+        text_file = io.TextIOWrapper(binary_file, encoding='utf-8', errors='replace', newline='')
+        lines = iter(text_file)
+        try:
+            for statement in self.iter_statements(lines):
+                self.report["total_statements"] += 1
+                normalized = ' '.join(statement.split()).upper()
+                if normalized.startswith(SKIP_PREFIXES):
+                    self.report["skipped"] += 1
+                    continue
+
+                copy_match = COPY_PATTERN.match(statement)
+                if copy_match:
+                    # The statement iterator and the COPY reader share the same line stream
+                    self._copy_block(statement, copy_match.group(1), lines)
+                else:
+                    self._execute_statement(statement)
+            self._commit_pending()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            text_file.detach()
+
+        self.report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.report["success"] = not self.report["errors"]
+        logger.info(
+            f"Dump import: {self.report['executed']} statements, {self.report['total_rows']} rows, "
+            f"{len(self.report['errors'])} errors in {self.report['elapsed_ms']}ms"
+        )
+        return self.report
@@ -0,0 +1,323 @@
+"""
+SQL Profiler
+Per-call-site statement profiling with normalized fingerprints, a slow query log and EXPLAIN capture for slow statements
+"""
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import call_site, observe_query
+
+try:
+    import psycopg2.extensions
+except ImportError:
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to keep only the latency metrics (no fingerprints, slow log or plans)
+SQL_PROFILER_ENABLED = os.getenv('SQL_PROFILER_ENABLED', 'true').lower() == 'true'
+
+# Statements at or above this duration go to the slow query log and get an EXPLAIN plan
+SQL_SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', '500'))
+SQL_SLOW_LOG_SIZE = int(os.getenv('SQL_SLOW_LOG_SIZE', '200'))
+
+# Distinct (fingerprint, call site) pairs kept; the least recently seen is evicted beyond this
+SQL_PROFILER_MAX_ENTRIES = int(os.getenv('SQL_PROFILER_MAX_ENTRIES', '1000'))
+
+# A captured plan is refreshed by the next slow run after this many seconds
+SQL_PLAN_REFRESH_SECONDS = float(os.getenv('SQL_PLAN_REFRESH_SECONDS', '900'))
+SQL_EXPLAIN_TIMEOUT = float(os.getenv('SQL_EXPLAIN_TIMEOUT', '5'))
+
+SORT_KEYS = ("total_ms", "avg_ms", "max_ms", "count", "rows", "errors", "last_seen")
+
+# Only read statements are explained; plain EXPLAIN doesn't run them, but DML plans can still take locks
+EXPLAINABLE = re.compile(r'^\s*(select|with)\b', re.IGNORECASE)
+
+_NORMALIZERS = [
+    (re.compile(r'--[^\n]*'), ' '),
+    (re.compile(r'/\*.*?\*/', re.DOTALL), ' '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\$\d+|%\([^)]*\)s|%s|(?<![\w:]):\w+'), '?'),
+    (re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?, ...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+# Set while the profiler runs its own EXPLAIN so that statement isn't profiled
+_explaining: ContextVar[bool] = ContextVar('sql_profiler_explaining', default=False)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> Tuple[str, str]:
+    """(id, normalized text): literals and bind parameters become ?, IN lists collapse, whitespace folds"""
+    normalized = statement
+    for pattern, replacement in _NORMALIZERS:
+        normalized = pattern.sub(replacement, normalized)
+    normalized = normalized.strip().rstrip(';').strip()
+    return hashlib.md5(normalized.lower().encode()).hexdigest()[:12], normalized
+
+
+def status_rows(status: Any) -> int:
+    """Row count from an asyncpg command tag ("UPDATE 3", "INSERT 0 1")"""
+    if isinstance(status, str):
+        tail = status.rsplit(' ', 1)[-1]
+        return int(tail) if tail.isdigit() else 0
+    return 0
+
+
+class SqlProfiler:
+    """
+    Aggregates every statement by (normalized fingerprint, Python call site).
+
+    Each entry keeps count, errors, total/max time and rows. Statements
+    over SQL_SLOW_QUERY_MS are logged, appended to a bounded slow query
+    log, and their fingerprint gets an EXPLAIN plan. asyncpg statements
+    are explained in a background task on another pooled connection, so
+    the caller isn't kept waiting. psycopg2 statements are explained on a
+    second cursor of the same connection. Hooks: ``InstrumentedConnection``
+    (asyncpg), ``ProfiledCursor`` (raw psycopg2 cursors from the SQLAlchemy
+    pool) and SQLAlchemy engine events (ORM/session statements).
+    """
+
+    def __init__(self, enabled: bool = SQL_PROFILER_ENABLED, slow_ms: float = SQL_SLOW_QUERY_MS,
+                 max_entries: int = SQL_PROFILER_MAX_ENTRIES):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.max_entries = max_entries
+        self.entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.slow_log: deque = deque(maxlen=SQL_SLOW_LOG_SIZE)
+        self.started_at = datetime.now()
+        self._lock = threading.Lock()
+        self.stats = {"statements": 0, "slow": 0, "errors": 0, "evicted": 0,
+                      "plans_captured": 0, "plan_errors": 0}
+
+    # ---- recording -------------------------------------------------------
+
+    def record(self, driver: str, statement: str, site: Tuple[str, str, int], seconds: float,
+               rows: int = 0, failed: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Record one executed statement. Returns the entry when the caller
+        should capture a plan for it (slow, explainable, no fresh plan yet).
+        """
+        observe_query(driver, site, seconds, failed)
+        if not self.enabled or _explaining.get() or not isinstance(statement, str):
+            return None
+
+        fingerprint_id, normalized = fingerprint(statement)
+        site_label = f"{site[0]}:{site[2]} {site[1]}"
+        elapsed_ms = seconds * 1000
+        now = time.time()
+        slow = elapsed_ms >= self.slow_ms and not failed
+        with self._lock:
+            self.stats["statements"] += 1
+            key = (fingerprint_id, site_label)
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.max_entries:
+                    oldest = min(self.entries, key=lambda k: self.entries[k]["last_seen"])
+                    del self.entries[oldest]
+                    self.stats["evicted"] += 1
+                entry = self.entries[key] = {
+                    "fingerprint": fingerprint_id, "statement": normalized[:2000], "call_site": site_label,
+                    "driver": driver, "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                    "slow": 0, "first_seen": now, "last_seen": now,
+                    "plan": None, "plan_captured_at": None, "plan_pending": False
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            rows = rows if rows is not None and rows >= 0 else None
+            entry["rows"] += rows or 0
+            entry["last_seen"] = now
+            if failed:
+                entry["errors"] += 1
+                self.stats["errors"] += 1
+            if not slow:
+                return None
+
+            entry["slow"] += 1
+            self.stats["slow"] += 1
+            self.slow_log.append({
+                "timestamp": datetime.fromtimestamp(now).isoformat(), "elapsed_ms": round(elapsed_ms, 1),
+                "rows": rows, "fingerprint": fingerprint_id, "call_site": site_label, "driver": driver,
+                "statement": statement[:2000]
+            })
+            wants_plan = (EXPLAINABLE.match(statement) and not entry["plan_pending"]
+                          and (entry["plan_captured_at"] is None or now - entry["plan_captured_at"] > SQL_PLAN_REFRESH_SECONDS))
+            if wants_plan:
+                entry["plan_pending"] = True
+        logger.warning(f"Slow query ({elapsed_ms:.0f}ms, {driver}) at {site_label}: {normalized[:300]}")
+        return entry if wants_plan else None
+
+    def _store_plan(self, entry: Dict[str, Any], plan: Optional[str], error: Optional[Exception] = None):
+        with self._lock:
+            entry["plan_pending"] = False
+            if error is not None:
+                self.stats["plan_errors"] += 1
+                entry["plan"] = f"EXPLAIN failed: {error}"[:500]
+            else:
+                self.stats["plans_captured"] += 1
+                entry["plan"] = plan
+            entry["plan_captured_at"] = time.time()
+
+    # ---- plan capture ----------------------------------------------------
+
+    def explain_sync(self, entry: Dict[str, Any], connection, statement: str, parameters: Any):
+        """EXPLAIN on a new cursor of the same psycopg2 connection (results of the original are already fetched)"""
+        token = _explaining.set(True)
+        # Inside the caller's transaction a failed EXPLAIN must not abort it
+        savepoint = not getattr(connection, "autocommit", True)
+        cursor = connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT sql_profiler_explain")
+            try:
+                cursor.execute(f"EXPLAIN {statement}", parameters or None)
+                plan = "\n".join(str(row[0]) for row in cursor.fetchall())
+            except Exception as e:
+                if savepoint:
+                    cursor.execute("ROLLBACK TO SAVEPOINT sql_profiler_explain")
+                self._store_plan(entry, None, e)
+            else:
+                self._store_plan(entry, plan)
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT sql_profiler_explain")
+        except Exception as e:
+            logger.warning(f"SQL profiler could not restore the transaction after EXPLAIN: {e}")
+        finally:
+            cursor.close()
+            _explaining.reset(token)
+
+    def explain_async(self, entry: Dict[str, Any], statement: str, args: Tuple[Any, ...]):
+        """Schedule EXPLAIN for an asyncpg statement on another pooled connection"""
+        async def capture():
+            from async_database import acquire
+            _explaining.set(True)
+            try:
+                async with acquire() as conn:
+                    rows = await conn.fetch(f"EXPLAIN {statement}", *args, timeout=SQL_EXPLAIN_TIMEOUT)
+                self._store_plan(entry, "\n".join(str(row[0]) for row in rows))
+            except Exception as e:
+                self._store_plan(entry, None, e)
+
+        try:
+            asyncio.get_running_loop().create_task(capture())
+        except RuntimeError:
+            self._store_plan(entry, None, RuntimeError("no running event loop"))
+
+    # ---- reads -----------------------------------------------------------
+
+    @staticmethod
+    def _view(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **{k: v for k, v in entry.items() if k not in ("plan_pending", "first_seen", "last_seen", "plan_captured_at")},
+            "total_ms": round(entry["total_ms"], 1),
+            "max_ms": round(entry["max_ms"], 1),
+            "avg_ms": round(entry["total_ms"] / entry["count"], 2) if entry["count"] else 0.0,
+            "first_seen": datetime.fromtimestamp(entry["first_seen"]).isoformat(),
+            "last_seen": datetime.fromtimestamp(entry["last_seen"]).isoformat(),
+            "plan_captured_at": datetime.fromtimestamp(entry["plan_captured_at"]).isoformat()
+                                if entry["plan_captured_at"] else None
+        }
+
+    def top(self, sort: str = "total_ms", limit: int = 50, driver: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Entries ordered by sort (one of SORT_KEYS), descending"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        with self._lock:
+            views = [self._view(entry) for entry in self.entries.values() if driver is None or entry["driver"] == driver]
+        return sorted(views, key=lambda view: view[sort], reverse=True)[:limit]
+
+    def slow_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.slow_log)[-limit:][::-1]
+
+    def reset(self):
+        with self._lock:
+            self.entries.clear()
+            self.slow_log.clear()
+            self.started_at = datetime.now()
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "enabled": self.enabled, "slow_ms": self.slow_ms,
+                    "entries": len(self.entries), "since": self.started_at.isoformat()}
+
+
+# Global profiler shared by every database path in the process
+sql_profiler = SqlProfiler()
+
+
+# ---- psycopg2 ------------------------------------------------------------
+
+if psycopg2 is not None:
+    class ProfiledCursor(psycopg2.extensions.cursor):
+        """psycopg2 cursor that profiles execute/executemany (database_pool passes it as cursor_factory)"""
+
+        def _profiled(self, method, query, vars_list):
+            site = call_site(2)
+            started = time.perf_counter()
+            try:
+                result = method(query, vars_list)
+            except Exception:
+                sql_profiler.record("psycopg2", query if isinstance(query, str) else str(query),
+                                    site, time.perf_counter() - started, failed=True)
+                raise
+            entry = sql_profiler.record("psycopg2", query if isinstance(query, str) else str(query),
+                                        site, time.perf_counter() - started, rows=self.rowcount)
+            if entry is not None:
+                sql_profiler.explain_sync(entry, self.connection, query, vars_list)
+            return result
+
+        def execute(self, query, vars=None):
+            return self._profiled(super().execute, query, vars)
+
+        def executemany(self, query, vars_list):
+            return self._profiled(super().executemany, query, vars_list)
+else:
+    ProfiledCursor = None
+
+
+# ---- SQLAlchemy ----------------------------------------------------------
+# One class-level listener covers every engine; statements already profiled by ProfiledCursor are skipped
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if ProfiledCursor is not None and isinstance(cursor, ProfiledCursor):
+        return
+    conn.info.setdefault("_profiler_started", []).append((time.perf_counter(), call_site()))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if ProfiledCursor is not None and isinstance(cursor, ProfiledCursor):
+        return
+    started, site = conn.info["_profiler_started"].pop()
+    entry = sql_profiler.record("sqlalchemy", statement, site, time.perf_counter() - started, rows=cursor.rowcount)
+    if entry is not None:
+        sql_profiler.explain_sync(entry, cursor.connection, statement, None if executemany else parameters)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    pending = connection.info.get("_profiler_started") if connection is not None else None
+    if pending:
+        started, site = pending.pop()
+        sql_profiler.record("sqlalchemy", exception_context.statement, site,
+                            time.perf_counter() - started, failed=True)
@@ -0,0 +1,83 @@
+"""
+Server-Sent Events Streaming
+Staged text/event-stream responses and batched row streaming from the shared asyncpg pool
+"""
+import os
+import json
+import time
+import logging
+from typing import Any, AsyncIterator, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+from async_database import acquire
+
+logger = logging.getLogger(__name__)
+
+# Rows per 'rows' event and the cap on rows streamed for one query
+SSE_ROW_BATCH = int(os.getenv('SSE_ROW_BATCH', '100'))
+SSE_MAX_ROWS = int(os.getenv('SSE_MAX_ROWS', '5000'))
+
+# Disable proxy buffering (nginx, App Runner) so each event is delivered as it is written
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    """
+    Encode (event, data) pairs as an SSE stream.
+
+    A comment line is written first so headers and the first bytes leave
+    immediately. An exception in the producer becomes an 'error' event, and
+    every stream ends with a 'done' event carrying the elapsed time.
+    """
+    async def body():
+        started = time.perf_counter()
+        yield ": stream open\n\n"
+        try:
+            async for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"SSE stream failed: {e}")
+            yield sse_event("error", {"status": "error", "error": str(e)[:200]})
+        yield sse_event("done", {"elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def stream_select_rows(sql: str, batch_size: int = SSE_ROW_BATCH, max_rows: int = SSE_MAX_ROWS,
+                             statement_timeout_ms: Optional[int] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    'columns', then 'rows' batches, then 'complete' for a SELECT.
+
+    Rows come from a server-side cursor inside a read-only transaction, so
+    the first batch is sent before the rest of the result is read.
+    """
+    async with acquire() as conn:
+        async with conn.transaction(readonly=True):
+            if statement_timeout_ms:
+                await conn.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+            statement = await conn.prepare(sql)
+            columns = [attr.name for attr in statement.get_attributes()]
+            yield "columns", {"columns": columns}
+
+            sent = 0
+            truncated = False
+            cursor = await statement.cursor()
+            while True:
+                rows = await cursor.fetch(min(batch_size, max_rows - sent))
+                if not rows:
+                    break
+                sent += len(rows)
+                yield "rows", {"rows": [list(row) for row in rows], "row_count": sent}
+                if sent >= max_rows:
+                    truncated = await cursor.fetchrow() is not None
+                    break
+            yield "complete", {"row_count": sent, "truncated": truncated}
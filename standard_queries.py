@@ -0,0 +1,195 @@
+"""
+Standard Query Runner
+Saved one-click queries compiled to typed prepared statements, with result caching and write-behind usage counters
+"""
+import os
+import re
+import time
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from async_database import acquire
+from response_cache import response_cache
+from write_behind import usage_counters
+
+logger = logging.getLogger(__name__)
+
+# Saved SQL/name lifetime in memory (save/delete endpoints invalidate immediately)
+STANDARD_QUERY_DEFINITION_TTL = float(os.getenv('STANDARD_QUERY_DEFINITION_TTL', '300'))
+
+# Default result cache lifetime; a query's cache_ttl_seconds column overrides it (0 disables)
+STANDARD_QUERY_CACHE_TTL = float(os.getenv('STANDARD_QUERY_CACHE_TTL', '30'))
+
+# Named parameters a saved query may use, with their PostgreSQL types
+PARAMETER_TYPES = {
+    "farmer_id": "integer",
+    "date_from": "date",
+    "date_to": "date"
+}
+
+# :name placeholders (not :: casts)
+PARAMETER_PATTERN = re.compile(r'(?<![:\w]):(' + '|'.join(PARAMETER_TYPES) + r')\b')
+
+def compile_query(sql: str) -> Tuple[str, List[str]]:
+    """
+    Rewrite :farmer_id / :date_from / :date_to into typed $n placeholders.
+
+    Returns the statement text and the parameter names in $n order. A name
+    used twice maps to the same $n.
+    """
+    order: List[str] = []
+
+    def placeholder(match):
+        name = match.group(1)
+        if name not in order:
+            order.append(name)
+        return f"${order.index(name) + 1}::{PARAMETER_TYPES[name]}"
+
+    return PARAMETER_PATTERN.sub(placeholder, sql.strip().rstrip(';')), order
+
+
+def to_pyformat(sql: str) -> str:
+    """psycopg2 form of a parameterized saved query (%(name)s placeholders, literal % escaped)"""
+    escaped = sql.strip().rstrip(';').replace('%', '%%')
+    return PARAMETER_PATTERN.sub(lambda m: f"%({m.group(1)})s::{PARAMETER_TYPES[m.group(1)]}", escaped)
+
+
+def coerce_parameter(name: str, value: Any) -> Any:
+    if PARAMETER_TYPES[name] == "integer":
+        return int(value)
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+class StandardQueryError(Exception):
+    """Saved query missing, misconfigured or called with bad parameters"""
+
+
+class StandardQueryRunner:
+    """
+    Runs saved standard queries on the shared asyncpg pool.
+
+    A definition (SQL, name, cache TTL) is read once and kept in memory. Its
+    SQL is compiled to typed $n parameters, so asyncpg's per-connection
+    statement cache reuses one named server-side prepared statement, and
+    PostgreSQL its plan, for every click. Results go through the response
+    cache, tagged per query. Usage counts go to the write-behind buffer
+    instead of being written in the request path.
+    """
+
+    def __init__(self, definition_ttl: float = STANDARD_QUERY_DEFINITION_TTL,
+                 cache_ttl: float = STANDARD_QUERY_CACHE_TTL):
+        self.definition_ttl = definition_ttl
+        self.cache_ttl = cache_ttl
+        self._definitions: Dict[int, Dict[str, Any]] = {}
+        self.stats = {"runs": 0, "definition_loads": 0, "cache_hits": 0, "total_ms": 0.0}
+
+    # ---- definitions -----------------------------------------------------
+
+    async def definition(self, query_id: int) -> Dict[str, Any]:
+        cached = self._definitions.get(query_id)
+        if cached and time.time() - cached["loaded_at"] < self.definition_ttl:
+            return cached
+
+        try:
+            row = await _fetch_definition(query_id)
+        except asyncpg.UndefinedTableError:
+            raise StandardQueryError("Standard queries table not found. Please run migration.")
+        if row is None:
+            self._definitions.pop(query_id, None)
+            raise StandardQueryError("Query not found")
+
+        statement, parameters = compile_query(row["sql_query"])
+        cache_ttl = row.get("cache_ttl_seconds")
+        definition = {
+            "id": query_id,
+            "query_name": row["query_name"],
+            "sql_query": row["sql_query"],
+            "statement": statement,
+            "parameters": parameters,
+            "cache_ttl": float(cache_ttl) if cache_ttl is not None else self.cache_ttl,
+            "loaded_at": time.time()
+        }
+        self._definitions[query_id] = definition
+        self.stats["definition_loads"] += 1
+        return definition
+
+    async def invalidate(self, query_id: Optional[int] = None):
+        """Forget a saved query's definition and cached results (all queries when None)"""
+        if query_id is None:
+            self._definitions.clear()
+            await response_cache.invalidate("standard_queries")
+        else:
+            self._definitions.pop(query_id, None)
+            await response_cache.invalidate(f"standard_query:{query_id}")
+
+    # ---- execution -------------------------------------------------------
+
+    async def run(self, query_id: int, params: Optional[Dict[str, Any]] = None,
+                  use_cache: bool = True) -> Dict[str, Any]:
+        """Execute a saved query; result shape matches the /api/run-standard-query endpoint"""
+        started = time.perf_counter()
+        definition = await self.definition(query_id)
+
+        params = {name: value for name, value in (params or {}).items() if value not in (None, "")}
+        missing = [name for name in definition["parameters"] if name not in params]
+        if missing:
+            raise StandardQueryError(f"Missing parameter(s): {', '.join(missing)}")
+        try:
+            args = [coerce_parameter(name, params[name]) for name in definition["parameters"]]
+        except ValueError as e:
+            raise StandardQueryError(f"Invalid parameter: {e}")
+
+        computed = []
+
+        async def produce():
+            computed.append(True)
+            async with acquire() as conn:
+                # Saved queries are reports; nothing they run may write
+                async with conn.transaction(readonly=True):
+                    rows = await conn.fetch(definition["statement"], *args)
+            return {
+                "status": "success",
+                "query_name": definition["query_name"],
+                "row_count": len(rows),
+                "data": [dict(row) for row in rows],
+                "sql_query": definition["sql_query"],
+                "parameters": {name: str(params[name]) for name in definition["parameters"]}
+            }
+
+        usage_counters.add(query_id)
+        self.stats["runs"] += 1
+        if use_cache and definition["cache_ttl"] > 0:
+            key = f"standard_query:{query_id}:" + "&".join(f"{name}={params[name]}" for name in definition["parameters"])
+            result = await response_cache.get_or_compute(
+                key, produce, ttl=definition["cache_ttl"],
+                tags=(f"standard_query:{query_id}", "standard_queries")
+            )
+        else:
+            result = await produce()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["total_ms"] += elapsed_ms
+        cached = not computed
+        if cached:
+            self.stats["cache_hits"] += 1
+        return {**result, "cached": cached, "elapsed_ms": round(elapsed_ms, 1)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **{k: v for k, v in self.stats.items() if k != "total_ms"},
+            "avg_ms": round(self.stats["total_ms"] / self.stats["runs"], 1) if self.stats["runs"] else 0.0,
+            "definitions": len(self._definitions),
+            "pending_usage": usage_counters.get_stats()["pending"]
+        }
+
+
+async def _fetch_definition(query_id: int) -> Optional[asyncpg.Record]:
+    async with acquire() as conn:
+        return await conn.fetchrow("SELECT * FROM standard_queries WHERE id = $1", query_id)
+
+
+# Global runner shared by the dashboard's standard query endpoints
+standard_query_runner = StandardQueryRunner()
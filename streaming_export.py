@@ -0,0 +1,196 @@
+"""
+Streaming Query Export
+Streams SELECT results as CSV, NDJSON or Parquet from a server-side cursor in fixed-size batches
+"""
+import io
+import os
+import csv
+import json
+import uuid
+import logging
+from contextlib import ExitStack
+from typing import Any, Callable, Iterator, List, Optional
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pyarrow = None
+    pyarrow_parquet = None
+    PARQUET_AVAILABLE = False
+
+# Rows fetched from the server-side cursor per round trip
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+# Per-FETCH statement timeout for export transactions (pooled connections default to 2s)
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv('EXPORT_STATEMENT_TIMEOUT_MS', '60000'))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+
+def validate_export_format(fmt: str) -> str:
+    """Normalize the requested format, rejecting unknown or unavailable ones"""
+    fmt = (fmt or "csv").lower()
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {tuple(EXPORT_MEDIA_TYPES)}")
+    if fmt == "parquet" and not PARQUET_AVAILABLE:
+        raise ValueError("Parquet export requires pyarrow to be installed")
+    return fmt
+
+
+class _DrainableBuffer(io.RawIOBase):
+    """Write-only sink whose accumulated bytes are handed out after each batch"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportStream:
+    """
+    One export: a read-only transaction with a named (server-side) cursor.
+
+    ``start()`` opens the connection, declares the cursor and fetches the
+    first batch so SQL errors surface before the response status is sent.
+    Iterating yields encoded batches; the connection is released when the
+    iterator finishes or the client disconnects.
+
+    ``connection_factory`` is a zero-argument context manager yielding a
+    psycopg2 (or pool-proxied psycopg2) connection, or None on failure.
+    """
+
+    def __init__(self, connection_factory: Callable, sql: str, params: Optional[Any] = None,
+                 fmt: str = "csv", batch_size: int = EXPORT_BATCH_SIZE):
+        self.connection_factory = connection_factory
+        self.sql = sql
+        self.params = params
+        self.fmt = validate_export_format(fmt)
+        self.batch_size = batch_size
+        self.columns: List[str] = []
+        self.row_count = 0
+        self._stack = ExitStack()
+        self._cursor = None
+        self._first_batch: List[tuple] = []
+        self._parquet_writer = None
+        self._parquet_sink = None
+
+    def start(self) -> "ExportStream":
+        try:
+            conn = self._stack.enter_context(self.connection_factory())
+            if conn is None:
+                raise ConnectionError("Database connection failed")
+            self._stack.callback(conn.rollback)
+
+            setup = conn.cursor()
+            setup.execute("SET TRANSACTION READ ONLY")
+            setup.execute(f"SET LOCAL statement_timeout = {EXPORT_STATEMENT_TIMEOUT_MS}")
+            setup.close()
+
+            self._cursor = conn.cursor(name=f"export_{uuid.uuid4().hex[:12]}")
+            self._cursor.itersize = self.batch_size
+            self._cursor.execute(self.sql, self.params)
+            self._first_batch = self._cursor.fetchmany(self.batch_size)
+            self.columns = [desc[0] for desc in self._cursor.description] if self._cursor.description else []
+            return self
+        except Exception:
+            self._stack.close()
+            raise
+
+    def _batches(self) -> Iterator[List[tuple]]:
+        batch = self._first_batch
+        self._first_batch = []
+        while batch:
+            yield batch
+            if len(batch) < self.batch_size:
+                return
+            batch = self._cursor.fetchmany(self.batch_size)
+
+    def _encode_csv(self, batch: List[tuple], header: bool) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(self.columns)
+        writer.writerows(batch)
+        return buffer.getvalue().encode("utf-8")
+
+    def _encode_ndjson(self, batch: List[tuple]) -> bytes:
+        lines = [json.dumps(dict(zip(self.columns, row)), default=str) for row in batch]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _encode_parquet(self, batch: List[tuple]) -> bytes:
+        records = [dict(zip(self.columns, row)) for row in batch]
+        if self._parquet_writer is None:
+            table = pyarrow.Table.from_pylist(records)
+            self._parquet_sink = _DrainableBuffer()
+            self._parquet_writer = pyarrow_parquet.ParquetWriter(self._parquet_sink, table.schema)
+        else:
+            table = pyarrow.Table.from_pylist(records, schema=self._parquet_writer.schema)
+        self._parquet_writer.write_table(table)
+        return self._parquet_sink.drain()
+
+    def _encode_parquet_empty(self):
+        schema = pyarrow.schema([(name, pyarrow.null()) for name in self.columns])
+        self._parquet_sink = _DrainableBuffer()
+        self._parquet_writer = pyarrow_parquet.ParquetWriter(self._parquet_sink, schema)
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            header = True
+            for batch in self._batches():
+                self.row_count += len(batch)
+                if self.fmt == "csv":
+                    yield self._encode_csv(batch, header)
+                elif self.fmt == "ndjson":
+                    yield self._encode_ndjson(batch)
+                else:
+                    yield self._encode_parquet(batch)
+                header = False
+
+            if self.fmt == "csv" and header:
+                # Empty result: still emit the header row
+                yield self._encode_csv([], True)
+            if self.fmt == "parquet":
+                if self._parquet_writer is None:
+                    # Empty result: write a schema-only file with null-typed columns
+                    self._encode_parquet_empty()
+                self._parquet_writer.close()
+                yield self._parquet_sink.drain()
+            logger.info(f"Export finished: {self.row_count} rows as {self.fmt}")
+        except Exception as e:
+            # Headers are already sent; the truncated body is the only signal left
+            logger.error(f"Export aborted after {self.row_count} rows: {e}")
+        finally:
+            self._stack.close()
+
+    def response(self, filename: str) -> StreamingResponse:
+        return StreamingResponse(
+            iter(self),
+            media_type=EXPORT_MEDIA_TYPES[self.fmt],
+            headers={"Content-Disposition": f'attachment; filename="{filename}.{self.fmt}"'}
+        )
+
@@ -0,0 +1,105 @@
+"""
+Database Explorer Pagination Tests
+Keyset cursor tokens and NULL-aware seeks over the date sort column
+"""
+import asyncio
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+database_explorer = pytest.importorskip("database_explorer")
+
+
+class FakeCatalog:
+    """Column and primary key lookups for the in-memory test table"""
+
+    def columns(self, table_name, session):
+        return ["id", "created_at", "updated_at"]
+
+    def primary_key(self, table_name, session):
+        return ["id"]
+
+
+class SessionOps:
+    def __init__(self, engine):
+        self.engine = engine
+
+    @contextmanager
+    def get_session(self):
+        with Session(self.engine) as session:
+            yield session
+
+
+@pytest.fixture
+def explorer(monkeypatch):
+    """Explorer over 23 rows; every 4th row has no created_at (matched through updated_at)"""
+    engine = create_engine("sqlite://")
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE events (id INTEGER PRIMARY KEY, created_at TIMESTAMP, updated_at TIMESTAMP)"))
+        for row_id in range(1, 24):
+            created_at = None if row_id % 4 == 0 else now - timedelta(hours=row_id % 5)
+            updated_at = now - timedelta(hours=1) if created_at is None else None
+            conn.execute(text("INSERT INTO events VALUES (:id, :created_at, :updated_at)"),
+                         {"id": row_id, "created_at": created_at, "updated_at": updated_at})
+
+    monkeypatch.setattr(database_explorer, "schema_catalog", FakeCatalog())
+    instance = database_explorer.DatabaseExplorer.__new__(database_explorer.DatabaseExplorer)
+    instance.db_ops = SessionOps(engine)
+    return instance
+
+
+def fetch_page(explorer, cursor=None):
+    result = asyncio.run(explorer.get_table_data_filtered(
+        "events", cursor=cursor, pagination="keyset", limit=5, exact_count=True))
+    assert "error" not in result, result
+    return result
+
+
+def test_page_cursor_round_trips_sort_values():
+    moment = datetime(2024, 5, 1, 12, 30)
+    for value in (moment, date(2024, 5, 1), None, 42, "north"):
+        token = database_explorer.encode_page_cursor(value, 7, "next")
+        assert database_explorer.decode_page_cursor(token) == {"value": value, "id": 7, "direction": "next"}
+    assert database_explorer.decode_page_cursor(
+        database_explorer.encode_page_cursor(moment, 7, "prev"))["direction"] == "prev"
+
+
+def test_decode_page_cursor_rejects_tampered_tokens():
+    with pytest.raises(ValueError):
+        database_explorer.decode_page_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        database_explorer.decode_page_cursor(database_explorer.encode_page_cursor(1, 7, "sideways"))
+
+
+def test_keyset_pages_visit_every_row_once_including_null_dates(explorer):
+    pages, cursor = [], None
+    while True:
+        result = fetch_page(explorer, cursor)
+        pages.append(result)
+        cursor = result["next_cursor"]
+        if not cursor:
+            break
+
+    seen = [row["id"] for page in pages for row in page["rows"]]
+    assert sorted(seen) == list(range(1, 24))
+    # NULL created_at rows sort after every dated row
+    assert [row_id % 4 for row_id in seen[-5:]] == [0] * 5
+    assert pages[0]["prev_cursor"] is None
+
+
+def test_keyset_prev_cursor_returns_the_previous_page(explorer):
+    pages, cursor = [], None
+    while True:
+        result = fetch_page(explorer, cursor)
+        pages.append(result)
+        cursor = result["next_cursor"]
+        if not cursor:
+            break
+
+    for earlier, later in zip(pages, pages[1:]):
+        previous = fetch_page(explorer, later["prev_cursor"])
+        assert [row["id"] for row in previous["rows"]] == [row["id"] for row in earlier["rows"]]
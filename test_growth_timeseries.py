@@ -0,0 +1,63 @@
+"""
+Farmer Growth Time Series Tests
+Cumulative totals and bucket alignment for the farmer growth series
+"""
+from datetime import datetime
+
+import pytest
+
+from growth_timeseries import NEW_FARMERS_SQL, FarmerGrowthSeries, cumulative_series, validate_window
+
+
+class FakeSession:
+    """Returns canned rows per growth query"""
+
+    def __init__(self, new_rows, unsub_rows, fail_new=False):
+        self.new_rows = new_rows
+        self.unsub_rows = unsub_rows
+        self.fail_new = fail_new
+        self.rollbacks = 0
+
+    def execute(self, clause, params):
+        is_new = str(clause) == NEW_FARMERS_SQL
+        if is_new and self.fail_new:
+            raise RuntimeError("column created_at does not exist")
+        rows = self.new_rows if is_new else self.unsub_rows
+        return type("Result", (), {"fetchall": lambda _self: rows})()
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_cumulative_series_starts_from_base_count():
+    assert cumulative_series(10, [2, 0, 5], [1, 3, 0]) == [11, 8, 13]
+    assert cumulative_series(0, [], []) == []
+
+
+def test_validate_window_rejects_unsupported_input():
+    validate_window(30, "week")
+    with pytest.raises(ValueError):
+        validate_window(14, "day")
+    with pytest.raises(ValueError):
+        validate_window(30, "hour")
+
+
+def test_build_aligns_unsubscribed_to_new_farmer_buckets():
+    new_rows = [(datetime(2024, 5, 1), 3, 100), (datetime(2024, 5, 2), 0, 100), (datetime(2024, 5, 3), 2, 100)]
+    unsub_rows = [(datetime(2024, 5, 2), 1)]
+    series = FarmerGrowthSeries(FakeSession(new_rows, unsub_rows)).build(7, "day", now=datetime(2024, 5, 7))
+
+    assert series["dates"] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+    assert series["new_farmers"] == [3, 0, 2]
+    assert series["unsubscribed"] == [0, 1, 0]
+    assert series["cumulative"] == [103, 102, 104]
+
+
+def test_build_falls_back_to_unsubscribed_buckets():
+    session = FakeSession([], [(datetime(2024, 5, 1), 2), (datetime(2024, 5, 2), 0)], fail_new=True)
+    series = FarmerGrowthSeries(session).build(7, "day", now=datetime(2024, 5, 7))
+
+    assert session.rollbacks == 1
+    assert series["dates"] == ["2024-05-01", "2024-05-02"]
+    assert series["new_farmers"] == [0, 0]
+    assert series["unsubscribed"] == [2, 0]
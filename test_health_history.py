@@ -0,0 +1,80 @@
+"""
+Health History Tests
+Latency percentile math, hourly rollups and the downsampled summary series
+"""
+import time
+
+import pytest
+
+from health_history import ROLLUP_SECONDS, HealthHistory, percentile, weighted_percentile
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [10.0, 20.0, 30.0, 40.0]
+    assert percentile(values, 0) == 10.0
+    assert percentile(values, 50) == 25.0
+    assert percentile(values, 100) == 40.0
+    assert percentile(values, 95) == pytest.approx(38.5)
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) is None
+
+
+def test_weighted_percentile_follows_sample_weights():
+    pairs = [(100.0, 9), (10.0, 1), (None, 5), (50.0, 0)]
+    assert weighted_percentile(pairs, 5) == 10.0
+    assert weighted_percentile(pairs, 50) == 100.0
+    assert weighted_percentile([], 50) is None
+
+
+def closed_hour_history():
+    """History with one closed hour three hours ago (10 ok samples, 1 failure) and one current sample"""
+    history = HealthHistory(path="", raw_hours=1)
+    now = time.time()
+    bucket = int(now // ROLLUP_SECONDS) * ROLLUP_SECONDS - 3 * ROLLUP_SECONDS
+    for n in range(10):
+        history.record("api", True, float(10 * (n + 1)), ts=bucket + 60 * n)
+    history.record("api", False, None, ts=bucket + 900)
+    history.record("api", True, 200.0, ts=now)
+    history.flush()
+    history.compact(now=now)
+    return history, bucket
+
+
+def test_compact_rolls_up_closed_hours_and_expires_raw_samples():
+    history, bucket = closed_hour_history()
+    rollup = history._db.execute(
+        "SELECT bucket, samples, ok_samples, latency_avg, p50, p95, p99, latency_max FROM health_rollups"
+    ).fetchall()
+    assert rollup == [(bucket, 11, 10, 55.0, 55.0, pytest.approx(95.5), pytest.approx(99.1), 100.0)]
+    # Only the current sample is still inside the 1h raw retention
+    assert history.get_stats()["raw_samples"] == 1
+
+
+def test_summary_combines_rollups_and_raw_samples():
+    history, _ = closed_hour_history()
+    summary = history.summary("api", window_seconds=86400, points=24)
+
+    assert summary["samples"] == 12
+    assert summary["uptime"] == round(11 / 12, 4)
+    # Hourly p50 carries the weight of its 11 samples against one raw 200ms sample
+    assert summary["p50"] == 55.0
+    assert summary["p99"] == 200.0
+
+    rollup_point = summary["sparkline_failures"].index(True)
+    assert summary["sparkline_failures"].count(True) == 1
+    assert summary["sparkline"][rollup_point] == 55.0
+    assert summary["sparkline"][-1] == 200.0
+    assert len([value for value in summary["sparkline"] if value is not None]) == 2
+
+
+def test_short_windows_read_raw_samples_only():
+    history = HealthHistory(path="")
+    now = time.time()
+    for n, latency in enumerate([30.0, 10.0, 20.0]):
+        history.record("db", True, latency, ts=now - 60 * (n + 1))
+    summary = history.summary("db", window_seconds=3600, points=6)
+
+    assert summary["samples"] == 3
+    assert summary["uptime"] == 1.0
+    assert (summary["p50"], summary["p95"]) == (20.0, 29.0)
+    assert summary["sparkline"][-1] == 20.0
@@ -0,0 +1,40 @@
+"""
+Health Prober Tests
+Ring buffer history and summaries of background health probes
+"""
+import asyncio
+
+from health_prober import HealthProber
+
+
+def run_probes(prober, name, times):
+    async def go():
+        for _ in range(times):
+            await prober.run_probe(name)
+    asyncio.run(go())
+
+
+def test_history_returns_latest_results():
+    prober = HealthProber(history_size=3)
+    calls = []
+    prober.register("counter", lambda: calls.append(1) or len(calls), interval=60)
+    run_probes(prober, "counter", 5)
+
+    assert [entry["value"] for entry in prober.history("counter")] == [3, 4, 5]
+    assert [entry["value"] for entry in prober.history("counter", 2)] == [4, 5]
+
+
+def test_failures_count_against_uptime():
+    prober = HealthProber()
+
+    def check():
+        raise RuntimeError("down")
+
+    prober.register("broken", check, interval=60)
+    run_probes(prober, "broken", 2)
+
+    summary = prober.summary("broken")
+    assert summary["ok"] is False
+    assert summary["consecutive_failures"] == 2
+    assert summary["uptime"] == 0
+    assert summary["last_error"] == "down"
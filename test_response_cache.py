@@ -0,0 +1,112 @@
+"""
+Response Cache Tests
+Single-flight misses, stale-while-revalidate refreshes and tag invalidation
+"""
+import asyncio
+
+from response_cache import LRUCacheBackend, ResponseCache
+
+
+class CountingProducer:
+    """Producer returning an increasing version number, optionally after a delay"""
+
+    def __init__(self, delay: float = 0, payload=None):
+        self.calls = 0
+        self.delay = delay
+        self.payload = payload
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.payload if self.payload is not None else {"version": self.calls}
+
+
+def new_cache() -> ResponseCache:
+    return ResponseCache(backend=LRUCacheBackend(), enabled=True)
+
+
+def test_concurrent_misses_share_one_computation():
+    cache, producer = new_cache(), CountingProducer(delay=0.05)
+
+    async def scenario():
+        return await asyncio.gather(*[cache.get_or_compute("kpis", producer, ttl=60) for _ in range(5)])
+
+    results = asyncio.run(scenario())
+    assert producer.calls == 1
+    assert results == [{"version": 1}] * 5
+    assert cache.stats["misses"] == 5
+    assert cache.stats["coalesced"] == 4
+
+
+def test_fresh_entries_are_served_from_cache():
+    cache, producer = new_cache(), CountingProducer()
+
+    async def scenario():
+        first = await cache.get_or_compute("kpis", producer, ttl=60)
+        second = await cache.get_or_compute("kpis", producer, ttl=60)
+        return first, second
+
+    assert asyncio.run(scenario()) == ({"version": 1}, {"version": 1})
+    assert producer.calls == 1
+    assert cache.stats["hits"] == 1
+
+
+def test_stale_entries_are_served_while_one_refresh_runs():
+    cache, producer = new_cache(), CountingProducer(delay=0.01)
+
+    async def scenario():
+        # ttl=0: every stored entry is immediately stale but within stale_ttl
+        await cache.get_or_compute("kpis", producer, ttl=0, stale_ttl=60)
+        stale = await asyncio.gather(*[cache.get_or_compute("kpis", producer, ttl=0, stale_ttl=60) for _ in range(3)])
+        await asyncio.sleep(0.05)
+        refreshed = await cache.get_or_compute("kpis", producer, ttl=0, stale_ttl=60)
+        await asyncio.sleep(0.05)
+        return stale, refreshed
+
+    stale, refreshed = asyncio.run(scenario())
+    assert stale == [{"version": 1}] * 3
+    assert refreshed == {"version": 2}
+    assert cache.stats["stale_served"] == 4
+    assert cache.stats["refreshes"] == 2
+
+
+def test_invalidation_drops_tagged_entries():
+    cache, producer = new_cache(), CountingProducer()
+
+    async def scenario():
+        await cache.get_or_compute("farmers", producer, ttl=60, tags=("farmers",))
+        await cache.get_or_compute("fields", producer, ttl=60, tags=("fields",))
+        await cache.invalidate("farmers")
+        farmers = await cache.get_or_compute("farmers", producer, ttl=60, tags=("farmers",))
+        fields = await cache.get_or_compute("fields", producer, ttl=60, tags=("fields",))
+        return farmers, fields
+
+    farmers, fields = asyncio.run(scenario())
+    assert farmers == {"version": 3}
+    assert fields == {"version": 2}
+    assert cache.stats["invalidations"] == 1
+
+
+def test_invalidation_during_computation_skips_the_write():
+    cache, producer = new_cache(), CountingProducer(delay=0.05)
+
+    async def scenario():
+        pending = asyncio.create_task(cache.get_or_compute("farmers", producer, ttl=60, tags=("farmers",)))
+        await asyncio.sleep(0.01)
+        await cache.invalidate("farmers")
+        await pending
+        return await cache.backend.get("farmers")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_error_payloads_are_not_cached():
+    cache, producer = new_cache(), CountingProducer(payload={"status": "error", "error": "db down"})
+
+    async def scenario():
+        await cache.get_or_compute("kpis", producer, ttl=60)
+        await cache.get_or_compute("kpis", producer, ttl=60)
+
+    asyncio.run(scenario())
+    assert producer.calls == 2
@@ -0,0 +1,81 @@
+"""
+SQL Admission Tests
+Statement classification and LIMIT injection for LLM-generated SQL
+"""
+import asyncio
+import json
+
+from sql_admission import QueryAdmission, inject_limit, is_single_statement, statement_type, unsupported_reason
+
+
+def test_statement_type_admitted_verbs():
+    assert statement_type("SELECT * FROM farmers") == "SELECT"
+    assert statement_type("  -- latest\n select 1") == "SELECT"
+    assert statement_type("WITH f AS (SELECT id FROM farmers) SELECT * FROM f") == "SELECT"
+    assert statement_type("INSERT INTO farmers (name) VALUES ('x')") == "INSERT"
+    assert statement_type("update farmers set name = 'x' where id = 1") == "UPDATE"
+    assert statement_type("DELETE FROM farmers WHERE id = 1") == "DELETE"
+
+
+def test_statement_type_ignores_keywords_in_literals_and_identifiers():
+    assert statement_type("SELECT 'drop table farmers' AS note, last_update FROM farmers") == "SELECT"
+    assert statement_type('SELECT "delete" FROM farmers') == "SELECT"
+    assert statement_type("SELECT * FROM farmers FOR UPDATE") == "SELECT"
+
+
+def test_statement_type_rejects_everything_else():
+    assert statement_type("BEGIN; DELETE FROM farmers; COMMIT;") == "TRANSACTION"
+    assert statement_type("START TRANSACTION") == "TRANSACTION"
+    for sql in ["DROP TABLE farmers", "TRUNCATE farmers", "ALTER TABLE farmers ADD COLUMN x int",
+                "WITH d AS (DELETE FROM farmers RETURNING id) SELECT * FROM d",
+                "SELECT * INTO backup FROM farmers", "COPY farmers TO '/tmp/x'", ""]:
+        assert statement_type(sql) in ("UNSUPPORTED", "TRANSACTION"), sql
+
+
+def test_unsupported_reason():
+    assert unsupported_reason("SELECT * FROM farmers;") is None
+    assert "transaction" in unsupported_reason("BEGIN; DELETE FROM farmers; COMMIT;")
+    assert "DROP" in unsupported_reason("DROP TABLE farmers")
+    assert "modify" in unsupported_reason("WITH d AS (DELETE FROM farmers RETURNING id) SELECT * FROM d")
+    assert "multiple" in unsupported_reason("SELECT 1; SELECT 2")
+
+
+def test_is_single_statement_ignores_literals_and_comments():
+    assert is_single_statement("SELECT 'a;b' FROM farmers;")
+    assert is_single_statement("SELECT 1 -- first; second\n")
+    assert not is_single_statement("SELECT 1; DELETE FROM farmers")
+
+
+def test_inject_limit_appends_and_lowers():
+    assert inject_limit("SELECT * FROM farmers", 1000) == "SELECT * FROM farmers LIMIT 1000"
+    assert inject_limit("SELECT * FROM farmers;", 1000) == "SELECT * FROM farmers LIMIT 1000"
+    assert inject_limit("SELECT * FROM farmers LIMIT 10", 1000) == "SELECT * FROM farmers LIMIT 10"
+    assert inject_limit("SELECT * FROM farmers LIMIT 5000 OFFSET 20", 1000) == "SELECT * FROM farmers LIMIT 1000 OFFSET 20"
+    assert inject_limit("SELECT * FROM farmers LIMIT ALL", 1000) == "SELECT * FROM farmers LIMIT 1000"
+
+
+def test_inject_limit_after_trailing_comment():
+    limited = inject_limit("SELECT * FROM farmers -- all farmers", 1000)
+    assert limited.endswith("LIMIT 1000")
+    assert "--" not in limited
+    limited = inject_limit("SELECT * FROM farmers /* all */ LIMIT 5000 -- cap", 1000)
+    assert limited.endswith("LIMIT 1000")
+
+
+def test_inject_limit_keeps_comment_markers_inside_literals():
+    assert inject_limit("SELECT * FROM farmers WHERE note = '-- x'", 10) == "SELECT * FROM farmers WHERE note = '-- x' LIMIT 10"
+
+
+def test_decision_log_is_off_by_default_and_written_on_flush(tmp_path):
+    assert QueryAdmission().log_path == ""
+
+    log_path = tmp_path / "admission.jsonl"
+    admission = QueryAdmission(log_path=str(log_path))
+    decision = asyncio.run(admission.admit(None, "DROP TABLE farmers"))
+    assert decision["action"] == "reject"
+    admission.flush()
+
+    entries = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert len(entries) == 1
+    assert entries[0]["original_sql"] == "DROP TABLE farmers"
+    assert entries[0]["plans"] == {}
@@ -0,0 +1,83 @@
+"""
+Write-Behind Buffer Tests
+Requeue on transient flush errors and per-item fallback for rejected batches
+"""
+import asyncio
+
+from write_behind import WriteBehindBuffer
+
+
+class FakeDatabase:
+    """Stands in for WriteBehindBuffer._write: records committed batches, fails on demand"""
+
+    def __init__(self, bad_items=(), outage_after=None, outage=False):
+        self.bad_items = set(bad_items)
+        self.outage_after = outage_after
+        self.outage = outage
+        self.committed = []
+
+    async def write(self, batch):
+        if self.outage or (self.outage_after is not None and len(self.committed) >= self.outage_after):
+            raise ConnectionError("connection refused")
+        if self.bad_items.intersection(batch):
+            raise ValueError("invalid input syntax")
+        self.committed.extend(batch)
+
+
+def new_buffer(database: FakeDatabase, max_retries: int = 3) -> WriteBehindBuffer:
+    buffer = WriteBehindBuffer("test", writer=None, max_retries=max_retries)
+    buffer._write = database.write
+    return buffer
+
+
+def test_transient_error_requeues_batch_ahead_of_new_items():
+    database = FakeDatabase(outage=True)
+    buffer = new_buffer(database)
+    for item in (1, 2, 3):
+        buffer.add(item)
+
+    assert asyncio.run(buffer.flush()) is False
+    buffer.add(4)
+    assert buffer._pending == [1, 2, 3, 4]
+    assert buffer.get_stats()["consecutive_failures"] == 1
+
+    database.outage = False
+    assert asyncio.run(buffer.flush()) is True
+    assert database.committed == [1, 2, 3, 4]
+    assert buffer.get_stats()["consecutive_failures"] == 0
+
+
+def test_rejected_batch_falls_back_to_single_items():
+    database = FakeDatabase(bad_items={"bad"})
+    buffer = new_buffer(database)
+    for item in ("a", "bad", "b"):
+        buffer.add(item)
+
+    assert asyncio.run(buffer.flush()) is True
+    assert database.committed == ["a", "b"]
+    assert buffer.stats["written"] == 2
+    assert buffer.stats["rejected"] == 1
+    assert buffer._pending == []
+
+
+def test_outage_during_item_fallback_requeues_only_unwritten_items():
+    database = FakeDatabase(bad_items={"bad"}, outage_after=1)
+    buffer = new_buffer(database)
+    for item in ("a", "bad", "b", "c"):
+        buffer.add(item)
+
+    assert asyncio.run(buffer.flush()) is False
+    assert database.committed == ["a"]
+    assert buffer._pending == ["bad", "b", "c"]
+
+
+def test_batch_is_dropped_after_max_retries():
+    database = FakeDatabase(outage=True)
+    buffer = new_buffer(database, max_retries=2)
+    buffer.add(1)
+
+    results = [asyncio.run(buffer.flush()) for _ in range(3)]
+    assert results == [False, False, False]
+    assert buffer._pending == []
+    assert buffer.stats["dropped"] == 1
+    assert buffer.get_stats()["consecutive_failures"] == 0
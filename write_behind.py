@@ -0,0 +1,256 @@
+"""
+Write-Behind Buffers
+In-process batching of fire-and-forget writes (cost events, usage counters) onto the shared asyncpg pool
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+
+from async_database import acquire
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many items are pending, or this often, whichever comes first
+WRITE_BEHIND_FLUSH_ROWS = int(os.getenv('WRITE_BEHIND_FLUSH_ROWS', '500'))
+WRITE_BEHIND_FLUSH_MS = int(os.getenv('WRITE_BEHIND_FLUSH_MS', '2000'))
+
+# Consecutive failed flushes before a batch is dropped; backoff doubles up to the cap
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', '8'))
+WRITE_BEHIND_MAX_BACKOFF_MS = int(os.getenv('WRITE_BEHIND_MAX_BACKOFF_MS', '30000'))
+
+# Items held during an outage; beyond this the oldest are discarded
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '50000'))
+
+# Errors that mean "database unreachable right now", as opposed to a bad row
+TRANSIENT_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    ConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+    asyncpg.AdminShutdownError
+)
+
+
+class WriteBehindBuffer:
+    """
+    Batches items in memory and writes them with one statement per flush.
+
+    ``add()`` is synchronous and thread-safe, so request handlers and
+    threadpool code can enqueue without touching the database. A background
+    task calls ``writer(conn, batch)`` every ``flush_ms``, or sooner once
+    ``flush_rows`` items are pending. If the database is unreachable, the
+    batch is kept and retried with exponential backoff. After
+    ``max_retries`` consecutive failures it is dropped. A batch rejected
+    for its data is retried item by item, so one bad row only loses itself.
+    ``stop()`` drains whatever is pending.
+    """
+
+    def __init__(self, name: str, writer: Callable[[Any, List[Any]], Awaitable[None]],
+                 flush_rows: int = WRITE_BEHIND_FLUSH_ROWS, flush_ms: int = WRITE_BEHIND_FLUSH_MS,
+                 max_retries: int = WRITE_BEHIND_MAX_RETRIES, max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self.name = name
+        self.writer = writer
+        self.flush_rows = flush_rows
+        self.flush_ms = flush_ms
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self._pending: List[Any] = []
+        self._lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._overflowing = False
+        self.stats = {"enqueued": 0, "written": 0, "flushes": 0, "flush_errors": 0,
+                      "dropped": 0, "rejected": 0, "last_flush_ms": 0.0, "last_error": None}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ---- producers -------------------------------------------------------
+
+    def add(self, item: Any):
+        with self._lock:
+            self._pending.append(item)
+            self.stats["enqueued"] += 1
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.stats["dropped"] += overflow
+            full = len(self._pending) >= self.flush_rows
+        if overflow > 0 and not self._overflowing:
+            # Logged once per outage; the running total is in stats["dropped"]
+            self._overflowing = True
+            logger.error(f"Write-behind '{self.name}' over {self.max_pending} pending items; dropping the oldest")
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ---- flushing --------------------------------------------------------
+
+    async def _write(self, batch: List[Any]):
+        async with acquire() as conn:
+            async with conn.transaction():
+                await self.writer(conn, batch)
+
+    async def _write_individually(self, batch: List[Any]):
+        """Write items one per transaction; on a transient error ``batch`` is trimmed to the unwritten items"""
+        for done, item in enumerate(batch):
+            try:
+                await self._write([item])
+                self.stats["written"] += 1
+            except TRANSIENT_ERRORS:
+                # Items already committed (or rejected) must not be requeued
+                del batch[:done]
+                raise
+            except Exception as e:
+                self.stats["rejected"] += 1
+                logger.error(f"Write-behind '{self.name}' rejected item {item!r}: {e}")
+
+    async def flush(self) -> bool:
+        """Write everything pending; False if the database was unreachable"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return True
+
+        started = time.perf_counter()
+        try:
+            try:
+                await self._write(batch)
+                self.stats["written"] += len(batch)
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as e:
+                logger.warning(f"Write-behind '{self.name}' batch of {len(batch)} rejected ({e}); retrying items individually")
+                await self._write_individually(batch)
+        except Exception as e:
+            self._failures += 1
+            self.stats["flush_errors"] += 1
+            self.stats["last_error"] = str(e)[:200]
+            if self._failures > self.max_retries:
+                self.stats["dropped"] += len(batch)
+                logger.error(f"Write-behind '{self.name}' dropped {len(batch)} items after {self._failures} failed flushes: {e}")
+                self._failures = 0
+            else:
+                # Put the unwritten items back ahead of anything enqueued meanwhile
+                with self._lock:
+                    self._pending[:0] = batch
+                logger.warning(f"Write-behind '{self.name}' flush failed ({self._failures}/{self.max_retries}), will retry: {e}")
+            return False
+
+        self._failures = 0
+        self._overflowing = False
+        self.stats["flushes"] += 1
+        self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+    def _delay(self) -> float:
+        if not self._failures:
+            return self.flush_ms / 1000
+        return min(self.flush_ms * 2 ** self._failures, WRITE_BEHIND_MAX_BACKOFF_MS) / 1000
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._delay())
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, attempts: int = 3):
+        """Stop the flush loop and drain pending items (a few quick attempts, then give up)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+        for attempt in range(attempts):
+            if await self.flush() and not self._pending:
+                return
+            await asyncio.sleep(0.2 * (attempt + 1))
+        if self._pending:
+            logger.error(f"Write-behind '{self.name}' shut down with {len(self._pending)} unwritten items")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending), "running": self.running,
+                "consecutive_failures": self._failures}
+
+
+# ---- writers -------------------------------------------------------------
+
+COST_EVENT_COLUMNS = ["farmer_id", "interaction_type", "cost_amount", "tokens_used", "api_service", "created_at"]
+
+
+async def write_cost_events(conn, batch: List[tuple]):
+    """COPY a batch of cost events into farmer_interaction_costs"""
+    await conn.copy_records_to_table("farmer_interaction_costs", records=batch, columns=COST_EVENT_COLUMNS)
+
+
+async def write_usage_counts(conn, batch: List[int]):
+    """One UPDATE adding each standard query's accumulated uses"""
+    uses = Counter(batch)
+    ids = list(uses)
+    await conn.execute("""
+        UPDATE standard_queries AS sq
+        SET usage_count = COALESCE(sq.usage_count, 0) + u.uses
+        FROM unnest($1::integer[], $2::integer[]) AS u(id, uses)
+        WHERE sq.id = u.id
+    """, ids, [uses[query_id] for query_id in ids])
+
+
+# Global buffers, started and drained by register_write_behind
+cost_events = WriteBehindBuffer("farmer_interaction_costs", write_cost_events)
+usage_counters = WriteBehindBuffer("standard_query_usage", write_usage_counts)
+
+BUFFERS = [cost_events, usage_counters]
+
+
+def record_cost_event(farmer_id, interaction_type, cost_amount, tokens_used=None, api_service="unknown") -> bool:
+    """Queue a farmer_interaction_costs row; False if the buffer is not running (caller writes directly)"""
+    if not cost_events.running:
+        return False
+    cost_events.add((int(farmer_id), interaction_type, Decimal(str(cost_amount)),
+                     int(tokens_used) if tokens_used is not None else None, api_service, datetime.now()))
+    return True
+
+
+def get_write_behind_stats() -> Dict[str, Any]:
+    return {buffer.name: buffer.get_stats() for buffer in BUFFERS}
+
+
+def register_write_behind(app):
+    """
+    Start every buffer's flush loop on startup and drain them on shutdown
+    (register before register_async_pool so the final flush still has a pool)
+    """
+    @app.on_event("startup")
+    async def _start_write_behind():
+        for buffer in BUFFERS:
+            buffer.start()
+
+    @app.on_event("shutdown")
+    async def _drain_write_behind():
+        await asyncio.gather(*(buffer.stop() for buffer in BUFFERS))